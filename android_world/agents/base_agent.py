@@ -71,6 +71,9 @@ class EnvironmentInteractingAgent(abc.ABC):
           f'transition_pause must be non-negative, got {transition_pause}'
       )
     self._transition_pause = transition_pause
+    # Seconds `get_post_transition_state` last waited for the screen to
+    # settle; None in "auto" mode, where the environment waits for it.
+    self.last_settle_time: float | None = None
 
     self._max_steps = None
 
@@ -97,6 +100,16 @@ class EnvironmentInteractingAgent(abc.ABC):
     """Resets the agent."""
     self.env.reset(go_home=go_home)
 
+  def flush(self) -> None:
+    """Waits for work that steps left running in the background.
+
+    Afterwards, the data returned by previous steps is complete.
+    """
+
+  def close(self) -> None:
+    """Waits for background work and stops the threads running it."""
+    self.flush()
+
   def get_post_transition_state(self) -> interface.State:
     """Convenience function to get the agent state after the transition."""
     if self._transition_pause is None:
@@ -105,16 +118,16 @@ class EnvironmentInteractingAgent(abc.ABC):
           end=' ',
       )
       start = time.time()
+      self.last_settle_time = None
       state = self.env.get_state(wait_to_stabilize=True)
       print(f'Fetched after {time.time() - start:2.1f} seconds.')
       return state
     else:
-      time.sleep(self._transition_pause)
       print(
-          'Pausing {:2.1f} seconds before grabbing state.'.format(
-              self._transition_pause
-          )
+          'Waiting at most {:2.1f} seconds for the screen to settle before'
+          ' grabbing state.'.format(self._transition_pause)
       )
+      self.last_settle_time = self.env.wait_for_settle(self._transition_pause)
       return self.env.get_state(wait_to_stabilize=False)
 
   @abc.abstractmethod
@@ -16,8 +16,10 @@
 
 import abc
 import base64
+import dataclasses
 import io
 import os
+import threading
 import time
 from typing import Any, Optional
 import google.generativeai as genai
@@ -33,6 +35,28 @@ import requests
 
 ERROR_CALLING_LLM = 'Error calling LLM'
 
+# Default OpenAI endpoint; can be overridden with the OPENAI_BASE_URL env
+# variable, e.g. to point at a proxy or a compatible local server.
+OPENAI_BASE_URL = 'https://api.openai.com/v1'
+
+
+def create_http_session(pool_size: int = 8) -> requests.Session:
+  """Returns a session that keeps up to `pool_size` connections per host alive.
+
+  Reusing connections saves a TCP and TLS handshake per LLM call. The pool
+  should be at least as large as the number of concurrent calls.
+
+  Args:
+    pool_size: Maximum number of connections kept per host.
+  """
+  session = requests.Session()
+  adapter = requests.adapters.HTTPAdapter(
+      pool_connections=pool_size, pool_maxsize=pool_size
+  )
+  session.mount('https://', adapter)
+  session.mount('http://', adapter)
+  return session
+
 
 def array_to_jpeg_bytes(image: np.ndarray) -> bytes:
   """Converts a numpy array into a byte string for a JPEG image."""
@@ -49,6 +73,118 @@ def image_to_jpeg_bytes(image: Image.Image) -> bytes:
   return img_bytes
 
 
+@dataclasses.dataclass(frozen=True)
+class ImageEncoding:
+  """How images are encoded for a model.
+
+  Attributes:
+    format: PIL image format, e.g. 'JPEG' or 'PNG'.
+    quality: Encoder quality, for lossy formats. Defaults to PIL's default.
+    max_side: If set, larger images are downscaled so that their longer side
+      has this many pixels.
+  """
+
+  format: str = 'JPEG'
+  quality: Optional[int] = None
+  max_side: Optional[int] = None
+
+  @property
+  def mime_type(self) -> str:
+    return f'image/{self.format.lower()}'
+
+
+class ImagePayload:
+  """An image sent to LLMs, converted at most once per encoding.
+
+  Agents wrap each screenshot of a step in one payload and pass it to every
+  call that uses the screenshot, so that it is not re-encoded per call or per
+  retry. The array must not be modified while the payload is in use.
+
+  Attributes:
+    array: The image.
+    encode_seconds: Total time spent converting the image.
+    sent_bytes: Total size of the encoded images handed out, counting reuse.
+  """
+
+  def __init__(self, array: np.ndarray):
+    self.array = array
+    self.encode_seconds = 0.0
+    self.sent_bytes = 0
+    self._lock = threading.Lock()
+    self._images: dict[Optional[int], Image.Image] = {}
+    self._encoded: dict[ImageEncoding, bytes] = {}
+    self._base64: dict[ImageEncoding, str] = {}
+
+  def _image(self, max_side: Optional[int]) -> Image.Image:
+    if max_side not in self._images:
+      image = Image.fromarray(self.array)
+      if max_side is not None and max(image.size) > max_side:
+        scale = max_side / max(image.size)
+        image = image.resize(
+            (
+                max(1, round(image.width * scale)),
+                max(1, round(image.height * scale)),
+            ),
+            Image.Resampling.LANCZOS,
+        )
+      self._images[max_side] = image
+    return self._images[max_side]
+
+  def image(self, max_side: Optional[int] = None) -> Image.Image:
+    """Returns the image as a PIL image, downscaled to `max_side` if set."""
+    with self._lock:
+      start = time.perf_counter()
+      image = self._image(max_side)
+      self.encode_seconds += time.perf_counter() - start
+    return image
+
+  def _encode(self, encoding: ImageEncoding) -> bytes:
+    if encoding not in self._encoded:
+      options = {} if encoding.quality is None else {'quality': encoding.quality}
+      buffer = io.BytesIO()
+      self._image(encoding.max_side).save(
+          buffer, format=encoding.format, **options
+      )
+      self._encoded[encoding] = buffer.getvalue()
+    return self._encoded[encoding]
+
+  def encode(self, encoding: ImageEncoding = ImageEncoding()) -> bytes:
+    """Returns the image encoded with `encoding`."""
+    with self._lock:
+      start = time.perf_counter()
+      encoded = self._encode(encoding)
+      self.encode_seconds += time.perf_counter() - start
+      self.sent_bytes += len(encoded)
+    return encoded
+
+  def base64(self, encoding: ImageEncoding = ImageEncoding()) -> str:
+    """Returns the image encoded with `encoding`, in base64."""
+    with self._lock:
+      start = time.perf_counter()
+      if encoding not in self._base64:
+        self._base64[encoding] = base64.b64encode(
+            self._encode(encoding)
+        ).decode('utf-8')
+      encoded = self._base64[encoding]
+      self.encode_seconds += time.perf_counter() - start
+      self.sent_bytes += len(encoded)
+    return encoded
+
+  def data_url(self, encoding: ImageEncoding = ImageEncoding()) -> str:
+    """Returns the image as a `data:` URL."""
+    return f'data:{encoding.mime_type};base64,{self.base64(encoding)}'
+
+
+ImageInput = np.ndarray | ImagePayload
+
+
+def as_image_payload(image: ImageInput) -> ImagePayload:
+  """Wraps `image` in a payload, unless it already is one."""
+  if isinstance(image, ImagePayload):
+    return image
+  return ImagePayload(image)
+
+
 class LlmWrapper(abc.ABC):
   """Abstract interface for (text only) LLM."""
 
@@ -72,13 +208,14 @@ class MultimodalLlmWrapper(abc.ABC):
 
   @abc.abstractmethod
   def predict_mm(
-      self, text_prompt: str, images: list[np.ndarray]
+      self, text_prompt: str, images: list[ImageInput]
   ) -> tuple[str, Optional[bool], Any]:
     """Calling multimodal LLM with a prompt and a list of images.
 
     Args:
       text_prompt: Text prompt.
-      images: List of images as numpy ndarray.
+      images: List of images as numpy ndarray, or as payloads to reuse their
+        encodings across calls.
 
     Returns:
       Text output and raw output.
@@ -111,10 +248,15 @@ class GeminiGcpWrapper(LlmWrapper, MultimodalLlmWrapper):
       temperature: float = 0.0,
       top_p: float = 0.95,
       enable_safety_checks: bool = True,
+      image_encoding: ImageEncoding = ImageEncoding(),
   ):
     if 'GCP_API_KEY' not in os.environ:
       raise RuntimeError('GCP API key not set.')
     genai.configure(api_key=os.environ['GCP_API_KEY'])
+    self.model_name = model_name
+    self.temperature = temperature
+    # The SDK encodes the images itself, so only the downscaling is used.
+    self.image_encoding = image_encoding
     self.llm = genai.GenerativeModel(
         model_name,
         safety_settings=None
@@ -152,17 +294,21 @@ class GeminiGcpWrapper(LlmWrapper, MultimodalLlmWrapper):
   def predict_mm(
       self,
       text_prompt: str,
-      images: list[np.ndarray],
+      images: list[ImageInput],
       enable_safety_checks: bool = True,
       generation_config: generation_types.GenerationConfigType | None = None,
   ) -> tuple[str, Optional[bool], Any]:
     counter = self.max_retry
     retry_delay = 1.0
     output = None
+    pil_images = [
+        as_image_payload(image).image(self.image_encoding.max_side)
+        for image in images
+    ]
     while counter > 0:
       try:
         output = self.llm.generate_content(
-            [text_prompt] + [Image.fromarray(image) for image in images],
+            [text_prompt] + pil_images,
             safety_settings=None
             if enable_safety_checks
             else SAFETY_SETTINGS_BLOCK_NONE,
@@ -250,6 +396,9 @@ class Gpt4Wrapper(LlmWrapper, MultimodalLlmWrapper):
     max_retry: Max number of retries when some error happens.
     temperature: The temperature parameter in LLM to control result stability.
     model: GPT model to use based on if it is multimodal.
+    base_url: Base URL of the API, without the `/chat/completions` path.
+    session: HTTP session reused across calls, keeping connections alive.
+    image_encoding: How images are encoded in requests.
   """
 
   RETRY_WAITING_SECONDS = 20
@@ -259,6 +408,9 @@ class Gpt4Wrapper(LlmWrapper, MultimodalLlmWrapper):
       model_name: str,
       max_retry: int = 3,
       temperature: float = 0.0,
+      base_url: Optional[str] = None,
+      session: Optional[requests.Session] = None,
+      image_encoding: ImageEncoding = ImageEncoding(),
   ):
     if 'OPENAI_API_KEY' not in os.environ:
       raise RuntimeError('OpenAI API key not set.')
@@ -269,10 +421,15 @@ class Gpt4Wrapper(LlmWrapper, MultimodalLlmWrapper):
     self.max_retry = min(max_retry, 5)
     self.temperature = temperature
     self.model = model_name
+    self.base_url = (
+        base_url or os.environ.get('OPENAI_BASE_URL') or OPENAI_BASE_URL
+    ).rstrip('/')
+    self.session = session or create_http_session()
+    self.image_encoding = image_encoding
 
   @classmethod
-  def encode_image(cls, image: np.ndarray) -> str:
-    return base64.b64encode(array_to_jpeg_bytes(image)).decode('utf-8')
+  def encode_image(cls, image: ImageInput) -> str:
+    return as_image_payload(image).base64()
 
   def predict(
       self,
@@ -281,7 +438,7 @@ class Gpt4Wrapper(LlmWrapper, MultimodalLlmWrapper):
     return self.predict_mm(text_prompt, [])
 
   def predict_mm(
-      self, text_prompt: str, images: list[np.ndarray]
+      self, text_prompt: str, images: list[ImageInput]
   ) -> tuple[str, Optional[bool], Any]:
     headers = {
         'Content-Type': 'application/json',
@@ -306,7 +463,7 @@ class Gpt4Wrapper(LlmWrapper, MultimodalLlmWrapper):
       payload['messages'][0]['content'].append({
           'type': 'image_url',
           'image_url': {
-              'url': f'data:image/jpeg;base64,{self.encode_image(image)}'
+              'url': as_image_payload(image).data_url(self.image_encoding)
           },
       })
 
@@ -314,20 +471,21 @@ class Gpt4Wrapper(LlmWrapper, MultimodalLlmWrapper):
     wait_seconds = self.RETRY_WAITING_SECONDS
     while counter > 0:
       try:
-        response = requests.post(
-            'https://api.openai.com/v1/chat/completions',
+        response = self.session.post(
+            f'{self.base_url}/chat/completions',
             headers=headers,
             json=payload,
         )
-        if response.ok and 'choices' in response.json():
+        body = response.json()
+        if response.ok and 'choices' in body:
           return (
-              response.json()['choices'][0]['message']['content'],
+              body['choices'][0]['message']['content'],
               None,
               response,
           )
         print(
             'Error calling OpenAI API with error message: '
-            + response.json()['error']['message']
+            + body['error']['message']
         )
         time.sleep(wait_seconds)
         wait_seconds *= 2
@@ -339,3 +497,7 @@ class Gpt4Wrapper(LlmWrapper, MultimodalLlmWrapper):
         print('Error calling LLM, will retry soon...')
         print(e)
     return ERROR_CALLING_LLM, None, None
+
+  def close(self) -> None:
+    """Closes the pooled connections."""
+    self.session.close()
@@ -12,7 +12,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import http.server
+import io
+import json
 import os
+import threading
 import time
 from unittest import mock
 from absl.testing import absltest
@@ -21,6 +25,8 @@ import google.ai.generativelanguage as glm
 import google.generativeai as genai
 from google.generativeai.types import answer_types
 from google.generativeai.types import generation_types
+import numpy as np
+from PIL import Image
 import requests
 
 
@@ -28,7 +34,7 @@ class InferTest(absltest.TestCase):
 
   def setUp(self):
     super().setUp()
-    self.mock_post = mock.patch.object(requests, "post").start()
+    self.mock_post = mock.patch.object(requests.Session, "post").start()
     self.mock_sleep = mock.patch.object(time, "sleep").start()
     os.environ["OPENAI_API_KEY"] = "fake_api_key"
     os.environ["GCP_API_KEY"] = "fake_api_key"
@@ -132,5 +138,131 @@ class InferTest(absltest.TestCase):
     self.mock_sleep.assert_called_once()
 
 
+  def test_gpt4v_base_url(self):
+    gpt4v = infer.Gpt4Wrapper(
+        model_name="gpt-4o", base_url="http://localhost:8000/v1/"
+    )
+    mock_200_response = requests.Response()
+    mock_200_response.status_code = 200
+    mock_200_response._content = (
+        b'{"choices": [{"message": {"content": "ok."}}]}'
+    )
+    self.mock_post.return_value = mock_200_response
+
+    gpt4v.predict("fake prompt")
+
+    self.assertEqual(
+        self.mock_post.call_args.args[0],
+        "http://localhost:8000/v1/chat/completions",
+    )
+
+
+class ImagePayloadTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.array = np.random.default_rng(0).integers(
+        0, 255, (40, 20, 3), dtype=np.uint8
+    )
+
+  def test_encodes_once_per_encoding(self):
+    payload = infer.ImagePayload(self.array)
+
+    with mock.patch.object(
+        Image.Image, "save", autospec=True, side_effect=Image.Image.save
+    ) as mock_save:
+      first = payload.base64()
+      second = payload.base64()
+      png = payload.encode(infer.ImageEncoding(format="PNG"))
+
+    self.assertEqual(first, second)
+    self.assertEqual(mock_save.call_count, 2)
+    self.assertEqual(payload.sent_bytes, 2 * len(first) + len(png))
+    self.assertGreater(payload.encode_seconds, 0)
+
+  def test_default_encoding_matches_jpeg_helper(self):
+    payload = infer.ImagePayload(self.array)
+
+    self.assertEqual(payload.encode(), infer.array_to_jpeg_bytes(self.array))
+    self.assertEqual(
+        infer.Gpt4Wrapper.encode_image(self.array), payload.base64()
+    )
+
+  def test_downscales_to_max_side(self):
+    payload = infer.ImagePayload(self.array)
+    encoding = infer.ImageEncoding(format="PNG", max_side=10)
+
+    image = Image.open(io.BytesIO(payload.encode(encoding)))
+
+    self.assertEqual(image.size, (5, 10))
+    self.assertEqual(payload.image().size, (20, 40))
+
+  def test_data_url(self):
+    payload = infer.ImagePayload(self.array)
+    encoding = infer.ImageEncoding(format="PNG")
+
+    self.assertEqual(
+        payload.data_url(encoding),
+        f"data:image/png;base64,{payload.base64(encoding)}",
+    )
+
+  def test_as_image_payload_keeps_payloads(self):
+    payload = infer.ImagePayload(self.array)
+
+    self.assertIs(infer.as_image_payload(payload), payload)
+    self.assertIs(infer.as_image_payload(self.array).array, self.array)
+
+
+class _ChatCompletionsHandler(http.server.BaseHTTPRequestHandler):
+  """Answers every request like the OpenAI chat completions endpoint."""
+
+  protocol_version = "HTTP/1.1"
+
+  def do_POST(self):  # pylint: disable=invalid-name
+    request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+    self.server.connections.add(self.client_address)
+    self.server.paths.append(self.path)
+    body = json.dumps({
+        "choices": [{"message": {"content": request["model"]}}]
+    }).encode("utf-8")
+    self.send_response(200)
+    self.send_header("Content-Type", "application/json")
+    self.send_header("Content-Length", str(len(body)))
+    self.end_headers()
+    self.wfile.write(body)
+
+  def log_message(self, *args):
+    pass
+
+
+class Gpt4WrapperServerTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.enter_context(
+        mock.patch.dict(os.environ, {"OPENAI_API_KEY": "fake_api_key"})
+    )
+    self.server = http.server.ThreadingHTTPServer(
+        ("localhost", 0), _ChatCompletionsHandler
+    )
+    self.server.connections = set()
+    self.server.paths = []
+    thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+    thread.start()
+    self.addCleanup(self.server.server_close)
+    self.addCleanup(self.server.shutdown)
+    self.base_url = f"http://localhost:{self.server.server_port}/v1"
+
+  def test_connection_is_reused(self):
+    gpt4v = infer.Gpt4Wrapper(model_name="gpt-4o", base_url=self.base_url)
+    self.addCleanup(gpt4v.close)
+
+    outputs = [gpt4v.predict(f"prompt {i}")[0] for i in range(3)]
+
+    self.assertEqual(outputs, ["gpt-4o"] * 3)
+    self.assertEqual(self.server.paths, ["/v1/chat/completions"] * 3)
+    self.assertLen(self.server.connections, 1)
+
+
 if __name__ == "__main__":
   absltest.main()
@@ -0,0 +1,300 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""On-disk cache of LLM responses, keyed on the content of each request.
+
+Re-running a suite with identical prompts and screenshots, e.g. when resuming
+a run, re-scoring it or debugging a single task, then replays the recorded
+responses instead of calling the model again:
+
+cache = llm_cache.ResponseCache('~/android_world/llm_cache.sqlite')
+llm = llm_cache.CachingLlmWrapper(infer.Gpt4Wrapper('gpt-4o'), cache)
+...
+print(cache.stats.hit_rate)
+"""
+
+import dataclasses
+import enum
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Optional
+
+from android_world.agents import infer
+import numpy as np
+
+
+class CacheMode(enum.Enum):
+  """How a `ResponseCache` is used."""
+
+  # Hits are served; responses to misses are not stored.
+  READ_ONLY = 'read_only'
+
+  # Hits are served; responses to misses are stored.
+  READ_WRITE = 'read_write'
+
+  # The model is always called and its responses stored, replacing earlier
+  # ones.
+  RECORD = 'record'
+
+
+@dataclasses.dataclass
+class CacheStats:
+  """Counts of cache operations since the cache was opened."""
+
+  hits: int = 0
+  misses: int = 0
+  writes: int = 0
+  evictions: int = 0
+
+  @property
+  def hit_rate(self) -> float:
+    lookups = self.hits + self.misses
+    return self.hits / lookups if lookups else 0.0
+
+
+@dataclasses.dataclass(frozen=True)
+class CachedResponse:
+  """Raw output returned for cache hits, in place of the model's response."""
+
+  key: str
+  text: str
+
+
+def _image_digest(image: infer.ImageInput) -> str:
+  image = np.ascontiguousarray(infer.as_image_payload(image).array)
+  digest = hashlib.sha256(f'{image.shape}{image.dtype}'.encode('utf-8'))
+  digest.update(image.data)
+  return digest.hexdigest()
+
+
+def cache_key(
+    model: Optional[str],
+    temperature: Optional[float],
+    text_prompt: str,
+    images: list[infer.ImageInput],
+) -> str:
+  """Returns the key of a request, a hash of everything that determines it."""
+  request = {
+      'model': model,
+      'temperature': temperature,
+      'prompt': text_prompt,
+      'images': [_image_digest(image) for image in images],
+  }
+  return hashlib.sha256(
+      json.dumps(request, sort_keys=True).encode('utf-8')
+  ).hexdigest()
+
+
+class ResponseCache:
+  """LLM responses stored in a SQLite file, evicted least recently used first.
+
+  The cache is safe to share between threads, e.g. by the agents of a parallel
+  run.
+  """
+
+  def __init__(
+      self,
+      path: str,
+      max_bytes: int = 1 << 30,
+      mode: CacheMode = CacheMode.READ_WRITE,
+  ):
+    """Opens the cache, creating it if needed.
+
+    Args:
+      path: The SQLite file.
+      max_bytes: Maximum total size of the stored keys and responses. Least
+        recently used entries are evicted beyond it.
+      mode: How the cache is used.
+    """
+    path = os.path.expanduser(path)
+    if os.path.dirname(path):
+      os.makedirs(os.path.dirname(path), exist_ok=True)
+    self.mode = mode
+    self._max_bytes = max_bytes
+    self._lock = threading.Lock()
+    self._connection = sqlite3.connect(path, check_same_thread=False)
+    self._connection.execute(
+        'CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, text TEXT'
+        ' NOT NULL, is_safe INTEGER, size INTEGER NOT NULL, last_used INTEGER'
+        ' NOT NULL)'
+    )
+    self._connection.execute(
+        'CREATE INDEX IF NOT EXISTS responses_last_used ON'
+        ' responses (last_used)'
+    )
+    self._connection.commit()
+    # Entries are ordered by use with a counter rather than timestamps, which
+    # may tie.
+    (last_used,) = self._connection.execute(
+        'SELECT COALESCE(MAX(last_used), 0) FROM responses'
+    ).fetchone()
+    self._last_used = last_used
+    self.stats = CacheStats()
+
+  def _next_use(self) -> int:
+    self._last_used += 1
+    return self._last_used
+
+  def lookup(self, key: str) -> Optional[tuple[str, Optional[bool]]]:
+    """Returns the stored text and safety flag, or None on a miss.
+
+    In RECORD mode, every lookup is a miss.
+
+    Args:
+      key: See `cache_key`.
+    """
+    with self._lock:
+      if self.mode == CacheMode.RECORD:
+        self.stats.misses += 1
+        return None
+      row = self._connection.execute(
+          'SELECT text, is_safe FROM responses WHERE key = ?', (key,)
+      ).fetchone()
+      if row is None:
+        self.stats.misses += 1
+        return None
+      self.stats.hits += 1
+      if self.mode == CacheMode.READ_WRITE:
+        self._connection.execute(
+            'UPDATE responses SET last_used = ? WHERE key = ?',
+            (self._next_use(), key),
+        )
+        self._connection.commit()
+    text, is_safe = row
+    return text, None if is_safe is None else bool(is_safe)
+
+  def store(self, key: str, text: str, is_safe: Optional[bool]) -> None:
+    """Stores a response, unless the cache is read-only.
+
+    Args:
+      key: See `cache_key`.
+      text: The text output of the model.
+      is_safe: The safety flag returned with it.
+    """
+    if self.mode == CacheMode.READ_ONLY:
+      return
+    size = len(key) + len(text.encode('utf-8'))
+    with self._lock:
+      self._connection.execute(
+          'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)',
+          (key, text, is_safe, size, self._next_use()),
+      )
+      self.stats.writes += 1
+      self._evict()
+      self._connection.commit()
+
+  def _evict(self) -> None:
+    """Removes least recently used entries beyond the maximum size."""
+    (total,) = self._connection.execute(
+        'SELECT COALESCE(SUM(size), 0) FROM responses'
+    ).fetchone()
+    if total <= self._max_bytes:
+      return
+    evicted = []
+    for key, size in self._connection.execute(
+        'SELECT key, size FROM responses ORDER BY last_used'
+    ):
+      if total <= self._max_bytes:
+        break
+      evicted.append((key,))
+      total -= size
+    self._connection.executemany('DELETE FROM responses WHERE key = ?', evicted)
+    self.stats.evictions += len(evicted)
+
+  def __len__(self) -> int:
+    with self._lock:
+      (count,) = self._connection.execute(
+          'SELECT COUNT(*) FROM responses'
+      ).fetchone()
+    return count
+
+  def close(self) -> None:
+    with self._lock:
+      self._connection.close()
+
+
+def _model_name(llm: Any) -> Optional[str]:
+  return getattr(llm, 'model', None) or getattr(llm, 'model_name', None)
+
+
+class CachingLlmWrapper(infer.LlmWrapper, infer.MultimodalLlmWrapper):
+  """Serves `predict` and `predict_mm` calls from a `ResponseCache`.
+
+  Entries are keyed on the model, the temperature, the prompt and the image
+  contents. Failed calls, i.e. `infer.ERROR_CALLING_LLM`, are not stored. Hits
+  return a `CachedResponse` as the raw output.
+  """
+
+  def __init__(
+      self,
+      llm: infer.LlmWrapper | infer.MultimodalLlmWrapper,
+      cache: ResponseCache,
+      model: Optional[str] = None,
+      temperature: Optional[float] = None,
+  ):
+    """Initializes the wrapper.
+
+    Args:
+      llm: The wrapper to call on misses.
+      cache: The cache, which may be shared by several wrappers.
+      model: Model name used in keys. Defaults to the `model` or `model_name`
+        attribute of `llm`.
+      temperature: Temperature used in keys. Defaults to the `temperature`
+        attribute of `llm`.
+    """
+    self.llm = llm
+    self.cache = cache
+    self.model = model or _model_name(llm)
+    self.temperature = (
+        temperature
+        if temperature is not None
+        else getattr(llm, 'temperature', None)
+    )
+
+  def predict(
+      self,
+      text_prompt: str,
+  ) -> tuple[str, Optional[bool], Any]:
+    if isinstance(self.llm, infer.LlmWrapper):
+      return self._predict(text_prompt, [], self.llm.predict, text_prompt)
+    return self.predict_mm(text_prompt, [])
+
+  def predict_mm(
+      self, text_prompt: str, images: list[infer.ImageInput]
+  ) -> tuple[str, Optional[bool], Any]:
+    if not isinstance(self.llm, infer.MultimodalLlmWrapper):
+      raise TypeError(f'{type(self.llm).__name__} is not multimodal.')
+    return self._predict(
+        text_prompt, images, self.llm.predict_mm, text_prompt, images
+    )
+
+  def _predict(
+      self,
+      text_prompt: str,
+      images: list[infer.ImageInput],
+      call: Any,
+      *args: Any,
+  ) -> tuple[str, Optional[bool], Any]:
+    key = cache_key(self.model, self.temperature, text_prompt, images)
+    cached = self.cache.lookup(key)
+    if cached is not None:
+      text, is_safe = cached
+      return text, is_safe, CachedResponse(key, text)
+    text, is_safe, raw = call(*args)
+    if text != infer.ERROR_CALLING_LLM:
+      self.cache.store(key, text, is_safe)
+    return text, is_safe, raw
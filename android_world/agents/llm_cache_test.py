@@ -0,0 +1,233 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from concurrent import futures
+import os
+import shutil
+import tempfile
+from typing import Any, Optional
+
+from absl.testing import absltest
+from android_world.agents import infer
+from android_world.agents import llm_cache
+import numpy as np
+
+
+class _FakeMultimodalLlm(infer.LlmWrapper, infer.MultimodalLlmWrapper):
+  """Answers with a counter, so that repeated calls can be told apart."""
+
+  def __init__(self, model: str = 'fake-model', temperature: float = 0.0):
+    self.model = model
+    self.temperature = temperature
+    self.calls = 0
+    self.fail = False
+
+  def predict(self, text_prompt: str) -> tuple[str, Optional[bool], Any]:
+    return self.predict_mm(text_prompt, [])
+
+  def predict_mm(
+      self, text_prompt: str, images: list[np.ndarray]
+  ) -> tuple[str, Optional[bool], Any]:
+    self.calls += 1
+    if self.fail:
+      return infer.ERROR_CALLING_LLM, None, None
+    return f'{text_prompt} #{self.calls}', True, 'raw'
+
+
+class _FakeTextLlm(infer.LlmWrapper):
+
+  def __init__(self):
+    self.model_name = 'fake-text-model'
+    self.calls = 0
+
+  def predict(self, text_prompt: str) -> tuple[str, Optional[bool], Any]:
+    self.calls += 1
+    return f'text {self.calls}', None, 'raw'
+
+
+class CacheKeyTest(absltest.TestCase):
+
+  def test_key_depends_on_every_field(self):
+    image = np.zeros((4, 4, 3), dtype=np.uint8)
+    key = llm_cache.cache_key('model', 0.0, 'prompt', [image])
+    other_image = image.copy()
+    other_image[0, 0, 0] = 1
+
+    self.assertEqual(
+        key, llm_cache.cache_key('model', 0.0, 'prompt', [image.copy()])
+    )
+    self.assertEqual(
+        key,
+        llm_cache.cache_key(
+            'model', 0.0, 'prompt', [infer.ImagePayload(image)]
+        ),
+    )
+    self.assertNotEqual(
+        key, llm_cache.cache_key('other', 0.0, 'prompt', [image])
+    )
+    self.assertNotEqual(
+        key, llm_cache.cache_key('model', 0.5, 'prompt', [image])
+    )
+    self.assertNotEqual(
+        key, llm_cache.cache_key('model', 0.0, 'other', [image])
+    )
+    self.assertNotEqual(
+        key, llm_cache.cache_key('model', 0.0, 'prompt', [other_image])
+    )
+    self.assertNotEqual(
+        key, llm_cache.cache_key('model', 0.0, 'prompt', [image.reshape(8, 6)])
+    )
+
+
+class ResponseCacheTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.directory)
+    self.path = os.path.join(self.directory, 'cache.sqlite')
+
+  def _cache(self, **kwargs) -> llm_cache.ResponseCache:
+    cache = llm_cache.ResponseCache(self.path, **kwargs)
+    self.addCleanup(cache.close)
+    return cache
+
+  def test_store_and_lookup(self):
+    cache = self._cache()
+
+    self.assertIsNone(cache.lookup('key'))
+    cache.store('key', 'text', True)
+
+    self.assertEqual(cache.lookup('key'), ('text', True))
+    self.assertEqual(cache.stats, llm_cache.CacheStats(1, 1, 1, 0))
+    self.assertEqual(cache.stats.hit_rate, 0.5)
+
+  def test_entries_persist(self):
+    cache = self._cache()
+    cache.store('key', 'text', None)
+    cache.close()
+
+    self.assertEqual(self._cache().lookup('key'), ('text', None))
+
+  def test_read_only_does_not_store(self):
+    self._cache().store('old', 'text', True)
+    cache = self._cache(mode=llm_cache.CacheMode.READ_ONLY)
+
+    cache.store('new', 'text', True)
+
+    self.assertIsNone(cache.lookup('new'))
+    self.assertEqual(cache.lookup('old'), ('text', True))
+
+  def test_record_misses_and_overwrites(self):
+    self._cache().store('key', 'old', True)
+    cache = self._cache(mode=llm_cache.CacheMode.RECORD)
+
+    self.assertIsNone(cache.lookup('key'))
+    cache.store('key', 'new', True)
+
+    self.assertEqual(self._cache().lookup('key'), ('new', True))
+
+  def test_record_misses_are_counted_across_threads(self):
+    cache = self._cache(mode=llm_cache.CacheMode.RECORD)
+
+    with futures.ThreadPoolExecutor(max_workers=8) as executor:
+      list(executor.map(cache.lookup, ['key'] * 1000))
+
+    self.assertEqual(cache.stats.misses, 1000)
+
+  def test_evicts_least_recently_used(self):
+    # Each entry is a 1 byte key and 9 bytes of text.
+    cache = self._cache(max_bytes=25)
+    cache.store('a', 'x' * 9, True)
+    cache.store('b', 'x' * 9, True)
+    cache.lookup('a')
+
+    cache.store('c', 'x' * 9, True)
+
+    self.assertIsNone(cache.lookup('b'))
+    self.assertIsNotNone(cache.lookup('a'))
+    self.assertIsNotNone(cache.lookup('c'))
+    self.assertLen(cache, 2)
+    self.assertEqual(cache.stats.evictions, 1)
+
+
+class CachingLlmWrapperTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.directory = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.directory)
+    self.cache = llm_cache.ResponseCache(
+        os.path.join(self.directory, 'cache.sqlite')
+    )
+    self.addCleanup(self.cache.close)
+    self.image = np.zeros((4, 4, 3), dtype=np.uint8)
+
+  def test_repeated_request_is_served_from_cache(self):
+    llm = _FakeMultimodalLlm()
+    wrapper = llm_cache.CachingLlmWrapper(llm, self.cache)
+
+    first = wrapper.predict_mm('prompt', [self.image])
+    second = wrapper.predict_mm('prompt', [self.image.copy()])
+
+    self.assertEqual(llm.calls, 1)
+    self.assertEqual(first[:2], second[:2])
+    self.assertIsInstance(second[2], llm_cache.CachedResponse)
+
+  def test_different_images_miss(self):
+    llm = _FakeMultimodalLlm()
+    wrapper = llm_cache.CachingLlmWrapper(llm, self.cache)
+
+    wrapper.predict_mm('prompt', [self.image])
+    wrapper.predict_mm('prompt', [self.image + 1])
+
+    self.assertEqual(llm.calls, 2)
+
+  def test_model_and_temperature_are_part_of_key(self):
+    llm_cache.CachingLlmWrapper(_FakeMultimodalLlm(), self.cache).predict('p')
+    other_model = _FakeMultimodalLlm(model='other')
+    other_temperature = _FakeMultimodalLlm(temperature=1.0)
+
+    llm_cache.CachingLlmWrapper(other_model, self.cache).predict('p')
+    llm_cache.CachingLlmWrapper(other_temperature, self.cache).predict('p')
+
+    self.assertEqual(other_model.calls, 1)
+    self.assertEqual(other_temperature.calls, 1)
+
+  def test_errors_are_not_cached(self):
+    llm = _FakeMultimodalLlm()
+    llm.fail = True
+    wrapper = llm_cache.CachingLlmWrapper(llm, self.cache)
+
+    wrapper.predict('prompt')
+    llm.fail = False
+    text, _, _ = wrapper.predict('prompt')
+
+    self.assertEqual(text, 'prompt #2')
+
+  def test_text_only_llm(self):
+    llm = _FakeTextLlm()
+    wrapper = llm_cache.CachingLlmWrapper(llm, self.cache)
+
+    wrapper.predict('prompt')
+    text, _, _ = wrapper.predict('prompt')
+
+    self.assertEqual(text, 'text 1')
+    self.assertEqual(wrapper.model, 'fake-text-model')
+    with self.assertRaises(TypeError):
+      wrapper.predict_mm('prompt', [self.image])
+
+
+if __name__ == '__main__':
+  absltest.main()
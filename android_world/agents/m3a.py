@@ -14,14 +14,17 @@
 
 """A Multimodal Autonomous Agent for Android (M3A)."""
 
-import time
+from typing import Any
+
 from android_world.agents import agent_utils
 from android_world.agents import base_agent
 from android_world.agents import infer
 from android_world.agents import m3a_utils
+from android_world.agents import step_pipeline
 from android_world.env import interface
 from android_world.env import json_action
 from android_world.env import representation_utils
+from android_world.env import screenshot_buffer
 
 PROMPT_PREFIX = (
     'You are an agent who can operate an Android phone on behalf of a user.'
@@ -329,6 +332,18 @@ def _summarize_prompt(
   )
 
 
+def _record_image_payloads(
+    step_data: dict[str, Any], payloads: list[infer.ImagePayload]
+) -> None:
+  """Records the encoding cost of the screenshots sent so far in the step."""
+  step_data['image_encode_time'] = sum(
+      payload.encode_seconds for payload in payloads
+  )
+  step_data['image_payload_bytes'] = sum(
+      payload.sent_bytes for payload in payloads
+  )
+
+
 class M3A(base_agent.EnvironmentInteractingAgent):
   """M3A which stands for Multimodal Autonomous Agent for Android."""
 
@@ -338,6 +353,7 @@ class M3A(base_agent.EnvironmentInteractingAgent):
       llm: infer.MultimodalLlmWrapper,
       name: str = 'M3A',
       wait_after_action_seconds: float = 2.0,
+      pipelined: bool = False,
   ):
     """Initializes a M3A Agent.
 
@@ -345,24 +361,35 @@ class M3A(base_agent.EnvironmentInteractingAgent):
       env: The environment.
       llm: The multimodal LLM wrapper.
       name: The agent name.
-      wait_after_action_seconds: Seconds to wait for the screen to stablize
-        after executing an action
+      wait_after_action_seconds: Maximum seconds to wait for the screen to
+        settle after executing an action
+      pipelined: Whether to summarize each step in the background, while the
+        next step captures its observation. The summary is then added to the
+        step data by the time the next action prompt is built.
     """
     super().__init__(env, name)
     self.llm = llm
     self.history = []
     self.additional_guidelines = None
     self.wait_after_action_seconds = wait_after_action_seconds
+    self._pipeline = step_pipeline.StepPipeline(pipelined)
 
   def set_task_guidelines(self, task_guidelines: list[str]) -> None:
     self.additional_guidelines = task_guidelines
 
   def reset(self, go_home_on_reset: bool = False):
+    self.flush()
     super().reset(go_home_on_reset)
     # Hide the coordinates on screen which might affect the vision model.
     self.env.hide_automation_ui()
     self.history = []
 
+  def flush(self) -> None:
+    self._pipeline.wait()
+
+  def close(self) -> None:
+    self._pipeline.close()
+
   def step(self, goal: str) -> base_agent.AgentInteractionResult:
     step_data = {
         'raw_screenshot': None,
@@ -377,6 +404,10 @@ class M3A(base_agent.EnvironmentInteractingAgent):
         'summary_prompt': None,
         'summary': None,
         'summary_raw_response': None,
+        'settle_time': None,
+        'image_encode_time': None,
+        'image_payload_bytes': None,
+        'summary_wait_time': None,
     }
     print('----------step ' + str(len(self.history) + 1))
 
@@ -390,8 +421,9 @@ class M3A(base_agent.EnvironmentInteractingAgent):
     before_ui_elements_list = _generate_ui_elements_description_list(
         before_ui_elements, logical_screen_size
     )
-    step_data['raw_screenshot'] = state.pixels.copy()
-    before_screenshot = state.pixels.copy()
+    before_buffer = screenshot_buffer.ScreenshotBuffer(state.pixels)
+    step_data['raw_screenshot'] = before_buffer.pixels
+    before_screenshot = before_buffer.overlay('som')
     for index, ui_element in enumerate(before_ui_elements):
       if m3a_utils.validate_ui_element(ui_element, logical_screen_size):
         m3a_utils.add_ui_element_mark(
@@ -402,10 +434,14 @@ class M3A(base_agent.EnvironmentInteractingAgent):
             physical_frame_boundary,
             orientation,
         )
-    step_data['before_screenshot_with_som'] = before_screenshot.copy()
+    # Shared with `before_screenshot`, which the summary model sees unlabeled;
+    # the 'before' label is added after the summary call.
+    step_data['before_screenshot_with_som'] = before_screenshot
 
     import pdb; pdb.set_trace()
 
+    # The history needs the summary of the previous step.
+    step_data['summary_wait_time'] = self._pipeline.wait()
     action_prompt = _action_selection_prompt(
         goal,
         [
@@ -416,13 +452,13 @@ class M3A(base_agent.EnvironmentInteractingAgent):
         self.additional_guidelines,
     )
     step_data['action_prompt'] = action_prompt
+    # The SoM screenshot is sent again for the summary, so it is encoded once.
+    before_payload = infer.ImagePayload(before_screenshot)
+    payloads = [infer.ImagePayload(step_data['raw_screenshot']), before_payload]
     action_output, is_safe, raw_response = self.llm.predict_mm(
-        action_prompt,
-        [
-            step_data['raw_screenshot'],
-            before_screenshot,
-        ],
+        action_prompt, payloads
     )
+    _record_image_payloads(step_data, payloads)
 
     import pdb; pdb.set_trace()
 
@@ -500,6 +536,7 @@ Action: {{"action_type": "status", "goal_status": "infeasible"}}"""
         return base_agent.AgentInteractionResult(False, step_data)
 
       # Add mark to the target element.
+      step_data['raw_screenshot'] = before_buffer.overlay('target')
       m3a_utils.add_ui_element_mark(
           step_data['raw_screenshot'],
           before_ui_elements[action_index],
@@ -525,7 +562,7 @@ Action: {{"action_type": "status", "goal_status": "infeasible"}}"""
       print('Agent answered with: ' + converted_action.text)
 
     try:
-      self.env.execute_action(converted_action)
+      self.env.execute_action(converted_action, state_token=state.token)
     except Exception as e:  # pylint: disable=broad-exception-caught
       print('Failed to execute action.')
       print(str(e))
@@ -538,7 +575,9 @@ Action: {{"action_type": "status", "goal_status": "infeasible"}}"""
           step_data,
       )
 
-    time.sleep(self.wait_after_action_seconds)
+    step_data['settle_time'] = self.env.wait_for_settle(
+        self.wait_after_action_seconds
+    )
 
     import pdb; pdb.set_trace()
 
@@ -550,7 +589,8 @@ Action: {{"action_type": "status", "goal_status": "infeasible"}}"""
     after_ui_elements_list = _generate_ui_elements_description_list(
         after_ui_elements, logical_screen_size
     )
-    after_screenshot = state.pixels.copy()
+    after_buffer = screenshot_buffer.ScreenshotBuffer(state.pixels)
+    after_screenshot = after_buffer.overlay('som')
     for index, ui_element in enumerate(after_ui_elements):
       if m3a_utils.validate_ui_element(ui_element, logical_screen_size):
         m3a_utils.add_ui_element_mark(
@@ -562,11 +602,8 @@ Action: {{"action_type": "status", "goal_status": "infeasible"}}"""
             orientation,
         )
 
-    m3a_utils.add_screenshot_label(
-        step_data['before_screenshot_with_som'], 'before'
-    )
     m3a_utils.add_screenshot_label(after_screenshot, 'after')
-    step_data['after_screenshot_with_som'] = after_screenshot.copy()
+    step_data['after_screenshot_with_som'] = after_screenshot
 
     import pdb; pdb.set_trace()
 
@@ -577,12 +614,40 @@ Action: {{"action_type": "status", "goal_status": "infeasible"}}"""
         before_ui_elements_list,
         after_ui_elements_list,
     )
-    summary, is_safe, raw_response = self.llm.predict_mm(
-        summary_prompt,
-        [
-            before_screenshot,
-            after_screenshot,
-        ],
+    after_payload = infer.ImagePayload(after_screenshot)
+    payloads.append(after_payload)
+    self.history.append(step_data)
+    self._pipeline.submit(
+        lambda: self._summarize(
+            step_data,
+            summary_prompt,
+            action,
+            [before_payload, after_payload],
+            payloads,
+        )
+    )
+
+    import pdb; pdb.set_trace()
+
+    return base_agent.AgentInteractionResult(
+        False,
+        step_data,
+    )
+
+  def _summarize(
+      self,
+      step_data: dict[str, Any],
+      summary_prompt: str,
+      action: str,
+      images: list[infer.ImagePayload],
+      payloads: list[infer.ImagePayload],
+  ) -> None:
+    """Asks the LLM to summarize the step and adds the summary to its data."""
+    summary, is_safe, raw_response = self.llm.predict_mm(summary_prompt, images)
+    _record_image_payloads(step_data, payloads)
+
+    m3a_utils.add_screenshot_label(
+        step_data['before_screenshot_with_som'], 'before'
     )
 
     if is_safe == False:  # pylint: disable=singleton-comparison
@@ -598,23 +663,9 @@ Action: {{"action_type": "status", "goal_status": "infeasible"}}"""
           'Some error occurred calling LLM during summarization phase: %s'
           % summary
       )
-      self.history.append(step_data)
-      return base_agent.AgentInteractionResult(
-          False,
-          step_data,
-      )
-
+      return
 
     step_data['summary_prompt'] = summary_prompt
     step_data['summary'] = f'Action selected: {action}. {summary}'
     print('Summary: ' + summary)
     step_data['summary_raw_response'] = raw_response
-
-    self.history.append(step_data)
-    
-    import pdb; pdb.set_trace()
-
-    return base_agent.AgentInteractionResult(
-        False,
-        step_data,
-    )
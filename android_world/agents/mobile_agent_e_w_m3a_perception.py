@@ -19,9 +19,11 @@ from android_world.agents import agent_utils
 from android_world.agents import base_agent
 from android_world.agents import infer
 from android_world.agents import m3a_utils
+from android_world.agents import sub_agent_scheduler
 from android_world.env import interface
 from android_world.env import json_action
 from android_world.env import representation_utils
+from android_world.env import screenshot_buffer
 
 
 import copy
@@ -251,6 +253,7 @@ class MobileAgentE_M3A(base_agent.EnvironmentInteractingAgent):
       llm: infer.MultimodalLlmWrapper,
       name: str = 'MobileAgentE_M3A',
       wait_after_action_seconds: float = 3.0,
+      deterministic_sub_agents: bool = False,
   ):
     """Initializes a MobileAgentE_M3A Agent.
 
@@ -258,13 +261,21 @@ class MobileAgentE_M3A(base_agent.EnvironmentInteractingAgent):
       env: The environment.
       llm: The multimodal LLM wrapper.
       name: The agent name.
-      wait_after_action_seconds: Seconds to wait for the screen to stablize
-        after executing an action
+      wait_after_action_seconds: Maximum seconds to wait for the screen to
+        settle after executing an action
+      deterministic_sub_agents: Whether to run the sub-agents one by one, in
+        order, instead of running the notetaker while the next step observes
+        the screen. Useful for debugging.
     """
     super().__init__(env, name)
     self.llm = llm
     self.additional_guidelines = None
     self.wait_after_action_seconds = wait_after_action_seconds
+    self._scheduler = sub_agent_scheduler.SubAgentScheduler(
+        deterministic=deterministic_sub_agents
+    )
+    # Notetaker calls still running, with the step data they complete.
+    self._pending_notes = []
     
     # Hide the coordinates on screen which might affect the vision model.
     self.env.hide_automation_ui()
@@ -324,6 +335,7 @@ class MobileAgentE_M3A(base_agent.EnvironmentInteractingAgent):
     self.additional_guidelines = task_guidelines
 
   def reset(self, go_home_on_reset: bool = False):
+    self.flush()
     super().reset(go_home_on_reset)
     # Hide the coordinates on screen which might affect the vision model.
     self.env.hide_automation_ui()
@@ -352,6 +364,96 @@ class MobileAgentE_M3A(base_agent.EnvironmentInteractingAgent):
     
     print(f"Logs saved to {self.save_log_dir}")
 
+  def flush(self) -> None:
+    """Waits for the notetaker and completes the data of its step."""
+    self._scheduler.wait()
+    self._record_notes()
+
+  def close(self) -> None:
+    self.flush()
+    self._scheduler.close()
+
+  def _predict_mm(self, text_prompt, payloads):
+    """Calls the LLM, adding the cost of encoding `payloads` to the info pool."""
+    encode_seconds = sum(payload.encode_seconds for payload in payloads)
+    sent_bytes = sum(payload.sent_bytes for payload in payloads)
+    output = self.llm.predict_mm(text_prompt, payloads)
+    self.info_pool.last_image_encode_time += (
+        sum(payload.encode_seconds for payload in payloads) - encode_seconds
+    )
+    self.info_pool.last_image_payload_bytes += (
+        sum(payload.sent_bytes for payload in payloads) - sent_bytes
+    )
+    return output
+
+  def _record_sub_agent_call(self, call):
+    """Adds a call that the step waited for to the latency report."""
+    self.info_pool.last_sub_agent_latency[call.name] = call.latency
+    if call.blocked > 0:
+      self.info_pool.last_critical_path.extend(call.blocked_on)
+    self.info_pool.last_critical_path.append(call.name)
+    self.info_pool.last_critical_path_time += call.blocked + call.latency
+
+  def _call_sub_agent(self, sub_agent, payloads):
+    """Prompts a sub-agent once the calls it depends on have finished.
+
+    Args:
+      sub_agent: The Manager, Executor or ActionReflector.
+      payloads: The screenshots sent with the prompt.
+
+    Returns:
+      The prompt and the LLM output.
+    """
+    def work():
+      prompt = sub_agent.get_prompt(self.info_pool)
+      return prompt, self._predict_mm(prompt, payloads)
+
+    call = self._scheduler.submit(
+        type(sub_agent).__name__, work, sub_agent.READS, sub_agent.WRITES
+    )
+    try:
+      return call.result()
+    finally:
+      self._record_sub_agent_call(call)
+
+  def _take_notes(self, notetaker, payload):
+    """Updates the important notes; may run while the next step starts.
+
+    Returns:
+      The notes, and the seconds spent encoding and bytes sent for `payload`.
+    """
+    encode_seconds, sent_bytes = payload.encode_seconds, payload.sent_bytes
+    prompt_note = notetaker.get_prompt(self.info_pool)
+    # Not `_predict_mm`, whose stats belong to the step that is running now.
+    output_note, _, _ = self.llm.predict_mm(prompt_note, [payload])
+    important_notes = notetaker.parse_response(output_note)['important_notes']
+    self.info_pool.important_notes = important_notes
+    print('Important notes: ' + important_notes, "\n")
+    return (
+        important_notes,
+        payload.encode_seconds - encode_seconds,
+        payload.sent_bytes - sent_bytes,
+    )
+
+  def _record_notes(self):
+    """Completes the step data of the notetaker calls that have finished."""
+    pending = []
+    for call, data in self._pending_notes:
+      if not call.future.done():
+        pending.append((call, data))
+        continue
+      try:
+        important_notes, encode_seconds, sent_bytes = call.result()
+      except Exception as e:  # pylint: disable=broad-exception-caught
+        print('Failed to take notes.')
+        print(str(e))
+        continue
+      data['important_notes'] = important_notes
+      data['last_sub_agent_latency'][call.name] = call.latency
+      data['last_image_encode_time'] += encode_seconds
+      data['last_image_payload_bytes'] += sent_bytes
+    self._pending_notes = pending
+
   def step(self, goal: str) -> base_agent.AgentInteractionResult:
     ## init agents ## 
     manager = Manager()
@@ -360,6 +462,12 @@ class MobileAgentE_M3A(base_agent.EnvironmentInteractingAgent):
     action_reflector = ActionReflector()
     
     self.info_pool.instruction = goal
+    self.info_pool.last_image_encode_time = 0.0
+    self.info_pool.last_image_payload_bytes = 0
+    self.info_pool.last_sub_agent_latency = {}
+    self.info_pool.last_critical_path = []
+    self.info_pool.last_critical_path_time = 0.0
+    self._record_notes()
     step_idx = len(self.info_pool.action_history)
 
     print('----------step ' + str(step_idx + 1))
@@ -378,19 +486,19 @@ class MobileAgentE_M3A(base_agent.EnvironmentInteractingAgent):
     before_ui_elements_list = _generate_ui_elements_description_list(
         before_ui_elements, logical_screen_size
     )
-    raw_screenshot = state.pixels.copy()
-    before_screenshot = state.pixels.copy()
+    before_buffer = screenshot_buffer.ScreenshotBuffer(state.pixels)
+    raw_screenshot = before_buffer.pixels
+    before_screenshot_with_som = before_buffer.overlay('som')
     for index, ui_element in enumerate(before_ui_elements):
       if m3a_utils.validate_ui_element(ui_element, logical_screen_size):
         m3a_utils.add_ui_element_mark(
-            before_screenshot,
+            before_screenshot_with_som,
             ui_element,
             index,
             logical_screen_size,
             physical_frame_boundary,
             orientation,
         )
-    before_screenshot_with_som = before_screenshot.copy()
 
     self.info_pool.ui_elements_list_before = before_ui_elements_list
     
@@ -424,10 +532,13 @@ class MobileAgentE_M3A(base_agent.EnvironmentInteractingAgent):
     if not skip_manager:
       print("\n### Manager ... ###\n")
       planning_start_time = time.time()
-      prompt_planning = manager.get_prompt(self.info_pool)
-      output_planning, is_safe, raw_response = self.llm.predict_mm(
-          prompt_planning,
-          [raw_screenshot], # original screenshot      
+      # Waits for the notetaker of the previous step, which updates the
+      # important notes.
+      prompt_planning, (output_planning, is_safe, raw_response) = (
+          self._call_sub_agent(
+              manager,
+              [infer.ImagePayload(raw_screenshot)], # original screenshot
+          )
       )
       parsed_result_planning = manager.parse_response(output_planning)
       self.info_pool.plan = parsed_result_planning['plan']
@@ -460,10 +571,11 @@ class MobileAgentE_M3A(base_agent.EnvironmentInteractingAgent):
 
       print("\n### Operator ... ###\n")
       action_decision_start_time = time.time()
-      prompt_action = executor.get_prompt(self.info_pool)
-      output_action, is_safe, raw_response = self.llm.predict_mm(
-          prompt_action,
-          [before_screenshot_with_som], # annotated screenshot
+      prompt_action, (output_action, is_safe, raw_response) = (
+          self._call_sub_agent(
+              executor,
+              [infer.ImagePayload(before_screenshot_with_som)], # annotated screenshot
+          )
       )
       if not raw_response:
         raise RuntimeError('Error calling LLM in operator phase.')
@@ -547,6 +659,7 @@ class MobileAgentE_M3A(base_agent.EnvironmentInteractingAgent):
         )
 
       # Add mark to the target element.
+      raw_screenshot = before_buffer.overlay('target')
       m3a_utils.add_ui_element_mark(
           raw_screenshot,
           before_ui_elements[action_index],
@@ -582,7 +695,7 @@ class MobileAgentE_M3A(base_agent.EnvironmentInteractingAgent):
 
     ## try execute action ##
     try:
-      self.env.execute_action(converted_action)
+      self.env.execute_action(converted_action, state_token=state.token)
     except Exception as e:  # pylint: disable=broad-exception-caught
       print('Failed to execute action.')
       print(str(e))
@@ -603,7 +716,9 @@ class MobileAgentE_M3A(base_agent.EnvironmentInteractingAgent):
     print("Done action execution.\n")
     self.info_pool.last_action = json.loads(converted_action.json_str())
 
-    time.sleep(self.wait_after_action_seconds)
+    self.info_pool.last_settle_time = self.env.wait_for_settle(
+        self.wait_after_action_seconds
+    )
 
     
     ### Perception after execution ###
@@ -616,11 +731,13 @@ class MobileAgentE_M3A(base_agent.EnvironmentInteractingAgent):
     after_ui_elements_list = _generate_ui_elements_description_list(
         after_ui_elements, logical_screen_size
     )
-    after_screenshot = state.pixels.copy()
+    after_screenshot_with_som = screenshot_buffer.ScreenshotBuffer(
+        state.pixels
+    ).overlay('som')
     for index, ui_element in enumerate(after_ui_elements):
       if m3a_utils.validate_ui_element(ui_element, logical_screen_size):
         m3a_utils.add_ui_element_mark(
-            after_screenshot,
+            after_screenshot_with_som,
             ui_element,
             index,
             logical_screen_size,
@@ -629,8 +746,9 @@ class MobileAgentE_M3A(base_agent.EnvironmentInteractingAgent):
         )
 
     m3a_utils.add_screenshot_label(before_screenshot_with_som, 'before')
-    m3a_utils.add_screenshot_label(after_screenshot, 'after')
-    after_screenshot_with_som = after_screenshot.copy()
+    m3a_utils.add_screenshot_label(after_screenshot_with_som, 'after')
+    # Shared by the reflector and the notetaker, so it is encoded once.
+    after_payload = infer.ImagePayload(after_screenshot_with_som)
     
     self.info_pool.ui_elements_list_after = after_ui_elements_list
 
@@ -640,13 +758,14 @@ class MobileAgentE_M3A(base_agent.EnvironmentInteractingAgent):
     print("\n### Action Reflector ... ###\n")
     if converted_action.action_type != 'answer':
       action_reflection_start_time = time.time()
-      prompt_action_reflect = action_reflector.get_prompt(self.info_pool)
-      output_action_reflect, if_safe, raw_response = self.llm.predict_mm(
-          prompt_action_reflect,
-          [
-            before_screenshot_with_som,
-            after_screenshot_with_som,
-          ],
+      prompt_action_reflect, (output_action_reflect, if_safe, raw_response) = (
+          self._call_sub_agent(
+              action_reflector,
+              [
+                infer.ImagePayload(before_screenshot_with_som),
+                after_payload,
+              ],
+          )
       )
       parsed_result_action_reflect = action_reflector.parse_response(output_action_reflect)
       outcome, error_description, progress_status = (
@@ -692,37 +811,33 @@ class MobileAgentE_M3A(base_agent.EnvironmentInteractingAgent):
     #################
     ### NoteKeeper ###
     #################
+    notes_call = None
     if action_outcome == "A" and converted_action.action_type != 'answer':
         print("\n### NoteKeeper ... ###\n")
-        # if previous action is successful, record the important content
-        notetaking_start_time = time.time()
-        prompt_note = notetaker.get_prompt(self.info_pool)
-        output_note, if_safe, raw_response = self.llm.predict_mm(
-          prompt_note,
-          [after_screenshot_with_som],
+        # if previous action is successful, record the important content.
+        # Nothing else in this step reads the notes, so the notetaker runs
+        # until the next Manager or Operator call needs them.
+        notes_call = self._scheduler.submit(
+            'Notetaker',
+            lambda: self._take_notes(notetaker, after_payload),
+            notetaker.READS,
+            notetaker.WRITES,
         )
-        parsed_result_note = notetaker.parse_response(output_note)
-        important_notes = parsed_result_note['important_notes']
-        self.info_pool.important_notes = important_notes
-        notetaking_end_time = time.time()
-        
-        # print('Note taking prompt: ' + prompt_note)
-        # print()
-        print('Important notes: ' + important_notes, "\n")
+        if self._scheduler.deterministic:
+          self._record_sub_agent_call(notes_call)
+          notes_call.result()  # Raises as the sequential notetaker did.
         # Image.fromarray(after_screenshot_with_som).save("screenshots/note_taking_input.png")
         # import pdb; pdb.set_trace()
 
     action_str_for_file_name = str(converted_action).replace(" ", "_").replace("\n", "_").strip()
     self.save_log(after_screenshot_with_som, step_idx, f"{step_idx}_{action_str_for_file_name}.png")
-    
-    if converted_action.action_type == 'answer':
-      # directly return after answer action
-      return base_agent.AgentInteractionResult(
-          True,
-          asdict(self.info_pool),
-      )
-    else:
-      return base_agent.AgentInteractionResult(
-          False,
-          asdict(self.info_pool),
-      )
+
+    data = asdict(self.info_pool)
+    if notes_call is not None:
+      self._pending_notes.append((notes_call, data))
+      self._record_notes()
+    # directly return after answer action
+    return base_agent.AgentInteractionResult(
+        converted_action.action_type == 'answer',
+        data,
+    )
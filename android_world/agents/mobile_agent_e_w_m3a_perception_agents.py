@@ -95,6 +95,12 @@ class InfoPool:
     last_summary: str = ""  # Last action description
     last_action: str = ""  # Last action
     last_action_thought: str = ""  # Last action thought
+    last_settle_time: float = 0.0  # Seconds waited for the screen to settle after the last action
+    last_image_encode_time: float = 0.0  # Seconds spent encoding screenshots in the last step
+    last_image_payload_bytes: int = 0  # Bytes of encoded screenshots sent in the last step
+    last_sub_agent_latency: dict = field(default_factory=dict)  # Seconds per sub-agent call in the last step
+    last_critical_path: list = field(default_factory=list)  # Sub-agent calls the last step waited for, in order
+    last_critical_path_time: float = 0.0  # Seconds the last step waited for sub-agent calls
     important_notes: str = ""
     
     error_flag_plan: bool = False # if an error is not solved for multiple attempts with the executor
@@ -114,6 +120,13 @@ class InfoPool:
 
 
 class BaseAgent(ABC):
+    # InfoPool fields the prompt reads and fields updated from the response,
+    # which decide what the sub-agent can run concurrently with. READS also
+    # lists the fields used by the commented-out parts of the prompt, so it
+    # stays complete if they are enabled again.
+    READS: frozenset = frozenset()
+    WRITES: frozenset = frozenset()
+
     @abstractmethod
     def get_prompt(self, info_pool: InfoPool) -> str:
         pass
@@ -147,6 +160,12 @@ ALL_APPS = [
 
 
 class Manager(BaseAgent):
+    READS = frozenset({
+        "instruction", "plan", "current_subgoal", "last_action", "progress_status",
+        "important_notes", "error_flag_plan", "err_to_manager_thresh",
+        "action_history", "summary_history", "error_descriptions", "shortcuts",
+    })
+    WRITES = frozenset({"plan", "current_subgoal", "finish_thought"})
 
     def get_prompt(self, info_pool: InfoPool) -> str:
         prompt = "You are an agent who can operate an Android phone on behalf of a user. Your goal is to track progress and devise high-level plans to achieve the user's requests.\n\n"
@@ -308,6 +327,16 @@ KNOWN_ISSUE_DRAW = (
 )
 
 class Executor(BaseAgent):
+    READS = frozenset({
+        "instruction", "plan", "progress_status", "current_subgoal",
+        "ui_elements_list_before", "additional_knowledge", "important_notes",
+        "action_history", "summary_history", "action_outcomes", "error_descriptions",
+        "shortcuts", "keyboard_pre",
+    })
+    WRITES = frozenset({
+        "last_action_thought", "last_summary", "last_action", "action_history",
+        "summary_history", "action_outcomes", "error_descriptions",
+    })
 
     def get_prompt(self, info_pool: InfoPool) -> str:
         prompt = "You are an agent who can operate an Android phone on behalf of a user. Your goal is to decide the next action to perform based on the current state of the phone and the user's request.\n\n"
@@ -434,6 +463,15 @@ class Executor(BaseAgent):
 
 
 class ActionReflector(BaseAgent):
+    READS = frozenset({
+        "instruction", "progress_status", "current_subgoal",
+        "ui_elements_list_before", "ui_elements_list_after", "last_action",
+        "last_summary",
+    })
+    WRITES = frozenset({
+        "action_history", "summary_history", "action_outcomes",
+        "error_descriptions", "progress_status", "progress_status_history",
+    })
 
     def get_prompt(self, info_pool: InfoPool) -> str:
         prompt = "You are an agent who can operate an Android phone on behalf of a user. Your goal is to verify whether the last action produced the expected behavior and to keep track of the overall progress.\n\n"
@@ -493,6 +531,12 @@ class ActionReflector(BaseAgent):
 
 
 class Notetaker(BaseAgent):
+    READS = frozenset({
+        "instruction", "plan", "current_subgoal", "progress_status",
+        "important_notes", "ui_elements_list_after", "width", "height",
+        "perception_infos_post",
+    })
+    WRITES = frozenset({"important_notes"})
 
     def get_prompt(self, info_pool: InfoPool) -> str:
         prompt = "You are a helpful AI assistant for operating mobile phones. Your goal is to take notes of important content relevant to the user's request.\n\n"
@@ -0,0 +1,84 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import dataclasses
+
+from absl.testing import absltest
+from absl.testing import parameterized
+from android_world.agents import mobile_agent_e_w_m3a_perception_agents as agents
+
+_FIELDS = frozenset(
+    field.name for field in dataclasses.fields(agents.InfoPool)
+)
+
+
+class _TracingInfoPool(agents.InfoPool):
+  """Records which InfoPool fields are read."""
+
+  def __init__(self, **kwargs):
+    object.__setattr__(self, 'reads', set())
+    super().__init__(**kwargs)
+
+  def __getattribute__(self, name):
+    if name in _FIELDS:
+      object.__getattribute__(self, 'reads').add(name)
+    return object.__getattribute__(self, name)
+
+
+def _info_pools() -> list[_TracingInfoPool]:
+  """Returns info pools that take every branch of the prompts."""
+  num_actions = 3
+  return [
+      _TracingInfoPool(instruction='Open the .html file'),
+      _TracingInfoPool(
+          instruction='Draw a cat',
+          additional_knowledge='Tips.',
+          plan='1. Open the app.',
+          current_subgoal='Open the app.',
+          progress_status='Started.',
+          important_notes='Notes.',
+          error_flag_plan=True,
+          last_action='{"action_type": "wait"}',
+          last_summary='Wait.',
+          action_history=['{"action_type": "wait"}'] * num_actions,
+          summary_history=['Wait.'] * num_actions,
+          action_outcomes=['C'] * num_actions,
+          error_descriptions=['None'] * num_actions,
+          ui_elements_list_before='UI before',
+          ui_elements_list_after='UI after',
+      ),
+  ]
+
+
+class SubAgentReadsTest(parameterized.TestCase):
+
+  @parameterized.parameters(
+      agents.Manager,
+      agents.Executor,
+      agents.ActionReflector,
+      agents.Notetaker,
+  )
+  def test_prompt_only_reads_declared_fields(self, agent_class):
+    agent = agent_class()
+    reads = set()
+    for info_pool in _info_pools():
+      agent.get_prompt(info_pool)
+      reads |= info_pool.reads
+
+    self.assertNotEmpty(reads)
+    self.assertEmpty(reads - agent_class.READS)
+
+
+if __name__ == '__main__':
+  absltest.main()
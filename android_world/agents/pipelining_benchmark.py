@@ -0,0 +1,143 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+r"""Measures the wall-clock time of agent steps with and without pipelining.
+
+Runs T3A or M3A episodes against a simulated device and model, which sleep for
+the given latencies instead of settling the screen, capturing observations and
+answering prompts. Each action is a `wait`, so every step ends with a summary:
+
+python -m android_world.agents.pipelining_benchmark --num_steps=10 \
+  --llm_latency=3 --settle_latency=1 --observe_latency=0.5
+
+M3A stops at the `pdb` breakpoints in `M3A.step`, so it is best run from a
+terminal.
+"""
+
+from collections.abc import Sequence
+import time
+from typing import Any, Optional
+
+from absl import app
+from absl import flags
+from android_world.agents import base_agent
+from android_world.agents import infer
+from android_world.agents import m3a
+from android_world.agents import t3a
+from android_world.env import interface
+from android_world.utils import test_utils
+import numpy as np
+
+_AGENT = flags.DEFINE_enum('agent', 't3a', ['t3a', 'm3a'], 'Agent to run.')
+_NUM_STEPS = flags.DEFINE_integer('num_steps', 10, 'Steps per episode.')
+_LLM_LATENCY = flags.DEFINE_float(
+    'llm_latency', 3.0, 'Seconds per LLM call.'
+)
+_SETTLE_LATENCY = flags.DEFINE_float(
+    'settle_latency', 1.0, 'Seconds for the screen to settle.'
+)
+_OBSERVE_LATENCY = flags.DEFINE_float(
+    'observe_latency', 0.5, 'Seconds to capture an observation.'
+)
+
+_ACTION = "Reason: benchmark.\nAction: {'action_type': 'wait'}"
+
+
+class _SimulatedEnv(test_utils.FakeAsyncEnv):
+  """Takes the given time to settle and to capture observations."""
+
+  def get_state(self, wait_to_stabilize: bool = False) -> interface.State:
+    time.sleep(_OBSERVE_LATENCY.value)
+    return interface.State(
+        pixels=np.zeros((100, 100, 3), dtype=np.uint8),
+        forest=None,
+        ui_elements=[],
+    )
+
+  def wait_for_settle(self, max_wait: float) -> float:
+    settle_time = min(max_wait, _SETTLE_LATENCY.value)
+    time.sleep(settle_time)
+    return settle_time
+
+  def hide_automation_ui(self) -> None:
+    pass
+
+  @property
+  def orientation(self) -> int:
+    return 0
+
+  @property
+  def physical_frame_boundary(self) -> tuple[int, int, int, int]:
+    return (0, 0, 100, 100)
+
+
+class _SimulatedLlm(infer.LlmWrapper, infer.MultimodalLlmWrapper):
+  """Takes the given time to answer with a `wait` action or a summary."""
+
+  def predict(self, text_prompt: str) -> tuple[str, Optional[bool], Any]:
+    return self.predict_mm(text_prompt, [])
+
+  def predict_mm(
+      self, text_prompt: str, images: list[infer.ImageInput]
+  ) -> tuple[str, Optional[bool], Any]:
+    time.sleep(_LLM_LATENCY.value)
+    if 'brief summary of this step' in text_prompt:
+      return 'Waited.', True, 'raw'
+    return _ACTION, True, 'raw'
+
+
+def _create_agent(pipelined: bool) -> base_agent.EnvironmentInteractingAgent:
+  env = _SimulatedEnv()
+  if _AGENT.value == 'm3a':
+    return m3a.M3A(
+        env, _SimulatedLlm(), wait_after_action_seconds=5, pipelined=pipelined
+    )
+  return t3a.T3A(env, _SimulatedLlm(), pipelined=pipelined)
+
+
+def _run(pipelined: bool) -> list[float]:
+  """Returns the wall-clock time of each step, including the final flush."""
+  agent = _create_agent(pipelined)
+  agent.reset()
+  step_times = []
+  for _ in range(_NUM_STEPS.value):
+    start = time.perf_counter()
+    agent.step('Wait.')
+    step_times.append(time.perf_counter() - start)
+  start = time.perf_counter()
+  agent.flush()
+  step_times[-1] += time.perf_counter() - start
+  agent.close()
+  return step_times
+
+
+def main(argv: Sequence[str]) -> None:
+  if len(argv) > 1:
+    raise app.UsageError('Too many command-line arguments.')
+  results = {
+      'sequential': _run(pipelined=False),
+      'pipelined': _run(pipelined=True),
+  }
+  print(f'{_AGENT.value}, {_NUM_STEPS.value} steps:')
+  for label, step_times in results.items():
+    print(
+        f'  {label:12}{np.mean(step_times):>8.2f} s/step'
+        f'{sum(step_times):>10.2f} s total'
+    )
+  speedup = sum(results['sequential']) / sum(results['pipelined'])
+  print(f'  speedup     {speedup:>8.2f}x')
+
+
+if __name__ == '__main__':
+  app.run(main)
@@ -0,0 +1,171 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+r"""Measures screenshot memory over an episode of M3A-style steps.
+
+Replays the screenshot handling of `M3A.step` (set-of-marks annotation of the
+before and after frames, target element mark and labels) without an emulator
+or model, once with the per-step copies the agent used to make and once with
+`screenshot_buffer.ScreenshotBuffer`. Frames are built like the emulator's: a
+read-only RGB view into an RGBA buffer.
+
+python -m android_world.agents.screenshot_memory_benchmark --num_steps=30
+"""
+
+from collections.abc import Callable, Sequence
+import tracemalloc
+from typing import Any
+
+from absl import app
+from absl import flags
+from android_world.agents import m3a_utils
+from android_world.env import representation_utils
+from android_world.env import screenshot_buffer
+import numpy as np
+
+_NUM_STEPS = flags.DEFINE_integer('num_steps', 30, 'Steps per episode.')
+_WIDTH = flags.DEFINE_integer('width', 1080, 'Screen width in pixels.')
+_HEIGHT = flags.DEFINE_integer('height', 2400, 'Screen height in pixels.')
+_NUM_ELEMENTS = 40
+_MIB = 1024 * 1024
+
+
+def _emulator_frame(width: int, height: int, seed: int) -> np.ndarray:
+  rgba = np.random.default_rng(seed).integers(
+      0, 256, size=height * width * 4, dtype=np.uint8
+  )
+  image = np.frombuffer(rgba.tobytes(), dtype=np.uint8)
+  return image.reshape((height, width, 4))[:, :, :3]
+
+
+def _ui_elements(
+    width: int, height: int
+) -> list[representation_utils.UIElement]:
+  row_height = height // _NUM_ELEMENTS
+  return [
+      representation_utils.UIElement(
+          text=f'Item {i}',
+          bbox_pixels=representation_utils.BoundingBox(
+              0, width, i * row_height, (i + 1) * row_height
+          ),
+          is_visible=True,
+      )
+      for i in range(_NUM_ELEMENTS)
+  ]
+
+
+def _mark(
+    screenshot: np.ndarray,
+    elements: list[representation_utils.UIElement],
+    screen_size: tuple[int, int],
+) -> None:
+  for index, element in enumerate(elements):
+    m3a_utils.add_ui_element_mark(
+        screenshot, element, index, screen_size, (0, 0, *screen_size), 0
+    )
+
+
+def _legacy_step(
+    before: np.ndarray,
+    after: np.ndarray,
+    elements: list[representation_utils.UIElement],
+    screen_size: tuple[int, int],
+) -> dict[str, Any]:
+  """Screenshot handling of `M3A.step` with a copy per use."""
+  step_data = {'raw_screenshot': before.copy()}
+  before_screenshot = before.copy()
+  _mark(before_screenshot, elements, screen_size)
+  step_data['before_screenshot_with_som'] = before_screenshot.copy()
+  _mark(step_data['raw_screenshot'], elements[:1], screen_size)
+  after_screenshot = after.copy()
+  _mark(after_screenshot, elements, screen_size)
+  m3a_utils.add_screenshot_label(
+      step_data['before_screenshot_with_som'], 'before'
+  )
+  m3a_utils.add_screenshot_label(after_screenshot, 'after')
+  step_data['after_screenshot_with_som'] = after_screenshot.copy()
+  return step_data
+
+
+def _buffered_step(
+    before: np.ndarray,
+    after: np.ndarray,
+    elements: list[representation_utils.UIElement],
+    screen_size: tuple[int, int],
+) -> dict[str, Any]:
+  """Screenshot handling of `M3A.step` with shared buffers."""
+  before_buffer = screenshot_buffer.ScreenshotBuffer(before)
+  step_data = {'raw_screenshot': before_buffer.pixels}
+  before_screenshot = before_buffer.overlay('som')
+  _mark(before_screenshot, elements, screen_size)
+  step_data['before_screenshot_with_som'] = before_screenshot
+  step_data['raw_screenshot'] = before_buffer.overlay('target')
+  _mark(step_data['raw_screenshot'], elements[:1], screen_size)
+  after_screenshot = screenshot_buffer.ScreenshotBuffer(after).overlay('som')
+  _mark(after_screenshot, elements, screen_size)
+  m3a_utils.add_screenshot_label(after_screenshot, 'after')
+  step_data['after_screenshot_with_som'] = after_screenshot
+  m3a_utils.add_screenshot_label(before_screenshot, 'before')
+  return step_data
+
+
+def _run_episode(
+    step_fn: Callable[..., dict[str, Any]],
+    frames: list[np.ndarray],
+    elements: list[representation_utils.UIElement],
+    screen_size: tuple[int, int],
+) -> dict[str, float]:
+  """Returns retained and peak MiB, and MiB allocated per step."""
+  history = []
+  allocated = 0
+  tracemalloc.start()
+  for before, after in zip(frames, frames[1:]):
+    start, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    history.append(step_fn(before, after, elements, screen_size))
+    _, peak = tracemalloc.get_traced_memory()
+    allocated += peak - start
+  retained, peak = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  return {
+      'retained_mib': retained / _MIB,
+      'peak_mib': peak / _MIB,
+      'step_mib': allocated / len(history) / _MIB,
+  }
+
+
+def main(argv: Sequence[str]) -> None:
+  if len(argv) > 1:
+    raise app.UsageError('Too many command-line arguments.')
+  screen_size = (_WIDTH.value, _HEIGHT.value)
+  frames = [
+      _emulator_frame(*screen_size, seed=seed)
+      for seed in range(_NUM_STEPS.value + 1)
+  ]
+  elements = _ui_elements(*screen_size)
+  print(f'{_NUM_STEPS.value} steps, {screen_size[0]}x{screen_size[1]} frames')
+  print(f'  {"":10}{"retained MiB":>14}{"peak MiB":>12}{"MiB/step":>12}')
+  for label, step_fn in (
+      ('copies', _legacy_step),
+      ('buffers', _buffered_step),
+  ):
+    result = _run_episode(step_fn, frames, elements, screen_size)
+    print(
+        f'  {label:10}{result["retained_mib"]:>14.1f}'
+        f'{result["peak_mib"]:>12.1f}{result["step_mib"]:>12.1f}'
+    )
+
+
+if __name__ == '__main__':
+  app.run(main)
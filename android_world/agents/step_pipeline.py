@@ -0,0 +1,79 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Overlaps the tail of an agent step with the start of the next one.
+
+The summary that ends an M3A or T3A step does not touch the device; it is only
+needed for the history in the next action prompt. With pipelining, it runs on
+a worker thread while the next step waits for the screen to settle and
+captures its observation.
+"""
+
+from collections.abc import Callable
+from concurrent import futures
+import time
+from typing import Optional
+
+
+class StepPipeline:
+  """Runs work that a later step depends on, one item at a time.
+
+  Without pipelining, work runs as soon as it is submitted.
+  """
+
+  def __init__(self, enabled: bool = False):
+    self.enabled = enabled
+    self._executor: Optional[futures.ThreadPoolExecutor] = None
+    self._pending: Optional[futures.Future[None]] = None
+
+  def submit(self, work: Callable[[], None]) -> None:
+    """Runs `work`, in the background if pipelining is enabled.
+
+    Args:
+      work: The work, e.g. a summary request that fills in the step data.
+    """
+    self.wait()
+    if not self.enabled:
+      work()
+      return
+    if self._executor is None:
+      self._executor = futures.ThreadPoolExecutor(
+          max_workers=1, thread_name_prefix='step_pipeline'
+      )
+    self._pending = self._executor.submit(work)
+
+  def wait(self) -> float:
+    """Waits for submitted work to finish.
+
+    Returns:
+      The seconds spent waiting.
+
+    Raises:
+      Exception: Whatever the work raised.
+    """
+    if self._pending is None:
+      return 0.0
+    pending, self._pending = self._pending, None
+    start = time.perf_counter()
+    pending.result()
+    return time.perf_counter() - start
+
+  def close(self) -> None:
+    """Waits for submitted work and stops the worker thread."""
+    try:
+      self.wait()
+    finally:
+      if self._executor is not None:
+        self._executor.shutdown()
+        self._executor = None
@@ -0,0 +1,76 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+
+from absl.testing import absltest
+from android_world.agents import step_pipeline
+
+
+class StepPipelineTest(absltest.TestCase):
+
+  def test_runs_inline_when_disabled(self):
+    pipeline = step_pipeline.StepPipeline(enabled=False)
+    threads = []
+
+    pipeline.submit(lambda: threads.append(threading.current_thread()))
+
+    self.assertEqual(threads, [threading.current_thread()])
+    self.assertEqual(pipeline.wait(), 0.0)
+
+  def test_runs_in_background_until_waited_on(self):
+    pipeline = step_pipeline.StepPipeline(enabled=True)
+    self.addCleanup(pipeline.close)
+    release = threading.Event()
+    done = []
+
+    def work():
+      release.wait()
+      done.append(threading.current_thread())
+
+    pipeline.submit(work)
+    self.assertEmpty(done)
+    release.set()
+    pipeline.wait()
+
+    self.assertLen(done, 1)
+    self.assertIsNot(done[0], threading.current_thread())
+
+  def test_submit_waits_for_previous_work(self):
+    pipeline = step_pipeline.StepPipeline(enabled=True)
+    self.addCleanup(pipeline.close)
+    order = []
+
+    pipeline.submit(lambda: order.append(1))
+    pipeline.submit(lambda: order.append(2))
+    pipeline.wait()
+
+    self.assertEqual(order, [1, 2])
+
+  def test_wait_raises_errors_of_work(self):
+    pipeline = step_pipeline.StepPipeline(enabled=True)
+    self.addCleanup(pipeline.close)
+
+    def work():
+      raise ValueError('summary failed')
+
+    pipeline.submit(work)
+
+    with self.assertRaisesRegex(ValueError, 'summary failed'):
+      pipeline.wait()
+    self.assertEqual(pipeline.wait(), 0.0)
+
+
+if __name__ == '__main__':
+  absltest.main()
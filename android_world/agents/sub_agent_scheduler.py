@@ -0,0 +1,197 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Runs sub-agent calls concurrently, ordered by the state they share.
+
+Each call declares the fields of the shared state, e.g. Mobile-Agent-E's
+`InfoPool`, that it reads and writes. A call starts once every earlier call it
+conflicts with has finished: one that writes a field it reads or writes, or
+reads a field it writes. Calls that do not conflict run at the same time on a
+thread pool. In deterministic mode, calls run one by one as they are
+submitted, which gives the sequential behavior for debugging.
+"""
+
+from collections.abc import Callable, Collection
+from concurrent import futures
+import dataclasses
+import threading
+import time
+from typing import Any, Optional
+
+
+@dataclasses.dataclass
+class SubAgentCall:
+  """A submitted call and its timing.
+
+  Attributes:
+    name: The sub-agent, e.g. 'Manager'.
+    reads: Fields of the shared state the call reads.
+    writes: Fields of the shared state the call writes.
+    blocked_on: Names of the earlier calls it had to wait for.
+    future: The result of the call.
+    submitted: When the call was submitted, in `time.perf_counter` seconds.
+    started: When the call started, after the calls it was blocked on.
+    finished: When the call finished.
+  """
+
+  name: str
+  reads: frozenset[str]
+  writes: frozenset[str]
+  blocked_on: list[str]
+  future: futures.Future[Any] = dataclasses.field(
+      default_factory=futures.Future
+  )
+  submitted: float = 0.0
+  started: Optional[float] = None
+  finished: Optional[float] = None
+
+  @property
+  def blocked(self) -> float:
+    """Seconds spent waiting for conflicting calls."""
+    return self.started - self.submitted
+
+  @property
+  def latency(self) -> float:
+    """Seconds the call itself took."""
+    return self.finished - self.started
+
+  def conflicts_with(
+      self, reads: Collection[str], writes: Collection[str]
+  ) -> bool:
+    return bool(
+        self.writes.intersection(reads)
+        or self.writes.intersection(writes)
+        or self.reads.intersection(writes)
+    )
+
+  def result(self) -> Any:
+    return self.future.result()
+
+
+class SubAgentScheduler:
+  """Schedules sub-agent calls on a thread pool by their read and write sets."""
+
+  def __init__(self, deterministic: bool = False, max_workers: int = 4):
+    """Initializes the scheduler.
+
+    Args:
+      deterministic: Whether to run calls one by one, when they are submitted.
+      max_workers: Maximum number of calls running at the same time.
+    """
+    self.deterministic = deterministic
+    self._max_workers = max_workers
+    self._executor: Optional[futures.ThreadPoolExecutor] = None
+    self._lock = threading.Lock()
+    self._pending: list[SubAgentCall] = []
+
+  def _run(
+      self,
+      call: SubAgentCall,
+      work: Callable[[], Any],
+      dependencies: list[SubAgentCall],
+  ) -> Any:
+    # Failed dependencies surface to whoever waits on them.
+    futures.wait([dependency.future for dependency in dependencies])
+    call.started = time.perf_counter()
+    try:
+      return work()
+    finally:
+      call.finished = time.perf_counter()
+
+  def submit(
+      self,
+      name: str,
+      work: Callable[[], Any],
+      reads: Collection[str] = (),
+      writes: Collection[str] = (),
+  ) -> SubAgentCall:
+    """Schedules `work` after the pending calls it conflicts with.
+
+    Args:
+      name: The sub-agent, for reporting.
+      work: The call.
+      reads: Fields of the shared state `work` reads.
+      writes: Fields of the shared state `work` writes.
+
+    Returns:
+      The scheduled call.
+    """
+    with self._lock:
+      self._pending = [
+          call for call in self._pending if not call.future.done()
+      ]
+      dependencies = [
+          call
+          for call in self._pending
+          if call.conflicts_with(reads, writes)
+      ]
+      call = SubAgentCall(
+          name=name,
+          reads=frozenset(reads),
+          writes=frozenset(writes),
+          blocked_on=[dependency.name for dependency in dependencies],
+          submitted=time.perf_counter(),
+      )
+      if self.deterministic:
+        try:
+          call.future.set_result(self._run(call, work, dependencies))
+        except Exception as e:  # pylint: disable=broad-exception-caught
+          call.future.set_exception(e)
+        return call
+      if self._executor is None:
+        self._executor = futures.ThreadPoolExecutor(
+            max_workers=self._max_workers, thread_name_prefix='sub_agent'
+        )
+      # The pool starts calls in submission order, so the dependencies of a
+      # call are running or done by the time it starts waiting for them.
+      call.future = self._executor.submit(self._run, call, work, dependencies)
+      self._pending.append(call)
+    return call
+
+  def wait_for(
+      self, reads: Collection[str] = (), writes: Collection[str] = ()
+  ) -> float:
+    """Waits for the pending calls that conflict with accessing the fields.
+
+    Args:
+      reads: Fields the caller is about to read.
+      writes: Fields the caller is about to write.
+
+    Returns:
+      The seconds spent waiting.
+    """
+    with self._lock:
+      conflicting = [
+          call.future
+          for call in self._pending
+          if call.conflicts_with(reads, writes)
+      ]
+    start = time.perf_counter()
+    futures.wait(conflicting)
+    return time.perf_counter() - start
+
+  def wait(self) -> float:
+    """Waits for all pending calls; returns the seconds spent waiting."""
+    with self._lock:
+      pending, self._pending = self._pending, []
+    start = time.perf_counter()
+    futures.wait([call.future for call in pending])
+    return time.perf_counter() - start
+
+  def close(self) -> None:
+    """Waits for pending calls and stops the worker threads."""
+    self.wait()
+    if self._executor is not None:
+      self._executor.shutdown()
+      self._executor = None
@@ -0,0 +1,117 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+
+from absl.testing import absltest
+from android_world.agents import sub_agent_scheduler
+
+
+class SubAgentSchedulerTest(absltest.TestCase):
+
+  def _scheduler(self, **kwargs) -> sub_agent_scheduler.SubAgentScheduler:
+    scheduler = sub_agent_scheduler.SubAgentScheduler(**kwargs)
+    self.addCleanup(scheduler.close)
+    return scheduler
+
+  def test_conflicting_call_waits(self):
+    scheduler = self._scheduler()
+    release = threading.Event()
+    order = []
+
+    def take_notes():
+      release.wait()
+      order.append('Notetaker')
+
+    notes = scheduler.submit(
+        'Notetaker', take_notes, reads={'plan'}, writes={'notes'}
+    )
+    plan = scheduler.submit(
+        'Manager',
+        lambda: order.append('Manager'),
+        reads={'notes'},
+        writes={'plan'},
+    )
+    release.set()
+    plan.result()
+
+    self.assertTrue(notes.future.done())
+    self.assertEqual(order, ['Notetaker', 'Manager'])
+    self.assertEqual(plan.blocked_on, ['Notetaker'])
+
+  def test_independent_calls_run_concurrently(self):
+    scheduler = self._scheduler()
+    # Each call only finishes once both have started.
+    barrier = threading.Barrier(2, timeout=5)
+
+    first = scheduler.submit('A', barrier.wait, reads={'x'}, writes={'a'})
+    second = scheduler.submit('B', barrier.wait, reads={'x'}, writes={'b'})
+    first.result()
+    second.result()
+
+    self.assertEmpty(second.blocked_on)
+
+  def test_deterministic_runs_inline(self):
+    scheduler = self._scheduler(deterministic=True)
+    threads = []
+
+    call = scheduler.submit(
+        'Notetaker', lambda: threads.append(threading.current_thread())
+    )
+
+    self.assertTrue(call.future.done())
+    self.assertEqual(threads, [threading.current_thread()])
+    self.assertGreaterEqual(call.latency, 0.0)
+
+  def test_errors_surface_in_result(self):
+    scheduler = self._scheduler()
+
+    def fail():
+      raise ValueError('bad response')
+
+    call = scheduler.submit('Manager', fail, writes={'plan'})
+
+    with self.assertRaisesRegex(ValueError, 'bad response'):
+      call.result()
+    # Later calls that depend on it still run.
+    self.assertEqual(
+        scheduler.submit('Executor', lambda: 1, reads={'plan'}).result(), 1
+    )
+
+  def test_wait_for_only_waits_for_conflicts(self):
+    scheduler = self._scheduler()
+    release = threading.Event()
+    call = scheduler.submit('Notetaker', release.wait, writes={'notes'})
+
+    scheduler.wait_for(reads={'plan'})
+    self.assertFalse(call.future.done())
+
+    release.set()
+    scheduler.wait_for(reads={'notes'})
+    self.assertTrue(call.future.done())
+
+  def test_wait(self):
+    scheduler = self._scheduler()
+    release = threading.Event()
+    call = scheduler.submit('Notetaker', release.wait, writes={'notes'})
+    release.set()
+
+    scheduler.wait()
+
+    self.assertTrue(call.future.done())
+    self.assertGreaterEqual(call.blocked, 0.0)
+
+
+if __name__ == '__main__':
+  absltest.main()
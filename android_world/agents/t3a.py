@@ -14,10 +14,13 @@
 
 """T3A: Text-only Autonomous Agent for Android."""
 
+from typing import Any
+
 from android_world.agents import agent_utils
 from android_world.agents import base_agent
 from android_world.agents import infer
 from android_world.agents import m3a_utils
+from android_world.agents import step_pipeline
 from android_world.env import adb_utils
 from android_world.env import interface
 from android_world.env import json_action
@@ -277,6 +280,7 @@ class T3A(base_agent.EnvironmentInteractingAgent):
       env: interface.AsyncEnv,
       llm: infer.LlmWrapper,
       name: str = 'T3A',
+      pipelined: bool = False,
   ):
     """Initializes a RandomAgent.
 
@@ -284,17 +288,27 @@ class T3A(base_agent.EnvironmentInteractingAgent):
       env: The environment.
       llm: The text only LLM.
       name: The agent name.
+      pipelined: Whether to summarize each step in the background, while the
+        next step captures its observation.
     """
     super().__init__(env, name)
     self.llm = llm
     self.history = []
     self.additional_guidelines = None
+    self._pipeline = step_pipeline.StepPipeline(pipelined)
 
   def reset(self, go_home_on_reset: bool = False):
+    self.flush()
     super().reset(go_home_on_reset)
     self.env.hide_automation_ui()
     self.history = []
 
+  def flush(self) -> None:
+    self._pipeline.wait()
+
+  def close(self) -> None:
+    self._pipeline.close()
+
   def set_task_guidelines(self, task_guidelines: list[str]) -> None:
     self.additional_guidelines = task_guidelines
 
@@ -310,6 +324,8 @@ class T3A(base_agent.EnvironmentInteractingAgent):
         'summary_prompt': None,
         'summary': None,
         'summary_raw_response': None,
+        'summary_wait_time': None,
+        'settle_time': None,
     }
     print('----------step ' + str(len(self.history) + 1))
 
@@ -322,9 +338,11 @@ class T3A(base_agent.EnvironmentInteractingAgent):
         logical_screen_size,
     )
     # Only save the screenshot for result visualization.
-    step_data['before_screenshot'] = state.pixels.copy()
+    step_data['before_screenshot'] = state.pixels
     step_data['before_element_list'] = ui_elements
 
+    # The history needs the summary of the previous step.
+    step_data['summary_wait_time'] = self._pipeline.wait()
     action_prompt = _action_selection_prompt(
         goal,
         [
@@ -424,7 +442,7 @@ Action: {{"action_type": "status", "goal_status": "infeasible"}}"""
       print('Agent answered with: ' + converted_action.text)
 
     try:
-      self.env.execute_action(converted_action)
+      self.env.execute_action(converted_action, state_token=state.token)
     except Exception as e:  # pylint: disable=broad-exception-caught
       print(
           'Some error happened executing the action ',
@@ -443,6 +461,7 @@ Action: {{"action_type": "status", "goal_status": "infeasible"}}"""
       )
 
     state = self.get_post_transition_state()
+    step_data['settle_time'] = self.last_settle_time
     ui_elements = state.ui_elements
 
     after_element_list = _generate_ui_elements_description_list_full(
@@ -451,7 +470,7 @@ Action: {{"action_type": "status", "goal_status": "infeasible"}}"""
     )
 
     # Save screenshot only for result visualization.
-    step_data['after_screenshot'] = state.pixels.copy()
+    step_data['after_screenshot'] = state.pixels
     step_data['after_element_list'] = ui_elements
 
     summary_prompt = _summarize_prompt(
@@ -462,6 +481,20 @@ Action: {{"action_type": "status", "goal_status": "infeasible"}}"""
         after_element_list,
     )
 
+    self.history.append(step_data)
+    self._pipeline.submit(
+        lambda: self._summarize(step_data, summary_prompt, action)
+    )
+
+    return base_agent.AgentInteractionResult(
+        False,
+        step_data,
+    )
+
+  def _summarize(
+      self, step_data: dict[str, Any], summary_prompt: str, action: str
+  ) -> None:
+    """Asks the LLM to summarize the step and adds the summary to its data."""
     summary, is_safe, raw_response = self.llm.predict(
         summary_prompt,
     )
@@ -477,10 +510,3 @@ Action: {{"action_type": "status", "goal_status": "infeasible"}}"""
     )
     print('Summary: ' + summary)
     step_data['summary_raw_response'] = raw_response
-
-    self.history.append(step_data)
-
-    return base_agent.AgentInteractionResult(
-        False,
-        step_data,
-    )
@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import threading
 from typing import Any
 from absl.testing import absltest
 from android_world.agents import infer
@@ -38,6 +39,13 @@ class MockLlmWrapper(infer.LlmWrapper):
       return infer.ERROR_CALLING_LLM, None, None
 
 
+class _SettlingEnv(test_utils.FakeAsyncEnv):
+  """Reports that the screen took a quarter of a second to settle."""
+
+  def wait_for_settle(self, max_wait: float) -> float:
+    return min(max_wait, 0.25)
+
+
 class T3AInteractionTest(absltest.TestCase):
 
   def test_step_method_with_completion(self):
@@ -88,6 +96,80 @@ class T3AInteractionTest(absltest.TestCase):
     self.assertTrue(step2_data.done)
     self.assertLen(agent.history, 2)
 
+  def test_pipelined_summary(self):
+    env = test_utils.FakeAsyncEnv()
+    mock_llm = MockLlmWrapper([
+        (
+            "Reason: wait.\nAction: {'action_type': 'wait'}",
+            "fake_response_1",
+        ),
+        (
+            "fake_summary",
+            "fake_response_1",
+        ),
+        (
+            (
+                "Reason: completed.\nAction: {'action_type': 'status',"
+                " 'goal_status': 'complete'}"
+            ),
+            "fake_response_2",
+        ),
+    ])
+    agent = t3a.T3A(env, mock_llm, pipelined=True)
+
+    goal = "do something"
+    step1_data = agent.step(goal)
+    step2_data = agent.step(goal)
+    agent.flush()
+
+    self.assertTrue(step2_data.done)
+    self.assertEqual(
+        step1_data.data["summary"],
+        'Action selected: {"action_type": "wait"}. fake_summary',
+    )
+    self.assertIn(step1_data.data["summary"], step2_data.data["action_prompt"])
+
+  def test_close_stops_pipeline_thread(self):
+    mock_llm = MockLlmWrapper([
+        (
+            "Reason: wait.\nAction: {'action_type': 'wait'}",
+            "fake_response_1",
+        ),
+        (
+            "fake_summary",
+            "fake_response_1",
+        ),
+    ])
+    agent = t3a.T3A(test_utils.FakeAsyncEnv(), mock_llm, pipelined=True)
+    threads_before = set(threading.enumerate())
+    step_data = agent.step("do something")
+
+    agent.close()
+
+    self.assertEqual(
+        step_data.data["summary"],
+        'Action selected: {"action_type": "wait"}. fake_summary',
+    )
+    self.assertEmpty(set(threading.enumerate()) - threads_before)
+
+
+  def test_settle_time_is_recorded(self):
+    mock_llm = MockLlmWrapper([
+        (
+            "Reason: wait.\nAction: {'action_type': 'wait'}",
+            "fake_response_1",
+        ),
+        (
+            "fake_summary",
+            "fake_response_1",
+        ),
+    ])
+    agent = t3a.T3A(_SettlingEnv(), mock_llm)
+
+    step_data = agent.step("do something")
+
+    self.assertEqual(step_data.data["settle_time"], 0.25)
+
 
 if __name__ == "__main__":
   absltest.main()
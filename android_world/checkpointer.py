@@ -20,6 +20,7 @@ import gzip
 import io
 import os
 import pickle
+import tempfile
 from typing import Any
 
 from absl import logging
@@ -118,14 +119,20 @@ class IncrementalCheckpointer(Checkpointer):
   def save_episodes(self, task_episodes: list[Episode], task_name: str):
     """Saves a task group to disk.
 
+    The file is written under a temporary name and then renamed, so that
+    concurrent runs sharing the directory never load a partially written file.
+
     Args:
         task_episodes: The task's episodes to save.
         task_name: The unique identifier for the task group.
     """
     filename = os.path.join(self.directory, f'{task_name}.pkl.gz')
-    with open(filename, 'wb') as f:
-      compressed = _gzip_pickle(task_episodes)
+    compressed = _gzip_pickle(task_episodes)
+    with tempfile.NamedTemporaryFile(
+        'wb', dir=self.directory, suffix='.tmp', delete=False
+    ) as f:
       f.write(compressed)
+    os.replace(f.name, filename)
     print(f'Wrote task episodes for {task_name} to {filename}')
 
   def load(self, fields: list[str] | None = None) -> list[Episode]:
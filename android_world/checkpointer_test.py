@@ -54,6 +54,12 @@ class CheckpointerTest(absltest.TestCase):
     loaded_data = self.checkpointer.load()
     self.assertEqual(new_data, loaded_data)
 
+  def test_save_leaves_no_temporary_files(self) -> None:
+    """Tests that save replaces the task group file atomically."""
+    self.checkpointer.save_episodes([{'key': 'value'}], 'task_group')
+    self.checkpointer.save_episodes([{'key': 'value2'}], 'task_group')
+    self.assertEqual(os.listdir(self.temp_dir.name), ['task_group.pkl.gz'])
+
   def test_save_and_load_multiple_task_groups(self) -> None:
     """Tests saving and loading multiple task groups."""
     task_groups = [
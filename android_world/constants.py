@@ -35,6 +35,10 @@ class EpisodeConstants:
     SEED: The random seed to initialize the current episode's task.
     AUX_DATA: Additional data which can be passed from the task to
       process_episodes.
+    RESET_TIMES: Seconds spent resetting apps in initialize and tear down, per
+      reset strategy.
+    RESTORE_STATS: The app snapshot restores in initialize and tear down, each
+      an `app_snapshot.RestoreStats` as a dict with the app name.
   """
 
   EPISODE_DATA = 'episode_data'
@@ -51,3 +55,5 @@ class EpisodeConstants:
   FINISH_DTIME = 'finish_dtime'
   SEED = 'seed'
   AUX_DATA = 'aux_data'
+  RESET_TIMES = 'reset_times'
+  RESTORE_STATS = 'restore_stats'
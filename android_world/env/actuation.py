@@ -15,14 +15,384 @@
 """Utilies for actuation."""
 
 import copy
+import dataclasses
+import enum
 import logging
 import time
-from typing import Any
+from typing import Any, Optional
 from android_env import env_interface
 from android_world.env import adb_utils
 from android_world.env import android_world_controller
 from android_world.env import json_action
 from android_world.env import representation_utils
+from android_world.env import screen_stability
+
+
+class TextEntryMode(enum.Enum):
+  """How `input_text` actions enter text."""
+
+  # One adb call per word, space and newline.
+  WORD_BY_WORD = 'word_by_word'
+  # Chunks of characters, all typed with a single adb call.
+  CHUNKED = 'chunked'
+
+
+@dataclasses.dataclass(frozen=True)
+class TextEntryConfig:
+  """Parameters for entering text.
+
+  Attributes:
+    mode: How text is entered.
+    chunk_size: Maximum number of characters per `input text` command in
+      CHUNKED mode.
+    paste_min_length: In CHUNKED mode, text at least this long is pasted through
+      the clipboard instead of typed. None to never paste long text.
+    paste_non_ascii: In CHUNKED mode, whether to paste text with non-ASCII
+      characters, which cannot be typed.
+    verify: In CHUNKED mode, whether to compare the text of the focused element
+      with the entered text afterwards. If it does not match, the entered text
+      is deleted and typed again word by word. Only single-line text is
+      verified, since enter presses may leave the element, and only if the
+      environment is an `AndroidWorldController`.
+    verify_timeout: Maximum time in seconds to wait for the UI tree to show the
+      entered text.
+  """
+
+  mode: TextEntryMode = TextEntryMode.WORD_BY_WORD
+  chunk_size: int = adb_utils.DEFAULT_TEXT_CHUNK_SIZE
+  paste_min_length: Optional[int] = None
+  paste_non_ascii: bool = True
+  verify: bool = True
+  verify_timeout: float = 1.0
+
+
+def ui_tree_hash(env: android_world_controller.AndroidWorldController) -> int:
+  """Returns the hash of the current UI tree, without a screenshot."""
+  if env.a11y_method == android_world_controller.A11yMethod.A11Y_FORWARDER_APP:
+    return screen_stability.forest_hash(env.get_a11y_forest())
+  return screen_stability.ui_elements_hash(env.get_ui_elements())
+
+
+def _screen_signature(
+    env: android_world_controller.AndroidWorldController,
+    config: screen_stability.SettleConfig,
+) -> screen_stability.ScreenSignature:
+  """Returns the UI tree hash and, if configured, the foreground activity."""
+  activity = None
+  if config.use_activity:
+    activity, _ = adb_utils.get_current_activity(env)
+  return screen_stability.ScreenSignature(
+      tree_hash=ui_tree_hash(env), activity=activity
+  )
+
+
+def _can_settle(
+    env: env_interface.AndroidEnvInterface,
+    config: Optional[screen_stability.SettleConfig],
+) -> bool:
+  return (
+      config is not None
+      and config.enabled
+      and isinstance(env, android_world_controller.AndroidWorldController)
+  )
+
+
+def _settle_baseline(
+    env: env_interface.AndroidEnvInterface,
+    config: Optional[screen_stability.SettleConfig],
+) -> Optional[screen_stability.ScreenSignature]:
+  """Captures the screen before a step that `_settle` waits for."""
+  if not _can_settle(env, config):
+    return None
+  return _screen_signature(env, config)
+
+
+def _settle(
+    env: env_interface.AndroidEnvInterface,
+    max_wait: float,
+    config: Optional[screen_stability.SettleConfig],
+    baseline: Optional[screen_stability.ScreenSignature] = None,
+) -> None:
+  """Waits for the screen to settle within an action, at most `max_wait`.
+
+  Screenshots are not compared here, since these waits only need the UI tree to
+  have caught up. Without a settle config, or if `env` is not an
+  `AndroidWorldController`, this sleeps for `max_wait`.
+
+  Args:
+    env: The environment.
+    max_wait: Maximum time in seconds to wait.
+    config: Settle parameters.
+    baseline: The screen before the step that is waited for, if captured.
+  """
+  if not _can_settle(env, config):
+    time.sleep(max_wait)
+    return
+  screen_stability.wait_for_settle(
+      lambda: _screen_signature(env, config), max_wait, config, baseline
+  )
+
+
+def _focused_element(
+    env: android_world_controller.AndroidWorldController,
+) -> Optional[representation_utils.UIElement]:
+  for element in env.get_ui_elements():
+    if element.is_focused and element.is_editable:
+      return element
+  return None
+
+
+def _field_text(element: representation_utils.UIElement) -> str:
+  """Returns the text of an editable element, without its hint."""
+  if element.text is None or element.text == element.hint_text:
+    return ''
+  return element.text
+
+
+def _wait_for_field_text(
+    expected: str,
+    env: android_world_controller.AndroidWorldController,
+    timeout: float,
+) -> Optional[str]:
+  """Waits for the focused element to contain `expected`; returns its text."""
+  deadline = time.time() + timeout
+  while True:
+    element = _focused_element(env)
+    text = _field_text(element) if element is not None else None
+    if (text is not None and expected in text) or time.time() >= deadline:
+      return text
+    time.sleep(0.1)
+
+
+def _enter_text(
+    text: str,
+    env: env_interface.AndroidEnvInterface,
+    config: TextEntryConfig,
+) -> None:
+  """Enters `text` into the focused element as configured."""
+  if config.mode == TextEntryMode.WORD_BY_WORD:
+    adb_utils.type_text(text, env, timeout_sec=10)
+    return
+
+  paste = (
+      config.paste_min_length is not None
+      and len(text) >= config.paste_min_length
+  ) or (config.paste_non_ascii and not text.isascii())
+  before = None
+  if (
+      config.verify
+      and '\n' not in text
+      and isinstance(env, android_world_controller.AndroidWorldController)
+  ):
+    element = _focused_element(env)
+    if element is not None:
+      before = _field_text(element)
+
+  if paste:
+    try:
+      adb_utils.paste_text(text, env)
+    except RuntimeError as error:
+      logging.warning('Failed to paste text, typing it instead: %s', error)
+      paste = False
+  if not paste:
+    adb_utils.type_text_chunked(text, env, config.chunk_size)
+  if before is None:
+    return
+
+  expected = text if paste else adb_utils.ascii_text(text)
+  after = _wait_for_field_text(expected, env, config.verify_timeout)
+  if after is not None and expected in after:
+    return
+  logging.warning(
+      'Entered text %r, but the focused element shows %r; typing it word by'
+      ' word.',
+      expected,
+      after,
+  )
+  if after is not None and len(after) > len(before):
+    adb_utils.issue_generic_request(
+        ['shell', 'input', 'keyevent']
+        + ['KEYCODE_DEL'] * (len(after) - len(before)),
+        env,
+    )
+  adb_utils.type_text(text, env, timeout_sec=10)
+
+
+# Actions that `compile_gesture` turns into touch input.
+_GESTURE_ACTION_TYPES = (
+    'click',
+    'double_tap',
+    'long_press',
+    'drag_and_drop',
+    'scroll',
+    'swipe',
+    'launch_adb_activity',
+)
+_LONG_PRESS_MS = 1000
+_DRAG_AND_DROP_MS = 4000
+_SWIPE_MS = 500
+_QUICK_SETTINGS_MS = 10
+
+
+def _tap(x: int, y: int) -> str:
+  return f'input tap {x} {y}'
+
+
+def _swipe(
+    start: tuple[int, int],
+    end: tuple[int, int],
+    duration_ms: Optional[int] = None,
+    command: str = 'swipe',
+) -> str:
+  script = f'input {command} {start[0]} {start[1]} {end[0]} {end[1]}'
+  if duration_ms:
+    script += f' {duration_ms}'
+  return script
+
+
+def _app_drawer_swipe(screen_size: tuple[int, int]) -> str:
+  x = int(screen_size[0] / 2)
+  return _swipe((x, int(screen_size[1] * 0.9)), (x, int(0.3 * screen_size[1])))
+
+
+def _action_point(
+    action: json_action.JSONAction, screen_elements: list[Any]
+) -> tuple[int, int]:
+  """Returns the point a click-like action targets."""
+  idx = action.index
+  if idx is not None:
+    if idx < 0 or idx >= len(screen_elements):
+      raise ValueError(
+          f'Invalid element index: {idx}, must be between 0 and'
+          f' {len(screen_elements)-1}.'
+      )
+    element = screen_elements[idx]
+    if element.bbox_pixels is None:
+      raise ValueError('Bbox is not present on element.')
+    x, y = element.bbox_pixels.center
+    return int(x), int(y)
+  if action.x is not None and action.y is not None:
+    return int(action.x), int(action.y)
+  raise ValueError(f'Invalid click action: {action}')
+
+
+def _scroll_points(
+    action: json_action.JSONAction,
+    screen_elements: list[Any],
+    screen_size: tuple[int, int],
+) -> Optional[tuple[tuple[int, int], tuple[int, int]]]:
+  """Returns the start and end of a scroll, or None for invalid directions."""
+  screen_width, screen_height = screen_size
+  if action.index:
+    bbox = screen_elements[action.index].bbox_pixels
+    x_min, y_min, x_max, y_max = (
+        max(bbox.x_min, 0),
+        max(bbox.y_min, 0),
+        min(bbox.x_max, screen_width),
+        min(bbox.y_max, screen_height),
+    )
+  else:
+    x_min, y_min, x_max, y_max = (0, 0, screen_width, screen_height)
+
+  start_x, start_y = (x_min + x_max) // 2, (y_min + y_max) // 2
+  direction = action.direction
+  if direction == 'down':
+    end_x, end_y = (x_min + x_max) // 2, y_min
+  elif direction == 'up':
+    end_x, end_y = (x_min + x_max) // 2, y_max
+  elif direction == 'right':
+    end_x, end_y = x_min, (y_min + y_max) // 2
+  elif direction == 'left':
+    end_x, end_y = x_max, (y_min + y_max) // 2
+  else:
+    return None
+  return (int(start_x), int(start_y)), (int(end_x), int(end_y))
+
+
+def _swipe_points(
+    direction: Optional[str], screen_size: tuple[int, int]
+) -> Optional[tuple[tuple[int, int], tuple[int, int]]]:
+  """Returns the start and end of a swipe, or None for invalid directions."""
+  screen_width, screen_height = screen_size
+  mid_x, mid_y = 0.5 * screen_width, 0.5 * screen_height
+  if direction == 'down':
+    start, end = (mid_x, 0), (mid_x, screen_height)
+  elif direction == 'up':
+    start, end = (mid_x, screen_height), (mid_x, 0)
+  elif direction == 'left':
+    start, end = (0, mid_y), (screen_width, mid_y)
+  elif direction == 'right':
+    start, end = (screen_width, mid_y), (0, mid_y)
+  else:
+    return None
+  return (int(start[0]), int(start[1])), (int(end[0]), int(end[1]))
+
+
+def compile_gesture(
+    action: json_action.JSONAction,
+    screen_elements: list[Any],  # list[UIElement]
+    screen_size: tuple[int, int],
+) -> Optional[str]:
+  """Compiles a touch action into a single on-device shell script.
+
+  The script chains `input` commands, and sleeps where a gesture needs the
+  screen to catch up, so the whole gesture runs with one adb call and its
+  timing does not depend on adb round trips.
+
+  Args:
+    action: The action to compile.
+    screen_elements: List of UI elements on the screen.
+    screen_size: The (width, height) of the screen.
+
+  Returns:
+    The script, or None if the action is not a gesture or lacks what the
+    gesture needs, e.g. a valid direction.
+
+  Raises:
+    ValueError: If a click, double tap or long press has no valid target.
+  """
+  action_type = action.action_type
+  if action_type in ('click', 'double_tap', 'long_press'):
+    x, y = _action_point(action, screen_elements)
+    if action_type == 'click':
+      return _tap(x, y)
+    if action_type == 'double_tap':
+      # Both taps go in one adb call, but each `input` command starts its own
+      # process, so the gap between them is not guaranteed to be within the
+      # double tap timeout.
+      return f'{_tap(x, y)} && {_tap(x, y)}'
+    return _swipe((x, y), (x, y), _LONG_PRESS_MS)
+
+  if action_type == 'drag_and_drop':
+    if action.touch_xy is None or action.lift_xy is None:
+      return None
+    return _swipe(
+        (int(action.touch_xy[0]), int(action.touch_xy[1])),
+        (int(action.lift_xy[0]), int(action.lift_xy[1])),
+        _DRAG_AND_DROP_MS,
+        command='draganddrop',
+    )
+
+  if action_type == 'scroll':
+    points = _scroll_points(action, screen_elements, screen_size)
+    return None if points is None else _swipe(*points)
+
+  if action_type == 'swipe':  # Inverse of scroll.
+    points = _swipe_points(action.direction, screen_size)
+    return None if points is None else _swipe(*points, _SWIPE_MS)
+
+  if action_type == 'launch_adb_activity':
+    if action.activity_nickname == 'app_drawer':
+      return (
+          'input keyevent KEYCODE_HOME && sleep 1 &&'
+          f' {_app_drawer_swipe(screen_size)}'
+      )
+    if action.activity_nickname == 'quick_settings':
+      x = int(screen_size[0] / 2)
+      return _swipe(
+          (x, 30), (x, int(0.3 * screen_size[1])), _QUICK_SETTINGS_MS
+      )
+  return None
 
 
 def execute_adb_action(
@@ -30,6 +400,8 @@ def execute_adb_action(
     screen_elements: list[Any],  # list[UIElement]
     screen_size: tuple[int, int],
     env: env_interface.AndroidEnvInterface,
+    text_entry: Optional[TextEntryConfig] = None,
+    settle: Optional[screen_stability.SettleConfig] = None,
 ) -> None:
   """Execute an action based on a JSONAction object.
 
@@ -38,38 +410,35 @@ def execute_adb_action(
       screen_elements: List of UI elements on the screen.
       screen_size: The (width, height) of the screen.
       env: The environment to execute the action in.
+      text_entry: How to enter text for `input_text` actions. Defaults to
+        typing word by word.
+      settle: If set, waits within actions, e.g. between focusing a text field
+        and typing, return as soon as the screen settles instead of sleeping
+        for a fixed time.
   """
-  if action.action_type in ['click', 'double_tap', 'long_press']:
-    idx = action.index
-    x = action.x
-    y = action.y
-    if idx is not None:
-      if idx < 0 or idx >= len(screen_elements):
-        raise ValueError(
-            f'Invalid element index: {idx}, must be between 0 and'
-            f' {len(screen_elements)-1}.'
-        )
-      element = screen_elements[idx]
-      if element.bbox_pixels is None:
-        raise ValueError('Bbox is not present on element.')
-      x, y = element.bbox_pixels.center
-      x, y = int(x), int(y)
-      if action.action_type == 'click':
-        adb_utils.tap_screen(x, y, env)
-      elif action.action_type == 'double_tap':
-        adb_utils.double_tap(x, y, env)
-      else:
-        adb_utils.long_press(x, y, env)
-    elif x is not None and y is not None:
-      x, y = int(x), int(y)
-      if action.action_type == 'click':
-        adb_utils.tap_screen(x, y, env)
-      elif action.action_type == 'double_tap':
-        adb_utils.double_tap(x, y, env)
-      else:
-        adb_utils.long_press(x, y, env)
+  if (
+      action.action_type == 'launch_adb_activity'
+      and action.activity_nickname == 'app_drawer'
+      and _can_settle(env, settle)
+  ):
+    # Poll for the home screen instead of the fixed sleep of the compiled
+    # gesture.
+    baseline = _settle_baseline(env, settle)
+    adb_utils.press_home_button(env)
+    _settle(env, 1.0, settle, baseline)
+    adb_utils.issue_generic_request(
+        ['shell', _app_drawer_swipe(screen_size)], env
+    )
+
+  elif action.action_type in _GESTURE_ACTION_TYPES:
+    script = compile_gesture(action, screen_elements, screen_size)
+    if script is None:
+      logging.warning(
+          'Gesture action %s is missing a target; no action will be executed.',
+          action,
+      )
     else:
-      raise ValueError(f'Invalid click action: {action}')
+      adb_utils.issue_generic_request(['shell', script], env)
 
   elif action.action_type == 'input_text':
     text = action.text
@@ -80,9 +449,10 @@ def execute_adb_action(
         # First focus on enter text UI element.
         click_action = copy.deepcopy(action)
         click_action.action_type = 'click'
+        baseline = _settle_baseline(env, settle)
         execute_adb_action(click_action, screen_elements, screen_size, env)
-        time.sleep(1.0)
-      adb_utils.type_text(text, env, timeout_sec=10)
+        _settle(env, 1.0, settle, baseline)
+      _enter_text(text, env, text_entry or TextEntryConfig())
       adb_utils.press_enter_button(env)
     else:
       logging.warning(
@@ -101,76 +471,6 @@ def execute_adb_action(
 
   elif action.action_type == 'press_keyboard':
     adb_utils.press_keyboard_generic(action.keycode, env)
-  elif action.action_type == 'drag_and_drop':
-    if action.touch_xy is not None and action.lift_xy is not None:
-      command = adb_utils.generate_drag_and_drop_command(
-          action.touch_xy[0],
-          action.touch_xy[1],
-          action.lift_xy[0],
-          action.lift_xy[1],
-          4000,
-      )
-      adb_utils.issue_generic_request(command, env)
-    else:
-      logging.warning(
-          'Drag and drop action indicated, but no coordinates provided. No '
-          'action will be executed.'
-      )
-  elif action.action_type == 'scroll':
-
-    screen_width, screen_height = screen_size
-    if action.index:
-      x_min, y_min, x_max, y_max = (
-          max(screen_elements[action.index].bbox_pixels.x_min, 0),
-          max(screen_elements[action.index].bbox_pixels.y_min, 0),
-          min(screen_elements[action.index].bbox_pixels.x_max, screen_width),
-          min(screen_elements[action.index].bbox_pixels.y_max, screen_height),
-      )
-    else:
-      x_min, y_min, x_max, y_max = (0, 0, screen_width, screen_height)
-
-    start_x, start_y = (x_min + x_max) // 2, (y_min + y_max) // 2
-    direction = action.direction
-    if direction == 'down':
-      end_x, end_y = (x_min + x_max) // 2, y_min
-    elif direction == 'up':
-      end_x, end_y = (x_min + x_max) // 2, y_max
-    elif direction == 'right':
-      end_x, end_y = x_min, (y_min + y_max) // 2
-    elif direction == 'left':
-      end_x, end_y = x_max, (y_min + y_max) // 2
-    else:
-      print('Invalid direction')
-      return
-    command = adb_utils.generate_swipe_command(
-        int(start_x), int(start_y), int(end_x), int(end_y)
-    )
-    adb_utils.issue_generic_request(command, env)
-
-  elif action.action_type == 'swipe':  # Inverse of scroll.
-    screen_width, screen_height = screen_size
-    mid_x, mid_y = 0.5 * screen_width, 0.5 * screen_height
-    direction = action.direction
-    if direction == 'down':
-      start_x, start_y = mid_x, 0
-      end_x, end_y = mid_x, screen_height
-    elif direction == 'up':
-      start_x, start_y = mid_x, screen_height
-      end_x, end_y = mid_x, 0
-    elif direction == 'left':
-      start_x, start_y = 0, mid_y
-      end_x, end_y = screen_width, mid_y
-    elif direction == 'right':
-      start_x, start_y = screen_width, mid_y
-      end_x, end_y = 0, mid_y
-    else:
-      print('Invalid direction')
-      return
-    command = adb_utils.generate_swipe_command(
-        int(start_x), int(start_y), int(end_x), int(end_y), 500
-    )
-    adb_utils.issue_generic_request(command, env)
-
   elif action.action_type == 'open_app':
     app_name = action.app_name
     if app_name:
@@ -179,25 +479,8 @@ def execute_adb_action(
       raise ValueError('No app name provided')
 
   elif action.action_type == 'wait':
-    time.sleep(1.0)
+    _settle(env, 1.0, settle)
 
-  elif action.action_type == 'launch_adb_activity':
-    if action.activity_nickname == 'app_drawer':
-      adb_utils.press_home_button(env)
-      time.sleep(1.0)
-      start_x, start_y = int(screen_size[0] / 2), int(screen_size[1] * 0.9)
-      end_x = start_x
-      end_y = int(0.3 * screen_size[1])
-      request = adb_utils.generate_swipe_command(start_x, start_y, end_x, end_y)
-      adb_utils.issue_generic_request(request, env)
-    elif action.activity_nickname == 'quick_settings':
-      start_x, start_y = int(screen_size[0] / 2), 30
-      end_x = start_x
-      end_y = int(0.3 * screen_size[1])
-      request = adb_utils.generate_swipe_command(
-          start_x, start_y, end_x, end_y, duration_ms=10
-      )
-      adb_utils.issue_generic_request(request, env)
   elif action.action_type == 'change_orientation':
     adb_utils.change_orientation(action.orientation, env)
   elif action.action_type == json_action.UNKNOWN:
@@ -12,7 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import copy
+import dataclasses
 import time
 from unittest import mock
 
@@ -23,6 +23,7 @@ from android_world.env import adb_utils
 from android_world.env import android_world_controller
 from android_world.env import json_action
 from android_world.env import representation_utils
+from android_world.env import screen_stability
 
 
 @mock.patch.object(time, 'sleep')
@@ -127,47 +128,59 @@ class ExecuteAdbActionTest(absltest.TestCase):
     ]
     self.screen_size = (100, 100)
 
+  def _assert_gesture(self, mock_issue_generic_request, script):
+    mock_issue_generic_request.assert_called_once_with(
+        ['shell', script], self.mock_env
+    )
+
   def test_click_by_index(self):
     action = json_action.JSONAction(action_type='click', index=0)
-    with mock.patch.object(adb_utils, 'tap_screen') as mock_tap_screen:
+    with mock.patch.object(
+        adb_utils, 'issue_generic_request'
+    ) as mock_issue_generic_request:
       actuation.execute_adb_action(
           action, self.screen_elements, self.screen_size, self.mock_env
       )
-      mock_tap_screen.assert_called_once_with(25, 30, self.mock_env)
+      self._assert_gesture(mock_issue_generic_request, 'input tap 25 30')
 
   def test_click_by_coordinates(self):
     action = json_action.JSONAction(action_type='click', x=50, y=50)
-    with mock.patch.object(adb_utils, 'tap_screen') as mock_tap_screen:
+    with mock.patch.object(
+        adb_utils, 'issue_generic_request'
+    ) as mock_issue_generic_request:
       actuation.execute_adb_action(
           action, self.screen_elements, self.screen_size, self.mock_env
       )
-      mock_tap_screen.assert_called_once_with(50, 50, self.mock_env)
+      self._assert_gesture(mock_issue_generic_request, 'input tap 50 50')
 
   def test_click_by_coordinate_floats(self):
     action = json_action.JSONAction(action_type='click', x=50.2, y=50.3)
-    with mock.patch.object(adb_utils, 'tap_screen') as mock_tap_screen:
+    with mock.patch.object(
+        adb_utils, 'issue_generic_request'
+    ) as mock_issue_generic_request:
       actuation.execute_adb_action(
           action, self.screen_elements, self.screen_size, self.mock_env
       )
-      mock_tap_screen.assert_called_once_with(50, 50, self.mock_env)
+      self._assert_gesture(mock_issue_generic_request, 'input tap 50 50')
 
   def test_input_text(self):
     action = json_action.JSONAction(
         action_type='input_text', text='test input', x=50, y=50
     )
-    click_action = copy.deepcopy(action)
-    click_action.action_type = 'click'
     with (
-        mock.patch.object(adb_utils, 'tap_screen') as mock_tap_screen,
+        mock.patch.object(
+            adb_utils, 'issue_generic_request'
+        ) as mock_issue_generic_request,
         mock.patch.object(adb_utils, 'type_text') as mock_type_text,
         mock.patch.object(
             adb_utils, 'press_enter_button'
         ) as mock_press_enter_button,
+        mock.patch.object(time, 'sleep'),
     ):
       actuation.execute_adb_action(
           action, self.screen_elements, self.screen_size, self.mock_env
       )
-      mock_tap_screen.assert_called_once_with(50, 50, self.mock_env)
+      self._assert_gesture(mock_issue_generic_request, 'input tap 50 50')
       mock_type_text.assert_called_once_with(
           'test input', self.mock_env, timeout_sec=10
       )
@@ -175,40 +188,26 @@ class ExecuteAdbActionTest(absltest.TestCase):
 
   def test_scroll(self):
     action = json_action.JSONAction(action_type='scroll', direction='down')
-    with (
-        mock.patch.object(
-            adb_utils, 'generate_swipe_command'
-        ) as mock_generate_swipe_command,
-        mock.patch.object(
-            adb_utils, 'issue_generic_request'
-        ) as mock_issue_generic_request,
-    ):
-      mock_generate_swipe_command.return_value = 'command'
+    with mock.patch.object(
+        adb_utils, 'issue_generic_request'
+    ) as mock_issue_generic_request:
       actuation.execute_adb_action(
           action, self.screen_elements, self.screen_size, self.mock_env
       )
-      mock_generate_swipe_command.assert_called_once_with(50, 50, 50, 0)
-      mock_issue_generic_request.assert_called_once_with(
-          'command', self.mock_env
+      self._assert_gesture(
+          mock_issue_generic_request, 'input swipe 50 50 50 0'
       )
 
   def test_swipe(self):
     action = json_action.JSONAction(action_type='swipe', direction='up')
-    with (
-        mock.patch.object(
-            adb_utils, 'generate_swipe_command'
-        ) as mock_generate_swipe_command,
-        mock.patch.object(
-            adb_utils, 'issue_generic_request'
-        ) as mock_issue_generic_request,
-    ):
-      mock_generate_swipe_command.return_value = 'command'
+    with mock.patch.object(
+        adb_utils, 'issue_generic_request'
+    ) as mock_issue_generic_request:
       actuation.execute_adb_action(
           action, self.screen_elements, self.screen_size, self.mock_env
       )
-      mock_generate_swipe_command.assert_called_once_with(50, 100, 50, 0, 500)
-      mock_issue_generic_request.assert_called_once_with(
-          'command', self.mock_env
+      self._assert_gesture(
+          mock_issue_generic_request, 'input swipe 50 100 50 0 500'
       )
 
   def test_open_app(self):
@@ -221,19 +220,43 @@ class ExecuteAdbActionTest(absltest.TestCase):
 
   def test_double_tap(self):
     action = json_action.JSONAction(action_type='double_tap', index=0)
-    with mock.patch.object(adb_utils, 'double_tap') as mock_double_tap:
+    with mock.patch.object(
+        adb_utils, 'issue_generic_request'
+    ) as mock_issue_generic_request:
       actuation.execute_adb_action(
           action, self.screen_elements, self.screen_size, self.mock_env
       )
-      mock_double_tap.assert_called_once_with(25, 30, self.mock_env)
+      self._assert_gesture(
+          mock_issue_generic_request, 'input tap 25 30 && input tap 25 30'
+      )
 
   def test_long_press(self):
     action = json_action.JSONAction(action_type='long_press', index=0)
-    with mock.patch.object(adb_utils, 'long_press') as mock_long_press:
+    with mock.patch.object(
+        adb_utils, 'issue_generic_request'
+    ) as mock_issue_generic_request:
       actuation.execute_adb_action(
           action, self.screen_elements, self.screen_size, self.mock_env
       )
-      mock_long_press.assert_called_once_with(25, 30, self.mock_env)
+      self._assert_gesture(
+          mock_issue_generic_request, 'input swipe 25 30 25 30 1000'
+      )
+
+  def test_app_drawer_is_one_call(self):
+    # These actions are not `JSONAction`s.
+    action = mock.Mock(
+        action_type='launch_adb_activity', activity_nickname='app_drawer'
+    )
+    with mock.patch.object(
+        adb_utils, 'issue_generic_request'
+    ) as mock_issue_generic_request:
+      actuation.execute_adb_action(
+          action, self.screen_elements, self.screen_size, self.mock_env
+      )
+      self._assert_gesture(
+          mock_issue_generic_request,
+          'input keyevent KEYCODE_HOME && sleep 1 && input swipe 50 90 50 30',
+      )
 
   def test_keyboard_enter(self):
     action = json_action.JSONAction(action_type='keyboard_enter')
@@ -273,6 +296,34 @@ class ExecuteAdbActionTest(absltest.TestCase):
       )
       mock_sleep.assert_called_once_with(1.0)
 
+  def test_wait_returns_once_screen_settles(self):
+    env = mock.create_autospec(
+        android_world_controller.AndroidWorldController, instance=True
+    )
+    env.a11y_method = android_world_controller.A11yMethod.UIAUTOMATOR
+    env.get_ui_elements.return_value = [
+        representation_utils.UIElement(text='Loaded')
+    ]
+    now = [0.0]
+
+    def sleep(seconds):
+      now[0] += seconds
+
+    with mock.patch.object(time, 'time', lambda: now[0]), mock.patch.object(
+        time, 'sleep', side_effect=sleep
+    ):
+      actuation.execute_adb_action(
+          json_action.JSONAction(action_type='wait'),
+          self.screen_elements,
+          self.screen_size,
+          env,
+          settle=screen_stability.SettleConfig(
+              quiet_window=0.25, poll_interval=0.125, use_activity=False
+          ),
+      )
+
+    self.assertEqual(now[0], 0.25)
+
   def test_unknown_action(self):
     action = json_action.JSONAction(action_type=json_action.UNKNOWN)
     actuation.execute_adb_action(
@@ -280,5 +331,179 @@ class ExecuteAdbActionTest(absltest.TestCase):
     )
 
 
+class CompileGestureTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.screen_elements = [
+        representation_utils.UIElement(
+            bbox_pixels=representation_utils.BoundingBox(
+                x_min=0, x_max=50, y_min=0, y_max=60
+            )
+        ),
+        representation_utils.UIElement(
+            bbox_pixels=representation_utils.BoundingBox(
+                x_min=20, x_max=80, y_min=40, y_max=140
+            )
+        ),
+    ]
+    self.screen_size = (100, 120)
+
+  def _compile(self, **kwargs):
+    return actuation.compile_gesture(
+        json_action.JSONAction(**kwargs),
+        self.screen_elements,
+        self.screen_size,
+    )
+
+  def _compile_raw(self, **kwargs):
+    # Drag and drop and adb activities are not `JSONAction`s.
+    return actuation.compile_gesture(
+        mock.Mock(**kwargs), self.screen_elements, self.screen_size
+    )
+
+  def test_scroll_within_element_is_clipped_to_screen(self):
+    self.assertEqual(
+        self._compile(action_type='scroll', direction='up', index=1),
+        'input swipe 50 80 50 120',
+    )
+
+  def test_swipe_left(self):
+    self.assertEqual(
+        self._compile(action_type='swipe', direction='left'),
+        'input swipe 0 60 100 60 500',
+    )
+
+  def test_drag_and_drop(self):
+    self.assertEqual(
+        self._compile_raw(
+            action_type='drag_and_drop', touch_xy=(1, 2), lift_xy=(3.5, 4)
+        ),
+        'input draganddrop 1 2 3 4 4000',
+    )
+
+  def test_quick_settings(self):
+    self.assertEqual(
+        self._compile_raw(
+            action_type='launch_adb_activity',
+            activity_nickname='quick_settings',
+        ),
+        'input swipe 50 30 50 36 10',
+    )
+
+  def test_incomplete_gestures_compile_to_none(self):
+    self.assertIsNone(
+        self._compile_raw(
+            action_type='drag_and_drop', touch_xy=None, lift_xy=(3, 4)
+        )
+    )
+    self.assertIsNone(self._compile(action_type='swipe'))
+
+  def test_non_gestures_compile_to_none(self):
+    self.assertIsNone(self._compile(action_type='navigate_back'))
+    self.assertIsNone(self._compile(action_type='input_text', text='a'))
+
+  def test_invalid_index_raises(self):
+    with self.assertRaises(ValueError):
+      self._compile(action_type='click', index=5)
+
+
+class EnterTextTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.env = mock.create_autospec(
+        android_world_controller.AndroidWorldController, instance=True
+    )
+    self.mock_type_text = self.enter_context(
+        mock.patch.object(adb_utils, 'type_text')
+    )
+    self.mock_type_text_chunked = self.enter_context(
+        mock.patch.object(adb_utils, 'type_text_chunked')
+    )
+    self.mock_paste_text = self.enter_context(
+        mock.patch.object(adb_utils, 'paste_text')
+    )
+    self.mock_issue_generic_request = self.enter_context(
+        mock.patch.object(adb_utils, 'issue_generic_request')
+    )
+    self.enter_context(mock.patch.object(time, 'sleep'))
+    self.config = actuation.TextEntryConfig(
+        mode=actuation.TextEntryMode.CHUNKED, chunk_size=16, verify_timeout=0
+    )
+
+  def _field(self, text):
+    return [
+        representation_utils.UIElement(text='Title'),
+        representation_utils.UIElement(
+            text=text, hint_text='Search', is_focused=True, is_editable=True
+        ),
+    ]
+
+  def test_word_by_word_by_default(self):
+    actuation._enter_text('hello', self.env, actuation.TextEntryConfig())
+
+    self.mock_type_text.assert_called_once_with(
+        'hello', self.env, timeout_sec=10
+    )
+    self.mock_type_text_chunked.assert_not_called()
+
+  def test_chunked_text_is_verified(self):
+    self.env.get_ui_elements.side_effect = [
+        self._field('Search'),
+        self._field('hello world'),
+    ]
+
+    actuation._enter_text('hello world', self.env, self.config)
+
+    self.mock_type_text_chunked.assert_called_once_with(
+        'hello world', self.env, 16
+    )
+    self.mock_type_text.assert_not_called()
+
+  def test_falls_back_to_word_by_word_if_verification_fails(self):
+    self.env.get_ui_elements.side_effect = [
+        self._field('note: '),
+        self._field('note: hlelo'),
+    ]
+
+    actuation._enter_text('hello', self.env, self.config)
+
+    self.mock_issue_generic_request.assert_called_once_with(
+        ['shell', 'input', 'keyevent'] + ['KEYCODE_DEL'] * 5, self.env
+    )
+    self.mock_type_text.assert_called_once_with(
+        'hello', self.env, timeout_sec=10
+    )
+
+  def test_non_ascii_text_is_pasted(self):
+    self.env.get_ui_elements.side_effect = [
+        self._field(''),
+        self._field('Grüße'),
+    ]
+
+    actuation._enter_text('Grüße', self.env, self.config)
+
+    self.mock_paste_text.assert_called_once_with('Grüße', self.env)
+    self.mock_type_text_chunked.assert_not_called()
+    self.mock_type_text.assert_not_called()
+
+  def test_long_text_is_pasted(self):
+    config = dataclasses.replace(
+        self.config, paste_min_length=10, verify=False
+    )
+
+    actuation._enter_text('a long piece of text', self.env, config)
+
+    self.mock_paste_text.assert_called_once()
+    self.env.get_ui_elements.assert_not_called()
+
+  def test_multiline_text_is_not_verified(self):
+    actuation._enter_text('two\nlines', self.env, self.config)
+
+    self.mock_type_text_chunked.assert_called_once()
+    self.env.get_ui_elements.assert_not_called()
+
+
 if __name__ == '__main__':
   absltest.main()
@@ -14,8 +14,10 @@
 
 """Utilties to interact with the environment using adb."""
 
+import dataclasses
 import os
 import re
+import shlex
 import time
 from typing import Any, Callable, Collection, Iterable, Literal, Optional, TypeVar
 import unicodedata
@@ -261,7 +263,10 @@ def double_tap(
     env: env_interface.AndroidEnvInterface,
     timeout_sec: Optional[float] = _DEFAULT_TIMEOUT_SECS,
 ) -> adb_pb2.AdbResponse:
-  """Issues two AdbRequests to double tap the screen at the specified point.
+  """Double taps the screen at the specified point with a single adb call.
+
+  No adb round trip separates the taps. Each tap is still its own `input`
+  process, though, so the gap between them may exceed the double tap timeout.
 
   Args:
     x: X coordinate on the screen, in pixels.
@@ -270,14 +275,12 @@ def double_tap(
     timeout_sec: A timeout to use for this operation.
 
   Returns:
-    The adb response received after issuing the second tap request.
+    The adb response received after issuing the taps.
   """
   logging.info('Attempting to double tap the screen at (%d, %d)', x, y)
-  first_tap = tap_screen(x, y, env, timeout_sec=0)
-  second_tap = tap_screen(x, y, env, timeout_sec=timeout_sec)
-  logging.info('First tap: %s', first_tap)
-  logging.info('Second tap: %s', second_tap)
-  return second_tap
+  return issue_generic_request(
+      ['shell', f'input tap {x} {y} && input tap {x} {y}'], env, timeout_sec
+  )
 
 
 def long_press(
@@ -420,6 +423,12 @@ def press_keyboard_generic(
   return response
 
 
+def ascii_text(text: str) -> str:
+  """Returns `text` as typed by `type_text`, i.e. without non-ASCII chars."""
+  normalized_text = unicodedata.normalize('NFKD', text)
+  return normalized_text.encode('ascii', 'ignore').decode('ascii')
+
+
 def _adb_text_format(text: str) -> str:
   """Prepares text for use with adb."""
   to_escape = [
@@ -441,8 +450,7 @@ def _adb_text_format(text: str) -> str:
   ]
   for char in to_escape:
     text = text.replace(char, '\\' + char)
-  normalized_text = unicodedata.normalize('NFKD', text)
-  return normalized_text.encode('ascii', 'ignore').decode('ascii')
+  return ascii_text(text)
 
 
 def _split_words_and_newlines(text: str) -> Iterable[str]:
@@ -495,6 +503,79 @@ def type_text(
       logging.error('Failed to type word: %r', formatted)
 
 
+# Default number of characters typed with a single `input text` command by
+# `type_text_chunked`.
+DEFAULT_TEXT_CHUNK_SIZE = 64
+
+
+def _split_chunks_and_newlines(text: str, chunk_size: int) -> Iterable[str]:
+  """Splits lines of text into chunks of at most `chunk_size` characters."""
+  lines = text.split('\n')
+  for i, line in enumerate(lines):
+    for start in range(0, len(line), chunk_size):
+      yield line[start : start + chunk_size]
+    if i < len(lines) - 1:
+      yield '\n'
+
+
+def type_text_chunked(
+    text: str,
+    env: env_interface.AndroidEnvInterface,
+    chunk_size: int = DEFAULT_TEXT_CHUNK_SIZE,
+    timeout_sec: Optional[float] = None,
+) -> bool:
+  """Types the specified text string in chunks, with a single adb call.
+
+  Unlike `type_text`, which makes a round trip per word, every chunk and enter
+  press is a command of one `issue_batch_request`. The commands still run one
+  after the other, so chunks cannot be typed out of order.
+
+  Args:
+    text: The text string to be typed. Like with `type_text`, non-ASCII
+      characters are dropped.
+    env: The environment.
+    chunk_size: Maximum number of characters typed by one `input text` command.
+      Larger chunks are faster, but very long ones may time out or drop
+      characters in some apps.
+    timeout_sec: A timeout for the whole batch. Defaults to the default timeout
+      of a single request per command.
+
+  Returns:
+    Whether all commands succeeded.
+  """
+  commands = []
+  for chunk in _split_chunks_and_newlines(text, chunk_size):
+    if chunk == '\n':
+      commands.append('input keyevent KEYCODE_ENTER')
+    else:
+      # `input text` types %s as a space.
+      commands.append(
+          f'input text {_adb_text_format(chunk.replace(" ", "%s"))}'
+      )
+  results = issue_batch_request(commands, env, timeout_sec)
+  for result in results:
+    if not result.ok:
+      logging.error('Failed to type text chunk: %r', result.command)
+  return all(result.ok for result in results)
+
+
+def paste_text(text: str, env: env_interface.AndroidEnvInterface) -> None:
+  """Pastes the specified text string into the focused element.
+
+  The text is put into the clipboard with the Clipper app, so it is entered
+  as is, including non-ASCII characters and newlines.
+
+  Args:
+    text: The text string to be pasted.
+    env: The environment.
+
+  Raises:
+    RuntimeError: If the clipboard could not be set.
+  """
+  set_clipboard_contents(text, env, exact=True)
+  press_keyboard_generic('KEYCODE_PASTE', env)
+
+
 def issue_generic_request(
     args: Collection[str] | str,
     env: env_interface.AndroidEnvInterface,
@@ -536,6 +617,139 @@ def issue_generic_request(
   return response
 
 
+# Printed after each command of a batch, followed by its index and exit code.
+_BATCH_MARKER = '__aw_batch_end__'
+_BATCH_END = re.compile(
+    rb'\n' + re.escape(_BATCH_MARKER.encode()) + rb' (\d+) (\d+)\n'
+)
+
+
+@dataclasses.dataclass(frozen=True)
+class ShellCommandResult:
+  """Result of a single command of `issue_batch_request`.
+
+  Attributes:
+    command: The shell command.
+    output: The combined stdout and stderr of the command.
+    exit_code: The exit code of the command, or None if the batch failed before
+      the command finished or its output could not be read.
+  """
+
+  command: str
+  output: bytes
+  exit_code: Optional[int]
+
+  @property
+  def ok(self) -> bool:
+    return self.exit_code == 0
+
+
+def _batch_script(commands: list[str]) -> str:
+  """Returns a script that runs `commands` and reports each exit code."""
+  parts = []
+  for index, command in enumerate(commands):
+    parts.append(
+        f'( {command} ) </dev/null 2>&1;'
+        f" printf '\\n%s %d %d\\n' {_BATCH_MARKER} {index} $?"
+    )
+  return '; '.join(parts)
+
+
+def _parse_batch_output(
+    commands: list[str], output: bytes
+) -> list[ShellCommandResult]:
+  """Splits the output of a batch script into per-command results."""
+  results = []
+  start = 0
+  for match in _BATCH_END.finditer(output):
+    index = int(match.group(1))
+    if index != len(results):
+      raise ValueError(f'Unexpected batch output for command {index}.')
+    results.append(
+        ShellCommandResult(
+            command=commands[index],
+            output=output[start : match.start()],
+            exit_code=int(match.group(2)),
+        )
+    )
+    start = match.end()
+  for command in commands[len(results) :]:
+    results.append(ShellCommandResult(command, b'', None))
+  return results
+
+
+def issue_batch_request(
+    commands: Collection[str],
+    env: env_interface.AndroidEnvInterface,
+    timeout_sec: Optional[float] = None,
+) -> list[ShellCommandResult]:
+  """Runs several shell commands with a single adb call.
+
+  The commands run one after the other, regardless of the exit codes of the
+  previous ones, each in its own subshell so that e.g. `cd` or `exit` do not
+  affect the others.
+
+  Example:
+  ~~~~~~~
+
+  results = issue_batch_request(
+      ['settings put global auto_time 0', 'date 1015150023.00'], env
+  )
+  if not all(result.ok for result in results):
+    ...
+
+  Args:
+    commands: Shell commands, as passed to `adb shell`. Each must be a complete
+      command on its own, e.g. without unbalanced quotes.
+    env: The environment.
+    timeout_sec: A timeout for the whole batch. Defaults to the default timeout
+      of a single request per command.
+
+  Returns:
+    The result of each command, in the order of `commands`.
+  """
+  commands = list(commands)
+  if not commands:
+    return []
+  if timeout_sec is None:
+    timeout_sec = _DEFAULT_TIMEOUT_SECS * len(commands)
+  response = env.execute_adb_call(
+      adb_pb2.AdbRequest(
+          generic=adb_pb2.AdbRequest.GenericRequest(
+              args=['shell', _batch_script(commands)]
+          ),
+          timeout_sec=timeout_sec,
+      )
+  )
+  if response.status != adb_pb2.AdbResponse.Status.OK:
+    logging.error('Failed to issue batch adb request: %r', commands)
+    return [ShellCommandResult(command, b'', None) for command in commands]
+  return _parse_batch_output(commands, response.generic.output)
+
+
+def check_batch_ok(
+    result: ShellCommandResult, message: Optional[str] = None
+) -> None:
+  """Like `check_ok`, for a result of `issue_batch_request`.
+
+  Args:
+    result: The result to check.
+    message: Error message to raise on failure. If not specified, a generic
+      error message with the command output is used.
+
+  Raises:
+    RuntimeError: If the command did not exit with 0.
+  """
+  if result.ok:
+    return
+  if message is not None:
+    raise RuntimeError(message)
+  raise RuntimeError(
+      f'Command {result.command!r} failed with exit code {result.exit_code}:'
+      f' {result.output.decode("utf-8", errors="replace")}.'
+  )
+
+
 def get_adb_activity(app_name: str) -> Optional[str]:
   """Get a mapping of regex patterns to ADB activities top Android apps."""
   for pattern, activity in _PATTERN_TO_ACTIVITY.items():
@@ -670,8 +884,9 @@ def close_recents(env: env_interface.AndroidEnvInterface):
   if response.status != adb_pb2.AdbResponse.Status.OK:
     return
   recents_ids = re.findall(r'id=(\d+)', response.generic.output.decode())
-  for recents_id in recents_ids:
-    issue_generic_request(['shell', 'am', 'stack', 'remove', recents_id], env)
+  issue_batch_request(
+      [f'am stack remove {recents_id}' for recents_id in recents_ids], env
+  )
 
 
 def close_app(
@@ -990,9 +1205,11 @@ def toggle_airplane_mode(
   if on_or_off not in ('on', 'off'):
     raise ValueError('Must be one of on or off.')
   state = '1' if on_or_off == 'on' else '0'
-  return issue_generic_request(
+  response = issue_generic_request(
       ['shell', 'settings', 'put', 'global', 'airplane_mode_on', state], env
   )
+  _invalidate_network_state(env)
+  return response
 
 
 def install_apk(
@@ -1141,10 +1358,11 @@ def change_orientation(
   issue_generic_request(
       command + ['user_rotation', _ORIENTATIONS[orientation]], env
   )
+  _invalidate_device_geometry(env)
 
 
 def set_clipboard_contents(
-    content: str, env: env_interface.AndroidEnvInterface
+    content: str, env: env_interface.AndroidEnvInterface, exact: bool = False
 ) -> None:
   """Sets the clipboard content on the Android device.
 
@@ -1155,6 +1373,8 @@ def set_clipboard_contents(
   Args:
     content: Content to put into clipboard.
     env: The environment.
+    exact: Whether to keep the content as is. By default, it is formatted like
+      typed text, e.g. without non-ASCII characters.
 
   Raises:
     RuntimeError: If the adb command does not successfully execute or if the
@@ -1167,7 +1387,7 @@ def set_clipboard_contents(
     )
 
   time.sleep(0.5)
-  content = _adb_text_format(content)
+  content = shlex.quote(content) if exact else _adb_text_format(content)
   output_str = issue_generic_request(
       ['shell', 'am', 'broadcast', '-a', 'clipper.set', '-e', 'text', content],
       env,
@@ -1461,7 +1681,9 @@ def put_settings(
       put=adb_pb2.AdbRequest.SettingsRequest.Put(key=key, value=value),
   )
   adb_request = adb_pb2.AdbRequest(settings=settings_request)
-  return env.execute_adb_call(adb_request)
+  response = env.execute_adb_call(adb_request)
+  _invalidate_network_state(env)
+  return response
 
 
 def delete_contacts(
@@ -1613,6 +1835,110 @@ def get_orientation(
   raise ValueError('Failed to get orientation.')
 
 
+@dataclasses.dataclass(frozen=True)
+class DeviceGeometry:
+  """Screen geometry of the device.
+
+  Attributes:
+    logical_screen_size: The logical (width, height) in pixels; see
+      `get_logical_screen_size`.
+    orientation: 0 for portrait, 1 for landscape, 2 for reverse portrait, 3 for
+      reverse landscape.
+    physical_frame_boundary: The physical frame boundary in portrait
+      orientation; see `get_physical_frame_boundary`.
+  """
+
+  logical_screen_size: tuple[int, int]
+  orientation: int
+  physical_frame_boundary: tuple[int, int, int, int]
+
+
+def _parse_device_geometry(
+    raw_output: str,
+) -> tuple[tuple[int, int], Optional[int], tuple[int, int, int, int]]:
+  """Parses the display viewports printed by `dumpsys input`.
+
+  Args:
+    raw_output: Output of `dumpsys input`, possibly filtered to the viewport
+      lines.
+
+  Returns:
+    The logical screen size, the orientation (None if the viewport does not
+    report it) and the physical frame boundary in portrait orientation.
+
+  Raises:
+    ValueError: If no active viewport is found.
+  """
+  for line in raw_output.splitlines():
+    logical = re.search(r'logicalFrame=\[0, 0, (\d+), (\d+)\]', line)
+    physical = re.search(
+        r'physicalFrame=\[(\d+), (\d+), (\d+), (\d+)\]', line
+    )
+    if logical is None or physical is None:
+      continue
+    width, height = map(int, logical.groups())
+    boundary = tuple(map(int, physical.groups()))
+    if (width == 0 and height == 0) or not any(boundary):
+      continue
+    orientation_match = re.search(r'orientation=(\d)', line)
+    orientation = (
+        int(orientation_match.group(1)) if orientation_match else None
+    )
+    return (width, height), orientation, boundary
+  raise ValueError(
+      f'Device geometry not found in adb response: "{raw_output}"'
+  )
+
+
+def get_device_geometry(
+    env: env_interface.AndroidEnvInterface,
+) -> DeviceGeometry:
+  """Returns logical size, orientation and physical frame in one adb call.
+
+  All three values are read from the display viewport reported by `dumpsys
+  input`, instead of the separate `dumpsys` calls issued by
+  `get_logical_screen_size`, `get_orientation` and
+  `get_physical_frame_boundary`.
+
+  Args:
+    env: The AndroidEnv interface.
+
+  Returns:
+    The current device geometry.
+  """
+  response = issue_generic_request(
+      'shell dumpsys input | grep logicalFrame', env
+  )
+  if not response.status:
+    raise ValueError('Failed to get device geometry.')
+  logical_size, orientation, boundary = _parse_device_geometry(
+      response.generic.output.decode('utf-8')
+  )
+  if orientation is None:
+    orientation = get_orientation(env)
+  if orientation == 1 or orientation == 3:
+    boundary = (boundary[1], boundary[0], boundary[3], boundary[2])
+  return DeviceGeometry(
+      logical_screen_size=logical_size,
+      orientation=orientation,
+      physical_frame_boundary=boundary,
+  )
+
+
+def _invalidate_device_geometry(env: env_interface.AndroidEnvInterface) -> None:
+  """Drops the device geometry cached by `env`, if it keeps one."""
+  invalidate = getattr(env, 'invalidate_device_geometry', None)
+  if callable(invalidate):
+    invalidate()
+
+
+def _invalidate_network_state(env: env_interface.AndroidEnvInterface) -> None:
+  """Drops the airplane mode state cached by `env`, if it keeps one."""
+  invalidate = getattr(env, 'invalidate_network_state', None)
+  if callable(invalidate):
+    invalidate()
+
+
 def set_screen_size(
     width: int,
     height: int,
@@ -1638,7 +1964,9 @@ def set_screen_size(
   adb_command = ['shell', f'wm size {width}x{height}']
 
   # Issue the command and return the response
-  return issue_generic_request(adb_command, env)
+  response = issue_generic_request(adb_command, env)
+  _invalidate_device_geometry(env)
+  return response
 
 
 def retry(n: int) -> Callable[[Any], Any]:
@@ -1693,3 +2021,35 @@ def uiautomator_dump(env) -> str:
   response = issue_generic_request(read_args, env)
 
   return response.generic.output.decode('utf-8')
+
+
+_XML_DECLARATION = b'<?xml'
+_HIERARCHY_END = b'</hierarchy>'
+
+
+def uiautomator_dump_exec_out(env) -> bytes:
+  """Returns the UI hierarchy XML with a single `exec-out` round-trip.
+
+  Unlike `uiautomator_dump`, the hierarchy is written to the adb stream instead
+  of a file on the device, which saves the second adb call to read it back.
+
+  Args:
+    env: The environment.
+
+  Returns:
+    The UI hierarchy XML, without the status line uiautomator prints after it.
+
+  Raises:
+    RuntimeError: If the output does not contain a UI hierarchy, e.g. because
+      uiautomator could not get an idle state.
+  """
+  response = issue_generic_request('exec-out uiautomator dump /dev/tty', env)
+  output = response.generic.output
+  start = output.find(_XML_DECLARATION)
+  end = output.rfind(_HIERARCHY_END)
+  if start == -1 or end == -1:
+    raise RuntimeError(
+        'uiautomator dump did not return a UI hierarchy:'
+        f' {output[:200].decode("utf-8", errors="replace")}'
+    )
+  return output[start : end + len(_HIERARCHY_END)]
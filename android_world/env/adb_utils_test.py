@@ -222,6 +222,52 @@ class AdbTypingTest(AdbTestSetup):
       ]
       mock_execute_adb_call.assert_has_calls(expected_calls)
 
+  @mock.patch.object(adb_utils, 'issue_batch_request')
+  def test_type_text_chunked(self, mock_issue_batch_request):
+    mock_issue_batch_request.side_effect = lambda commands, *_: [
+        adb_utils.ShellCommandResult(command, b'', 0) for command in commands
+    ]
+
+    ok = adb_utils.type_text_chunked(
+        "Type some\ntext (it's ok)", self.mock_env, chunk_size=6
+    )
+
+    self.assertTrue(ok)
+    mock_issue_batch_request.assert_called_once_with(
+        [
+            'input text Type%ss',
+            'input text ome',
+            'input keyevent KEYCODE_ENTER',
+            'input text text%s\\(',
+            "input text it\\'s%so",
+            'input text k\\)',
+        ],
+        self.mock_env,
+        None,
+    )
+
+  @mock.patch.object(adb_utils, 'issue_batch_request')
+  def test_type_text_chunked_reports_failure(self, mock_issue_batch_request):
+    mock_issue_batch_request.return_value = [
+        adb_utils.ShellCommandResult('input text text', b'', None)
+    ]
+
+    self.assertFalse(adb_utils.type_text_chunked('text', self.mock_env))
+
+  @mock.patch.object(adb_utils, 'press_keyboard_generic')
+  @mock.patch.object(adb_utils, 'set_clipboard_contents')
+  def test_paste_text(
+      self, mock_set_clipboard_contents, mock_press_keyboard_generic
+  ):
+    adb_utils.paste_text('Grüße\naus Zürich', self.mock_env)
+
+    mock_set_clipboard_contents.assert_called_once_with(
+        'Grüße\naus Zürich', self.mock_env, exact=True
+    )
+    mock_press_keyboard_generic.assert_called_once_with(
+        'KEYCODE_PASTE', self.mock_env
+    )
+
 
 class TestExtractBroadcastData(absltest.TestCase):
 
@@ -263,5 +309,202 @@ class TestScreenUtils(absltest.TestCase):
     )
 
 
+class DeviceGeometryTest(AdbTestSetup):
+
+  def test_get_device_geometry_portrait(self):
+    self.mock_issue_generic_request.return_value = adb_pb2.AdbResponse(
+        status=adb_pb2.AdbResponse.Status.OK,
+        generic=adb_pb2.AdbResponse.GenericResponse(
+            output=(
+                b'    Viewport INTERNAL: displayId=0, orientation=0,'
+                b' logicalFrame=[0, 0, 1080, 2400], physicalFrame=[0, 0,'
+                b' 1080, 2400], deviceSize=[1080, 2400], isActive=true\n'
+            )
+        ),
+    )
+
+    geometry = adb_utils.get_device_geometry(self.mock_env)
+
+    self.assertEqual(geometry.logical_screen_size, (1080, 2400))
+    self.assertEqual(geometry.orientation, 0)
+    self.assertEqual(geometry.physical_frame_boundary, (0, 0, 1080, 2400))
+    self.mock_issue_generic_request.assert_called_once()
+
+  def test_get_device_geometry_landscape_skips_empty_viewports(self):
+    self.mock_issue_generic_request.return_value = adb_pb2.AdbResponse(
+        status=adb_pb2.AdbResponse.Status.OK,
+        generic=adb_pb2.AdbResponse.GenericResponse(
+            output=(
+                b'    Viewport VIRTUAL: orientation=0, logicalFrame=[0, 0, 0,'
+                b' 0], physicalFrame=[0, 0, 0, 0]\n'
+                b'    Viewport INTERNAL: orientation=1, logicalFrame=[0, 0,'
+                b' 2400, 1080], physicalFrame=[0, 0, 2400, 1080]\n'
+            )
+        ),
+    )
+
+    geometry = adb_utils.get_device_geometry(self.mock_env)
+
+    self.assertEqual(geometry.logical_screen_size, (2400, 1080))
+    self.assertEqual(geometry.orientation, 1)
+    self.assertEqual(geometry.physical_frame_boundary, (0, 0, 1080, 2400))
+
+  def test_get_device_geometry_falls_back_to_window_orientation(self):
+    self.mock_issue_generic_request.side_effect = [
+        adb_pb2.AdbResponse(
+            status=adb_pb2.AdbResponse.Status.OK,
+            generic=adb_pb2.AdbResponse.GenericResponse(
+                output=(
+                    b'logicalFrame=[0, 0, 1080, 2400], physicalFrame=[0, 0,'
+                    b' 1080, 2400]\n'
+                )
+            ),
+        ),
+        adb_pb2.AdbResponse(
+            status=adb_pb2.AdbResponse.Status.OK,
+            generic=adb_pb2.AdbResponse.GenericResponse(
+                output=b'mCurrentRotation=ROTATION_180\n'
+            ),
+        ),
+    ]
+
+    geometry = adb_utils.get_device_geometry(self.mock_env)
+
+    self.assertEqual(geometry.orientation, 2)
+    self.assertEqual(self.mock_issue_generic_request.call_count, 2)
+
+  def test_change_orientation_invalidates_cached_geometry(self):
+    env = mock.MagicMock()
+
+    adb_utils.change_orientation('landscape', env)
+
+    env.invalidate_device_geometry.assert_called_once()
+
+  def test_set_screen_size_invalidates_cached_geometry(self):
+    env = mock.MagicMock()
+
+    adb_utils.set_screen_size(720, 1520, env)
+
+    env.invalidate_device_geometry.assert_called_once()
+
+
+class BatchRequestTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.env = mock.create_autospec(env_interface.AndroidEnvInterface)
+
+  def test_issue_batch_request(self):
+    self.env.execute_adb_call.return_value = adb_pb2.AdbResponse(
+        status=adb_pb2.AdbResponse.Status.OK,
+        generic=adb_pb2.AdbResponse.GenericResponse(
+            output=(
+                b'a\n\n__aw_batch_end__ 0 0\n'
+                b'b\n__aw_batch_end__ 1 1\n'
+                b'\n__aw_batch_end__ 2 0\n'
+            )
+        ),
+    )
+
+    results = adb_utils.issue_batch_request(
+        ['echo a', 'printf b; false', 'true'], self.env
+    )
+
+    self.assertEqual(
+        results,
+        [
+            adb_utils.ShellCommandResult('echo a', b'a\n', 0),
+            adb_utils.ShellCommandResult('printf b; false', b'b', 1),
+            adb_utils.ShellCommandResult('true', b'', 0),
+        ],
+    )
+    self.assertEqual([result.ok for result in results], [True, False, True])
+    self.env.execute_adb_call.assert_called_once()
+    request = self.env.execute_adb_call.call_args.args[0]
+    self.assertEqual(request.generic.args[0], 'shell')
+    self.assertLen(request.generic.args, 2)
+    self.assertEqual(request.timeout_sec, 30)
+
+  def test_issue_batch_request_incomplete(self):
+    self.env.execute_adb_call.return_value = adb_pb2.AdbResponse(
+        status=adb_pb2.AdbResponse.Status.OK,
+        generic=adb_pb2.AdbResponse.GenericResponse(
+            output=b'\n__aw_batch_end__ 0 0\n'
+        ),
+    )
+
+    results = adb_utils.issue_batch_request(['true', 'reboot'], self.env)
+
+    self.assertEqual(results[0].exit_code, 0)
+    self.assertIsNone(results[1].exit_code)
+    with self.assertRaises(RuntimeError):
+      adb_utils.check_batch_ok(results[1])
+
+  def test_issue_batch_request_failed(self):
+    self.env.execute_adb_call.return_value = adb_pb2.AdbResponse(
+        status=adb_pb2.AdbResponse.Status.TIMEOUT
+    )
+
+    results = adb_utils.issue_batch_request(['true', 'sleep 60'], self.env)
+
+    self.assertEqual([result.exit_code for result in results], [None, None])
+
+  def test_issue_empty_batch_request(self):
+    self.assertEqual(adb_utils.issue_batch_request([], self.env), [])
+    self.env.execute_adb_call.assert_not_called()
+
+  def test_close_recents_uses_one_batch(self):
+    self.env.execute_adb_call.side_effect = [
+        adb_pb2.AdbResponse(
+            status=adb_pb2.AdbResponse.Status.OK,
+            generic=adb_pb2.AdbResponse.GenericResponse(
+                output=b'Recent #0: id=12\nRecent #1: id=34\n'
+            ),
+        ),
+        adb_pb2.AdbResponse(status=adb_pb2.AdbResponse.Status.OK),
+    ]
+
+    adb_utils.close_recents(self.env)
+
+    self.assertEqual(self.env.execute_adb_call.call_count, 2)
+    script = self.env.execute_adb_call.call_args.args[0].generic.args[1]
+    self.assertIn('am stack remove 12', script)
+    self.assertIn('am stack remove 34', script)
+
+
+class UiautomatorDumpTest(AdbTestSetup):
+
+  def test_exec_out_strips_status_line(self):
+    self.mock_issue_generic_request.return_value = adb_pb2.AdbResponse(
+        status=adb_pb2.AdbResponse.Status.OK,
+        generic=adb_pb2.AdbResponse.GenericResponse(
+            output=(
+                b"<?xml version='1.0' encoding='UTF-8' standalone='yes'"
+                b' ?><hierarchy rotation="0"><node text="a" /></hierarchy>'
+                b'UI hierchary dumped to: /dev/tty\n'
+            )
+        ),
+    )
+
+    xml_dump = adb_utils.uiautomator_dump_exec_out(self.mock_env)
+
+    self.assertTrue(xml_dump.startswith(b'<?xml'))
+    self.assertTrue(xml_dump.endswith(b'</hierarchy>'))
+    self.mock_issue_generic_request.assert_called_once_with(
+        'exec-out uiautomator dump /dev/tty', self.mock_env
+    )
+
+  def test_exec_out_raises_without_hierarchy(self):
+    self.mock_issue_generic_request.return_value = adb_pb2.AdbResponse(
+        status=adb_pb2.AdbResponse.Status.OK,
+        generic=adb_pb2.AdbResponse.GenericResponse(
+            output=b'ERROR: could not get idle state.\n'
+        ),
+    )
+
+    with self.assertRaises(RuntimeError):
+      adb_utils.uiautomator_dump_exec_out(self.mock_env)
+
+
 if __name__ == '__main__':
   absltest.main()
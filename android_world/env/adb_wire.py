@@ -0,0 +1,507 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Client for the ADB server socket protocol with pooled connections.
+
+AndroidEnv executes every `AdbRequest` by spawning an `adb` process, which
+connects to the ADB server, forwards the command to the device and exits. This
+module talks to the ADB server directly and keeps the device connections open:
+
+  * Shell commands are written to persistent interactive `shell,raw:` sessions.
+    Each command runs in its own `sh -c`, like `adb shell <command>`, and its
+    end is detected with a per-session marker followed by the exit status.
+  * Files are transferred over persistent `sync:` sessions.
+
+`AdbWireClient.execute_adb_call` accepts the same `AdbRequest` messages as
+`AndroidEnvInterface.execute_adb_call` and returns None for requests it does
+not handle, so that callers can fall back to AndroidEnv.
+
+Protocol reference:
+https://android.googlesource.com/platform/packages/modules/adb/+/refs/heads/main/protocol.txt
+https://android.googlesource.com/platform/packages/modules/adb/+/refs/heads/main/SYNC.TXT
+"""
+
+import collections
+from collections.abc import Callable, Iterator
+import contextlib
+import re
+import secrets
+import socket
+import struct
+import threading
+import time
+from typing import Generic, Optional, TypeVar
+
+from absl import logging
+from android_env.proto import adb_pb2
+
+DEFAULT_ADB_SERVER_PORT = 5037
+_DEFAULT_TIMEOUT_SECS = 120.0
+_CONNECT_TIMEOUT_SECS = 5.0
+
+# Maximum payload of a sync DATA message.
+_SYNC_DATA_MAX = 64 * 1024
+_SYNC_HEADER = struct.Struct('<4sI')
+_DEFAULT_FILE_MODE = 0o100644
+
+_RECV_SIZE = 64 * 1024
+
+
+class AdbWireError(Exception):
+  """Raised when the ADB server or device rejects a request."""
+
+
+class AdbConnectionError(AdbWireError):
+  """Raised when a connection to a device could not be opened.
+
+  Nothing has been sent to the device at this point, so the request can be
+  safely retried through another path.
+  """
+
+
+def _encode_request(payload: str) -> bytes:
+  data = payload.encode('utf-8')
+  return b'%04x' % len(data) + data
+
+
+def _quote(command: str) -> str:
+  """Quotes `command` as a single argument for `sh`."""
+  return "'" + command.replace("'", "'\\''") + "'"
+
+
+class _Connection:
+  """A socket to the ADB server that is bound to a device service."""
+
+  def __init__(self, sock: socket.socket):
+    self._sock = sock
+    self._buffer = bytearray()
+    self._deadline: Optional[float] = None
+
+  @classmethod
+  def open(
+      cls,
+      host: str,
+      port: int,
+      serial: str,
+      service: str,
+      timeout_sec: float = _CONNECT_TIMEOUT_SECS,
+  ) -> '_Connection':
+    """Connects to `service` on device `serial`.
+
+    Args:
+      host: Host of the ADB server.
+      port: Port of the ADB server.
+      serial: Serial of the device, e.g. "emulator-5554".
+      service: Device service to open, e.g. "sync:".
+      timeout_sec: Timeout for connecting and opening the service.
+
+    Returns:
+      The connection.
+
+    Raises:
+      AdbConnectionError: If the server is unreachable or rejects the request.
+    """
+    try:
+      sock = socket.create_connection((host, port), timeout=timeout_sec)
+    except OSError as e:
+      raise AdbConnectionError(
+          f'Could not connect to the ADB server at {host}:{port}: {e}'
+      ) from e
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    connection = cls(sock)
+    try:
+      connection.request(f'host:transport:{serial}')
+      connection.request(service)
+    except (OSError, AdbWireError) as e:
+      connection.close()
+      raise AdbConnectionError(
+          f'Could not open {service!r} on {serial}: {e}'
+      ) from e
+    return connection
+
+  def close(self) -> None:
+    self._sock.close()
+
+  def set_timeout(self, timeout_sec: float) -> None:
+    """Sets the time limit for all reads and writes until the next call."""
+    self._deadline = time.monotonic() + timeout_sec
+
+  def _apply_deadline(self) -> None:
+    if self._deadline is None:
+      return
+    remaining = self._deadline - time.monotonic()
+    if remaining <= 0:
+      raise TimeoutError('ADB request timed out.')
+    self._sock.settimeout(remaining)
+
+  def send(self, data: bytes) -> None:
+    self._apply_deadline()
+    self._sock.sendall(data)
+
+  def request(self, payload: str) -> None:
+    """Sends a length-prefixed request and reads its OKAY/FAIL status."""
+    self.send(_encode_request(payload))
+    status = self.read_exactly(4)
+    if status == b'OKAY':
+      return
+    if status == b'FAIL':
+      length = int(self.read_exactly(4), 16)
+      raise AdbWireError(self.read_exactly(length).decode('utf-8', 'replace'))
+    raise AdbWireError(f'Unexpected ADB server status: {status!r}')
+
+  def _fill(self) -> None:
+    self._apply_deadline()
+    chunk = self._sock.recv(_RECV_SIZE)
+    if not chunk:
+      raise AdbWireError('Connection closed by the ADB server.')
+    self._buffer += chunk
+
+  def read_exactly(self, size: int) -> bytes:
+    while len(self._buffer) < size:
+      self._fill()
+    data = bytes(self._buffer[:size])
+    del self._buffer[:size]
+    return data
+
+  def read_until(self, pattern: re.Pattern[bytes]) -> re.Match[bytes]:
+    """Reads until `pattern` matches; the match is kept in the buffer."""
+    start = 0
+    while True:
+      match = pattern.search(self._buffer, start)
+      if match is not None:
+        return match
+      # A match may straddle the previous end of the buffer.
+      start = max(0, len(self._buffer) - _RECV_SIZE)
+      self._fill()
+
+  def consume(self, size: int) -> bytes:
+    data = bytes(self._buffer[:size])
+    del self._buffer[:size]
+    return data
+
+
+class _ShellSession:
+  """An interactive `shell,raw:` session that runs one command at a time."""
+
+  def __init__(self, connection: _Connection):
+    self._connection = connection
+    # The marker is only known to this session, so command output cannot
+    # imitate it.
+    self._marker = f'__aw_{secrets.token_hex(8)}__'
+    self._end = re.compile(
+        rb'\n' + re.escape(self._marker.encode()) + rb' (\d+)\n'
+    )
+
+  def close(self) -> None:
+    self._connection.close()
+
+  def run(self, command: str, timeout_sec: float) -> tuple[bytes, int]:
+    """Runs `command` and returns its output and exit status.
+
+    Args:
+      command: Shell command, as passed to `adb shell`.
+      timeout_sec: Time limit for the command.
+
+    Returns:
+      The combined stdout and stderr of the command, and its exit status.
+
+    Raises:
+      TimeoutError: If the command does not finish in time.
+    """
+    self._connection.set_timeout(timeout_sec)
+    self._connection.send(
+        (
+            f'sh -c {_quote(command)} </dev/null 2>&1;'
+            f" printf '\\n%s %d\\n' {self._marker} $?\n"
+        ).encode('utf-8')
+    )
+    match = self._connection.read_until(self._end)
+    # The match refers to the buffer, so read it before consuming.
+    exit_status = int(match.group(1))
+    output = self._connection.consume(match.start())
+    self._connection.consume(match.end() - match.start())
+    return output, exit_status
+
+
+class _SyncSession:
+  """A `sync:` session for file transfers."""
+
+  def __init__(self, connection: _Connection):
+    self._connection = connection
+
+  def close(self) -> None:
+    with contextlib.suppress(OSError):
+      self._connection.send(_SYNC_HEADER.pack(b'QUIT', 0))
+    self._connection.close()
+
+  def _send_command(self, command: bytes, path: str) -> None:
+    data = path.encode('utf-8')
+    self._connection.send(_SYNC_HEADER.pack(command, len(data)) + data)
+
+  def _read_header(self) -> tuple[bytes, int]:
+    return _SYNC_HEADER.unpack(self._connection.read_exactly(8))
+
+  def _raise_failure(self, length: int) -> None:
+    message = self._connection.read_exactly(length)
+    raise AdbWireError(message.decode('utf-8', 'replace'))
+
+  def pull(self, path: str, timeout_sec: float) -> bytes:
+    """Returns the contents of the file at `path` on the device."""
+    self._connection.set_timeout(timeout_sec)
+    self._send_command(b'RECV', path)
+    chunks = []
+    while True:
+      command, length = self._read_header()
+      if command == b'DATA':
+        chunks.append(self._connection.read_exactly(length))
+      elif command == b'DONE':
+        return b''.join(chunks)
+      elif command == b'FAIL':
+        self._raise_failure(length)
+      else:
+        raise AdbWireError(f'Unexpected sync response: {command!r}')
+
+  def push(
+      self,
+      path: str,
+      content: bytes,
+      timeout_sec: float,
+      mode: int = _DEFAULT_FILE_MODE,
+  ) -> None:
+    """Writes `content` to the file at `path` on the device."""
+    self._connection.set_timeout(timeout_sec)
+    self._send_command(b'SEND', f'{path},{mode}')
+    view = memoryview(content)
+    for offset in range(0, len(view), _SYNC_DATA_MAX):
+      chunk = view[offset : offset + _SYNC_DATA_MAX]
+      self._connection.send(_SYNC_HEADER.pack(b'DATA', len(chunk)))
+      self._connection.send(chunk)
+    self._connection.send(_SYNC_HEADER.pack(b'DONE', int(time.time())))
+    command, length = self._read_header()
+    if command == b'FAIL':
+      self._raise_failure(length)
+    if command != b'OKAY':
+      raise AdbWireError(f'Unexpected sync response: {command!r}')
+
+
+_SessionT = TypeVar('_SessionT', _ShellSession, _SyncSession)
+
+
+class _SessionPool(Generic[_SessionT]):
+  """Thread-safe pool of idle sessions."""
+
+  def __init__(self, connect: Callable[[], _SessionT], max_idle: int):
+    self._connect = connect
+    self._max_idle = max_idle
+    self._idle: collections.deque[_SessionT] = collections.deque()
+    self._lock = threading.Lock()
+    self.num_opened = 0
+
+  @contextlib.contextmanager
+  def session(self) -> Iterator[_SessionT]:
+    """Yields an idle session, or a new one if none is idle.
+
+    The session is closed instead of returned to the pool if the block raises,
+    since its state is unknown.
+
+    Yields:
+      The session.
+    """
+    with self._lock:
+      session = self._idle.pop() if self._idle else None
+    if session is None:
+      session = self._connect()
+      with self._lock:
+        self.num_opened += 1
+    try:
+      yield session
+    except BaseException:
+      session.close()
+      raise
+    with self._lock:
+      if len(self._idle) < self._max_idle:
+        self._idle.append(session)
+        return
+    session.close()
+
+  def close(self) -> None:
+    with self._lock:
+      idle, self._idle = self._idle, collections.deque()
+    for session in idle:
+      session.close()
+
+
+class AdbWireClient:
+  """Executes adb requests for one device over pooled ADB server connections.
+
+  Usage:
+
+  client = AdbWireClient('emulator-5554')
+  output, exit_status = client.shell('settings get global airplane_mode_on')
+  """
+
+  def __init__(
+      self,
+      serial: str,
+      host: str = '127.0.0.1',
+      port: int = DEFAULT_ADB_SERVER_PORT,
+      max_idle_sessions: int = 4,
+      default_timeout_sec: float = _DEFAULT_TIMEOUT_SECS,
+  ):
+    """Initializes the client.
+
+    Args:
+      serial: Serial of the device, e.g. "emulator-5554".
+      host: Host of the ADB server.
+      port: Port of the ADB server.
+      max_idle_sessions: Number of idle shell and of idle sync sessions kept
+        open. More sessions are opened for concurrent callers.
+      default_timeout_sec: Timeout for requests without `timeout_sec`.
+    """
+    self._serial = serial
+    self._host = host
+    self._port = port
+    self._default_timeout_sec = default_timeout_sec
+    self._shell_pool = _SessionPool(
+        lambda: _ShellSession(self._open('shell,raw:')), max_idle_sessions
+    )
+    self._sync_pool = _SessionPool(
+        lambda: _SyncSession(self._open('sync:')), max_idle_sessions
+    )
+    self._num_calls = 0
+    self._num_fallbacks = 0
+
+  @property
+  def serial(self) -> str:
+    return self._serial
+
+  def _open(self, service: str) -> _Connection:
+    return _Connection.open(self._host, self._port, self._serial, service)
+
+  def close(self) -> None:
+    """Closes all idle sessions."""
+    self._shell_pool.close()
+    self._sync_pool.close()
+
+  @property
+  def stats(self) -> dict[str, int]:
+    """Returns the number of calls, fallbacks and sessions opened."""
+    return {
+        'calls': self._num_calls,
+        'fallbacks': self._num_fallbacks,
+        'shell_sessions_opened': self._shell_pool.num_opened,
+        'sync_sessions_opened': self._sync_pool.num_opened,
+    }
+
+  def shell(
+      self, command: str, timeout_sec: Optional[float] = None
+  ) -> tuple[bytes, int]:
+    """Runs `command` like `adb shell <command>`.
+
+    Args:
+      command: Shell command.
+      timeout_sec: Time limit for the command.
+
+    Returns:
+      The combined stdout and stderr of the command, and its exit status.
+
+    Raises:
+      AdbConnectionError: If no session could be opened.
+      AdbWireError: If the session failed.
+      TimeoutError: If the command did not finish in time.
+    """
+    with self._shell_pool.session() as session:
+      return session.run(command, timeout_sec or self._default_timeout_sec)
+
+  def pull(self, path: str, timeout_sec: Optional[float] = None) -> bytes:
+    """Returns the contents of the file at `path` on the device."""
+    with self._sync_pool.session() as session:
+      return session.pull(path, timeout_sec or self._default_timeout_sec)
+
+  def push(
+      self,
+      path: str,
+      content: bytes,
+      timeout_sec: Optional[float] = None,
+  ) -> None:
+    """Writes `content` to the file at `path` on the device."""
+    with self._sync_pool.session() as session:
+      session.push(path, content, timeout_sec or self._default_timeout_sec)
+
+  def _execute(
+      self, request: adb_pb2.AdbRequest
+  ) -> Optional[adb_pb2.AdbResponse]:
+    """Executes `request`, or returns None if it is not handled."""
+    timeout_sec = request.timeout_sec or None
+    match request.WhichOneof('command'):
+      case 'generic':
+        args = list(request.generic.args)
+        if len(args) < 2 or args[0] != 'shell':
+          return None
+        output, exit_status = self.shell(' '.join(args[1:]), timeout_sec)
+        if exit_status != 0:
+          # Like a failing `adb shell`, which exits with the command's status.
+          return adb_pb2.AdbResponse(
+              status=adb_pb2.AdbResponse.Status.ADB_ERROR,
+              error_message=output.decode('utf-8', 'replace'),
+          )
+        return adb_pb2.AdbResponse(
+            status=adb_pb2.AdbResponse.Status.OK,
+            generic=adb_pb2.AdbResponse.GenericResponse(output=output),
+        )
+      case 'pull' if request.pull.path:
+        return adb_pb2.AdbResponse(
+            status=adb_pb2.AdbResponse.Status.OK,
+            pull=adb_pb2.AdbResponse.PullResponse(
+                content=self.pull(request.pull.path, timeout_sec)
+            ),
+        )
+      case 'push' if request.push.path:
+        self.push(request.push.path, request.push.content, timeout_sec)
+        return adb_pb2.AdbResponse(status=adb_pb2.AdbResponse.Status.OK)
+      case _:
+        return None
+
+  def execute_adb_call(
+      self, request: adb_pb2.AdbRequest
+  ) -> Optional[adb_pb2.AdbResponse]:
+    """Executes `request` over the wire protocol.
+
+    Handles `generic` requests for `shell` commands, `pull` and `push`.
+
+    Args:
+      request: The request.
+
+    Returns:
+      The response, or None if the request is not handled or if no connection
+      to the device could be opened. Nothing was sent to the device in that
+      case, so the caller should execute the request through AndroidEnv.
+    """
+    try:
+      response = self._execute(request)
+    except AdbConnectionError as e:
+      logging.warning('%s Falling back to the adb binary.', e)
+      self._num_fallbacks += 1
+      return None
+    except TimeoutError:
+      response = adb_pb2.AdbResponse(
+          status=adb_pb2.AdbResponse.Status.TIMEOUT, error_message='Timeout'
+      )
+    except (OSError, AdbWireError) as e:
+      response = adb_pb2.AdbResponse(
+          status=adb_pb2.AdbResponse.Status.ADB_ERROR, error_message=str(e)
+      )
+    if response is not None:
+      self._num_calls += 1
+    return response
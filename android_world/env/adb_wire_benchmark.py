@@ -0,0 +1,117 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+r"""Compares shell calls/sec of the `adb` binary and `adb_wire`.
+
+Against a running emulator, `subprocess` is AndroidEnv's `AdbController`, which
+spawns `adb -s <serial> shell <command>` per call:
+
+python -m android_world.env.adb_wire_benchmark \
+  --adb_path=~/Android/Sdk/platform-tools/adb --serial=emulator-5554
+
+Without an emulator, `--fake_server` runs the commands through
+`fake_adb_server.FakeAdbServer`. `subprocess` then spawns `sh -c <command>`,
+which is a lower bound of the cost of spawning `adb`.
+"""
+
+from collections.abc import Callable, Sequence
+import os
+import subprocess
+import tempfile
+import time
+
+from absl import app
+from absl import flags
+from android_env.components import adb_controller
+from android_env.components import config_classes
+from android_world.env import adb_wire
+from android_world.utils import fake_adb_server
+
+_ADB_PATH = flags.DEFINE_string(
+    'adb_path', '~/Android/Sdk/platform-tools/adb', 'Path to the adb binary.'
+)
+_ADB_SERVER_PORT = flags.DEFINE_integer(
+    'adb_server_port', adb_wire.DEFAULT_ADB_SERVER_PORT, 'ADB server port.'
+)
+_SERIAL = flags.DEFINE_string('serial', 'emulator-5554', 'Device serial.')
+_COMMAND = flags.DEFINE_string(
+    'command', 'settings get global airplane_mode_on', 'Shell command to run.'
+)
+_NUM_CALLS = flags.DEFINE_integer('num_calls', 100, 'Calls per backend.')
+_FAKE_SERVER = flags.DEFINE_boolean(
+    'fake_server', False, 'Use a local fake ADB server instead of a device.'
+)
+
+
+def _calls_per_sec(call: Callable[[], object], num_calls: int) -> float:
+  call()  # Warm up, e.g. open the first session.
+  start = time.perf_counter()
+  for _ in range(num_calls):
+    call()
+  return num_calls / (time.perf_counter() - start)
+
+
+def _run(
+    subprocess_call: Callable[[], object],
+    client: adb_wire.AdbWireClient,
+    command: str,
+    num_calls: int,
+) -> None:
+  """Prints calls/sec of both backends."""
+  results = {
+      'subprocess': _calls_per_sec(subprocess_call, num_calls),
+      'adb_wire': _calls_per_sec(lambda: client.shell(command), num_calls),
+  }
+  print(f'{num_calls} x {command!r}')
+  for label, calls_per_sec in results.items():
+    print(f'  {label:12}{calls_per_sec:>10.1f} calls/s')
+  print(f'  speedup     {results["adb_wire"] / results["subprocess"]:>10.1f}x')
+
+
+def main(argv: Sequence[str]) -> None:
+  if len(argv) > 1:
+    raise app.UsageError('Too many command-line arguments.')
+  command = _COMMAND.value
+  if _FAKE_SERVER.value:
+    with tempfile.TemporaryDirectory() as device_dir:
+      with fake_adb_server.FakeAdbServer(_SERIAL.value, device_dir) as server:
+        client = adb_wire.AdbWireClient(_SERIAL.value, port=server.port)
+        _run(
+            lambda: subprocess.check_output(['sh', '-c', command]),
+            client,
+            command,
+            _NUM_CALLS.value,
+        )
+        client.close()
+    return
+
+  controller = adb_controller.AdbController(
+      config_classes.AdbControllerConfig(
+          adb_path=os.path.expanduser(_ADB_PATH.value),
+          adb_server_port=_ADB_SERVER_PORT.value,
+          device_name=_SERIAL.value,
+      )
+  )
+  client = adb_wire.AdbWireClient(_SERIAL.value, port=_ADB_SERVER_PORT.value)
+  _run(
+      lambda: controller.execute_command(['shell', command]),
+      client,
+      command,
+      _NUM_CALLS.value,
+  )
+  client.close()
+
+
+if __name__ == '__main__':
+  app.run(main)
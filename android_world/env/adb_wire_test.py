@@ -0,0 +1,176 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import concurrent.futures
+import os
+import tempfile
+
+from absl.testing import absltest
+from android_env.proto import adb_pb2
+from android_world.env import adb_wire
+from android_world.utils import fake_adb_server
+
+_SERIAL = 'emulator-5554'
+
+
+def _shell_request(*args: str, timeout_sec: float = 0) -> adb_pb2.AdbRequest:
+  return adb_pb2.AdbRequest(
+      generic=adb_pb2.AdbRequest.GenericRequest(args=['shell', *args]),
+      timeout_sec=timeout_sec,
+  )
+
+
+class AdbWireClientTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.device_dir = self.enter_context(tempfile.TemporaryDirectory())
+    self.server = self.enter_context(
+        fake_adb_server.FakeAdbServer(_SERIAL, self.device_dir)
+    )
+    self.client = adb_wire.AdbWireClient(_SERIAL, port=self.server.port)
+    self.addCleanup(self.client.close)
+
+  def test_shell(self):
+    output, exit_status = self.client.shell("echo 'a  b'; echo err >&2")
+
+    self.assertEqual(output, b'a  b\nerr\n')
+    self.assertEqual(exit_status, 0)
+
+  def test_shell_output_without_trailing_newline(self):
+    self.assertEqual(self.client.shell('printf abc'), (b'abc', 0))
+    self.assertEqual(self.client.shell('true'), (b'', 0))
+
+  def test_shell_exit_status(self):
+    self.assertEqual(self.client.shell('exit 3'), (b'', 3))
+
+  def test_shell_commands_do_not_share_state(self):
+    self.client.shell('cd /; X=1')
+
+    output, _ = self.client.shell('echo "$X"; cat')
+
+    self.assertEqual(output, b'\n')
+
+  def test_shell_reuses_session(self):
+    for _ in range(5):
+      self.client.shell('echo hi')
+
+    self.assertEqual(self.client.stats['shell_sessions_opened'], 1)
+    self.assertEqual(self.server.num_connections, 1)
+
+  def test_concurrent_shell_commands(self):
+    with concurrent.futures.ThreadPoolExecutor(4) as executor:
+      outputs = list(
+          executor.map(
+              lambda i: self.client.shell(f'sleep 0.05; echo {i}')[0],
+              range(8),
+          )
+      )
+
+    self.assertEqual(outputs, [f'{i}\n'.encode() for i in range(8)])
+    self.assertBetween(self.client.stats['shell_sessions_opened'], 2, 8)
+
+  def test_push_and_pull(self):
+    content = os.urandom(200 * 1024)
+
+    self.client.push('/sdcard/file.bin', content)
+
+    with open(os.path.join(self.device_dir, 'sdcard/file.bin'), 'rb') as f:
+      self.assertEqual(f.read(), content)
+    self.assertEqual(self.client.pull('/sdcard/file.bin'), content)
+    self.assertEqual(self.client.stats['sync_sessions_opened'], 1)
+
+  def test_pull_missing_file(self):
+    with self.assertRaises(adb_wire.AdbWireError):
+      self.client.pull('/sdcard/missing')
+
+    # The failed session is not reused.
+    self.client.push('/sdcard/file', b'content')
+    self.assertEqual(self.client.stats['sync_sessions_opened'], 2)
+
+  def test_execute_generic_shell_request(self):
+    response = self.client.execute_adb_call(_shell_request('echo', 'hi'))
+
+    self.assertEqual(response.status, adb_pb2.AdbResponse.Status.OK)
+    self.assertEqual(response.generic.output, b'hi\n')
+    self.assertEqual(self.client.stats['calls'], 1)
+
+  def test_execute_failing_shell_request(self):
+    response = self.client.execute_adb_call(
+        _shell_request('echo', 'oops;', 'false')
+    )
+
+    self.assertEqual(response.status, adb_pb2.AdbResponse.Status.ADB_ERROR)
+    self.assertEqual(response.error_message, 'oops\n')
+
+  def test_execute_timeout(self):
+    response = self.client.execute_adb_call(
+        _shell_request('sleep', '5', timeout_sec=0.2)
+    )
+
+    self.assertEqual(response.status, adb_pb2.AdbResponse.Status.TIMEOUT)
+    # The timed out session is discarded.
+    self.assertEqual(self.client.shell('echo ok'), (b'ok\n', 0))
+    self.assertEqual(self.client.stats['shell_sessions_opened'], 2)
+
+  def test_execute_push_and_pull_requests(self):
+    response = self.client.execute_adb_call(
+        adb_pb2.AdbRequest(
+            push=adb_pb2.AdbRequest.Push(path='/data/a.txt', content=b'abc')
+        )
+    )
+    self.assertEqual(response.status, adb_pb2.AdbResponse.Status.OK)
+
+    response = self.client.execute_adb_call(
+        adb_pb2.AdbRequest(pull=adb_pb2.AdbRequest.Pull(path='/data/a.txt'))
+    )
+    self.assertEqual(response.status, adb_pb2.AdbResponse.Status.OK)
+    self.assertEqual(response.pull.content, b'abc')
+
+    response = self.client.execute_adb_call(
+        adb_pb2.AdbRequest(pull=adb_pb2.AdbRequest.Pull(path='/data/b.txt'))
+    )
+    self.assertEqual(response.status, adb_pb2.AdbResponse.Status.ADB_ERROR)
+
+  def test_unhandled_requests(self):
+    for request in (
+        adb_pb2.AdbRequest(
+            generic=adb_pb2.AdbRequest.GenericRequest(args=['root'])
+        ),
+        _shell_request(),
+        adb_pb2.AdbRequest(pull=adb_pb2.AdbRequest.Pull()),
+        adb_pb2.AdbRequest(
+            force_stop=adb_pb2.AdbRequest.ForceStop(package_name='a.b')
+        ),
+    ):
+      self.assertIsNone(self.client.execute_adb_call(request))
+    self.assertEqual(self.server.num_connections, 0)
+
+  def test_falls_back_when_device_is_unknown(self):
+    client = adb_wire.AdbWireClient('emulator-5556', port=self.server.port)
+
+    self.assertIsNone(client.execute_adb_call(_shell_request('ls')))
+    self.assertEqual(client.stats['fallbacks'], 1)
+
+  def test_close(self):
+    self.client.shell('true')
+    self.client.close()
+
+    self.client.shell('true')
+
+    self.assertEqual(self.client.stats['shell_sessions_opened'], 2)
+
+
+if __name__ == '__main__':
+  absltest.main()
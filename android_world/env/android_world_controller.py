@@ -14,22 +14,32 @@
 
 """Controller for Android that adds UI tree information to the observation."""
 
+from collections.abc import Sequence
+import concurrent.futures
 import contextlib
+import dataclasses
 import enum
 import os
+import threading
 import time
 from typing import Any
+from typing import Callable
 from typing import cast
 from typing import Optional
 from absl import logging
 from android_env import env_interface
 from android_env import loader
 from android_env.components import config_classes
+from android_env.components import errors
+from android_env.proto import adb_pb2
+from android_env.proto import state_pb2
 from android_env.proto.a11y import android_accessibility_forest_pb2
 from android_env.wrappers import a11y_grpc_wrapper
 from android_env.wrappers import base_wrapper
 from android_world.env import adb_utils
+from android_world.env import adb_wire
 from android_world.env import representation_utils
+from android_world.env import ui_element_table
 from android_world.utils import file_utils
 import dm_env
 
@@ -55,10 +65,163 @@ def _has_wrapper(
     return False
 
 
+class NetworkStateWatcher:
+  """Caches whether airplane mode is on.
+
+  The a11y forwarder streams forests over gRPC, which stops working in airplane
+  mode. Checking the setting costs an adb round-trip, so the result is cached
+  until `invalidate` is called, e.g. after an action that may have changed it,
+  or until it is older than `refresh_interval_sec`.
+  """
+
+  def __init__(
+      self,
+      refresh_interval_sec: float = 60.0,
+      clock: Callable[[], float] = time.monotonic,
+  ):
+    self._refresh_interval_sec = refresh_interval_sec
+    self._clock = clock
+    self._airplane_mode_on: Optional[bool] = None
+    self._checked_at = 0.0
+    self._num_checks = 0
+
+  @property
+  def num_checks(self) -> int:
+    """Returns how many times airplane mode was checked on the device."""
+    return self._num_checks
+
+  def invalidate(self) -> None:
+    """Forces the next `airplane_mode_on` call to check the device."""
+    self._airplane_mode_on = None
+
+  def airplane_mode_on(self, env: env_interface.AndroidEnvInterface) -> bool:
+    """Returns whether airplane mode is on, checking the device if stale."""
+    now = self._clock()
+    if (
+        self._airplane_mode_on is None
+        or now - self._checked_at >= self._refresh_interval_sec
+    ):
+      self._airplane_mode_on = adb_utils.retry(3)(
+          adb_utils.check_airplane_mode
+      )(env)
+      self._checked_at = now
+      self._num_checks += 1
+    return self._airplane_mode_on
+
+
+class A11yForestMonitor:
+  """Notifies waiters when the a11y forwarder delivers a forest.
+
+  Hooks into the servicer of an `A11yGrpcWrapper` so that a fetch that finds no
+  forest can block until one arrives, rather than sleeping for a fixed time.
+  Also keeps per-fetch latency and miss statistics.
+  """
+
+  def __init__(self, servicer: Any):
+    self._condition = threading.Condition()
+    self._num_forests = 0
+    self._num_fetches = 0
+    self._num_failures = 0
+    self._num_misses = 0
+    self._total_latency_sec = 0.0
+    self._max_latency_sec = 0.0
+
+    # pylint: disable=protected-access
+    process_forest = servicer._process_forest
+
+    def _process_forest(forest):
+      process_forest(forest)
+      with self._condition:
+        self._num_forests += 1
+        self._condition.notify_all()
+
+    servicer._process_forest = _process_forest
+    # pylint: enable=protected-access
+
+  @classmethod
+  def attach(
+      cls, env: env_interface.AndroidEnvInterface
+  ) -> Optional['A11yForestMonitor']:
+    """Returns a monitor for the a11y servicer of `env`, if it has one."""
+    servicer = getattr(env, '_servicer', None)
+    if servicer is None or not hasattr(servicer, '_process_forest'):
+      return None
+    return cls(servicer)
+
+  @property
+  def num_forests(self) -> int:
+    """Returns the number of forests received so far."""
+    with self._condition:
+      return self._num_forests
+
+  def wait_for_forest(self, num_forests_seen: int, timeout: float) -> bool:
+    """Blocks until more than `num_forests_seen` forests have been received.
+
+    Args:
+      num_forests_seen: Value of `num_forests` read before the last fetch.
+      timeout: Maximum time to wait in seconds.
+
+    Returns:
+      True if a new forest arrived, False if the timeout expired.
+    """
+    with self._condition:
+      return self._condition.wait_for(
+          lambda: self._num_forests > num_forests_seen, timeout
+      )
+
+  def record_fetch(
+      self, latency_sec: float, num_misses: int, succeeded: bool
+  ) -> None:
+    """Records the outcome of a call to `get_a11y_tree`."""
+    self._num_fetches += 1
+    self._num_misses += num_misses
+    if not succeeded:
+      self._num_failures += 1
+    self._total_latency_sec += latency_sec
+    self._max_latency_sec = max(self._max_latency_sec, latency_sec)
+
+  @property
+  def stats(self) -> dict[str, float]:
+    """Returns fetch counts and latencies.
+
+    `misses` counts the attempts that found no forest and had to wait, and
+    `failures` the fetches that timed out.
+    """
+    return {
+        'fetches': self._num_fetches,
+        'misses': self._num_misses,
+        'failures': self._num_failures,
+        'mean_latency_sec': (
+            self._total_latency_sec / self._num_fetches
+            if self._num_fetches
+            else 0.0
+        ),
+        'max_latency_sec': self._max_latency_sec,
+    }
+
+
+def _enable_networking(
+    env: a11y_grpc_wrapper.A11yGrpcWrapper,
+    network_state: Optional[NetworkStateWatcher],
+) -> None:
+  logging.warning(
+      'Airplane mode is on -- cannot retrieve a11y tree via gRPC. Turning'
+      ' it off...'
+  )
+  logging.info('Enabling networking...')
+  env.attempt_enable_networking()
+  time.sleep(1.0)
+  if network_state is not None:
+    network_state.invalidate()
+
+
 def get_a11y_tree(
     env: env_interface.AndroidEnvInterface,
     max_retries: int = 5,
     sleep_duration: float = 1.0,
+    network_state: Optional[NetworkStateWatcher] = None,
+    forest_monitor: Optional[A11yForestMonitor] = None,
+    env_lock: Optional[threading.Lock] = None,
 ) -> android_accessibility_forest_pb2.AndroidAccessibilityForest:
   """Gets a11y tree.
 
@@ -66,6 +229,16 @@ def get_a11y_tree(
     env: AndroidEnv.
     max_retries: Maximum number of retries to get a11y tree.
     sleep_duration: Time to sleep between each retry in seconds.
+    network_state: If provided, airplane mode is read from it instead of being
+      checked on the device before the fetch; the device is only checked again
+      if the fetch fails.
+    forest_monitor: If provided, a fetch that finds no forest waits for the
+      next one to arrive, for up to `max_retries * sleep_duration` seconds in
+      total, instead of sleeping `sleep_duration` between retries. The fetch is
+      also recorded in its stats.
+    env_lock: If provided, it is held while `env` is called, but not while
+      waiting between retries, so the fetch can run alongside a step of the
+      same AndroidEnv on another thread.
 
   Returns:
     A11y tree.
@@ -78,29 +251,56 @@ def get_a11y_tree(
         'Must use a11y_grpc_wrapper.A11yGrpcWrapper to get the a11y tree.'
     )
   env = cast(a11y_grpc_wrapper.A11yGrpcWrapper, env)
-  if adb_utils.retry(3)(adb_utils.check_airplane_mode)(env):
-    logging.warning(
-        'Airplane mode is on -- cannot retrieve a11y tree via gRPC. Turning'
-        ' it off...'
-    )
-    logging.info('Enabling networking...')
-    env.attempt_enable_networking()
-    time.sleep(1.0)
-
-  forest: Optional[
-      android_accessibility_forest_pb2.AndroidAccessibilityForest
-  ] = None
-  for _ in range(max_retries):
+  if env_lock is None:
+    env_lock = contextlib.nullcontext()
+  with env_lock:
+    if network_state is None:
+      airplane_mode_on = adb_utils.retry(3)(adb_utils.check_airplane_mode)(env)
+    else:
+      airplane_mode_on = network_state.airplane_mode_on(env)
+    if airplane_mode_on:
+      _enable_networking(env, network_state)
+
+  start = time.monotonic()
+  deadline = start + max_retries * sleep_duration
+  num_misses = 0
+  while True:
+    num_forests_seen = forest_monitor.num_forests if forest_monitor else 0
     try:
-      forest = env.accumulate_new_extras()['accessibility_tree'][-1]  # pytype:disable=attribute-error
+      with env_lock:
+        extras = env.accumulate_new_extras()  # pytype:disable=attribute-error
+      forest = extras['accessibility_tree'][-1]
+      if forest_monitor is not None:
+        forest_monitor.record_fetch(
+            time.monotonic() - start, num_misses, succeeded=True
+        )
       return forest
     except KeyError:
       logging.warning('Could not get a11y tree, retrying.')
-    time.sleep(sleep_duration)
-
-  if forest is None:
-    raise RuntimeError('Could not get a11y tree.')
-  return forest
+      num_misses += 1
+      if num_misses == 1 and network_state is not None:
+        # The cached state may be outdated; check the device once.
+        network_state.invalidate()
+        with env_lock:
+          if network_state.airplane_mode_on(env):
+            _enable_networking(env, network_state)
+
+    if forest_monitor is None:
+      if num_misses >= max_retries:
+        break
+      time.sleep(sleep_duration)
+    else:
+      remaining = deadline - time.monotonic()
+      if remaining <= 0 or not forest_monitor.wait_for_forest(
+          num_forests_seen, remaining
+      ):
+        break
+
+  if forest_monitor is not None:
+    forest_monitor.record_fetch(
+        time.monotonic() - start, num_misses, succeeded=False
+    )
+  raise RuntimeError('Could not get a11y tree.')
 
 
 _TASK_PATH = '/tmp/default.textproto'
@@ -131,15 +331,101 @@ class A11yMethod(enum.Enum):
   # From `uiautomator dump``.
   UIAUTOMATOR = 'uiautomator'
 
+  # From `uiautomator dump`, streamed over `adb exec-out` in one round-trip
+  # and parsed incrementally.
+  UIAUTOMATOR_STREAMING = 'uiautomator_streaming'
+
+
+_A11Y_FORWARDER_PACKAGE = 'com.google.androidenv.accessibilityforwarder'
+_A11Y_FORWARDER_FLAGS_RECEIVER = (
+    f'{_A11Y_FORWARDER_PACKAGE}/{_A11Y_FORWARDER_PACKAGE}.FlagsBroadcastReceiver'
+)
+
+
+class RecoveryTier(enum.Enum):
+  """Ways to restore a11y forest fetches, from cheapest to most expensive."""
+
+  # Points the a11y forwarder at the gRPC server again.
+  RESTART_STREAM = 'restart_stream'
+
+  # Stops and re-enables the a11y forwarder service, then restarts the stream.
+  RESTART_SERVICE = 'restart_service'
+
+  # Swaps in the connection of a standby controller built in the background;
+  # see `AndroidWorldController.start_standby`.
+  STANDBY_CONTROLLER = 'standby_controller'
+
+  # Reconnects to the emulator and reloads AndroidEnv; see `refresh_env`.
+  FULL_RELOAD = 'full_reload'
+
+
+@dataclasses.dataclass(frozen=True)
+class RecoveryRecord:
+  """An attempt to restore a11y forest fetches.
+
+  Attributes:
+    tier: What was tried.
+    duration_sec: Time taken by the attempt, including the fetch that checks
+      whether it worked.
+    succeeded: Whether a forest could be fetched afterwards.
+  """
+
+  tier: RecoveryTier
+  duration_sec: float
+  succeeded: bool
+
+
+class StandbyController:
+  """Builds a controller in the background to replace a lost connection.
+
+  A replacement is built as soon as the standby is created, and again every
+  time one is taken, so that recovering from a lost connection does not wait
+  for AndroidEnv to load.
+  """
+
+  def __init__(self, build: Callable[[], 'AndroidWorldController']):
+    self._build = build
+    self._executor = concurrent.futures.ThreadPoolExecutor(
+        max_workers=1, thread_name_prefix='standby_controller'
+    )
+    self._future = self._executor.submit(build)
+
+  @property
+  def ready(self) -> bool:
+    """Whether a replacement has been built and can be taken immediately."""
+    return self._future.done() and self._future.exception() is None
+
+  def take(self) -> Optional['AndroidWorldController']:
+    """Returns the replacement, waiting for it if still being built.
+
+    Building the next replacement starts right away.
+
+    Returns:
+      The replacement, or None if building it failed.
+    """
+    future = self._future
+    self._future = self._executor.submit(self._build)
+    try:
+      return future.result()
+    except Exception:  # pylint: disable=broad-exception-caught
+      logging.exception('Failed to build the standby controller.')
+      return None
+
+  def close(self) -> None:
+    self._future.cancel()
+    self._executor.shutdown(wait=False)
+
 
 def apply_a11y_forwarder_app_wrapper(
-    env: env_interface.AndroidEnvInterface, install_a11y_forwarding_app: bool
+    env: env_interface.AndroidEnvInterface,
+    install_a11y_forwarding_app: bool,
+    start_a11y_service: bool = True,
 ) -> env_interface.AndroidEnvInterface:
   return a11y_grpc_wrapper.A11yGrpcWrapper(
       env,
       install_a11y_forwarding=install_a11y_forwarding_app,
-      start_a11y_service=True,
-      enable_a11y_tree_info=True,
+      start_a11y_service=start_a11y_service,
+      enable_a11y_tree_info=start_a11y_service,
       latest_a11y_info_only=True,
   )
 
@@ -159,22 +445,105 @@ class AndroidWorldController(base_wrapper.BaseWrapper):
       env: env_interface.AndroidEnvInterface,
       a11y_method: A11yMethod = A11yMethod.A11Y_FORWARDER_APP,
       install_a11y_forwarding_app: bool = True,
+      connect_a11y_forwarder: bool = True,
   ):
+    """Initializes the controller.
+
+    Args:
+      env: The AndroidEnv to wrap.
+      a11y_method: How UI trees are obtained.
+      install_a11y_forwarding_app: Whether to install the a11y forwarder app.
+      connect_a11y_forwarder: If False, the a11y forwarder on the device is
+        left alone: it is not installed, started or pointed at the gRPC server
+        of this controller until `connect_a11y_stream` is called. Used for
+        standby controllers, while another controller owns the stream.
+    """
     self._original_env = env
+    # AndroidEnv is not thread-safe, but `step_without_ui` and
+    # `get_ui_observation` may run at the same time; calls into it from either
+    # are serialized on this lock.
+    self._env_lock = threading.Lock()
     if a11y_method == A11yMethod.A11Y_FORWARDER_APP:
       self._env = apply_a11y_forwarder_app_wrapper(
-          env, install_a11y_forwarding_app
+          env,
+          install_a11y_forwarding_app and connect_a11y_forwarder,
+          start_a11y_service=connect_a11y_forwarder,
       )
-      self._env.reset()  # Initializes required server services in a11y wrapper.
+      if connect_a11y_forwarder:
+        self._env.reset()  # Initializes required server services in a11y wrapper.
+      self._forest_monitor = A11yForestMonitor.attach(self._env)
     else:
       self._env = env
+      self._forest_monitor = None
     self._a11y_method = a11y_method
 
+    # Geometry only changes through orientation/resolution changes, which
+    # invalidate the cache (see `adb_utils.change_orientation` and
+    # `adb_utils.set_screen_size`).
+    self.cache_device_geometry = True
+    self._device_geometry: Optional[adb_utils.DeviceGeometry] = None
+    self._geometry_cache_hits = 0
+    self._geometry_cache_misses = 0
+
+    # If True, UI elements extracted from the a11y forest are returned as a
+    # columnar `ui_element_table.UIElementTable` instead of a list.
+    self.compact_ui_elements = False
+    self._network_state = NetworkStateWatcher()
+    self._ui_element_converter = (
+        representation_utils.IncrementalForestConverter()
+    )
+    self._ui_elements_diff: Optional[representation_utils.UIElementsDiff] = (
+        None
+    )
+
+    # If set, shell commands and file transfers are sent to the ADB server
+    # over pooled connections instead of through the `adb` binary.
+    self.adb_client: Optional[adb_wire.AdbWireClient] = None
+
+    self._standby: Optional[StandbyController] = None
+    self._recoveries: list[RecoveryRecord] = []
+
   @property
   def device_screen_size(self) -> tuple[int, int]:
     """Returns the physical screen size of the device: (width, height)."""
     return adb_utils.get_screen_size(self._env)
 
+  @property
+  def device_geometry(self) -> adb_utils.DeviceGeometry:
+    """Returns the logical size, orientation and physical frame boundary.
+
+    The geometry is loaded with a single adb call and then served from cache
+    until `invalidate_device_geometry` is called.
+    """
+    if self._device_geometry is not None:
+      self._geometry_cache_hits += 1
+      return self._device_geometry
+    self._geometry_cache_misses += 1
+    geometry = adb_utils.get_device_geometry(self._env)
+    if self.cache_device_geometry:
+      self._device_geometry = geometry
+    return geometry
+
+  def invalidate_device_geometry(self) -> None:
+    """Forces the next `device_geometry` read to query the device."""
+    self._device_geometry = None
+
+  @property
+  def geometry_cache_stats(self) -> dict[str, int]:
+    """Returns the number of geometry cache hits and misses."""
+    return {
+        'hits': self._geometry_cache_hits,
+        'misses': self._geometry_cache_misses,
+    }
+
+  @property
+  def network_state(self) -> NetworkStateWatcher:
+    return self._network_state
+
+  def invalidate_network_state(self) -> None:
+    """Forces the next a11y tree fetch to check airplane mode on the device."""
+    self._network_state.invalidate()
+
   @property
   def logical_screen_size(self) -> tuple[int, int]:
     """Returns the logical screen size of the device.
@@ -182,66 +551,341 @@ class AndroidWorldController(base_wrapper.BaseWrapper):
     This will be different with the physical size if orientation or resolution
     is changed.
     """
-    return adb_utils.get_logical_screen_size(self._env)
+    return self.device_geometry.logical_screen_size
 
   @property
   def env(self) -> env_interface.AndroidEnvInterface:
     return self._env
 
-  def refresh_env(self):
+  @property
+  def a11y_method(self) -> A11yMethod:
+    return self._a11y_method
+
+  def _connection_args(self) -> dict[str, Any]:
+    """Returns the `get_controller` arguments to reconnect to the emulator."""
     # pylint: disable=protected-access
     # pytype: disable=attribute-error
-    # Reconnect to emulator and reload a11y wrapper in case we lose connection.
-    self._env = get_controller(
-        console_port=self.env._coordinator._simulator._config.emulator_launcher.emulator_console_port,
-        adb_path=self.env._coordinator._simulator._config.adb_controller.adb_path,
-        grpc_port=self.env._coordinator._simulator._config.emulator_launcher.grpc_port,
-    ).env
+    config = self.env._coordinator._simulator._config
     # pylint: enable=protected-access
     # pytype: enable=attribute-error
+    return {
+        'console_port': config.emulator_launcher.emulator_console_port,
+        'adb_path': config.adb_controller.adb_path,
+        'grpc_port': config.emulator_launcher.grpc_port,
+    }
+
+  def refresh_env(self):
+    # Reconnect to emulator and reload a11y wrapper in case we lose connection.
+    self._adopt_connection(get_controller(**self._connection_args()))
+
+  def connect_a11y_stream(self) -> None:
+    """Points the a11y forwarder at the gRPC server of this controller.
+
+    Only needed for controllers created with `connect_a11y_forwarder=False`.
+    """
+    # The first reset of the wrapper sets up networking for its gRPC server and
+    # sends the forwarder its port.
+    self._env.reset()
+    # pylint: disable-next=protected-access
+    cast(a11y_grpc_wrapper.A11yGrpcWrapper, self._env)._enable_a11y_tree_logs()
+
+  def _adopt_connection(
+      self,
+      controller: 'AndroidWorldController',
+      connect_a11y_stream: bool = False,
+  ) -> None:
+    """Replaces the connection to the device with that of `controller`.
+
+    Args:
+      controller: The controller whose connection to take over.
+      connect_a11y_stream: Whether to point the a11y forwarder at the gRPC
+        server of `controller` first, which a standby controller has not done.
+    """
+    if connect_a11y_stream:
+      controller.connect_a11y_stream()
+    # pylint: disable=protected-access
+    self._env = controller.env
+    self._original_env = controller._original_env
+    self._forest_monitor = controller._forest_monitor
+    # pylint: enable=protected-access
+    if self.adb_client is not None:
+      # Pooled sessions may belong to the lost connection.
+      self.adb_client.close()
+    # Node ids are only stable within a connection to the a11y forwarder.
+    self._ui_element_converter.reset()
+    self._network_state.invalidate()
+
+  def load_state(
+      self, request: state_pb2.LoadStateRequest
+  ) -> state_pb2.LoadStateResponse:
+    """Loads an emulator snapshot and drops what is cached about the device.
+
+    The snapshot restores the orientation, network settings and screen as they
+    were when it was saved, and the a11y forwarder's connection with them.
+
+    Args:
+      request: The snapshot to load.
+
+    Returns:
+      The response of the emulator.
+    """
+    response = self._env.load_state(request)
+    # Even a failed load may have changed the device.
+    self.invalidate_device_geometry()
+    self._network_state.invalidate()
+    self._ui_element_converter.reset()
+    self._ui_elements_diff = None
+    if (
+        self._a11y_method == A11yMethod.A11Y_FORWARDER_APP
+        and response.status == state_pb2.LoadStateResponse.Status.OK
+    ):
+      # Forests received before the load describe the old screen.
+      # pylint: disable=protected-access
+      # pytype: disable=attribute-error
+      servicer = self._env._servicer
+      servicer.pause_and_clear()
+      servicer.resume()
+      # pylint: enable=protected-access
+      # pytype: enable=attribute-error
+      try:
+        self._restart_a11y_stream()
+      except RuntimeError as error:
+        # The next forest fetch recovers the stream; see `get_a11y_forest`.
+        logging.warning('Failed to restart the a11y stream: %s', error)
+    return response
+
+  def close(self) -> None:
+    if self._standby is not None:
+      self._standby.close()
+    super().close()
+
+  def execute_adb_call(
+      self, adb_call: adb_pb2.AdbRequest
+  ) -> adb_pb2.AdbResponse:
+    if self.adb_client is not None:
+      response = self.adb_client.execute_adb_call(adb_call)
+      if response is not None:
+        return response
+    with self._env_lock:
+      return self._env.execute_adb_call(adb_call)
 
   def _get_a11y_forest(
       self,
   ) -> android_accessibility_forest_pb2.AndroidAccessibilityForest:
-    return get_a11y_tree(self._env)
+    return get_a11y_tree(
+        self._env,
+        network_state=self._network_state,
+        forest_monitor=self._forest_monitor,
+        env_lock=self._env_lock,
+    )
+
+  @property
+  def a11y_fetch_stats(self) -> dict[str, float]:
+    """Returns a11y forest fetch statistics; see `A11yForestMonitor.stats`."""
+    if self._forest_monitor is None:
+      return {}
+    return self._forest_monitor.stats
+
+  def start_standby(self) -> None:
+    """Keeps a controller warm in the background to recover from lost a11y.
+
+    It costs a second AndroidEnv connection to the emulator, but recovering
+    with it skips reloading AndroidEnv; see `RecoveryTier`. The standby leaves
+    the a11y forwarder streaming to this controller until it is swapped in.
+    """
+    if self._standby is None:
+      args = self._connection_args()
+      self._standby = StandbyController(
+          lambda: get_controller(**args, connect_a11y_forwarder=False)
+      )
+
+  @property
+  def recoveries(self) -> list[RecoveryRecord]:
+    """Returns the attempts made to restore a11y forest fetches, in order."""
+    return list(self._recoveries)
+
+  def _restart_a11y_stream(self) -> None:
+    """Points the a11y forwarder at the gRPC server of the wrapper again."""
+    # pylint: disable=protected-access
+    # pytype: disable=attribute-error
+    wrapper = cast(a11y_grpc_wrapper.A11yGrpcWrapper, self._env)
+    wrapper._reset_enable_networking_attempts()
+    host = wrapper._grpc_server_ip
+    # pylint: enable=protected-access
+    # pytype: enable=attribute-error
+    response = self._env.execute_adb_call(
+        adb_pb2.AdbRequest(
+            send_broadcast=adb_pb2.AdbRequest.SendBroadcast(
+                action=(
+                    'accessibility_forwarder.intent.action.SET_GRPC --ei'
+                    f' "port" {wrapper.get_port()} --es "host" {host}'
+                ),
+                component=_A11Y_FORWARDER_FLAGS_RECEIVER,
+            )
+        )
+    )
+    adb_utils.check_ok(response, 'Failed to set the a11y forwarder gRPC port.')
+    wrapper._enable_a11y_tree_logs()  # pylint: disable=protected-access
+
+  def _restart_a11y_service(self) -> None:
+    """Restarts the a11y forwarder service and its stream."""
+    adb_utils.check_ok(
+        adb_utils.issue_generic_request(
+            [
+                'shell',
+                f'am force-stop {_A11Y_FORWARDER_PACKAGE} && settings delete'
+                ' secure enabled_accessibility_services',
+            ],
+            self._env,
+        ),
+        'Failed to stop the a11y forwarder.',
+    )
+    # pylint: disable-next=protected-access
+    cast(a11y_grpc_wrapper.A11yGrpcWrapper, self._env)._start_a11y_services()
+    self._restart_a11y_stream()
+
+  def _swap_in_standby(self) -> None:
+    controller = self._standby.take() if self._standby is not None else None
+    if controller is None:
+      raise RuntimeError('No standby controller is available.')
+    self._adopt_connection(controller, connect_a11y_stream=True)
+
+  def _try_recovery(
+      self, tier: RecoveryTier, recover: Callable[[], None]
+  ) -> Optional[android_accessibility_forest_pb2.AndroidAccessibilityForest]:
+    """Runs `recover` and fetches a forest; records and logs the attempt.
+
+    Args:
+      tier: The kind of recovery.
+      recover: Restores the connection.
+
+    Returns:
+      The forest, or None if the recovery or the fetch failed, including when
+      adb itself fails. For the full reload, failures are raised instead.
+    """
+    start = time.monotonic()
+    forest = None
+    try:
+      recover()
+      forest = self._get_a11y_forest()
+    except (RuntimeError, ValueError, errors.AndroidEnvError) as error:
+      if tier == RecoveryTier.FULL_RELOAD:
+        raise
+      logging.warning('A11y recovery %s failed: %s', tier.value, error)
+    finally:
+      record = RecoveryRecord(
+          tier, time.monotonic() - start, succeeded=forest is not None
+      )
+      self._recoveries.append(record)
+      logging.info(
+          'A11y recovery %s took %.2f s; succeeded: %s.',
+          tier.value,
+          record.duration_sec,
+          record.succeeded,
+      )
+    return forest
 
   def get_a11y_forest(
       self,
   ) -> android_accessibility_forest_pb2.AndroidAccessibilityForest:
-    """Returns the most recent a11y forest from the device."""
+    """Returns the most recent a11y forest from the device.
+
+    If no forest can be fetched, the connection is restored with the cheapest
+    `RecoveryTier` that works; reloading AndroidEnv is the last resort.
+    """
     try:
       return self._get_a11y_forest()
     except RuntimeError:
-      print(
-          'Could not get a11y tree. Reconnecting to Android, reinitializing'
-          ' AndroidEnv, and restarting a11y forwarding.'
+      print('Could not get a11y tree. Restoring a11y forwarding.')
+    steps = [
+        (RecoveryTier.RESTART_STREAM, self._restart_a11y_stream),
+        (RecoveryTier.RESTART_SERVICE, self._restart_a11y_service),
+    ]
+    if self._standby is not None:
+      steps.append((RecoveryTier.STANDBY_CONTROLLER, self._swap_in_standby))
+    for tier, recover in steps:
+      forest = self._try_recovery(tier, recover)
+      if forest is not None:
+        return forest
+    print(
+        'Could not restore a11y forwarding. Reconnecting to Android,'
+        ' reinitializing AndroidEnv, and restarting a11y forwarding.'
+    )
+    return self._try_recovery(RecoveryTier.FULL_RELOAD, self.refresh_env)
+
+  def _forest_to_ui_elements(
+      self,
+      forest: android_accessibility_forest_pb2.AndroidAccessibilityForest,
+  ) -> Sequence[representation_utils.UIElement]:
+    if self.compact_ui_elements:
+      self._ui_elements_diff = None
+      return ui_element_table.UIElementTable.from_forest(
+          forest, exclude_invisible_elements=True
       )
-      self.refresh_env()
-      return self._get_a11y_forest()
+    ui_elements, self._ui_elements_diff = self._ui_element_converter.convert(
+        forest,
+        exclude_invisible_elements=True,
+    )
+    return ui_elements
+
+  @property
+  def ui_elements_diff(self) -> Optional[representation_utils.UIElementsDiff]:
+    """Change in UI elements between the last two a11y forest conversions.
+
+    None if no forest has been converted yet, or if UI elements come from
+    `uiautomator dump` or are compact.
+    """
+    return self._ui_elements_diff
 
   def get_ui_elements(self) -> list[representation_utils.UIElement]:
     """Returns the most recent UI elements from the device."""
     if self._a11y_method == A11yMethod.A11Y_FORWARDER_APP:
-      return representation_utils.forest_to_ui_elements(
-          self.get_a11y_forest(),
-          exclude_invisible_elements=True,
-      )
-    else:
-      return representation_utils.xml_dump_to_ui_elements(
-          adb_utils.uiautomator_dump(self._env)
-      )
+      return self._forest_to_ui_elements(self.get_a11y_forest())
+    if self._a11y_method == A11yMethod.UIAUTOMATOR_STREAMING:
+      try:
+        return representation_utils.stream_xml_dump_to_ui_elements(
+            adb_utils.uiautomator_dump_exec_out(self._env)
+        )
+      except RuntimeError as e:
+        logging.warning('%s Falling back to a dump file.', e)
+    return representation_utils.xml_dump_to_ui_elements(
+        adb_utils.uiautomator_dump(self._env)
+    )
 
-  def _process_timestep(self, timestep: dm_env.TimeStep) -> dm_env.TimeStep:
-    """Adds a11y tree info to the observation."""
+  def get_ui_observation(
+      self,
+  ) -> tuple[
+      Optional[android_accessibility_forest_pb2.AndroidAccessibilityForest],
+      Sequence[representation_utils.UIElement],
+  ]:
+    """Returns the a11y forest and the UI elements extracted from it.
+
+    The forest is None unless the a11y forwarder app is used.
+    """
     if self._a11y_method == A11yMethod.A11Y_FORWARDER_APP:
       forest = self.get_a11y_forest()
-      ui_elements = representation_utils.forest_to_ui_elements(
-          forest,
-          exclude_invisible_elements=True,
-      )
-    else:
-      forest = None
-      ui_elements = self.get_ui_elements()
+      return forest, self._forest_to_ui_elements(forest)
+    return None, self.get_ui_elements()
+
+  def step_without_ui(self, action: Any) -> dm_env.TimeStep:
+    """Steps the environment without adding a11y tree info to the observation.
+
+    The unwrapped AndroidEnv is stepped, so the screenshot can be captured while
+    `get_ui_observation` runs on another thread; their calls into AndroidEnv
+    are serialized, the wait for the a11y forest is not.
+
+    Args:
+      action: The action to step with.
+
+    Returns:
+      The timestep, with the screenshot under "pixels".
+    """
+    with self._env_lock:
+      return self._original_env.step(action)
+
+  def _process_timestep(self, timestep: dm_env.TimeStep) -> dm_env.TimeStep:
+    """Adds a11y tree info to the observation."""
+    forest, ui_elements = self.get_ui_observation()
     timestep.observation[OBSERVATION_KEY_FOREST] = forest
     timestep.observation[OBSERVATION_KEY_UI_ELEMENTS] = ui_elements
     return timestep
@@ -261,7 +905,7 @@ class AndroidWorldController(base_wrapper.BaseWrapper):
     """
     remote_db_directory = os.path.dirname(remote_db_file_path)
     return file_utils.tmp_directory_from_device(
-        remote_db_directory, self.env, timeout_sec
+        remote_db_directory, self, timeout_sec
     )
 
   def push_file(
@@ -279,7 +923,7 @@ class AndroidWorldController(base_wrapper.BaseWrapper):
     file_utils.copy_data_to_device(
         local_db_file_path,
         remote_db_file_path,
-        self.env,
+        self,
         timeout_sec,
     )
 
@@ -301,8 +945,28 @@ def get_controller(
     console_port: int = 5554,
     adb_path: str = DEFAULT_ADB_PATH,
     grpc_port: int = 8554,
+    use_adb_wire_client: bool = False,
+    warm_standby: bool = False,
+    connect_a11y_forwarder: bool = True,
 ) -> AndroidWorldController:
-  """Creates a controller by connecting to an existing Android environment."""
+  """Creates a controller by connecting to an existing Android environment.
+
+  Args:
+    console_port: The console port of the emulator.
+    adb_path: The location of the adb binary.
+    grpc_port: The port for gRPC communication with the emulator.
+    use_adb_wire_client: If True, shell commands and file transfers go to the
+      ADB server over pooled connections; see `adb_wire`.
+    warm_standby: If True, a second controller is kept warm in the background
+      to recover quickly from a lost a11y connection; see
+      `AndroidWorldController.start_standby`.
+    connect_a11y_forwarder: If False, the a11y forwarder on the device is not
+      installed, started or pointed at the new controller; see
+      `AndroidWorldController.connect_a11y_stream`.
+
+  Returns:
+    The controller.
+  """
 
   config = config_classes.AndroidEnvConfig(
       task=config_classes.FilesystemTaskConfig(
@@ -319,4 +983,11 @@ def get_controller(
   )
   android_env_instance = loader.load(config)
   logging.info('Setting up AndroidWorldController.')
-  return AndroidWorldController(android_env_instance)
+  controller = AndroidWorldController(
+      android_env_instance, connect_a11y_forwarder=connect_a11y_forwarder
+  )
+  if use_adb_wire_client:
+    controller.adb_client = adb_wire.AdbWireClient(f'emulator-{console_port}')
+  if warm_standby:
+    controller.start_standby()
+  return controller
@@ -12,16 +12,25 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import copy
 import os
 import tempfile
+import threading
+import time
 from unittest import mock
 
 from absl.testing import absltest
 from android_env import env_interface
+from android_env.components import errors
+from android_env.proto import adb_pb2
+from android_env.proto import state_pb2
+from android_env.proto.a11y import android_accessibility_forest_pb2
 from android_env.wrappers import a11y_grpc_wrapper
 from android_world.env import adb_utils
+from android_world.env import adb_wire
 from android_world.env import android_world_controller
 from android_world.env import representation_utils
+from android_world.env import ui_element_table
 from android_world.utils import fake_adb_responses
 from android_world.utils import file_test_utils
 from android_world.utils import file_utils
@@ -36,6 +45,151 @@ def create_file_with_contents(contents: str) -> str:
   return file_path
 
 
+class _FakeServicer:
+
+  def __init__(self):
+    self.forests = []
+
+  def _process_forest(self, forest):
+    self.forests.append(forest)
+
+
+class A11yForestMonitorTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.enter_context(
+        mock.patch.object(android_world_controller, '_has_wrapper')
+    )
+    self.servicer = _FakeServicer()
+    self.monitor = android_world_controller.A11yForestMonitor(self.servicer)
+    self.env = mock.Mock()
+
+    def accumulate_new_extras():
+      if not self.servicer.forests:
+        return {}
+      return {'accessibility_tree': self.servicer.forests}
+
+    self.env.accumulate_new_extras.side_effect = accumulate_new_extras
+
+  def test_returns_as_soon_as_forest_arrives(self):
+    timer = threading.Timer(0.05, self.servicer._process_forest, ['forest'])
+    timer.start()
+    start = time.monotonic()
+
+    forest = android_world_controller.get_a11y_tree(
+        self.env,
+        sleep_duration=1.0,
+        network_state=mock.Mock(airplane_mode_on=lambda env: False),
+        forest_monitor=self.monitor,
+    )
+
+    self.assertEqual(forest, 'forest')
+    self.assertLess(time.monotonic() - start, 0.9)
+    self.assertEqual(self.monitor.num_forests, 1)
+    stats = self.monitor.stats
+    self.assertEqual(stats['fetches'], 1)
+    self.assertEqual(stats['misses'], 1)
+    self.assertEqual(stats['failures'], 0)
+    self.assertGreater(stats['max_latency_sec'], 0.0)
+
+  def test_raises_after_deadline(self):
+    with self.assertRaises(RuntimeError):
+      android_world_controller.get_a11y_tree(
+          self.env,
+          max_retries=2,
+          sleep_duration=0.05,
+          network_state=mock.Mock(airplane_mode_on=lambda env: False),
+          forest_monitor=self.monitor,
+      )
+
+    self.assertEqual(self.monitor.stats['failures'], 1)
+
+  def test_wait_for_forest(self):
+    self.assertFalse(self.monitor.wait_for_forest(0, timeout=0.01))
+    self.servicer._process_forest('forest')
+    self.assertTrue(self.monitor.wait_for_forest(0, timeout=0.01))
+    self.assertEqual(self.servicer.forests, ['forest'])
+
+  def test_attach_without_servicer(self):
+    self.assertIsNone(
+        android_world_controller.A11yForestMonitor.attach(object())
+    )
+
+
+def _a11y_forwarder_requests(
+    env: mock.Mock,
+) -> list[adb_pb2.AdbRequest]:
+  """Returns the requests `env` received that install or configure a11y."""
+  requests = []
+  for call in env.execute_adb_call.call_args_list:
+    request = call.args[0]
+    if (
+        request.HasField('install_apk')
+        or request.HasField('settings')
+        or request.HasField('send_broadcast')
+    ):
+      requests.append(request)
+  return requests
+
+
+class StandbyControllerTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.enter_context(mock.patch.object(time, 'sleep'))
+    self.base_envs = []
+    self.controllers = []
+
+  def _build(self) -> android_world_controller.AndroidWorldController:
+    base_env = mock.Mock(spec=env_interface.AndroidEnvInterface)
+    base_env.execute_adb_call.return_value = adb_pb2.AdbResponse(
+        status=adb_pb2.AdbResponse.Status.OK
+    )
+    base_env.reset.return_value = dm_env.restart({})
+    base_env.stats.return_value = {'relaunch_count': 1}
+    base_env.task_extras.return_value = {}
+    self.base_envs.append(base_env)
+    controller = android_world_controller.AndroidWorldController(
+        base_env, connect_a11y_forwarder=False
+    )
+    self.controllers.append(controller)
+    self.addCleanup(controller.env.close)
+    return controller
+
+  def test_building_and_holding_standby_leaves_a11y_forwarder_alone(self):
+    standby = android_world_controller.StandbyController(self._build)
+    self.addCleanup(standby.close)
+
+    controller = standby.take()
+    standby.take()  # Waits for the next build.
+
+    # A third build may still be running.
+    self.assertGreaterEqual(len(self.base_envs), 2)
+    for base_env in self.base_envs:
+      self.assertEmpty(_a11y_forwarder_requests(base_env))
+      base_env.reset.assert_not_called()
+    self.assertIs(controller, self.controllers[0])
+
+  def test_connect_a11y_stream_points_forwarder_at_controller(self):
+    controller = self._build()
+
+    controller.connect_a11y_stream()
+
+    broadcasts = [
+        request.send_broadcast.action
+        for request in _a11y_forwarder_requests(self.base_envs[0])
+        if request.HasField('send_broadcast')
+    ]
+    port = controller.env.get_port()
+    self.assertTrue(
+        any(
+            'SET_GRPC' in action and f'"port" {port}' in action
+            for action in broadcasts
+        )
+    )
+
+
 class AndroidWorldControllerTest(absltest.TestCase):
 
   def setUp(self):
@@ -102,9 +256,114 @@ class AndroidWorldControllerTest(absltest.TestCase):
 
     self.assertEqual(env.device_screen_size, (100, 200))
 
+  @mock.patch.object(adb_utils, 'get_device_geometry')
+  def test_device_geometry_is_cached_until_invalidated(
+      self, mock_get_device_geometry
+  ):
+    mock_base_env = mock.Mock(spec=env_interface.AndroidEnvInterface)
+    env = android_world_controller.AndroidWorldController(mock_base_env)
+    mock_get_device_geometry.side_effect = [
+        adb_utils.DeviceGeometry((1080, 2400), 0, (0, 0, 1080, 2400)),
+        adb_utils.DeviceGeometry((2400, 1080), 1, (0, 0, 1080, 2400)),
+    ]
+
+    self.assertEqual(env.logical_screen_size, (1080, 2400))
+    self.assertEqual(env.device_geometry.orientation, 0)
+    adb_utils.change_orientation('landscape', env)
+    self.assertEqual(env.logical_screen_size, (2400, 1080))
+    self.assertEqual(env.device_geometry.orientation, 1)
+
+    self.assertEqual(mock_get_device_geometry.call_count, 2)
+    self.assertEqual(env.geometry_cache_stats, {'hits': 2, 'misses': 2})
+
+  @mock.patch.object(adb_utils, 'check_airplane_mode', return_value=False)
+  @mock.patch.object(adb_utils, 'get_device_geometry')
+  def test_load_state_invalidates_device_caches(
+      self, mock_get_device_geometry, mock_check_airplane_mode
+  ):
+    env = android_world_controller.AndroidWorldController(
+        mock.Mock(spec=env_interface.AndroidEnvInterface)
+    )
+    env._env._servicer = mock.Mock()
+    env._env._grpc_server_ip = '10.0.2.2'
+    env._env.get_port.return_value = 1234
+    env._env.execute_adb_call.return_value = adb_pb2.AdbResponse(
+        status=adb_pb2.AdbResponse.Status.OK
+    )
+    env._env.load_state.return_value = state_pb2.LoadStateResponse(
+        status=state_pb2.LoadStateResponse.Status.OK
+    )
+    mock_get_device_geometry.side_effect = [
+        adb_utils.DeviceGeometry((2400, 1080), 1, (0, 0, 1080, 2400)),
+        adb_utils.DeviceGeometry((1080, 2400), 0, (0, 0, 1080, 2400)),
+    ]
+    self.assertEqual(env.device_geometry.orientation, 1)
+    env.network_state.airplane_mode_on(env)
+    env._ui_element_converter = mock.Mock()
+    request = state_pb2.LoadStateRequest(args={'snapshot_name': 'snap'})
+
+    env.load_state(request)
+
+    env._env.load_state.assert_called_once_with(request)
+    self.assertEqual(env.device_geometry.orientation, 0)
+    env.network_state.airplane_mode_on(env)
+    self.assertEqual(mock_check_airplane_mode.call_count, 2)
+    env._ui_element_converter.reset.assert_called_once()
+    env._env._servicer.pause_and_clear.assert_called_once()
+    broadcast = env._env.execute_adb_call.call_args.args[0].send_broadcast
+    self.assertIn('SET_GRPC --ei "port" 1234', broadcast.action)
+
+  @mock.patch.object(adb_utils, 'get_device_geometry')
+  def test_device_geometry_cache_disabled(self, mock_get_device_geometry):
+    mock_base_env = mock.Mock(spec=env_interface.AndroidEnvInterface)
+    env = android_world_controller.AndroidWorldController(mock_base_env)
+    env.cache_device_geometry = False
+    mock_get_device_geometry.return_value = adb_utils.DeviceGeometry(
+        (1080, 2400), 0, (0, 0, 1080, 2400)
+    )
+
+    env.device_geometry  # pylint: disable=pointless-statement
+    env.device_geometry  # pylint: disable=pointless-statement
+
+    self.assertEqual(mock_get_device_geometry.call_count, 2)
+
+  @mock.patch.object(adb_utils, 'check_airplane_mode', return_value=False)
+  @mock.patch.object(android_world_controller, '_has_wrapper')
+  def test_step_without_ui_is_serialized_with_a11y_fetch(
+      self, unused_mock_has_wrapper, unused_mock_check_airplane_mode
+  ):
+    env = android_world_controller.AndroidWorldController(
+        mock.Mock(spec=env_interface.AndroidEnvInterface)
+    )
+    step_started = threading.Event()
+    calls = []
+
+    def step(action):
+      del action
+      calls.append('step_start')
+      step_started.set()
+      time.sleep(0.1)
+      calls.append('step_end')
+
+    def accumulate_new_extras():
+      calls.append('fetch')
+      return {'accessibility_tree': ['forest']}
+
+    env._original_env.step.side_effect = step
+    env._env.accumulate_new_extras.side_effect = accumulate_new_extras
+    step_thread = threading.Thread(target=env.step_without_ui, args=({},))
+    step_thread.start()
+    step_started.wait(timeout=5)
+
+    forest = env.get_a11y_forest()
+    step_thread.join()
+
+    self.assertEqual(forest, 'forest')
+    self.assertEqual(calls, ['step_start', 'step_end', 'fetch'])
+
   @mock.patch.object(adb_utils, 'get_logical_screen_size')
   @mock.patch.object(android_world_controller, 'get_a11y_tree')
-  @mock.patch.object(representation_utils, 'forest_to_ui_elements')
+  @mock.patch.object(representation_utils.IncrementalForestConverter, 'convert')
   def test_process_timestep(
       self, mock_forest_to_ui, mock_get_a11y_tree, mock_get_logical_screen_size
   ):
@@ -112,9 +371,10 @@ class AndroidWorldControllerTest(absltest.TestCase):
     env = android_world_controller.AndroidWorldController(mock_base_env)
     mock_forest = mock.Mock()
     mock_ui_elements = mock.Mock()
+    mock_diff = mock.Mock()
     mock_get_logical_screen_size.return_value = (100, 200)
     mock_get_a11y_tree.return_value = mock_forest
-    mock_forest_to_ui.return_value = mock_ui_elements
+    mock_forest_to_ui.return_value = (mock_ui_elements, mock_diff)
     timestep = dm_env.TimeStep(
         observation={}, reward=None, discount=None, step_type=None
     )
@@ -129,37 +389,294 @@ class AndroidWorldControllerTest(absltest.TestCase):
         mock_forest,
         exclude_invisible_elements=True,
     )
+    self.assertIs(env.ui_elements_diff, mock_diff)
+
+  @mock.patch.object(android_world_controller, 'get_a11y_tree')
+  def test_ui_elements_diff(self, mock_get_a11y_tree):
+    mock_base_env = mock.Mock(spec=env_interface.AndroidEnvInterface)
+    env = android_world_controller.AndroidWorldController(mock_base_env)
+    forest = android_accessibility_forest_pb2.AndroidAccessibilityForest()
+    node = forest.windows.add().tree.nodes.add()
+    node.unique_id = 1
+    node.text = 'before'
+    node.is_visible_to_user = True
+    changed_forest = copy.deepcopy(forest)
+    changed_forest.windows[0].tree.nodes[0].text = 'after'
+    mock_get_a11y_tree.side_effect = [forest, forest, changed_forest]
+
+    self.assertIsNone(env.ui_elements_diff)
+    first = env.get_ui_elements()
+    self.assertEqual(env.ui_elements_diff.added, first)
+    second = env.get_ui_elements()
+    self.assertIs(second[0], first[0])
+    self.assertTrue(env.ui_elements_diff.is_empty)
+    env.get_ui_elements()
+    self.assertLen(env.ui_elements_diff.changed, 1)
+
+  @mock.patch.object(android_world_controller, 'get_a11y_tree')
+  def test_process_timestep_compact_ui_elements(self, mock_get_a11y_tree):
+    mock_base_env = mock.Mock(spec=env_interface.AndroidEnvInterface)
+    env = android_world_controller.AndroidWorldController(mock_base_env)
+    env.compact_ui_elements = True
+    forest = android_accessibility_forest_pb2.AndroidAccessibilityForest()
+    node = forest.windows.add().tree.nodes.add()
+    node.text = 'hello'
+    node.is_visible_to_user = True
+    mock_get_a11y_tree.return_value = forest
+    timestep = dm_env.TimeStep(
+        observation={}, reward=None, discount=None, step_type=None
+    )
+
+    ui_elements = env._process_timestep(timestep).observation['ui_elements']
+
+    self.assertIsInstance(ui_elements, ui_element_table.UIElementTable)
+    self.assertEqual(
+        ui_elements,
+        representation_utils.forest_to_ui_elements(
+            forest, exclude_invisible_elements=True
+        ),
+    )
+
+  def _create_recovering_controller(
+      self, num_failed_fetches: int
+  ) -> android_world_controller.AndroidWorldController:
+    """Returns a controller whose first forest fetches all find no forest."""
+    self.enter_context(mock.patch.object(time, 'sleep'))
+    self.enter_context(
+        mock.patch.object(adb_utils, 'check_airplane_mode', return_value=False)
+    )
+    self.enter_context(
+        mock.patch.object(android_world_controller, '_has_wrapper')
+    )
+    env = android_world_controller.AndroidWorldController(
+        mock.Mock(spec=env_interface.AndroidEnvInterface)
+    )
+    env._env._grpc_server_ip = '10.0.2.2'
+    env._env.get_port.return_value = 1234
+    env._env.execute_adb_call.return_value = adb_pb2.AdbResponse(
+        status=adb_pb2.AdbResponse.Status.OK
+    )
+    # Each fetch retries 5 times.
+    env._env.accumulate_new_extras.side_effect = [{}] * (
+        5 * num_failed_fetches
+    ) + [{'accessibility_tree': ['success']}]
+    return env
+
+  def _recovered_tiers(self, env) -> list[tuple[str, bool]]:
+    return [
+        (record.tier.value, record.succeeded) for record in env.recoveries
+    ]
+
+  def test_recovery_restarts_stream_first(self):
+    env = self._create_recovering_controller(num_failed_fetches=1)
+
+    with mock.patch.object(
+        android_world_controller.AndroidWorldController, 'refresh_env'
+    ) as mock_refresh_env:
+      forest = env.get_a11y_forest()
+
+    self.assertEqual(forest, 'success')
+    mock_refresh_env.assert_not_called()
+    self.assertEqual(self._recovered_tiers(env), [('restart_stream', True)])
+    broadcast = env._env.execute_adb_call.call_args.args[0].send_broadcast
+    self.assertIn('--ei "port" 1234 --es "host" 10.0.2.2', broadcast.action)
+    env._env._enable_a11y_tree_logs.assert_called_once()
+
+  def test_recovery_restarts_service(self):
+    env = self._create_recovering_controller(num_failed_fetches=2)
+
+    self.assertEqual(env.get_a11y_forest(), 'success')
+
+    self.assertEqual(
+        self._recovered_tiers(env),
+        [('restart_stream', False), ('restart_service', True)],
+    )
+    env._env._start_a11y_services.assert_called_once()
 
-  @mock.patch.object(adb_utils, 'check_airplane_mode')
   @mock.patch.object(android_world_controller, 'get_controller')
-  @mock.patch.object(android_world_controller, '_has_wrapper')
+  def test_recovery_swaps_in_standby(self, mock_get_controller):
+    env = self._create_recovering_controller(num_failed_fetches=3)
+    config = mock.Mock()
+    config.emulator_launcher.emulator_console_port = 5556
+    env._env._coordinator = mock.Mock()
+    env._env._coordinator._simulator._config = config
+    standby = mock.Mock()
+    standby.env.accumulate_new_extras.return_value = {
+        'accessibility_tree': ['standby']
+    }
+    standby._forest_monitor = None
+    mock_get_controller.return_value = standby
+    env.start_standby()
+
+    forest = env.get_a11y_forest()
+    env.close()
+
+    self.assertEqual(forest, 'standby')
+    self.assertIs(env.env, standby.env)
+    standby.connect_a11y_stream.assert_called_once()
+    self.assertEqual(
+        self._recovered_tiers(env),
+        [
+            ('restart_stream', False),
+            ('restart_service', False),
+            ('standby_controller', True),
+        ],
+    )
+    mock_get_controller.assert_called_with(
+        console_port=5556,
+        adb_path=mock.ANY,
+        grpc_port=mock.ANY,
+        connect_a11y_forwarder=False,
+    )
+
+  def test_initialization_without_connecting_a11y_forwarder(self):
+    mock_env = mock.Mock(spec=env_interface.AndroidEnvInterface)
+
+    env = android_world_controller.AndroidWorldController(
+        mock_env, connect_a11y_forwarder=False
+    )
+
+    self.mock_a11y_wrapper.assert_called_with(
+        mock_env,
+        install_a11y_forwarding=False,
+        start_a11y_service=False,
+        enable_a11y_tree_info=False,
+        latest_a11y_info_only=True,
+    )
+    env._env.reset.assert_not_called()
+
+  @mock.patch.object(
+      android_world_controller.AndroidWorldController, 'refresh_env'
+  )
+  def test_refresh_env(self, mock_refresh_env):
+    env = self._create_recovering_controller(num_failed_fetches=3)
+
+    forest = env.get_a11y_forest()
+
+    self.assertEqual(forest, 'success')
+    mock_refresh_env.assert_called_once()
+    self.assertEqual(
+        self._recovered_tiers(env),
+        [
+            ('restart_stream', False),
+            ('restart_service', False),
+            ('full_reload', True),
+        ],
+    )
+
   @mock.patch.object(
       android_world_controller.AndroidWorldController, 'refresh_env'
   )
-  def test_refresh_env(
-      self,
-      mock_refresh_env,
-      mock_has_wrapper,
-      mock_get_controller,
-      mock_check_airplane_mode,
+  def test_refresh_env_after_adb_errors(self, mock_refresh_env):
+    env = self._create_recovering_controller(num_failed_fetches=1)
+    env._env.execute_adb_call.side_effect = errors.AdbControllerError(
+        'adb is unreachable'
+    )
+
+    forest = env.get_a11y_forest()
+
+    self.assertEqual(forest, 'success')
+    mock_refresh_env.assert_called_once()
+    self.assertEqual(
+        self._recovered_tiers(env),
+        [
+            ('restart_stream', False),
+            ('restart_service', False),
+            ('full_reload', True),
+        ],
+    )
+
+  @mock.patch.object(time, 'sleep')
+  @mock.patch.object(adb_utils, 'check_airplane_mode')
+  @mock.patch.object(android_world_controller, '_has_wrapper')
+  def test_get_a11y_forest_caches_airplane_mode(
+      self, mock_has_wrapper, mock_check_airplane_mode, mock_sleep
   ):
-    del mock_has_wrapper, mock_get_controller, mock_check_airplane_mode
+    del mock_has_wrapper, mock_sleep
+    mock_check_airplane_mode.return_value = False
+    mock_base_env = mock.Mock(spec=env_interface.AndroidEnvInterface)
+    env = android_world_controller.AndroidWorldController(mock_base_env)
+    env._env.accumulate_new_extras.return_value = {
+        'accessibility_tree': ['forest']
+    }
+
+    env.get_a11y_forest()
+    env.get_a11y_forest()
+    self.assertEqual(mock_check_airplane_mode.call_count, 1)
+
+    adb_utils.toggle_airplane_mode('off', env)
+    env.get_a11y_forest()
+    self.assertEqual(mock_check_airplane_mode.call_count, 2)
+    self.assertEqual(env.network_state.num_checks, 2)
+
+  @mock.patch.object(time, 'sleep')
+  @mock.patch.object(adb_utils, 'check_airplane_mode')
+  @mock.patch.object(android_world_controller, '_has_wrapper')
+  def test_get_a11y_forest_checks_airplane_mode_on_failure(
+      self, mock_has_wrapper, mock_check_airplane_mode, mock_sleep
+  ):
+    del mock_has_wrapper, mock_sleep
+    mock_check_airplane_mode.side_effect = [False, True]
     mock_base_env = mock.Mock(spec=env_interface.AndroidEnvInterface)
     env = android_world_controller.AndroidWorldController(mock_base_env)
-    unused_mock_check_airplane_mode = False
     env._env.accumulate_new_extras.side_effect = [
         {},
-        {},
-        {},
-        {},
-        {},
-        {'accessibility_tree': ['success']},
+        {'accessibility_tree': ['forest']},
     ]
+    env.network_state.airplane_mode_on(env._env)
 
-    forest = env.get_a11y_forest()
+    self.assertEqual(env.get_a11y_forest(), 'forest')
+    self.assertEqual(mock_check_airplane_mode.call_count, 2)
+    env._env.attempt_enable_networking.assert_called_once()
 
-    self.assertEqual(forest, 'success')
-    mock_refresh_env.assert_called_once()
+  def test_network_state_refreshes_on_timer(self):
+    now = 0.0
+    watcher = android_world_controller.NetworkStateWatcher(
+        refresh_interval_sec=10.0, clock=lambda: now
+    )
+    with mock.patch.object(
+        adb_utils, 'check_airplane_mode', return_value=False
+    ) as mock_check:
+      watcher.airplane_mode_on(mock.Mock())
+      now = 5.0
+      watcher.airplane_mode_on(mock.Mock())
+      self.assertEqual(mock_check.call_count, 1)
+      now = 10.0
+      watcher.airplane_mode_on(mock.Mock())
+      self.assertEqual(mock_check.call_count, 2)
+
+  @mock.patch.object(adb_utils, 'uiautomator_dump')
+  @mock.patch.object(adb_utils, 'uiautomator_dump_exec_out')
+  def test_get_ui_elements_uiautomator_streaming(
+      self, mock_dump_exec_out, mock_dump
+  ):
+    mock_base_env = mock.Mock(spec=env_interface.AndroidEnvInterface)
+    env = android_world_controller.AndroidWorldController(
+        mock_base_env,
+        a11y_method=android_world_controller.A11yMethod.UIAUTOMATOR_STREAMING,
+    )
+    xml_dump = '<hierarchy><node text="a" bounds="[0,0][1,1]" /></hierarchy>'
+    mock_dump_exec_out.side_effect = [
+        xml_dump.encode(),
+        RuntimeError('No hierarchy.'),
+    ]
+    mock_dump.return_value = xml_dump
+
+    self.assertEqual(env.get_ui_elements()[0].text, 'a')
+    mock_dump.assert_not_called()
+    self.assertEqual(env.get_ui_elements()[0].text, 'a')
+    mock_dump.assert_called_once()
+
+  def test_step_without_ui_steps_unwrapped_env(self):
+    mock_base_env = mock.Mock(spec=env_interface.AndroidEnvInterface)
+    env = android_world_controller.AndroidWorldController(mock_base_env)
+
+    timestep = env.step_without_ui({'action_type': 0})
+
+    self.assertIs(timestep, mock_base_env.step.return_value)
+    mock_base_env.step.assert_called_once_with({'action_type': 0})
+    env._env.step.assert_not_called()
+    env._env.accumulate_new_extras.assert_not_called()
 
   def test_pull_file(self):
     file_contents = 'test file contents'
@@ -173,7 +690,7 @@ class AndroidWorldControllerTest(absltest.TestCase):
       self.assertEqual(open(remote_file_path, 'r').read(), local_file.read())
 
     self.mock_copy_db.assert_called_once_with(
-        os.path.dirname(remote_file_path), env._env, None
+        os.path.dirname(remote_file_path), env, None
     )
 
   def test_push_file(self):
@@ -188,6 +705,25 @@ class AndroidWorldControllerTest(absltest.TestCase):
 
     self.assertEqual(open(remote_file_path, 'r').read(), new_file_contents)
 
+  def test_execute_adb_call_uses_adb_client(self):
+    mock_base_env = mock.Mock(spec=env_interface.AndroidEnvInterface)
+    env = android_world_controller.AndroidWorldController(mock_base_env)
+    env.adb_client = mock.create_autospec(adb_wire.AdbWireClient)
+    wire_response = fake_adb_responses.create_successful_generic_response('1')
+    env.adb_client.execute_adb_call.side_effect = [wire_response, None]
+    request = adb_pb2.AdbRequest(
+        generic=adb_pb2.AdbRequest.GenericRequest(args=['shell', 'ls'])
+    )
+
+    self.assertIs(env.execute_adb_call(request), wire_response)
+    env._env.execute_adb_call.assert_not_called()
+    # Requests the client does not handle go through AndroidEnv.
+    self.assertIs(
+        env.execute_adb_call(request),
+        env._env.execute_adb_call.return_value,
+    )
+    env._env.execute_adb_call.assert_called_once_with(request)
+
 
 if __name__ == '__main__':
   absltest.main()
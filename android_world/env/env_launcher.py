@@ -29,12 +29,23 @@ _ANDROID_WORLD_API_LEVEL = 33
 
 
 def _get_env(
-    console_port: int, adb_path: str, grpc_port: int
+    console_port: int,
+    adb_path: str,
+    grpc_port: int,
+    use_adb_wire_client: bool = False,
+    concurrent_observations: bool = False,
+    warm_standby: bool = False,
 ) -> interface.AsyncEnv:
   """Creates an AsyncEnv by connecting to an existing Android environment."""
   controller = android_world_controller.get_controller(
-      console_port, adb_path, grpc_port
+      console_port,
+      adb_path,
+      grpc_port,
+      use_adb_wire_client=use_adb_wire_client,
+      warm_standby=warm_standby,
   )
+  if concurrent_observations:
+    return interface.AioEnvSyncAdapter(interface.AioAndroidEnv(controller))
   return interface.AsyncAndroidEnv(controller)
 
 
@@ -94,6 +105,9 @@ def load_and_setup_env(
     freeze_datetime: bool = True,
     adb_path: str = android_world_controller.DEFAULT_ADB_PATH,
     grpc_port: int = 8554,
+    use_adb_wire_client: bool = False,
+    concurrent_observations: bool = False,
+    warm_standby: bool = False,
 ) -> interface.AsyncEnv:
   """Create environment with `get_env()` and perform env setup and validation.
 
@@ -113,10 +127,23 @@ def load_and_setup_env(
       2023, to ensure consistent benchmarking.
     adb_path: The location of the adb binary.
     grpc_port: The port for gRPC communication with the emulator.
+    use_adb_wire_client: Whether to send shell commands and file transfers to
+      the ADB server over pooled connections instead of spawning `adb`.
+    concurrent_observations: Whether to capture the screenshot and the UI tree
+      of each observation concurrently; see `interface.AioAndroidEnv`.
+    warm_standby: Whether to keep a second controller warm in the background
+      to recover quickly from a lost a11y connection.
 
   Returns:
     An interactable Android environment.
   """
-  env = _get_env(console_port, adb_path, grpc_port)
+  env = _get_env(
+      console_port,
+      adb_path,
+      grpc_port,
+      use_adb_wire_client,
+      concurrent_observations,
+      warm_standby,
+  )
   setup_env(env, emulator_setup, freeze_datetime)
   return env
@@ -56,7 +56,9 @@ class EnvLauncherTest(absltest.TestCase):
             ),
         )
     )
-    mock_controller.assert_called_with(mock_android_env)
+    mock_controller.assert_called_with(
+        mock_android_env, connect_a11y_forwarder=True
+    )
     mock_async_android_env.assert_called_with(mock_controller.return_value)
 
 
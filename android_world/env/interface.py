@@ -15,19 +15,102 @@
 """Environment interface for real-time interaction Android."""
 
 import abc
+import asyncio
+from collections.abc import Sequence
+import concurrent.futures
 import dataclasses
+import itertools
+import threading
 import time
-from typing import Any, Optional, Self
+from typing import Any, Awaitable, Optional, Self, TypeVar
 
+from absl import logging
 from android_env.components import action_type
 from android_world.env import actuation
 from android_world.env import adb_utils
 from android_world.env import android_world_controller
 from android_world.env import json_action
 from android_world.env import representation_utils
+from android_world.env import screen_stability
+from android_world.env import screenshot_buffer
 import dm_env
 import numpy as np
 
+_T = TypeVar('_T')
+
+# Airplane mode can be toggled from the Settings app and from the quick
+# settings in the notification shade, which System UI draws. System UI also
+# draws the status and navigation bars shown on almost every screen, so its
+# elements only count while the shade is open.
+_SETTINGS_PACKAGE = 'com.android.settings'
+_SYSTEM_UI_PACKAGE = 'com.android.systemui'
+# Substrings of the resource names of views in the expanded shade.
+_SHADE_RESOURCE_MARKERS = (
+    ':id/qs_',
+    ':id/quick_qs',
+    ':id/quick_settings',
+    ':id/notification_panel',
+    ':id/notification_stack_scroller',
+)
+
+
+def _is_shade_element(element: representation_utils.UIElement) -> bool:
+  resource_name = element.resource_name or element.resource_id or ''
+  return element.package_name == _SYSTEM_UI_PACKAGE and any(
+      marker in resource_name for marker in _SHADE_RESOURCE_MARKERS
+  )
+
+
+def _target_element(
+    action: json_action.JSONAction,
+    ui_elements: Sequence[representation_utils.UIElement],
+    screen_elements: Sequence[representation_utils.UIElement],
+) -> Optional[representation_utils.UIElement]:
+  """Returns the element an action acts on, if it targets one."""
+  if action.index is not None:
+    index = int(action.index)
+    return ui_elements[index] if 0 <= index < len(ui_elements) else None
+  if action.x is None or action.y is None:
+    return None
+  # The smallest element under the point is the one that receives the tap.
+  target, target_area = None, float('inf')
+  for element in screen_elements:
+    bbox = element.bbox_pixels
+    if bbox is None or not (
+        bbox.x_min <= action.x <= bbox.x_max
+        and bbox.y_min <= action.y <= bbox.y_max
+    ):
+      continue
+    area = (bbox.x_max - bbox.x_min) * (bbox.y_max - bbox.y_min)
+    if area < target_area:
+      target, target_area = element, area
+  return target
+
+
+def _may_change_network_state(
+    action: json_action.JSONAction,
+    ui_elements: Sequence[representation_utils.UIElement],
+    screen_elements: Sequence[representation_utils.UIElement],
+) -> bool:
+  """Returns whether an action may have toggled airplane mode.
+
+  Args:
+    action: The executed action.
+    ui_elements: The elements that `action.index` refers to.
+    screen_elements: The elements on screen before the action.
+  """
+  shade_open = any(_is_shade_element(e) for e in screen_elements)
+  target = _target_element(action, ui_elements, screen_elements)
+  if target is not None:
+    return target.package_name == _SETTINGS_PACKAGE or (
+        target.package_name == _SYSTEM_UI_PACKAGE and shade_open
+    )
+  # Gestures without a target, e.g. swipes and key presses, act on whatever is
+  # in the foreground.
+  return shade_open or any(
+      e.package_name == _SETTINGS_PACKAGE for e in screen_elements
+  )
+
 
 def _get_no_op_action() -> dict[str, Any]:
   """Creates a no-op action; used to retrieve screen & UI tree."""
@@ -42,17 +125,22 @@ class State:
   """State of the Android environment.
 
   Attributes:
-    pixels: RGB array of current screen.
+    pixels: RGB array of current screen. States served by `AsyncEnv` have a
+      read-only array; use `screenshot_buffer.ScreenshotBuffer` to annotate it.
     forest: Raw UI forest; see android_world_controller.py for more info.
     ui_elements: Processed children and stateful UI elements extracted from
       forest.
     auxiliaries: Additional information about the state.
+    token: Identifies the observation served by the environment. It can be
+      passed back to `AsyncEnv.execute_action` so that index-based actions are
+      resolved against the UI elements of this observation.
   """
 
   pixels: np.ndarray
   forest: Any
   ui_elements: list[representation_utils.UIElement]
   auxiliaries: dict[str, Any] | None = None
+  token: int | None = None
 
   @classmethod
   def create_and_infer_elements(
@@ -134,8 +222,34 @@ class AsyncEnv(abc.ABC):
     """
 
   @abc.abstractmethod
-  def execute_action(self, action: json_action.JSONAction) -> None:
-    """Executes action on the environment."""
+  def execute_action(
+      self,
+      action: json_action.JSONAction,
+      state_token: int | None = None,
+  ) -> None:
+    """Executes action on the environment.
+
+    Args:
+      action: The action to execute.
+      state_token: Token of the `State` the action was chosen from. Element
+        indices in the action refer to `ui_elements` of that state.
+    """
+
+  def wait_for_settle(self, max_wait: float) -> float:
+    """Waits for the screen to settle after the last executed action.
+
+    Implementations may return as soon as the effects of the action have
+    appeared and the screen went quiet; by default this sleeps for `max_wait`.
+
+    Args:
+      max_wait: Maximum time in seconds to wait, e.g. a fixed post-action
+        sleep.
+
+    Returns:
+      The time in seconds spent waiting.
+    """
+    time.sleep(max_wait)
+    return max_wait
 
   @property
   @abc.abstractmethod
@@ -209,16 +323,57 @@ def _process_timestep(timestep: dm_env.TimeStep) -> State:
   )
 
 
+def _state_from_parts(
+    timestep: dm_env.TimeStep,
+    ui_observation: tuple[Any, list[representation_utils.UIElement]],
+) -> State:
+  """Combines a screenshot and a UI observation captured separately."""
+  forest, ui_elements = ui_observation
+  return State(
+      pixels=timestep.observation['pixels'],
+      forest=forest,
+      ui_elements=ui_elements,
+      auxiliaries={},
+  )
+
+
+def _state_hash(state: State) -> int:
+  """Returns the structural hash of a state's UI tree."""
+  if state.forest is not None:
+    return screen_stability.forest_hash(state.forest)
+  return screen_stability.ui_elements_hash(state.ui_elements)
+
+
 class AsyncAndroidEnv(AsyncEnv):
   """Async environment interface using AndroidEnv to communicate with device."""
 
   interaction_cache = ''
 
   def __init__(
-      self, controller: android_world_controller.AndroidWorldController
+      self,
+      controller: android_world_controller.AndroidWorldController,
+      stability_config: screen_stability.StabilityConfig | None = None,
+      capture_executor: concurrent.futures.Executor | None = None,
+      text_entry_config: actuation.TextEntryConfig | None = None,
+      settle_config: screen_stability.SettleConfig | None = None,
   ):
     self._controller = controller
+    # If set, the screenshot is captured on this executor while the UI tree is
+    # fetched, instead of before it.
+    self._capture_executor = capture_executor
     self._prior_state = None
+    self.stability_config = (
+        stability_config or screen_stability.StabilityConfig()
+    )
+    self.text_entry_config = text_entry_config or actuation.TextEntryConfig()
+    self.settle_config = settle_config or screen_stability.SettleConfig()
+    # Last state served to the caller; reused to resolve index-based actions.
+    # Cleared after every executed action since the screen may have changed.
+    self._last_state: State | None = None
+    # State served before the last executed action; the baseline that
+    # `wait_for_settle` compares the screen with.
+    self._pre_action_state: State | None = None
+    self._state_tokens = itertools.count()
     # Variable used to temporarily save interactions between agent and user.
     # Like when agent use answer action to answer user questions, we
     # use this to save the agent response. Or later on when agent has the
@@ -234,18 +389,53 @@ class AsyncAndroidEnv(AsyncEnv):
       adb_utils.press_home_button(self.controller)
     self.interaction_cache = ''
 
-    return _process_timestep(self.controller.reset())
+    return self._serve_state(_process_timestep(self.controller.reset()))
+
+  def _serve_state(self, state: State) -> State:
+    """Stamps a state with a fresh token and remembers it as last served.
+
+    The screenshot is made read-only so that it can be shared, rather than
+    copied, by agents; see `screenshot_buffer`.
+
+    Args:
+      state: The state to serve.
+
+    Returns:
+      The served state.
+    """
+    pixels = state.pixels
+    if isinstance(pixels, np.ndarray):
+      pixels = screenshot_buffer.freeze(pixels)
+    self._last_state = dataclasses.replace(
+        state, pixels=pixels, token=next(self._state_tokens)
+    )
+    return self._last_state
 
   def _get_state(self):
-    return _process_timestep(self.controller.step(_get_no_op_action()))
+    if self._capture_executor is None:
+      return _process_timestep(self.controller.step(_get_no_op_action()))
+    timestep = self._capture_executor.submit(
+        self.controller.step_without_ui, _get_no_op_action()
+    )
+    ui_observation = self.controller.get_ui_observation()
+    return _state_from_parts(timestep.result(), ui_observation)
+
+  def _get_tree_hash(self) -> int:
+    """Returns the hash of the current UI tree, without a screenshot."""
+    return actuation.ui_tree_hash(self.controller)
 
   def _get_stable_state(
       self,
-      stability_threshold: int = 3,
-      sleep_duration: float = 0.5,
-      timeout: float = 6.0,
+      stability_threshold: int | None = None,
+      sleep_duration: float | None = None,
+      timeout: float | None = None,
   ) -> State:
-    """Checks if the UI elements remain stable over a number of checks and returns the state.
+    """Polls the screen until it remains unchanged and returns the state.
+
+    Observations are compared by a structural hash of the UI tree and,
+    optionally, by pixel difference; the poll interval backs off while the
+    screen keeps changing. See `screen_stability.StabilityConfig`. Arguments
+    override the corresponding fields of `self.stability_config`.
 
     Args:
         stability_threshold: Number of consecutive checks where UI elements must
@@ -257,55 +447,167 @@ class AsyncAndroidEnv(AsyncEnv):
     Returns:
         The current state of the UI if stability is achieved within the timeout.
     """
-    if not self._prior_state:
-      self._prior_state = self._get_state()
-    if stability_threshold <= 0:
-      raise ValueError('Stability threshold must be a positive integer.')
-
-    stable_checks = 1
-    start_time = time.time()
-    deadline = start_time + timeout
-
-    while stable_checks < stability_threshold and time.time() < deadline:
+    overrides = {
+        'stability_threshold': stability_threshold,
+        'min_poll_interval': sleep_duration,
+        'timeout': timeout,
+    }
+    config = dataclasses.replace(
+        self.stability_config,
+        **{k: v for k, v in overrides.items() if v is not None},
+    )
+    tracker = screen_stability.StabilityTracker(config)
+    deadline = time.time() + config.timeout
+
+    current_state = None
+    if not config.tree_only_polling:
+      if not self._prior_state:
+        self._prior_state = self._get_state()
+      tracker.observe(
+          _state_hash(self._prior_state), self._prior_state.pixels
+      )
+
+    while not tracker.is_stable and time.time() < deadline:
       iteration_start_time = time.time()
-      current_state = self._get_state()
-
-      if self._prior_state.ui_elements == current_state.ui_elements:
-        stable_checks += 1
-        if stable_checks == stability_threshold:
-          break  # Exit early if stability is achieved.
+      if config.tree_only_polling:
+        tracker.observe(self._get_tree_hash())
       else:
-        stable_checks = 1  # Reset if any change is detected
+        current_state = self._get_state()
+        tracker.observe(_state_hash(current_state), current_state.pixels)
         self._prior_state = current_state
+      if tracker.is_stable:
+        break  # Exit early if stability is achieved.
 
       elapsed_time = time.time() - iteration_start_time
-      remaining_sleep = sleep_duration - elapsed_time
+      remaining_sleep = tracker.poll_interval - elapsed_time
       if remaining_sleep > 0:
         sleep_time = min(remaining_sleep, deadline - time.time())
         if sleep_time > 0:
           time.sleep(sleep_time)
       # If remaining_sleep <= 0, proceed immediately to the next iteration
 
-    return current_state  # pylint: disable=undefined-variable
+    if current_state is None:
+      # Only the tree was polled, or the timeout elapsed before the first poll;
+      # capture the screenshot once now.
+      current_state = self._get_state()
+    return current_state
 
   def get_state(self, wait_to_stabilize: bool = False) -> State:
     if wait_to_stabilize:
-      return self._get_stable_state()
-    return self._get_state()
+      return self._serve_state(self._get_stable_state())
+    return self._serve_state(self._get_state())
+
+  def _screen_signature(
+      self, state: State | None = None
+  ) -> screen_stability.ScreenSignature:
+    """Returns what `wait_for_settle` compares, for `state` or the screen.
+
+    Args:
+      state: A state to describe. The foreground activity is not part of
+        states, so it is left out. If None, the current screen is observed.
+
+    Returns:
+      The signature of the state or screen.
+    """
+    config = self.settle_config
+    activity = None
+    if state is None:
+      if config.use_activity:
+        activity, _ = adb_utils.get_current_activity(self.controller)
+      if config.use_pixels:
+        state = self._get_state()
+      else:
+        return screen_stability.ScreenSignature(
+            tree_hash=self._get_tree_hash(), activity=activity
+        )
+    frame = None
+    if config.use_pixels and isinstance(state.pixels, np.ndarray):
+      frame = screen_stability.downsample_frame(
+          state.pixels, config.downsample_stride
+      )
+    return screen_stability.ScreenSignature(
+        tree_hash=_state_hash(state), frame=frame, activity=activity
+    )
+
+  def wait_for_settle(self, max_wait: float) -> float:
+    """Waits until the screen changed and went quiet, or `max_wait` elapsed.
+
+    The screen is compared with the state served before the last action, by UI
+    tree hash, screenshot difference and foreground activity; see
+    `screen_stability.SettleConfig`.
+
+    Args:
+      max_wait: Maximum time in seconds to wait.
 
-  def execute_action(self, action: json_action.JSONAction) -> None:
+    Returns:
+      The time in seconds spent waiting.
+    """
+    pre_action_state = self._pre_action_state
+    self._pre_action_state = None
+    if not self.settle_config.enabled:
+      return super().wait_for_settle(max_wait)
+    baseline = None
+    if pre_action_state is not None:
+      baseline = self._screen_signature(pre_action_state)
+    return screen_stability.wait_for_settle(
+        self._screen_signature, max_wait, self.settle_config, baseline
+    )
+
+  def _get_action_ui_elements(
+      self, state_token: int | None
+  ) -> list[representation_utils.UIElement]:
+    """Returns the UI elements that action indices refer to.
+
+    The last served state is reused if no action was executed since it was
+    served and it matches `state_token` (or no token is given). Otherwise the
+    state is captured again.
+
+    Args:
+      state_token: Token of the state the action was chosen from.
+
+    Returns:
+      The UI elements to resolve element indices against.
+    """
+    last_state = self._last_state
+    if last_state is not None and state_token in (None, last_state.token):
+      return last_state.ui_elements
+    if state_token is not None:
+      logging.warning(
+          'State token %d is stale; capturing the current state.', state_token
+      )
+    return self.get_state(wait_to_stabilize=False).ui_elements
+
+  def execute_action(
+      self,
+      action: json_action.JSONAction,
+      state_token: int | None = None,
+  ) -> None:
+    self._pre_action_state = None
     if action.action_type == json_action.ANSWER:
       self.interaction_cache = action.text
       if action.text:
         self.display_message(action.text, header='Agent answered:')
       return
-    state = self.get_state(wait_to_stabilize=False)
+    if action.index is not None:
+      ui_elements = self._get_action_ui_elements(state_token)
+      screen_elements = ui_elements
+    else:
+      ui_elements = []
+      screen_elements = (
+          self._last_state.ui_elements if self._last_state is not None else []
+      )
+    self._pre_action_state = self._last_state
+    self._last_state = None
     actuation.execute_adb_action(
         action,
-        state.ui_elements,
+        ui_elements,
         self.logical_screen_size,
         self.controller,
+        self.text_entry_config,
+        self.settle_config,
     )
+    if _may_change_network_state(action, ui_elements, screen_elements):
+      self.controller.invalidate_network_state()
 
   def hide_automation_ui(self) -> None:
     """Hides the coordinates on screen."""
@@ -340,15 +642,199 @@ class AsyncAndroidEnv(AsyncEnv):
 
   @property
   def logical_screen_size(self) -> tuple[int, int]:
-    return adb_utils.get_logical_screen_size(self.controller)
+    return self.controller.device_geometry.logical_screen_size
 
   def close(self) -> None:
     return self.controller.close()
 
   @property
   def orientation(self) -> int:
-    return adb_utils.get_orientation(self.controller)
+    return self.controller.device_geometry.orientation
 
   @property
   def physical_frame_boundary(self) -> tuple[int, int, int, int]:
-    return adb_utils.get_physical_frame_boundary(self.controller)
+    return self.controller.device_geometry.physical_frame_boundary
+
+  @property
+  def geometry_cache_stats(self) -> dict[str, int]:
+    """Returns hit/miss counters of the controller's device geometry cache."""
+    return self.controller.geometry_cache_stats
+
+
+class AioAndroidEnv:
+  """asyncio interface to an Android device.
+
+  Unlike `AsyncAndroidEnv`, the screenshot and the UI tree of an observation
+  are captured concurrently, so an observation takes about as long as the
+  slower of the two. Device I/O runs on worker threads; operations are
+  serialized so that the controller is used by one of them at a time, while
+  the caller is free to do other work, such as LLM calls, in the meantime.
+
+  Usage:
+
+  env = AioAndroidEnv(controller)
+  state = await env.get_state()
+  await env.execute_action(action, state_token=state.token)
+  """
+
+  def __init__(
+      self,
+      controller: android_world_controller.AndroidWorldController,
+      stability_config: screen_stability.StabilityConfig | None = None,
+      text_entry_config: actuation.TextEntryConfig | None = None,
+      settle_config: screen_stability.SettleConfig | None = None,
+  ):
+    self._capture_executor = concurrent.futures.ThreadPoolExecutor(
+        max_workers=1, thread_name_prefix='aio_env_capture'
+    )
+    self._env = AsyncAndroidEnv(
+        controller,
+        stability_config,
+        capture_executor=self._capture_executor,
+        text_entry_config=text_entry_config,
+        settle_config=settle_config,
+    )
+    self._lock = asyncio.Lock()
+
+  @property
+  def env(self) -> AsyncAndroidEnv:
+    """Synchronous environment that shares served states with this one."""
+    return self._env
+
+  @property
+  def controller(self) -> android_world_controller.AndroidWorldController:
+    return self._env.controller
+
+  async def _run(self, awaitable: Awaitable[_T]) -> _T:
+    async with self._lock:
+      return await awaitable
+
+  async def reset(self, go_home: bool = False) -> State:
+    return await self._run(asyncio.to_thread(self._env.reset, go_home))
+
+  async def _get_state(self) -> State:
+    timestep, ui_observation = await asyncio.gather(
+        asyncio.to_thread(
+            self.controller.step_without_ui, _get_no_op_action()
+        ),
+        asyncio.to_thread(self.controller.get_ui_observation),
+    )
+    # pylint: disable-next=protected-access
+    return self._env._serve_state(_state_from_parts(timestep, ui_observation))
+
+  async def get_state(self, wait_to_stabilize: bool = False) -> State:
+    """Gets the state of the environment; see `AsyncEnv.get_state`."""
+    if wait_to_stabilize:
+      # Each poll of the stability check still captures concurrently.
+      return await self._run(asyncio.to_thread(self._env.get_state, True))
+    return await self._run(self._get_state())
+
+  async def execute_action(
+      self,
+      action: json_action.JSONAction,
+      state_token: int | None = None,
+  ) -> None:
+    """Executes action on the environment; see `AsyncEnv.execute_action`."""
+    await self._run(
+        asyncio.to_thread(self._env.execute_action, action, state_token)
+    )
+
+  async def wait_for_settle(self, max_wait: float) -> float:
+    """Waits for the screen to settle; see `AsyncEnv.wait_for_settle`."""
+    return await self._run(
+        asyncio.to_thread(self._env.wait_for_settle, max_wait)
+    )
+
+  def close(self) -> None:
+    self._capture_executor.shutdown()
+    self._env.close()
+
+
+class AioEnvSyncAdapter(AsyncEnv):
+  """Exposes an `AioAndroidEnv` through the synchronous `AsyncEnv` interface.
+
+  Coroutines run on an event loop owned by the adapter, so that existing agents
+  work unchanged, from any thread, and still get concurrent observations.
+  """
+
+  def __init__(self, aio_env: AioAndroidEnv):
+    self._aio_env = aio_env
+    self._loop = asyncio.new_event_loop()
+    self._thread = threading.Thread(
+        target=self._loop.run_forever, name='aio_env_loop', daemon=True
+    )
+    self._thread.start()
+
+  def _run(self, awaitable: Awaitable[_T]) -> _T:
+    return asyncio.run_coroutine_threadsafe(awaitable, self._loop).result()
+
+  @property
+  def aio_env(self) -> AioAndroidEnv:
+    return self._aio_env
+
+  @property
+  def controller(self) -> android_world_controller.AndroidWorldController:
+    return self._aio_env.controller
+
+  def reset(self, go_home: bool = False) -> State:
+    return self._run(self._aio_env.reset(go_home))
+
+  def get_state(self, wait_to_stabilize: bool = False) -> State:
+    return self._run(self._aio_env.get_state(wait_to_stabilize))
+
+  def execute_action(
+      self,
+      action: json_action.JSONAction,
+      state_token: int | None = None,
+  ) -> None:
+    self._run(self._aio_env.execute_action(action, state_token))
+
+  def wait_for_settle(self, max_wait: float) -> float:
+    return self._run(self._aio_env.wait_for_settle(max_wait))
+
+  @property
+  def interaction_cache(self) -> str:
+    return self._aio_env.env.interaction_cache
+
+  @interaction_cache.setter
+  def interaction_cache(self, value: str) -> None:
+    self._aio_env.env.interaction_cache = value
+
+  def hide_automation_ui(self) -> None:
+    self._aio_env.env.hide_automation_ui()
+
+  def display_message(self, message: str, header: str = '') -> None:
+    self._aio_env.env.display_message(message, header)
+
+  def ask_question(
+      self, question: str, timeout_seconds: float = -1.0
+  ) -> str | None:
+    return self._aio_env.env.ask_question(question, timeout_seconds)
+
+  @property
+  def foreground_activity_name(self) -> str:
+    return self._aio_env.env.foreground_activity_name
+
+  @property
+  def device_screen_size(self) -> tuple[int, int]:
+    return self._aio_env.env.device_screen_size
+
+  @property
+  def logical_screen_size(self) -> tuple[int, int]:
+    return self._aio_env.env.logical_screen_size
+
+  @property
+  def orientation(self) -> int:
+    return self._aio_env.env.orientation
+
+  @property
+  def physical_frame_boundary(self) -> tuple[int, int, int, int]:
+    return self._aio_env.env.physical_frame_boundary
+
+  def close(self) -> None:
+    try:
+      self._aio_env.close()
+    finally:
+      self._loop.call_soon_threadsafe(self._loop.stop)
+      self._thread.join()
+      self._loop.close()
@@ -12,14 +12,37 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
+import concurrent.futures
+import threading
 from unittest import mock
 
 from absl.testing import absltest
+from android_world.env import actuation
+from android_world.env import android_world_controller
 from android_world.env import interface
+from android_world.env import json_action
 from android_world.env import representation_utils
+from android_world.env import screen_stability
+import dm_env
 import numpy as np
 
 
+class _FakeClock:
+  """Deterministic replacement for time.time and time.sleep."""
+
+  def __init__(self):
+    self.now = 0.0
+    self.sleeps = []
+
+  def time(self) -> float:
+    return self.now
+
+  def sleep(self, seconds: float) -> None:
+    self.sleeps.append(round(seconds, 6))
+    self.now += seconds
+
+
 class InterfaceTest(absltest.TestCase):
 
   @mock.patch("time.sleep", return_value=None)
@@ -55,12 +78,18 @@ class InterfaceTest(absltest.TestCase):
         for elem in changing_ui_elements
     ]
     env._get_state = mock.MagicMock(side_effect=states)
-    self.assertEqual(
-        env._get_stable_state(
-            stability_threshold=3, sleep_duration=0.1, timeout=0.41
-        ),
-        states[5],
-    )
+    clock = _FakeClock()
+    with mock.patch("time.time", clock.time), mock.patch(
+        "time.sleep", clock.sleep
+    ):
+      state = env._get_stable_state(
+          stability_threshold=3, sleep_duration=0.2, timeout=1.0
+      )
+
+    # The poll interval doubles every time the screen changes: polls happen at
+    # 0.0 and 0.4 seconds, then the wait is cut short by the timeout.
+    self.assertIs(state, states[2])
+    self.assertEqual(clock.sleeps, [0.4, 0.6])
 
   @mock.patch("time.sleep", return_value=None)
   def test_stability_fluctuates(self, unused_mocked_time_sleep):
@@ -87,5 +116,317 @@ class InterfaceTest(absltest.TestCase):
     )
 
 
+  def test_tree_only_polling_captures_screenshot_once(self):
+    controller = mock.MagicMock()
+    controller.a11y_method = (
+        android_world_controller.A11yMethod.A11Y_FORWARDER_APP
+    )
+    env = interface.AsyncAndroidEnv(
+        controller,
+        stability_config=screen_stability.StabilityConfig(
+            tree_only_polling=True
+        ),
+    )
+    state = interface.State(
+        ui_elements=[], pixels=np.empty([1, 2, 3]), forest=None
+    )
+    env._get_state = mock.MagicMock(return_value=state)
+    clock = _FakeClock()
+    with mock.patch.object(
+        screen_stability, "forest_hash", side_effect=[1, 2, 2, 2]
+    ), mock.patch("time.time", clock.time), mock.patch(
+        "time.sleep", clock.sleep
+    ):
+      result = env._get_stable_state()
+
+    self.assertIs(result, state)
+    self.assertEqual(controller.get_a11y_forest.call_count, 4)
+    env._get_state.assert_called_once()
+
+
+class ExecuteActionTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.mock_execute_adb_action = self.enter_context(
+        mock.patch.object(actuation, "execute_adb_action")
+    )
+    self.env = interface.AsyncAndroidEnv(mock.MagicMock())
+    self.states = [
+        interface.State(
+            ui_elements=[representation_utils.UIElement(text=f"Element{i}")],
+            pixels=np.empty([1, 2, 3]),
+            forest=None,
+        )
+        for i in range(2)
+    ]
+    self.env._get_state = mock.MagicMock(side_effect=self.states)
+
+  def test_served_pixels_are_read_only(self):
+    state = self.env.get_state()
+
+    self.assertFalse(state.pixels.flags.writeable)
+    self.assertTrue(self.states[0].pixels.flags.writeable)
+
+  def test_served_states_carry_distinct_tokens(self):
+    first = self.env.get_state()
+    second = self.env.get_state()
+
+    self.assertIsNotNone(first.token)
+    self.assertNotEqual(first.token, second.token)
+
+  def test_index_action_reuses_last_served_state(self):
+    state = self.env.get_state()
+
+    self.env.execute_action(
+        json_action.JSONAction(action_type="click", index=0),
+        state_token=state.token,
+    )
+
+    self.env._get_state.assert_called_once()
+    self.assertEqual(
+        self.mock_execute_adb_action.call_args[0][1], state.ui_elements
+    )
+
+  def test_stale_token_recaptures_state(self):
+    state = self.env.get_state()
+    self.env.execute_action(
+        json_action.JSONAction(action_type="click", index=0),
+        state_token=state.token,
+    )
+
+    self.env.execute_action(
+        json_action.JSONAction(action_type="click", index=0),
+        state_token=state.token,
+    )
+
+    self.assertEqual(self.env._get_state.call_count, 2)
+    self.assertEqual(
+        self.mock_execute_adb_action.call_args[0][1],
+        self.states[1].ui_elements,
+    )
+
+  def test_action_without_index_does_not_capture_state(self):
+    self.env.execute_action(json_action.JSONAction(action_type="navigate_home"))
+
+    self.env._get_state.assert_not_called()
+    self.mock_execute_adb_action.assert_called_once()
+
+  def _serve_screen(self, ui_elements):
+    self.states[0] = interface.State(
+        ui_elements=ui_elements,
+        pixels=np.empty([1, 2, 3]),
+        forest=None,
+    )
+    self.env._get_state = mock.MagicMock(side_effect=self.states)
+    return self.env.get_state()
+
+  def test_quick_settings_action_invalidates_network_state(self):
+    self._serve_screen([
+        representation_utils.UIElement(
+            package_name="com.android.systemui",
+            resource_name="com.android.systemui:id/quick_settings_panel",
+            bbox_pixels=representation_utils.BoundingBox(0, 100, 0, 100),
+        ),
+        representation_utils.UIElement(
+            text="Airplane mode",
+            package_name="com.android.systemui",
+            bbox_pixels=representation_utils.BoundingBox(0, 10, 0, 10),
+        ),
+    ])
+
+    self.env.execute_action(
+        json_action.JSONAction(action_type="click", x=1, y=1)
+    )
+
+    self.env.controller.invalidate_network_state.assert_called_once()
+
+  def test_settings_app_action_invalidates_network_state(self):
+    state = self._serve_screen([
+        representation_utils.UIElement(
+            text="Airplane mode", package_name="com.android.settings"
+        )
+    ])
+
+    self.env.execute_action(
+        json_action.JSONAction(action_type="click", index=0),
+        state_token=state.token,
+    )
+
+    self.env.controller.invalidate_network_state.assert_called_once()
+
+  def test_app_action_keeps_network_state(self):
+    # The status and navigation bars are System UI elements on most screens.
+    state = self._serve_screen([
+        representation_utils.UIElement(
+            text="Save", package_name="com.example.app"
+        ),
+        representation_utils.UIElement(
+            package_name="com.android.systemui",
+            resource_name="com.android.systemui:id/status_bar",
+        ),
+        representation_utils.UIElement(
+            content_description="Home",
+            package_name="com.android.systemui",
+            resource_name="com.android.systemui:id/home",
+        ),
+    ])
+
+    self.env.execute_action(
+        json_action.JSONAction(action_type="click", index=0),
+        state_token=state.token,
+    )
+
+    self.env.controller.invalidate_network_state.assert_not_called()
+
+
+class WaitForSettleTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.enter_context(mock.patch.object(actuation, "execute_adb_action"))
+    self.clock = _FakeClock()
+    self.enter_context(mock.patch("time.time", self.clock.time))
+    self.enter_context(mock.patch("time.sleep", self.clock.sleep))
+
+  def _state(self, text: str) -> interface.State:
+    return interface.State(
+        ui_elements=[representation_utils.UIElement(text=text)],
+        pixels=np.zeros([16, 16, 3], dtype=np.uint8),
+        forest=None,
+    )
+
+  def _env(self, **settle_kwargs) -> interface.AsyncAndroidEnv:
+    return interface.AsyncAndroidEnv(
+        mock.MagicMock(),
+        settle_config=screen_stability.SettleConfig(
+            quiet_window=0.5,
+            poll_interval=0.25,
+            use_activity=False,
+            **settle_kwargs,
+        ),
+    )
+
+  def test_returns_once_screen_changed_and_went_quiet(self):
+    env = self._env()
+    before, after = self._state("Before"), self._state("After")
+    env._get_state = mock.MagicMock(
+        side_effect=[before, before, after, after, after, after]
+    )
+    state = env.get_state()
+    env.execute_action(
+        json_action.JSONAction(action_type="click", index=0),
+        state_token=state.token,
+    )
+
+    waited = env.wait_for_settle(3.0)
+
+    # The screen changed at 0.25 s, the second poll, and stayed unchanged for
+    # the quiet window.
+    self.assertEqual(waited, 0.75)
+
+  def test_unchanged_screen_settles_after_no_change_timeout(self):
+    env = self._env(no_change_timeout=1.0)
+    before = self._state("Before")
+    env._get_state = mock.MagicMock(return_value=before)
+    state = env.get_state()
+    env.execute_action(
+        json_action.JSONAction(action_type="click", index=0),
+        state_token=state.token,
+    )
+
+    self.assertEqual(env.wait_for_settle(3.0), 1.0)
+
+  def test_disabled_sleeps_max_wait(self):
+    env = self._env(enabled=False)
+    env._get_state = mock.MagicMock()
+
+    self.assertEqual(env.wait_for_settle(2.0), 2.0)
+    self.assertEqual(self.clock.sleeps, [2.0])
+    env._get_state.assert_not_called()
+
+
+
+def _concurrent_capture_controller() -> mock.MagicMock:
+  """Returns a controller whose screenshot and UI fetches must overlap."""
+  # Each fetch waits for the other one to start, so the barrier breaks, and the
+  # fetch raises, unless both run at the same time.
+  barrier = threading.Barrier(2, timeout=5)
+  controller = mock.MagicMock()
+
+  def step_without_ui(unused_action):
+    barrier.wait()
+    return dm_env.transition(
+        reward=0.0, observation={"pixels": np.zeros([2, 2, 3])}
+    )
+
+  def get_ui_observation():
+    barrier.wait()
+    return None, [representation_utils.UIElement(text="Element")]
+
+  controller.step_without_ui.side_effect = step_without_ui
+  controller.get_ui_observation.side_effect = get_ui_observation
+  return controller
+
+
+class ConcurrentCaptureTest(absltest.TestCase):
+
+  def test_async_android_env_with_capture_executor(self):
+    executor = self.enter_context(concurrent.futures.ThreadPoolExecutor(1))
+    env = interface.AsyncAndroidEnv(
+        _concurrent_capture_controller(), capture_executor=executor
+    )
+
+    state = env.get_state()
+
+    self.assertEqual(state.ui_elements[0].text, "Element")
+    self.assertEqual(state.pixels.shape, (2, 2, 3))
+    env.controller.step.assert_not_called()
+
+  def test_aio_env_get_state(self):
+    env = interface.AioAndroidEnv(_concurrent_capture_controller())
+    self.addCleanup(env.close)
+
+    state = asyncio.run(env.get_state())
+
+    self.assertEqual(state.ui_elements[0].text, "Element")
+    self.assertFalse(state.pixels.flags.writeable)
+    self.assertIsNotNone(state.token)
+
+  @mock.patch.object(actuation, "execute_adb_action")
+  def test_aio_env_execute_action(self, mock_execute_adb_action):
+    env = interface.AioAndroidEnv(_concurrent_capture_controller())
+    self.addCleanup(env.close)
+
+    async def step():
+      state = await env.get_state()
+      await env.execute_action(
+          json_action.JSONAction(action_type="click", index=0),
+          state_token=state.token,
+      )
+      return state
+
+    state = asyncio.run(step())
+
+    self.assertEqual(mock_execute_adb_action.call_args[0][1], state.ui_elements)
+
+  @mock.patch.object(actuation, "execute_adb_action")
+  def test_sync_adapter(self, mock_execute_adb_action):
+    adapter = interface.AioEnvSyncAdapter(
+        interface.AioAndroidEnv(_concurrent_capture_controller())
+    )
+    self.addCleanup(adapter.close)
+
+    state = adapter.get_state()
+    adapter.execute_action(
+        json_action.JSONAction(action_type="click", index=0),
+        state_token=state.token,
+    )
+    adapter.interaction_cache = "answer"
+
+    self.assertEqual(mock_execute_adb_action.call_args[0][1], state.ui_elements)
+    self.assertEqual(adapter.aio_env.env.interaction_cache, "answer")
+
+
 if __name__ == "__main__":
   absltest.main()
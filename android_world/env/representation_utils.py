@@ -14,15 +14,19 @@
 
 """Tools for processing and representing accessibility trees."""
 
+import collections
 import dataclasses
+import io
+import re
 from typing import Any, Optional
 import xml.etree.ElementTree as ET
 from android_env.proto.a11y import android_accessibility_forest_pb2
 
 
-@dataclasses.dataclass
-class BoundingBox:
-  """Class for representing a bounding box."""
+class _BoundingBoxProperties:
+  """Derived geometry shared by `BoundingBox` and `SlotsBoundingBox`."""
+
+  __slots__ = ()
 
   x_min: float | int
   x_max: float | int
@@ -49,6 +53,16 @@ class BoundingBox:
     return self.width * self.height
 
 
+@dataclasses.dataclass
+class BoundingBox(_BoundingBoxProperties):
+  """Class for representing a bounding box."""
+
+  x_min: float | int
+  x_max: float | int
+  y_min: float | int
+  y_max: float | int
+
+
 @dataclasses.dataclass
 class UIElement:
   """Represents a UI element."""
@@ -77,6 +91,76 @@ class UIElement:
   metadata: Optional[dict[str, Any]] = None
 
 
+@dataclasses.dataclass(slots=True)
+class SlotsBoundingBox(_BoundingBoxProperties):
+  """`BoundingBox` stored in `__slots__`, without a per-instance `__dict__`."""
+
+  x_min: float | int
+  x_max: float | int
+  y_min: float | int
+  y_max: float | int
+
+
+@dataclasses.dataclass(slots=True)
+class SlotsUIElement:
+  """`UIElement` stored in `__slots__`, without a per-instance `__dict__`.
+
+  Has the same fields as `UIElement`; use `to_slots` and `from_slots` to
+  convert between the two. Instances do not compare equal to `UIElement`s.
+  """
+
+  text: Optional[str] = None
+  content_description: Optional[str] = None
+  class_name: Optional[str] = None
+  bbox: Optional[SlotsBoundingBox] = None
+  bbox_pixels: Optional[SlotsBoundingBox] = None
+  hint_text: Optional[str] = None
+  is_checked: Optional[bool] = None
+  is_checkable: Optional[bool] = None
+  is_clickable: Optional[bool] = None
+  is_editable: Optional[bool] = None
+  is_enabled: Optional[bool] = None
+  is_focused: Optional[bool] = None
+  is_focusable: Optional[bool] = None
+  is_long_clickable: Optional[bool] = None
+  is_scrollable: Optional[bool] = None
+  is_selected: Optional[bool] = None
+  is_visible: Optional[bool] = None
+  package_name: Optional[str] = None
+  resource_name: Optional[str] = None
+  tooltip: Optional[str] = None
+  resource_id: Optional[str] = None
+  metadata: Optional[dict[str, Any]] = None
+
+
+def to_slots(element: UIElement) -> SlotsUIElement:
+  """Converts a UIElement to its `__slots__` variant."""
+  values = {
+      field.name: getattr(element, field.name)
+      for field in dataclasses.fields(UIElement)
+  }
+  for key in ('bbox', 'bbox_pixels'):
+    if values[key] is not None:
+      bbox = values[key]
+      values[key] = SlotsBoundingBox(
+          bbox.x_min, bbox.x_max, bbox.y_min, bbox.y_max
+      )
+  return SlotsUIElement(**values)
+
+
+def from_slots(element: SlotsUIElement) -> UIElement:
+  """Converts a `__slots__` UI element back to a UIElement."""
+  values = {
+      field.name: getattr(element, field.name)
+      for field in dataclasses.fields(SlotsUIElement)
+  }
+  for key in ('bbox', 'bbox_pixels'):
+    if values[key] is not None:
+      bbox = values[key]
+      values[key] = BoundingBox(bbox.x_min, bbox.x_max, bbox.y_min, bbox.y_max)
+  return UIElement(**values)
+
+
 def accessibility_node_to_ui_element(
     node: Any,
     screen_size: Optional[tuple[int, int]] = None,
@@ -155,12 +239,128 @@ def forest_to_ui_elements(
   elements = []
   for window in forest.windows:
     for node in window.tree.nodes:
-      if not node.child_ids or node.content_description or node.is_scrollable:
-        if exclude_invisible_elements and not node.is_visible_to_user:
+      if _is_ui_element_node(node, exclude_invisible_elements):
+        elements.append(accessibility_node_to_ui_element(node, screen_size))
+  return elements
+
+
+def _is_ui_element_node(node: Any, exclude_invisible_elements: bool) -> bool:
+  """Returns whether `forest_to_ui_elements` converts the node."""
+  if node.child_ids and not node.content_description and not node.is_scrollable:
+    return False
+  return node.is_visible_to_user or not exclude_invisible_elements
+
+
+@dataclasses.dataclass(frozen=True)
+class UIElementsDiff:
+  """Difference between the UI elements of two consecutive forests.
+
+  Attributes:
+    added: Elements of nodes that were not in the previous forest.
+    removed: Elements of nodes that are no longer in the forest.
+    changed: (previous, current) element pairs of nodes whose element changed.
+  """
+
+  added: list[UIElement] = dataclasses.field(default_factory=list)
+  removed: list[UIElement] = dataclasses.field(default_factory=list)
+  changed: list[tuple[UIElement, UIElement]] = dataclasses.field(
+      default_factory=list
+  )
+
+  @property
+  def is_empty(self) -> bool:
+    return not (self.added or self.removed or self.changed)
+
+
+class IncrementalForestConverter:
+  """Converts consecutive forests to UI elements, reusing unchanged elements.
+
+  Nodes are identified by their window id and the unique id assigned by the
+  a11y forwarder app; a hash of the serialized node detects content changes.
+  Elements of nodes whose content did not change since the previous call are
+  returned as-is instead of being rebuilt, so callers must not modify them.
+  """
+
+  def __init__(self):
+    # Maps (window id, node id, occurrence) to (content hash, element). The
+    # occurrence disambiguates nodes sharing an id, e.g. when ids are unset.
+    self._elements: dict[tuple[int, int, int], tuple[int, UIElement]] = {}
+    self._screen_size: Optional[tuple[int, int]] = None
+    self._exclude_invisible_elements = False
+    self._reused = 0
+    self._converted = 0
+
+  @property
+  def stats(self) -> dict[str, int]:
+    """Returns the number of reused and converted elements so far."""
+    return {'reused': self._reused, 'converted': self._converted}
+
+  def reset(self) -> None:
+    """Forgets the previous forest; the next diff reports all as added."""
+    self._elements = {}
+
+  def convert(
+      self,
+      forest: android_accessibility_forest_pb2.AndroidAccessibilityForest | Any,
+      exclude_invisible_elements: bool = False,
+      screen_size: Optional[tuple[int, int]] = None,
+  ) -> tuple[list[UIElement], UIElementsDiff]:
+    """Converts a forest, like `forest_to_ui_elements`.
+
+    Args:
+      forest: The forest to extract nodes from.
+      exclude_invisible_elements: True if invisible elements should not be
+        returned.
+      screen_size: The size of the device screen in pixels (width, height).
+
+    Returns:
+      The UI elements, in the same order as `forest_to_ui_elements`, and their
+      difference with the elements returned by the previous call.
+    """
+    # Cached elements were built for other arguments; keep them for the diff
+    # but do not reuse them.
+    reuse = (
+        screen_size == self._screen_size
+        and exclude_invisible_elements == self._exclude_invisible_elements
+    )
+    self._screen_size = screen_size
+    self._exclude_invisible_elements = exclude_invisible_elements
+
+    elements = []
+    current = {}
+    occurrences = collections.Counter()
+    diff = UIElementsDiff()
+    for window in forest.windows:
+      for node in window.tree.nodes:
+        if not _is_ui_element_node(node, exclude_invisible_elements):
           continue
+        node_id = (window.id, node.unique_id)
+        key = (*node_id, occurrences[node_id])
+        occurrences[node_id] += 1
+        content_hash = hash(node.SerializeToString(deterministic=True))
+        previous_hash, previous = self._elements.get(key, (None, None))
+        if reuse and previous is not None and previous_hash == content_hash:
+          element = previous
+          self._reused += 1
         else:
-          elements.append(accessibility_node_to_ui_element(node, screen_size))
-  return elements
+          element = accessibility_node_to_ui_element(node, screen_size)
+          self._converted += 1
+          if previous is None:
+            diff.added.append(element)
+          elif element == previous:
+            element = previous
+          else:
+            diff.changed.append((previous, element))
+        current[key] = (content_hash, element)
+        elements.append(element)
+
+    diff.removed.extend(
+        element
+        for key, (_, element) in self._elements.items()
+        if key not in current
+    )
+    self._elements = current
+    return elements, diff
 
 
 def _parse_ui_hierarchy(xml_string: str) -> dict[str, Any]:
@@ -217,3 +417,68 @@ def xml_dump_to_ui_elements(xml_string: str) -> list[UIElement]:
 
   process_node(parsed_hierarchy, is_root=True)
   return ui_elements
+
+
+_BOUNDS_PATTERN = re.compile(r'\[(-?\d+),(-?\d+)\]\[(-?\d+),(-?\d+)\]')
+
+
+def _parse_bounds(bounds: Optional[str]) -> Optional[BoundingBox]:
+  """Parses uiautomator bounds of the form `[x_min,y_min][x_max,y_max]`."""
+  if not bounds:
+    return None
+  match = _BOUNDS_PATTERN.fullmatch(bounds)
+  if match is None:
+    return None
+  x_min, y_min, x_max, y_max = map(int, match.groups())
+  return BoundingBox(x_min, x_max, y_min, y_max)
+
+
+def stream_xml_dump_to_ui_elements(xml_dump: bytes | str) -> list[UIElement]:
+  """Converts a uiautomator XML dump to UIElements in a single pass.
+
+  Produces the same elements as `xml_dump_to_ui_elements`, but emits them while
+  the XML is parsed instead of first building a nested dict of the hierarchy.
+
+  Args:
+    xml_dump: The UI hierarchy XML from uiautomator dump.
+
+  Returns:
+    The UI elements, in document order, excluding the root node.
+  """
+  if isinstance(xml_dump, str):
+    xml_dump = xml_dump.encode('utf-8')
+  ui_elements = []
+  depth = 0
+  events = ET.iterparse(io.BytesIO(xml_dump), events=('start', 'end'))
+  for event, node in events:
+    if event == 'end':
+      depth -= 1
+      node.clear()
+      continue
+    depth += 1
+    if depth == 1:
+      continue  # The root node.
+    attributes = node.attrib
+    bbox = _parse_bounds(attributes.get('bounds'))
+    ui_elements.append(
+        UIElement(
+            text=attributes.get('text'),
+            content_description=attributes.get('content-desc'),
+            class_name=attributes.get('class'),
+            bbox=bbox,
+            bbox_pixels=bbox,
+            is_checked=attributes.get('checked') == 'true',
+            is_checkable=attributes.get('checkable') == 'true',
+            is_clickable=attributes.get('clickable') == 'true',
+            is_enabled=attributes.get('enabled') == 'true',
+            is_focused=attributes.get('focused') == 'true',
+            is_focusable=attributes.get('focusable') == 'true',
+            is_long_clickable=attributes.get('long-clickable') == 'true',
+            is_scrollable=attributes.get('scrollable') == 'true',
+            is_selected=attributes.get('selected') == 'true',
+            package_name=attributes.get('package'),
+            resource_id=attributes.get('resource-id'),
+            is_visible=True,
+        )
+    )
+  return ui_elements
@@ -17,6 +17,7 @@ from unittest import mock
 
 from absl.testing import absltest
 from absl.testing import parameterized
+from android_env.proto.a11y import android_accessibility_forest_pb2
 from android_world.env import representation_utils
 
 
@@ -115,5 +116,175 @@ class TestAccessibilityNodeToUIElement(parameterized.TestCase):
     self.assertEqual(ui_element.bbox, expected_normalized_bbox)
 
 
+def _create_forest(
+    texts: dict[int, str],
+) -> android_accessibility_forest_pb2.AndroidAccessibilityForest:
+  """Returns a forest with one visible leaf per (unique id, text) item."""
+  forest = android_accessibility_forest_pb2.AndroidAccessibilityForest()
+  window = forest.windows.add()
+  window.id = 3
+  for unique_id, text in texts.items():
+    node = window.tree.nodes.add()
+    node.unique_id = unique_id
+    node.text = text
+    node.is_visible_to_user = True
+  return forest
+
+
+class IncrementalForestConverterTest(absltest.TestCase):
+
+  def test_matches_forest_to_ui_elements(self):
+    converter = representation_utils.IncrementalForestConverter()
+    forest = _create_forest({1: 'a', 2: 'b'})
+    forest.windows[0].tree.nodes[1].is_visible_to_user = False
+
+    elements, diff = converter.convert(
+        forest, exclude_invisible_elements=True, screen_size=(10, 10)
+    )
+
+    self.assertEqual(
+        elements,
+        representation_utils.forest_to_ui_elements(
+            forest, exclude_invisible_elements=True, screen_size=(10, 10)
+        ),
+    )
+    self.assertEqual(diff.added, elements)
+
+  def test_diff_and_reuse(self):
+    converter = representation_utils.IncrementalForestConverter()
+    first, _ = converter.convert(_create_forest({1: 'a', 2: 'b', 3: 'c'}))
+
+    second, diff = converter.convert(_create_forest({1: 'a', 2: 'B', 4: 'd'}))
+
+    self.assertIs(second[0], first[0])
+    self.assertEqual([e.text for e in diff.added], ['d'])
+    self.assertEqual([e.text for e in diff.removed], ['c'])
+    self.assertEqual(
+        [(old.text, new.text) for old, new in diff.changed], [('b', 'B')]
+    )
+    self.assertEqual(converter.stats, {'reused': 1, 'converted': 5})
+
+  def test_unchanged_forest_has_empty_diff(self):
+    converter = representation_utils.IncrementalForestConverter()
+    converter.convert(_create_forest({1: 'a'}))
+
+    _, diff = converter.convert(_create_forest({1: 'a'}))
+
+    self.assertTrue(diff.is_empty)
+
+  def test_screen_size_change_rebuilds_elements(self):
+    converter = representation_utils.IncrementalForestConverter()
+    converter.convert(_create_forest({1: 'a'}), screen_size=(10, 10))
+
+    elements, _ = converter.convert(
+        _create_forest({1: 'a'}), screen_size=(20, 20)
+    )
+
+    self.assertEqual(converter.stats['converted'], 2)
+    self.assertEqual(
+        elements,
+        representation_utils.forest_to_ui_elements(
+            _create_forest({1: 'a'}), screen_size=(20, 20)
+        ),
+    )
+
+  def test_nodes_without_unique_ids(self):
+    converter = representation_utils.IncrementalForestConverter()
+    forest = _create_forest({1: 'a', 2: 'b'})
+    for node in forest.windows[0].tree.nodes:
+      node.unique_id = 0
+    converter.convert(forest)
+
+    elements, diff = converter.convert(forest)
+
+    self.assertEqual([e.text for e in elements], ['a', 'b'])
+    self.assertTrue(diff.is_empty)
+
+  def test_reset(self):
+    converter = representation_utils.IncrementalForestConverter()
+    converter.convert(_create_forest({1: 'a'}))
+    converter.reset()
+
+    _, diff = converter.convert(_create_forest({1: 'a'}))
+
+    self.assertLen(diff.added, 1)
+
+
+class SlotsVariantsTest(absltest.TestCase):
+
+  def test_round_trip(self):
+    element = representation_utils.UIElement(
+        text='OK',
+        bbox=representation_utils.BoundingBox(0.1, 0.2, 0.3, 0.4),
+        bbox_pixels=representation_utils.BoundingBox(10, 20, 30, 40),
+        is_clickable=True,
+    )
+
+    slots_element = representation_utils.to_slots(element)
+
+    self.assertIsInstance(
+        slots_element.bbox_pixels, representation_utils.SlotsBoundingBox
+    )
+    self.assertEqual(slots_element.bbox_pixels.area, 100)
+    self.assertEqual(representation_utils.from_slots(slots_element), element)
+
+  def test_slots_variants_have_no_dict(self):
+    self.assertFalse(
+        hasattr(representation_utils.SlotsBoundingBox(0, 1, 0, 1), '__dict__')
+    )
+    self.assertFalse(hasattr(representation_utils.SlotsUIElement(), '__dict__'))
+
+  def test_slots_ui_element_has_same_fields(self):
+    self.assertEqual(
+        [f.name for f in dataclasses.fields(representation_utils.UIElement)],
+        [
+            f.name
+            for f in dataclasses.fields(representation_utils.SlotsUIElement)
+        ],
+    )
+
+
+_XML_DUMP = """<?xml version='1.0' encoding='UTF-8' standalone='yes' ?>
+<hierarchy rotation="0">
+  <node index="0" text="" resource-id="" class="android.widget.FrameLayout"
+      package="com.android.settings" content-desc="" checkable="false"
+      checked="false" clickable="false" enabled="true" focusable="false"
+      focused="false" scrollable="true" long-clickable="false" password="false"
+      selected="false" bounds="[0,0][1080,2400]">
+    <node index="0" text="Network &amp; internet"
+        resource-id="android:id/title" class="android.widget.TextView"
+        package="com.android.settings" content-desc="" checkable="false"
+        checked="false" clickable="true" enabled="true" focusable="true"
+        focused="false" scrollable="false" long-clickable="false"
+        password="false" selected="false" bounds="[42,310][1038,-5]" />
+  </node>
+  <node index="1" text="No bounds" class="android.view.View" />
+</hierarchy>"""
+
+
+class StreamXmlDumpToUIElementsTest(absltest.TestCase):
+
+  def test_matches_xml_dump_to_ui_elements(self):
+    self.assertEqual(
+        representation_utils.stream_xml_dump_to_ui_elements(_XML_DUMP),
+        representation_utils.xml_dump_to_ui_elements(_XML_DUMP),
+    )
+
+  def test_parses_bytes(self):
+    elements = representation_utils.stream_xml_dump_to_ui_elements(
+        _XML_DUMP.encode('utf-8')
+    )
+
+    self.assertEqual(
+        [e.text for e in elements], ['', 'Network & internet', 'No bounds']
+    )
+    self.assertEqual(
+        elements[1].bbox_pixels,
+        representation_utils.BoundingBox(42, 1038, 310, -5),
+    )
+    self.assertTrue(elements[0].is_scrollable)
+    self.assertIsNone(elements[2].bbox)
+
+
 if __name__ == '__main__':
   absltest.main()
@@ -0,0 +1,356 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Signals and bookkeeping used to decide when the screen has stabilized."""
+
+from collections.abc import Callable
+import dataclasses
+import time
+from typing import Any, Optional
+
+from android_env.proto.a11y import android_accessibility_forest_pb2
+from android_world.env import representation_utils
+import numpy as np
+
+
+@dataclasses.dataclass(frozen=True)
+class StabilityConfig:
+  """Parameters for waiting on a stable screen.
+
+  Attributes:
+    stability_threshold: Number of consecutive identical observations required
+      to consider the screen stable.
+    min_poll_interval: Time in seconds between polls while the screen is
+      unchanged.
+    max_poll_interval: Upper bound in seconds for the poll interval.
+    backoff_factor: Factor by which the poll interval grows every time the
+      screen is observed to change, so that long animations are not polled at
+      full rate.
+    timeout: Maximum time in seconds to wait for the screen to stabilize.
+    tree_only_polling: If True, only the UI tree is fetched while polling; the
+      screenshot is captured once, after stability is reached.
+    pixel_diff_threshold: If set, consecutive screenshots must also have a mean
+      absolute difference, in [0, 1], of at most this value. Only used when
+      screenshots are captured while polling, i.e. `tree_only_polling` is
+      False.
+    downsample_stride: Stride used to downsample screenshots before computing
+      the pixel difference.
+  """
+
+  stability_threshold: int = 3
+  min_poll_interval: float = 0.5
+  max_poll_interval: float = 1.0
+  backoff_factor: float = 2.0
+  timeout: float = 6.0
+  tree_only_polling: bool = False
+  pixel_diff_threshold: Optional[float] = None
+  downsample_stride: int = 8
+
+
+def _node_signature(node: Any) -> tuple[Any, ...]:
+  bounds = node.bounds_in_screen
+  return (
+      node.class_name,
+      node.text,
+      node.content_description,
+      node.hint_text,
+      node.view_id_resource_name,
+      bounds.left,
+      bounds.top,
+      bounds.right,
+      bounds.bottom,
+      node.is_checked,
+      node.is_enabled,
+      node.is_focused,
+      node.is_selected,
+      node.is_visible_to_user,
+  )
+
+
+def forest_hash(
+    forest: android_accessibility_forest_pb2.AndroidAccessibilityForest | Any,
+) -> int:
+  """Returns a structural hash of an accessibility forest.
+
+  The hash covers the node attributes that are visible to agents (class, text,
+  bounds and state flags), read directly from the proto nodes without building
+  UI elements. It is only meant to be compared within the same process.
+
+  Args:
+    forest: The accessibility forest.
+
+  Returns:
+    The hash of the forest.
+  """
+  return hash(
+      tuple(
+          tuple(_node_signature(node) for node in window.tree.nodes)
+          for window in forest.windows
+      )
+  )
+
+
+def ui_elements_hash(elements: list[representation_utils.UIElement]) -> int:
+  """Returns a structural hash of UI elements; used when no forest exists."""
+
+  def bbox_tuple(bbox):
+    if bbox is None:
+      return None
+    return (bbox.x_min, bbox.x_max, bbox.y_min, bbox.y_max)
+
+  return hash(
+      tuple(
+          (
+              element.class_name,
+              element.text,
+              element.content_description,
+              element.hint_text,
+              element.resource_name,
+              element.resource_id,
+              bbox_tuple(element.bbox_pixels),
+              element.is_checked,
+              element.is_enabled,
+              element.is_focused,
+              element.is_selected,
+              element.is_visible,
+          )
+          for element in elements
+      )
+  )
+
+
+def downsample_frame(pixels: np.ndarray, stride: int) -> np.ndarray:
+  """Returns a strided, grayscale view of an RGB frame as int16."""
+  small = pixels[::stride, ::stride]
+  if small.ndim == 3:
+    small = small.mean(axis=2)
+  return small.astype(np.int16)
+
+
+def frame_difference(previous: np.ndarray, current: np.ndarray) -> float:
+  """Returns the mean absolute difference of two downsampled frames in [0, 1]."""
+  if previous.shape != current.shape:
+    return 1.0
+  return float(np.abs(current - previous).mean()) / 255.0
+
+
+class StabilityTracker:
+  """Tracks consecutive observations of the screen to detect stability.
+
+  Each observation is summarized by a tree hash and, optionally, a downsampled
+  frame. The tracker counts consecutive unchanged observations and adapts the
+  poll interval: it grows by `backoff_factor` while the screen keeps changing
+  and drops back to `min_poll_interval` once it stops, so that stability is
+  confirmed quickly.
+  """
+
+  def __init__(self, config: StabilityConfig):
+    if config.stability_threshold <= 0:
+      raise ValueError('Stability threshold must be a positive integer.')
+    self._config = config
+    self._tree_hash: Optional[int] = None
+    self._frame: Optional[np.ndarray] = None
+    self._stable_checks = 0
+    self._poll_interval = config.min_poll_interval
+
+  @property
+  def stable_checks(self) -> int:
+    return self._stable_checks
+
+  @property
+  def poll_interval(self) -> float:
+    return self._poll_interval
+
+  @property
+  def is_stable(self) -> bool:
+    return self._stable_checks >= self._config.stability_threshold
+
+  def observe(
+      self, tree_hash: int, pixels: Optional[np.ndarray] = None
+  ) -> bool:
+    """Records an observation and returns whether the screen is stable.
+
+    Args:
+      tree_hash: Hash of the UI tree; see `forest_hash` and `ui_elements_hash`.
+      pixels: The screenshot, only used if a pixel difference threshold is
+        configured.
+
+    Returns:
+      True if the last `stability_threshold` observations were unchanged.
+    """
+    frame = None
+    if pixels is not None and self._config.pixel_diff_threshold is not None:
+      frame = downsample_frame(pixels, self._config.downsample_stride)
+
+    is_first = self._tree_hash is None
+    unchanged = not is_first and tree_hash == self._tree_hash
+    if unchanged and frame is not None and self._frame is not None:
+      unchanged = (
+          frame_difference(self._frame, frame)
+          <= self._config.pixel_diff_threshold
+      )
+
+    if unchanged:
+      self._stable_checks += 1
+      self._poll_interval = self._config.min_poll_interval
+    else:
+      self._stable_checks = 1
+      if not is_first:
+        self._poll_interval = min(
+            self._poll_interval * self._config.backoff_factor,
+            self._config.max_poll_interval,
+        )
+    self._tree_hash = tree_hash
+    self._frame = frame
+    return self.is_stable
+
+
+@dataclasses.dataclass(frozen=True)
+class SettleConfig:
+  """Parameters for waiting until the screen settles after an action.
+
+  Attributes:
+    enabled: If False, waits for the screen to settle sleep for their full
+      maximum time instead.
+    quiet_window: Time in seconds the screen must stay unchanged after its
+      last change to be considered settled.
+    no_change_timeout: If set, time in seconds after which the screen is
+      considered settled if it has not changed at all, e.g. because the action
+      had no visible effect. By default, an unchanged screen is waited on until
+      the maximum wait, since some effects, like a cold app start, take a while
+      to show.
+    poll_interval: Minimum time in seconds between observations.
+    use_pixels: Whether to compare screenshots besides the UI tree.
+    pixel_diff_threshold: Mean absolute difference of consecutive screenshots,
+      in [0, 1], above which the screen is considered changed.
+    downsample_stride: Stride used to downsample screenshots before computing
+      the pixel difference.
+    use_activity: Whether to compare the foreground activity besides the UI
+      tree.
+  """
+
+  enabled: bool = True
+  quiet_window: float = 0.5
+  no_change_timeout: Optional[float] = None
+  poll_interval: float = 0.1
+  use_pixels: bool = True
+  pixel_diff_threshold: float = 0.01
+  downsample_stride: int = 8
+  use_activity: bool = True
+
+
+@dataclasses.dataclass(frozen=True)
+class ScreenSignature:
+  """What the settle detector compares between observations.
+
+  Attributes:
+    tree_hash: Hash of the UI tree; see `forest_hash` and `ui_elements_hash`.
+    frame: Downsampled screenshot, see `downsample_frame`, or None if
+      screenshots are not compared.
+    activity: Foreground activity, or None if it is not compared.
+  """
+
+  tree_hash: int
+  frame: Optional[np.ndarray] = None
+  activity: Optional[str] = None
+
+
+class SettleTracker:
+  """Detects when the screen has changed after an action and gone quiet.
+
+  Observations are compared with the previous one, or for the first, with the
+  baseline captured before the action. Without a baseline, the first
+  observation only starts the quiet window, since a change may already have
+  happened.
+  """
+
+  def __init__(
+      self,
+      config: SettleConfig,
+      start_time: float,
+      baseline: Optional[ScreenSignature] = None,
+  ):
+    self._config = config
+    self._start_time = start_time
+    self._previous = baseline
+    self._last_change: Optional[float] = None
+
+  @property
+  def changed(self) -> bool:
+    """Whether a change was observed, or assumed for lack of a baseline."""
+    return self._last_change is not None
+
+  def _differs(self, signature: ScreenSignature) -> bool:
+    previous = self._previous
+    if previous is None:
+      return True
+    if signature.tree_hash != previous.tree_hash:
+      return True
+    if (
+        signature.activity is not None
+        and previous.activity is not None
+        and signature.activity != previous.activity
+    ):
+      return True
+    return (
+        signature.frame is not None
+        and previous.frame is not None
+        and frame_difference(previous.frame, signature.frame)
+        > self._config.pixel_diff_threshold
+    )
+
+  def observe(self, signature: ScreenSignature, now: float) -> bool:
+    """Records an observation and returns whether the screen has settled."""
+    if self._differs(signature):
+      self._last_change = now
+    self._previous = signature
+    if self._last_change is not None:
+      return now - self._last_change >= self._config.quiet_window
+    return (
+        self._config.no_change_timeout is not None
+        and now - self._start_time >= self._config.no_change_timeout
+    )
+
+
+def wait_for_settle(
+    observe: Callable[[], ScreenSignature],
+    max_wait: float,
+    config: SettleConfig,
+    baseline: Optional[ScreenSignature] = None,
+) -> float:
+  """Polls the screen until it settles or `max_wait` elapses.
+
+  Args:
+    observe: Returns the current screen signature.
+    max_wait: Upper bound in seconds, e.g. the fixed sleep this replaces.
+    config: Settle parameters.
+    baseline: Signature of the screen before the action, if known.
+
+  Returns:
+    The time in seconds spent waiting.
+  """
+  start = time.time()
+  deadline = start + max_wait
+  tracker = SettleTracker(config, start, baseline)
+  while time.time() < deadline:
+    poll_start = time.time()
+    if tracker.observe(observe(), time.time()):
+      break
+    sleep_time = min(
+        config.poll_interval - (time.time() - poll_start),
+        deadline - time.time(),
+    )
+    if sleep_time > 0:
+      time.sleep(sleep_time)
+  return time.time() - start
@@ -0,0 +1,276 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import mock
+
+from absl.testing import absltest
+from android_env.proto.a11y import android_accessibility_forest_pb2
+from android_world.env import representation_utils
+from android_world.env import screen_stability
+import numpy as np
+
+
+def _create_forest(
+    text: str, left: int = 0
+) -> android_accessibility_forest_pb2.AndroidAccessibilityForest:
+  forest = android_accessibility_forest_pb2.AndroidAccessibilityForest()
+  node = forest.windows.add().tree.nodes.add()
+  node.class_name = 'android.widget.TextView'
+  node.text = text
+  node.unique_id = 7
+  node.bounds_in_screen.left = left
+  node.bounds_in_screen.right = 100
+  node.bounds_in_screen.bottom = 50
+  node.is_visible_to_user = True
+  return forest
+
+
+class ForestHashTest(absltest.TestCase):
+
+  def test_identical_forests_have_same_hash(self):
+    self.assertEqual(
+        screen_stability.forest_hash(_create_forest('a')),
+        screen_stability.forest_hash(_create_forest('a')),
+    )
+
+  def test_hash_ignores_node_ids(self):
+    other = _create_forest('a')
+    other.windows[0].tree.nodes[0].unique_id = 8
+
+    self.assertEqual(
+        screen_stability.forest_hash(_create_forest('a')),
+        screen_stability.forest_hash(other),
+    )
+
+  def test_text_and_bounds_changes_change_hash(self):
+    base = screen_stability.forest_hash(_create_forest('a'))
+
+    self.assertNotEqual(
+        base, screen_stability.forest_hash(_create_forest('b'))
+    )
+    self.assertNotEqual(
+        base, screen_stability.forest_hash(_create_forest('a', left=10))
+    )
+
+  def test_ui_elements_hash(self):
+    elements = [representation_utils.UIElement(text='a')]
+
+    self.assertEqual(
+        screen_stability.ui_elements_hash(elements),
+        screen_stability.ui_elements_hash(
+            [representation_utils.UIElement(text='a')]
+        ),
+    )
+    self.assertNotEqual(
+        screen_stability.ui_elements_hash(elements),
+        screen_stability.ui_elements_hash(
+            [representation_utils.UIElement(text='b')]
+        ),
+    )
+
+
+class FrameDifferenceTest(absltest.TestCase):
+
+  def test_downsample_frame(self):
+    frame = np.zeros((40, 20, 3), dtype=np.uint8)
+
+    self.assertEqual(screen_stability.downsample_frame(frame, 8).shape, (5, 3))
+
+  def test_frame_difference(self):
+    black = screen_stability.downsample_frame(
+        np.zeros((16, 16, 3), dtype=np.uint8), 4
+    )
+    white = screen_stability.downsample_frame(
+        np.full((16, 16, 3), 255, dtype=np.uint8), 4
+    )
+
+    self.assertEqual(screen_stability.frame_difference(black, black), 0.0)
+    self.assertEqual(screen_stability.frame_difference(black, white), 1.0)
+
+
+class StabilityTrackerTest(absltest.TestCase):
+
+  def test_stable_after_threshold_unchanged_observations(self):
+    tracker = screen_stability.StabilityTracker(
+        screen_stability.StabilityConfig(stability_threshold=3)
+    )
+
+    self.assertFalse(tracker.observe(1))
+    self.assertFalse(tracker.observe(1))
+    self.assertTrue(tracker.observe(1))
+
+  def test_default_unchanged_screen_is_polled_as_before(self):
+    tracker = screen_stability.StabilityTracker(
+        screen_stability.StabilityConfig()
+    )
+
+    tracker.observe(1)
+    tracker.observe(1)
+
+    # Three identical reads 0.5 s apart, as with the fixed poll interval.
+    self.assertEqual(tracker.poll_interval, 0.5)
+    self.assertFalse(tracker.is_stable)
+
+  def test_change_resets_count_and_backs_off(self):
+    tracker = screen_stability.StabilityTracker(
+        screen_stability.StabilityConfig(
+            min_poll_interval=0.25, max_poll_interval=0.6, backoff_factor=2.0
+        )
+    )
+
+    tracker.observe(1)
+    self.assertEqual(tracker.poll_interval, 0.25)
+    tracker.observe(2)
+    self.assertEqual(tracker.poll_interval, 0.5)
+    tracker.observe(3)
+    self.assertEqual(tracker.poll_interval, 0.6)
+    self.assertEqual(tracker.stable_checks, 1)
+    tracker.observe(3)
+    self.assertEqual(tracker.poll_interval, 0.25)
+    self.assertEqual(tracker.stable_checks, 2)
+
+  def test_pixel_difference_breaks_stability(self):
+    tracker = screen_stability.StabilityTracker(
+        screen_stability.StabilityConfig(
+            stability_threshold=2, pixel_diff_threshold=0.01
+        )
+    )
+    black = np.zeros((16, 16, 3), dtype=np.uint8)
+    white = np.full((16, 16, 3), 255, dtype=np.uint8)
+
+    tracker.observe(1, black)
+    self.assertFalse(tracker.observe(1, white))
+    self.assertTrue(tracker.observe(1, white))
+
+  def test_invalid_threshold(self):
+    with self.assertRaises(ValueError):
+      screen_stability.StabilityTracker(
+          screen_stability.StabilityConfig(stability_threshold=0)
+      )
+
+
+class SettleTrackerTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.config = screen_stability.SettleConfig(
+        quiet_window=0.5, no_change_timeout=1.0
+    )
+
+  def test_settles_after_quiet_window_following_change(self):
+    tracker = screen_stability.SettleTracker(
+        self.config, 0.0, screen_stability.ScreenSignature(1)
+    )
+
+    self.assertFalse(tracker.observe(screen_stability.ScreenSignature(1), 0.1))
+    self.assertFalse(tracker.observe(screen_stability.ScreenSignature(2), 0.2))
+    self.assertTrue(tracker.changed)
+    self.assertFalse(tracker.observe(screen_stability.ScreenSignature(3), 0.4))
+    self.assertFalse(tracker.observe(screen_stability.ScreenSignature(3), 0.8))
+    self.assertTrue(tracker.observe(screen_stability.ScreenSignature(3), 0.9))
+
+  def test_no_change_settles_after_timeout(self):
+    tracker = screen_stability.SettleTracker(
+        self.config, 0.0, screen_stability.ScreenSignature(1)
+    )
+
+    self.assertFalse(tracker.observe(screen_stability.ScreenSignature(1), 0.9))
+    self.assertTrue(tracker.observe(screen_stability.ScreenSignature(1), 1.0))
+    self.assertFalse(tracker.changed)
+
+  def test_no_change_does_not_settle_by_default(self):
+    tracker = screen_stability.SettleTracker(
+        screen_stability.SettleConfig(),
+        0.0,
+        screen_stability.ScreenSignature(1),
+    )
+
+    self.assertFalse(tracker.observe(screen_stability.ScreenSignature(1), 5.0))
+
+  def test_without_baseline_first_observation_starts_quiet_window(self):
+    tracker = screen_stability.SettleTracker(self.config, 0.0)
+
+    self.assertFalse(tracker.observe(screen_stability.ScreenSignature(1), 0.1))
+    self.assertTrue(tracker.observe(screen_stability.ScreenSignature(1), 0.6))
+
+  def test_activity_and_frame_changes_count(self):
+    black = np.zeros((4, 4), dtype=np.int16)
+    white = np.full((4, 4), 255, dtype=np.int16)
+    tracker = screen_stability.SettleTracker(
+        self.config,
+        0.0,
+        screen_stability.ScreenSignature(1, black, 'app/.Main'),
+    )
+
+    tracker.observe(
+        screen_stability.ScreenSignature(1, black, 'app/.Main'), 0.1
+    )
+    self.assertFalse(tracker.changed)
+    tracker.observe(
+        screen_stability.ScreenSignature(1, black, 'app/.Detail'), 0.2
+    )
+    self.assertFalse(
+        tracker.observe(
+            screen_stability.ScreenSignature(1, white, 'app/.Detail'), 0.6
+        )
+    )
+    self.assertTrue(
+        tracker.observe(
+            screen_stability.ScreenSignature(1, white, 'app/.Detail'), 1.1
+        )
+    )
+
+
+class WaitForSettleTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.now = 0.0
+
+    def sleep(seconds):
+      self.now += seconds
+
+    self.enter_context(
+        mock.patch.object(screen_stability.time, 'time', lambda: self.now)
+    )
+    self.enter_context(
+        mock.patch.object(screen_stability.time, 'sleep', side_effect=sleep)
+    )
+
+  def test_returns_once_settled(self):
+    hashes = iter([1, 2, 3, 3, 3, 3, 3, 3, 3, 3])
+    observe = lambda: screen_stability.ScreenSignature(next(hashes))
+
+    waited = screen_stability.wait_for_settle(
+        observe,
+        3.0,
+        screen_stability.SettleConfig(quiet_window=0.5, poll_interval=0.25),
+        screen_stability.ScreenSignature(1),
+    )
+
+    self.assertEqual(waited, 1.0)
+
+  def test_max_wait_bounds_changing_screen(self):
+    hashes = iter(range(100))
+    observe = lambda: screen_stability.ScreenSignature(next(hashes))
+
+    waited = screen_stability.wait_for_settle(
+        observe, 2.0, screen_stability.SettleConfig(poll_interval=0.1)
+    )
+
+    self.assertAlmostEqual(waited, 2.0)
+
+
+if __name__ == '__main__':
+  absltest.main()
@@ -0,0 +1,72 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Read-only screenshots that are shared instead of copied.
+
+A 1080x2400 RGB frame is about 7.8 MB. `State.pixels` is a read-only array so
+that agents can store it in step data and pass it to models without copying
+it; a copy is only made when something is drawn on the frame, through
+`ScreenshotBuffer.overlay`.
+"""
+
+import numpy as np
+
+
+def freeze(pixels: np.ndarray) -> np.ndarray:
+  """Returns a read-only view of `pixels`, without copying it.
+
+  Args:
+    pixels: The frame.
+
+  Returns:
+    The frozen frame.
+  """
+  if not pixels.flags.writeable:
+    return pixels
+  frozen = pixels.view()
+  frozen.flags.writeable = False
+  return frozen
+
+
+class ScreenshotBuffer:
+  """A read-only frame with lazily created, writable annotation overlays.
+
+  Each named overlay is a copy of the frame that is created the first time it
+  is requested and shared afterwards, e.g. one overlay with set-of-marks
+  annotations and another one highlighting the target element.
+  """
+
+  def __init__(self, pixels: np.ndarray):
+    self._pixels = freeze(pixels)
+    self._overlays: dict[str, np.ndarray] = {}
+
+  @property
+  def pixels(self) -> np.ndarray:
+    """The unannotated, read-only frame."""
+    return self._pixels
+
+  def overlay(self, name: str = 'default') -> np.ndarray:
+    """Returns the writable overlay `name`, copying the frame on first use."""
+    overlay = self._overlays.get(name)
+    if overlay is None:
+      overlay = self._overlays[name] = self._pixels.copy()
+    return overlay
+
+  def has_overlay(self, name: str = 'default') -> bool:
+    return name in self._overlays
+
+  @property
+  def nbytes(self) -> int:
+    """Bytes held by the frame and all overlays."""
+    return self._pixels.nbytes + sum(o.nbytes for o in self._overlays.values())
@@ -0,0 +1,69 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from absl.testing import absltest
+from android_world.env import screenshot_buffer
+import numpy as np
+
+
+class FreezeTest(absltest.TestCase):
+
+  def test_frame_is_not_copied(self):
+    pixels = np.zeros((4, 2, 3), dtype=np.uint8)
+
+    frozen = screenshot_buffer.freeze(pixels)
+
+    self.assertFalse(frozen.flags.writeable)
+    self.assertTrue(np.shares_memory(frozen, pixels))
+    self.assertTrue(pixels.flags.writeable)
+    with self.assertRaises(ValueError):
+      frozen[0, 0, 0] = 1
+
+  def test_frozen_frame_is_returned_as_is(self):
+    frozen = screenshot_buffer.freeze(np.zeros((4, 2, 3), dtype=np.uint8))
+
+    self.assertIs(screenshot_buffer.freeze(frozen), frozen)
+
+  def test_overlays_of_rgba_views_are_contiguous(self):
+    rgba = np.arange(4 * 2 * 4, dtype=np.uint8).reshape((4, 2, 4))
+    buffer = screenshot_buffer.ScreenshotBuffer(rgba[:, :, :3])
+
+    overlay = buffer.overlay()
+
+    self.assertTrue(np.shares_memory(buffer.pixels, rgba))
+    self.assertTrue(overlay.flags.c_contiguous)
+    np.testing.assert_array_equal(overlay, rgba[:, :, :3])
+
+
+class ScreenshotBufferTest(absltest.TestCase):
+
+  def test_overlays_are_lazy_and_shared(self):
+    buffer = screenshot_buffer.ScreenshotBuffer(
+        np.zeros((4, 2, 3), dtype=np.uint8)
+    )
+    self.assertFalse(buffer.has_overlay('som'))
+    self.assertEqual(buffer.nbytes, 24)
+
+    overlay = buffer.overlay('som')
+    overlay[0, 0, 0] = 255
+
+    self.assertIs(buffer.overlay('som'), overlay)
+    self.assertTrue(buffer.has_overlay('som'))
+    self.assertEqual(buffer.pixels[0, 0, 0], 0)
+    self.assertEqual(buffer.overlay('target')[0, 0, 0], 0)
+    self.assertEqual(buffer.nbytes, 72)
+
+
+if __name__ == '__main__':
+  absltest.main()
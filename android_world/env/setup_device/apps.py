@@ -29,6 +29,7 @@ from android_world.env import interface
 from android_world.env import tools
 from android_world.task_evals.information_retrieval import joplin_app_utils
 from android_world.utils import file_utils
+from android_world.utils import tar_transfer
 import requests
 
 
@@ -96,18 +97,14 @@ class AppSetup(abc.ABC):
       device_path: Location on device to load the files.
       env: Android environment.
     """
-    for file in files:
-      copy_to_device = lambda path: adb_utils.check_ok(
-          file_utils.copy_data_to_device(
-              path,
-              device_path,
-              env.controller,
-          ),
-          f"Failed to copy {device_path} to device.",
-      )
-
-      full_path = download_app_data(file)
-      copy_to_device(full_path)
+    adb_utils.check_ok(
+        tar_transfer.push_files(
+            [download_app_data(file) for file in files],
+            device_path,
+            env.controller,
+        ),
+        f"Failed to copy {device_path} to device.",
+    )
 
 
 class CameraApp(AppSetup):
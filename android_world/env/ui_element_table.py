@@ -0,0 +1,267 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Columnar representation of the UI elements extracted from a forest.
+
+`representation_utils.forest_to_ui_elements` builds one `UIElement` (plus two
+`BoundingBox`es) per node. `UIElementTable` stores the same information in
+columns instead: bounds and boolean flags in NumPy structured arrays, class,
+package and resource names as codes into a per-table vocabulary of interned
+strings, and free text in plain lists. It is a read-only sequence whose items
+are `UIElement`s materialized on access, so it can be used wherever a list of
+UI elements is expected.
+"""
+
+from collections.abc import Iterator, Sequence
+import sys
+from typing import Any, Optional
+
+from android_env.proto.a11y import android_accessibility_forest_pb2
+from android_world.env import representation_utils
+import numpy as np
+
+
+BOUNDS_DTYPE = np.dtype([
+    ('x_min', np.int32),
+    ('x_max', np.int32),
+    ('y_min', np.int32),
+    ('y_max', np.int32),
+])
+
+# UIElement flag fields, in column order, and the node attribute each one is
+# read from.
+_FLAG_ATTRIBUTES = (
+    ('is_checked', 'is_checked'),
+    ('is_checkable', 'is_checkable'),
+    ('is_clickable', 'is_clickable'),
+    ('is_editable', 'is_editable'),
+    ('is_enabled', 'is_enabled'),
+    ('is_focused', 'is_focused'),
+    ('is_focusable', 'is_focusable'),
+    ('is_long_clickable', 'is_long_clickable'),
+    ('is_scrollable', 'is_scrollable'),
+    ('is_selected', 'is_selected'),
+    ('is_visible', 'is_visible_to_user'),
+)
+FLAGS_DTYPE = np.dtype([(field, np.bool_) for field, _ in _FLAG_ATTRIBUTES])
+
+# Names that repeat across nodes and are stored as vocabulary codes.
+_NAME_ATTRIBUTES = (
+    ('class_name', 'class_name'),
+    ('package_name', 'package_name'),
+    ('resource_name', 'view_id_resource_name'),
+)
+NAMES_DTYPE = np.dtype([(field, np.int32) for field, _ in _NAME_ATTRIBUTES])
+
+# Free text, mostly unique per node.
+_TEXT_ATTRIBUTES = (
+    ('text', 'text'),
+    ('content_description', 'content_description'),
+    ('hint_text', 'hint_text'),
+)
+
+# Vocabulary code for a missing name.
+_NO_NAME = -1
+
+
+class UIElementTable(Sequence[representation_utils.UIElement]):
+  """Read-only, columnar sequence of UI elements.
+
+  Indexing returns a newly built `UIElement` that is equal to the one
+  `representation_utils.forest_to_ui_elements` would have returned for the same
+  node. Views are snapshots: modifying one does not change the table.
+
+  Tables pickle compactly since they only hold a handful of arrays and lists,
+  with every distinct name stored once.
+  """
+
+  def __init__(
+      self,
+      bounds: np.ndarray,
+      flags: np.ndarray,
+      name_codes: np.ndarray,
+      names: Sequence[str],
+      texts: dict[str, list[Optional[str]]],
+      screen_size: Optional[tuple[int, int]] = None,
+  ):
+    """Initializes the table from its columns; see `from_forest`.
+
+    Args:
+      bounds: Pixel bounds with dtype `BOUNDS_DTYPE`.
+      flags: Boolean flags with dtype `FLAGS_DTYPE`.
+      name_codes: Indices into `names`, or -1 for no name, with dtype
+        `NAMES_DTYPE`.
+      names: The vocabulary of class, package and resource names.
+      texts: Maps each text field of `UIElement` to a per-element list.
+      screen_size: The size of the device screen in pixels (width, height),
+        used to compute normalized bounding boxes.
+
+    Raises:
+      ValueError: If the columns do not have the same length.
+    """
+    lengths = {len(bounds), len(flags), len(name_codes)}
+    lengths.update(len(column) for column in texts.values())
+    if len(lengths) > 1:
+      raise ValueError(f'Columns have different lengths: {sorted(lengths)}.')
+    self._bounds = bounds
+    self._flags = flags
+    self._name_codes = name_codes
+    self._names = tuple(names)
+    self._texts = texts
+    self._screen_size = screen_size
+
+  @classmethod
+  def from_forest(
+      cls,
+      forest: android_accessibility_forest_pb2.AndroidAccessibilityForest | Any,
+      exclude_invisible_elements: bool = False,
+      screen_size: Optional[tuple[int, int]] = None,
+  ) -> 'UIElementTable':
+    """Builds a table from the same nodes as `forest_to_ui_elements`.
+
+    Args:
+      forest: The forest to extract nodes from.
+      exclude_invisible_elements: True if invisible elements should not be
+        returned.
+      screen_size: The size of the device screen in pixels (width, height).
+
+    Returns:
+      The table.
+    """
+    bounds = []
+    flags = []
+    name_codes = []
+    texts = {field: [] for field, _ in _TEXT_ATTRIBUTES}
+    vocabulary: dict[str, int] = {}
+
+    def encode(name: str) -> int:
+      if not name:
+        return _NO_NAME
+      code = vocabulary.get(name)
+      if code is None:
+        code = vocabulary[sys.intern(name)] = len(vocabulary)
+      return code
+
+    for window in forest.windows:
+      for node in window.tree.nodes:
+        if (
+            node.child_ids
+            and not node.content_description
+            and not node.is_scrollable
+        ):
+          continue
+        if exclude_invisible_elements and not node.is_visible_to_user:
+          continue
+        node_bounds = node.bounds_in_screen
+        bounds.append((
+            node_bounds.left,
+            node_bounds.right,
+            node_bounds.top,
+            node_bounds.bottom,
+        ))
+        flags.append(
+            tuple(getattr(node, attribute) for _, attribute in _FLAG_ATTRIBUTES)
+        )
+        name_codes.append(
+            tuple(
+                encode(getattr(node, attribute))
+                for _, attribute in _NAME_ATTRIBUTES
+            )
+        )
+        for field, attribute in _TEXT_ATTRIBUTES:
+          texts[field].append(getattr(node, attribute) or None)
+
+    return cls(
+        bounds=np.array(bounds, dtype=BOUNDS_DTYPE),
+        flags=np.array(flags, dtype=FLAGS_DTYPE),
+        name_codes=np.array(name_codes, dtype=NAMES_DTYPE),
+        names=list(vocabulary),
+        texts=texts,
+        screen_size=screen_size,
+    )
+
+  @property
+  def bounds(self) -> np.ndarray:
+    """Pixel bounds of all elements, with dtype `BOUNDS_DTYPE`."""
+    return self._bounds
+
+  @property
+  def flags(self) -> np.ndarray:
+    """Boolean flags of all elements, with dtype `FLAGS_DTYPE`."""
+    return self._flags
+
+  @property
+  def screen_size(self) -> Optional[tuple[int, int]]:
+    return self._screen_size
+
+  def _name(self, code: int) -> Optional[str]:
+    return None if code == _NO_NAME else self._names[code]
+
+  def _element(self, index: int) -> representation_utils.UIElement:
+    x_min, x_max, y_min, y_max = (int(v) for v in self._bounds[index].item())
+    bbox_pixels = representation_utils.BoundingBox(x_min, x_max, y_min, y_max)
+    if self._screen_size is not None:
+      width, height = self._screen_size
+      bbox = representation_utils.BoundingBox(
+          x_min / width, x_max / width, y_min / height, y_max / height
+      )
+    else:
+      bbox = None
+    flags = self._flags[index].item()
+    name_codes = self._name_codes[index].item()
+    return representation_utils.UIElement(
+        bbox=bbox,
+        bbox_pixels=bbox_pixels,
+        **{
+            field: bool(value)
+            for (field, _), value in zip(_FLAG_ATTRIBUTES, flags)
+        },
+        **{
+            field: self._name(code)
+            for (field, _), code in zip(_NAME_ATTRIBUTES, name_codes)
+        },
+        **{field: column[index] for field, column in self._texts.items()},
+    )
+
+  def __len__(self) -> int:
+    return len(self._bounds)
+
+  def __getitem__(self, index):
+    if isinstance(index, slice):
+      return [self._element(i) for i in range(*index.indices(len(self)))]
+    if index < 0:
+      index += len(self)
+    if not 0 <= index < len(self):
+      raise IndexError('UIElementTable index out of range')
+    return self._element(index)
+
+  def __iter__(self) -> Iterator[representation_utils.UIElement]:
+    for index in range(len(self)):
+      yield self._element(index)
+
+  def __eq__(self, other: Any) -> bool:
+    if not isinstance(other, (list, tuple, UIElementTable)):
+      return NotImplemented
+    return len(self) == len(other) and all(
+        mine == theirs for mine, theirs in zip(self, other)
+    )
+
+  __hash__ = None
+
+  def __repr__(self) -> str:
+    return f'UIElementTable({len(self)} elements)'
+
+  def to_list(self) -> list[representation_utils.UIElement]:
+    """Materializes all elements."""
+    return list(self)
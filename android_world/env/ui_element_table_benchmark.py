@@ -0,0 +1,205 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+r"""Compares UI element representations on large accessibility forests.
+
+For each forest, reports the build time, the memory retained by the result and
+its pickled size for:
+
+  * `list`: `representation_utils.forest_to_ui_elements`.
+  * `slots`: the same elements converted to `SlotsUIElement`.
+  * `table`: `ui_element_table.UIElementTable.from_forest`.
+
+By default, synthetic forests shaped like a Chrome page and an OsmAnd map screen
+are used. Real forests, e.g. dumped with `forest.SerializeToString()`, can be
+passed instead:
+
+python -m android_world.env.ui_element_table_benchmark \
+  --forest_paths=/tmp/chrome.pb,/tmp/osmand.pb
+"""
+
+from collections.abc import Callable, Sequence
+import os
+import pickle
+import statistics
+import time
+import tracemalloc
+from typing import Any
+
+from absl import app
+from absl import flags
+from android_env.proto.a11y import android_accessibility_forest_pb2
+from android_world.env import representation_utils
+from android_world.env import ui_element_table
+
+_FOREST_PATHS = flags.DEFINE_list(
+    'forest_paths',
+    [],
+    'Serialized AndroidAccessibilityForest protos to benchmark. If empty,'
+    ' synthetic forests are used.',
+)
+_REPEATS = flags.DEFINE_integer(
+    'repeats', 20, 'Number of builds used to measure build time.'
+)
+_SCREEN_SIZE = (1080, 2400)
+
+
+def _synthetic_forest(
+    package_name: str,
+    num_leaves: int,
+    class_names: Sequence[str],
+    text_every: int,
+) -> android_accessibility_forest_pb2.AndroidAccessibilityForest:
+  """Returns a forest with a root, one container per row and `num_leaves`."""
+  forest = android_accessibility_forest_pb2.AndroidAccessibilityForest()
+  tree = forest.windows.add().tree
+  root = tree.nodes.add()
+  root.unique_id = 0
+  root.class_name = 'android.widget.FrameLayout'
+  root.package_name = package_name
+  root.is_scrollable = True
+  next_id = 1
+  leaves_per_row = 8
+  for row in range(0, num_leaves, leaves_per_row):
+    container = tree.nodes.add()
+    container.unique_id = next_id
+    next_id += 1
+    container.class_name = 'android.view.ViewGroup'
+    container.package_name = package_name
+    root.child_ids.append(container.unique_id)
+    for i in range(row, min(row + leaves_per_row, num_leaves)):
+      leaf = tree.nodes.add()
+      leaf.unique_id = next_id
+      next_id += 1
+      container.child_ids.append(leaf.unique_id)
+      leaf.class_name = class_names[i % len(class_names)]
+      leaf.package_name = package_name
+      leaf.view_id_resource_name = f'{package_name}:id/item_{i % 16}'
+      if i % text_every == 0:
+        leaf.text = f'Item {i}'
+      else:
+        leaf.content_description = f'Element {i}'
+      leaf.is_clickable = i % 2 == 0
+      leaf.is_enabled = True
+      leaf.is_visible_to_user = True
+      top = (i // leaves_per_row) * 40
+      leaf.bounds_in_screen.left = (i % leaves_per_row) * 135
+      leaf.bounds_in_screen.right = leaf.bounds_in_screen.left + 135
+      leaf.bounds_in_screen.top = top
+      leaf.bounds_in_screen.bottom = top + 40
+  return forest
+
+
+def _synthetic_forests() -> (
+    dict[str, android_accessibility_forest_pb2.AndroidAccessibilityForest]
+):
+  return {
+      'chrome (synthetic)': _synthetic_forest(
+          'com.android.chrome',
+          num_leaves=1500,
+          class_names=('android.view.View', 'android.widget.TextView'),
+          text_every=2,
+      ),
+      'osmand (synthetic)': _synthetic_forest(
+          'net.osmand',
+          num_leaves=600,
+          class_names=(
+              'android.widget.ImageButton',
+              'android.widget.TextView',
+              'android.widget.ImageView',
+          ),
+          text_every=3,
+      ),
+  }
+
+
+def _load_forest(
+    path: str,
+) -> android_accessibility_forest_pb2.AndroidAccessibilityForest:
+  forest = android_accessibility_forest_pb2.AndroidAccessibilityForest()
+  with open(path, 'rb') as f:
+    forest.ParseFromString(f.read())
+  return forest
+
+
+def _measure(build: Callable[[], Any], repeats: int) -> dict[str, float]:
+  """Returns build time in ms, retained memory and pickled size in KiB."""
+  times = []
+  for _ in range(repeats):
+    start = time.perf_counter()
+    build()
+    times.append((time.perf_counter() - start) * 1000)
+
+  tracemalloc.start()
+  before, _ = tracemalloc.get_traced_memory()
+  result = build()
+  after, _ = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  return {
+      'build_ms': statistics.median(times),
+      'memory_kib': (after - before) / 1024,
+      'pickle_kib': len(pickle.dumps(result)) / 1024,
+  }
+
+
+def _benchmark(
+    name: str,
+    forest: android_accessibility_forest_pb2.AndroidAccessibilityForest,
+    repeats: int,
+) -> None:
+  """Prints measurements for all representations of the forest."""
+
+  def build_list():
+    return representation_utils.forest_to_ui_elements(
+        forest, exclude_invisible_elements=True, screen_size=_SCREEN_SIZE
+    )
+
+  def build_slots():
+    return [representation_utils.to_slots(e) for e in build_list()]
+
+  def build_table():
+    return ui_element_table.UIElementTable.from_forest(
+        forest, exclude_invisible_elements=True, screen_size=_SCREEN_SIZE
+    )
+
+  print(f'{name}: {len(build_list())} elements')
+  print(f'  {"":8}{"build ms":>12}{"memory KiB":>14}{"pickle KiB":>14}')
+  for label, build in (
+      ('list', build_list),
+      ('slots', build_slots),
+      ('table', build_table),
+  ):
+    result = _measure(build, repeats)
+    print(
+        f'  {label:8}{result["build_ms"]:>12.2f}'
+        f'{result["memory_kib"]:>14.1f}{result["pickle_kib"]:>14.1f}'
+    )
+
+
+def main(argv: Sequence[str]) -> None:
+  if len(argv) > 1:
+    raise app.UsageError('Too many command-line arguments.')
+  if _FOREST_PATHS.value:
+    forests = {
+        os.path.basename(path): _load_forest(path)
+        for path in _FOREST_PATHS.value
+    }
+  else:
+    forests = _synthetic_forests()
+  for name, forest in forests.items():
+    _benchmark(name, forest, _REPEATS.value)
+
+
+if __name__ == '__main__':
+  app.run(main)
@@ -0,0 +1,171 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import dataclasses
+import pickle
+
+from absl.testing import absltest
+from android_env.proto.a11y import android_accessibility_forest_pb2
+from android_world.env import representation_utils
+from android_world.env import ui_element_table
+import numpy as np
+
+
+def _create_forest() -> (
+    android_accessibility_forest_pb2.AndroidAccessibilityForest
+):
+  forest = android_accessibility_forest_pb2.AndroidAccessibilityForest()
+  tree = forest.windows.add().tree
+
+  parent = tree.nodes.add()
+  parent.unique_id = 1
+  parent.child_ids.extend([2, 3, 4])
+  parent.class_name = 'android.widget.FrameLayout'
+
+  button = tree.nodes.add()
+  button.unique_id = 2
+  button.class_name = 'android.widget.Button'
+  button.package_name = 'com.android.chrome'
+  button.view_id_resource_name = 'com.android.chrome:id/ok'
+  button.text = 'OK'
+  button.is_clickable = True
+  button.is_visible_to_user = True
+  button.bounds_in_screen.left = 10
+  button.bounds_in_screen.right = 110
+  button.bounds_in_screen.top = 20
+  button.bounds_in_screen.bottom = 70
+
+  hidden = tree.nodes.add()
+  hidden.unique_id = 3
+  hidden.class_name = 'android.widget.Button'
+  hidden.package_name = 'com.android.chrome'
+  hidden.text = 'Hidden'
+
+  edit = tree.nodes.add()
+  edit.unique_id = 4
+  edit.class_name = 'android.widget.EditText'
+  edit.package_name = 'com.android.chrome'
+  edit.hint_text = 'Search'
+  edit.is_editable = True
+  edit.is_visible_to_user = True
+  edit.bounds_in_screen.right = 200
+  edit.bounds_in_screen.bottom = 40
+
+  scroll = forest.windows.add().tree.nodes.add()
+  scroll.child_ids.append(5)
+  scroll.is_scrollable = True
+  scroll.content_description = 'List'
+  scroll.is_visible_to_user = True
+  return forest
+
+
+class UIElementTableTest(absltest.TestCase):
+
+  def test_matches_forest_to_ui_elements(self):
+    forest = _create_forest()
+
+    for exclude_invisible in (False, True):
+      for screen_size in (None, (400, 800)):
+        table = ui_element_table.UIElementTable.from_forest(
+            forest,
+            exclude_invisible_elements=exclude_invisible,
+            screen_size=screen_size,
+        )
+        expected = representation_utils.forest_to_ui_elements(
+            forest,
+            exclude_invisible_elements=exclude_invisible,
+            screen_size=screen_size,
+        )
+        self.assertEqual(table.to_list(), expected)
+        self.assertEqual(table, expected)
+
+  def test_sequence_protocol(self):
+    table = ui_element_table.UIElementTable.from_forest(
+        _create_forest(), exclude_invisible_elements=True
+    )
+
+    self.assertLen(table, 3)
+    self.assertEqual(table[0].text, 'OK')
+    self.assertEqual(table[-1].content_description, 'List')
+    self.assertEqual([e.hint_text for e in table[1:2]], ['Search'])
+    self.assertEqual([e.is_editable for e in table], [False, True, False])
+    with self.assertRaises(IndexError):
+      table[3]  # pylint: disable=pointless-statement
+
+  def test_views_are_ui_elements(self):
+    table = ui_element_table.UIElementTable.from_forest(_create_forest())
+
+    element = table[0]
+
+    self.assertIsInstance(element, representation_utils.UIElement)
+    self.assertIsInstance(element.is_clickable, bool)
+    self.assertIsInstance(element.bbox_pixels.x_min, int)
+    self.assertEqual(dataclasses.asdict(element)['text'], 'OK')
+    self.assertEqual(element.bbox_pixels.center, (60.0, 45.0))
+
+  def test_names_are_stored_once(self):
+    table = ui_element_table.UIElementTable.from_forest(_create_forest())
+
+    self.assertEqual(
+        sorted(table._names),
+        [
+            'android.widget.Button',
+            'android.widget.EditText',
+            'com.android.chrome',
+            'com.android.chrome:id/ok',
+        ],
+    )
+    self.assertIs(table[0].package_name, table[1].package_name)
+
+  def test_columns(self):
+    table = ui_element_table.UIElementTable.from_forest(
+        _create_forest(), exclude_invisible_elements=True
+    )
+
+    np.testing.assert_array_equal(table.bounds['x_max'], [110, 200, 0])
+    np.testing.assert_array_equal(
+        table.flags['is_editable'], [False, True, False]
+    )
+
+  def test_pickle_round_trip(self):
+    table = ui_element_table.UIElementTable.from_forest(
+        _create_forest(), screen_size=(400, 800)
+    )
+
+    restored = pickle.loads(pickle.dumps(table))
+
+    self.assertEqual(restored, table.to_list())
+    self.assertEqual(restored.screen_size, (400, 800))
+
+  def test_empty_forest(self):
+    table = ui_element_table.UIElementTable.from_forest(
+        android_accessibility_forest_pb2.AndroidAccessibilityForest()
+    )
+
+    self.assertEmpty(table)
+    self.assertEqual(table, [])
+
+  def test_mismatched_columns(self):
+    with self.assertRaises(ValueError):
+      ui_element_table.UIElementTable(
+          bounds=np.zeros(2, dtype=ui_element_table.BOUNDS_DTYPE),
+          flags=np.zeros(1, dtype=ui_element_table.FLAGS_DTYPE),
+          name_codes=np.zeros(2, dtype=ui_element_table.NAMES_DTYPE),
+          names=[],
+          texts={},
+      )
+
+
+if __name__ == '__main__':
+  absltest.main()
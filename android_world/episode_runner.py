@@ -76,23 +76,32 @@ def run_episode(
   agent.reset(start_on_home_screen)
   agent.set_max_steps(max_n_steps)
 
-  output = []
+  step_data = []
+
+  def episode_data() -> dict[str, list[Any]]:
+    # Steps may still be filling in their data, e.g. pipelined summaries.
+    agent.flush()
+    return _transpose_lod_to_dol([
+        data | {constants.STEP_NUMBER: step_n}
+        for step_n, data in enumerate(step_data)
+    ])
+
   for step_n in range(max_n_steps):
     result = agent.step(goal)
     print_fn('Completed step {:d}.'.format(step_n + 1))
     assert constants.STEP_NUMBER not in result.data
-    output.append(result.data | {constants.STEP_NUMBER: step_n})
+    step_data.append(result.data)
     if termination_fn(agent.env):
       print_fn('Environment ends episode.')
       return EpisodeResult(
           done=True,
-          step_data=_transpose_lod_to_dol(output),
+          step_data=episode_data(),
       )
     elif result.done:
       print_fn('Agent indicates task is done.')
       return EpisodeResult(
           done=result.done,
-          step_data=_transpose_lod_to_dol(output),
+          step_data=episode_data(),
       )
   print_fn(
       termcolor.colored(
@@ -101,7 +110,7 @@ def run_episode(
       )
   )
   return EpisodeResult(
-      done=result.done, step_data=_transpose_lod_to_dol(output)  # pylint: disable=undefined-variable
+      done=result.done, step_data=episode_data()  # pylint: disable=undefined-variable
   )
 
 
@@ -44,6 +44,25 @@ class FakeEnvironmentInteractingAgent(base_agent.EnvironmentInteractingAgent):
     )
 
 
+class _BackgroundAgent(FakeEnvironmentInteractingAgent):
+  """Completes the data of each step only when flushed."""
+
+  def __init__(self, env: interface.AsyncAndroidEnv):
+    super().__init__(env, 'background_agent')
+    self.pending = []
+
+  def step(self, goal: str) -> base_agent.AgentInteractionResult:
+    self.call_count += 1
+    data = {'summary': None}
+    self.pending.append(data)
+    return base_agent.AgentInteractionResult(done=False, data=data)
+
+  def flush(self) -> None:
+    for data in self.pending:
+      data['summary'] = 'done'
+    self.pending = []
+
+
 class EpisodeRunnerTest(absltest.TestCase):
 
   def setUp(self):
@@ -89,6 +108,14 @@ class EpisodeRunnerTest(absltest.TestCase):
 
     mock_agent.env.reset.assert_called_with(go_home=True)
 
+  def test_step_data_is_collected_after_flush(self):
+    agent = _BackgroundAgent(self.env)
+
+    result = episode_runner.run_episode('test_goal', agent, max_n_steps=2)
+
+    self.assertEqual(result.step_data['summary'], ['done', 'done'])
+    self.assertEqual(result.step_data[constants.STEP_NUMBER], [0, 1])
+
 
 if __name__ == '__main__':
   absltest.main()
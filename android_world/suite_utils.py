@@ -15,11 +15,14 @@
 """Utilities for evaluating automation agents."""
 
 import collections
+from collections.abc import Sequence
+import dataclasses
 import datetime
 import hashlib
 import logging
 import os
 import random
+import threading
 import time
 import traceback
 from typing import Any, Callable, Type, TypeVar
@@ -276,6 +279,11 @@ def _run_task(
         ],
     }
     task.tear_down(env)
+    result[constants.EpisodeConstants.RESET_TIMES] = dict(task.reset_times)
+    result[constants.EpisodeConstants.RESTORE_STATS] = [
+        {'app_name': app_name, **dataclasses.asdict(stats)}
+        for app_name, stats in task.restore_stats
+    ]
     return result
 
 
@@ -306,6 +314,18 @@ def _get_task_info(
   return completed, failed
 
 
+# Episode fields kept in memory and passed to `process_episodes`.
+_METADATA_FIELDS = (
+    constants.EpisodeConstants.GOAL,
+    constants.EpisodeConstants.TASK_TEMPLATE,
+    constants.EpisodeConstants.INSTANCE_ID,
+    constants.EpisodeConstants.IS_SUCCESSFUL,
+    constants.EpisodeConstants.EPISODE_LENGTH,
+    constants.EpisodeConstants.RUN_TIME,
+    constants.EpisodeConstants.EXCEPTION_INFO,
+    constants.EpisodeConstants.AUX_DATA,
+)
+
 TASKS_TO_SKIP = [
   "OsmAndTrack"
 ]
@@ -339,16 +359,7 @@ def _run_task_suite(
   Returns:
     Metadata for each episode, including the scripted reward.
   """
-  metadata_fields = [
-      constants.EpisodeConstants.GOAL,
-      constants.EpisodeConstants.TASK_TEMPLATE,
-      constants.EpisodeConstants.INSTANCE_ID,
-      constants.EpisodeConstants.IS_SUCCESSFUL,
-      constants.EpisodeConstants.EPISODE_LENGTH,
-      constants.EpisodeConstants.RUN_TIME,
-      constants.EpisodeConstants.EXCEPTION_INFO,
-      constants.EpisodeConstants.AUX_DATA,
-  ]
+  metadata_fields = _METADATA_FIELDS
   completed_tasks, failed_tasks = _get_task_info(
       checkpointer.load(fields=metadata_fields)
   )
@@ -420,6 +431,29 @@ def _run_task_suite(
   return full_episode_data if return_full_episode_data else episodes_metadata
 
 
+def _episode_fn(
+    agent: base_agent.EnvironmentInteractingAgent, demo_mode: bool
+) -> Callable[[task_eval.TaskEval], episode_runner.EpisodeResult]:
+  """Returns a function that runs `agent` on a task."""
+
+  def run_episode(task: task_eval.TaskEval) -> episode_runner.EpisodeResult:
+    if demo_mode:
+      _display_goal(agent.env, task)
+    return episode_runner.run_episode(
+        goal=task.goal,
+        agent=agent,
+        max_n_steps=_allocate_step_budget(task.complexity),
+        start_on_home_screen=task.start_on_home_screen,
+        termination_fn=(
+            miniwob_base.is_episode_terminated
+            if task.name.lower().startswith('miniwob')
+            else None
+        ),
+    )
+
+  return run_episode
+
+
 def run(
     suite: Suite,
     agent: base_agent.EnvironmentInteractingAgent,
@@ -450,20 +484,7 @@ def run(
     Step-by-step data from each episode.
   """
 
-  def run_episode(task: task_eval.TaskEval) -> episode_runner.EpisodeResult:
-    if demo_mode:
-      _display_goal(agent.env, task)
-    return episode_runner.run_episode(
-        goal=task.goal,
-        agent=agent,
-        max_n_steps=_allocate_step_budget(task.complexity),
-        start_on_home_screen=task.start_on_home_screen,
-        termination_fn=(
-            miniwob_base.is_episode_terminated
-            if task.name.lower().startswith('miniwob')
-            else None
-        ),
-    )
+  run_episode = _episode_fn(agent, demo_mode)
 
   if demo_mode:
     adb_utils.send_android_intent(
@@ -488,6 +509,188 @@ def run(
   return results
 
 
+@dataclasses.dataclass
+class _PendingInstance:
+  """A task instance waiting to be run by `run_parallel`."""
+
+  name: str
+  index: int
+  task: task_eval.TaskEval
+  attempts: int = 0
+
+  @property
+  def instance_name(self) -> str:
+    return (
+        self.task.name + checkpointer_lib.INSTANCE_SEPARATOR + str(self.index)
+    )
+
+
+class _InstanceQueue:
+  """Queue of task instances shared by the workers of `run_parallel`.
+
+  `get` blocks while the queue is empty but instances are still running, since
+  those may be requeued, and returns None once all instances are done.
+  """
+
+  def __init__(self, instances: list[_PendingInstance]):
+    self._instances = collections.deque(instances)
+    self._num_running = 0
+    self._condition = threading.Condition()
+
+  def get(self) -> _PendingInstance | None:
+    with self._condition:
+      while not self._instances and self._num_running:
+        self._condition.wait()
+      if not self._instances:
+        return None
+      self._num_running += 1
+      return self._instances.popleft()
+
+  def done(self, requeue: _PendingInstance | None = None) -> None:
+    """Marks an instance returned by `get` as done, or requeues it."""
+    with self._condition:
+      self._num_running -= 1
+      if requeue is not None:
+        self._instances.append(requeue)
+      self._condition.notify_all()
+
+  def remaining(self) -> list[_PendingInstance]:
+    with self._condition:
+      return list(self._instances)
+
+
+def run_parallel(
+    suite: Suite,
+    agents: Sequence[base_agent.EnvironmentInteractingAgent],
+    checkpointer: checkpointer_lib.Checkpointer = checkpointer_lib.NullCheckpointer(),
+    max_attempts: int = 2,
+    process_episodes_fn=None,
+    check_episode_fn: Callable[[dict[str, Any]], bool] | None = None,
+) -> list[dict[str, Any]]:
+  """Runs the suite on several devices in parallel.
+
+  Each agent must interact with its own environment, i.e. device. Every agent
+  runs in its own thread and takes task instances from a shared queue until
+  none are left. Instances already completed in the checkpoint are skipped, as
+  in `run`.
+
+  A task instance that fails, e.g. because its initialization raised, is
+  requeued until it has been attempted `max_attempts` times; the last failure is
+  then saved like in `run`. If an error escapes the task itself, e.g. in
+  `tear_down`, the device is assumed to be unusable: the instance is requeued
+  and the worker stops. Instances left when all workers stopped are not run and
+  can be resumed from the checkpoint.
+
+  Args:
+    suite: The suite of tasks to run on.
+    agents: The agents, one per device.
+    checkpointer: See docstring from `run`. Episodes are saved by all workers.
+    max_attempts: Number of times a failing instance is attempted.
+    process_episodes_fn: The function to process episode data of all workers
+      at the end. Defaults to process_episodes from this file.
+    check_episode_fn: The function to check episode data.
+
+  Returns:
+    Metadata for each episode, in suite order.
+  """
+  if not agents:
+    raise ValueError('At least one agent is required.')
+  if max_attempts < 1:
+    raise ValueError('max_attempts must be positive.')
+  if process_episodes_fn is None:
+    process_episodes_fn = process_episodes
+
+  completed_tasks, failed_tasks = _get_task_info(
+      checkpointer.load(fields=_METADATA_FIELDS)
+  )
+  previous_episodes: dict[str, list[dict[str, Any]]] = {}
+  pending = []
+  for name, instances in suite.items():
+    for i, instance in enumerate(instances):
+      item = _PendingInstance(name, i, instance)
+      previous_episodes[item.instance_name] = completed_tasks.get(
+          item.instance_name, []
+      ) + failed_tasks.get(item.instance_name, [])
+      if (
+          item.instance_name in completed_tasks
+          and item.instance_name not in failed_tasks
+      ):
+        print(f'Skipping already processed task {item.instance_name}')
+        continue
+      if name in TASKS_TO_SKIP:
+        print(f'Skipping problematic task: {item.instance_name}')
+        continue
+      pending.append(item)
+
+  instance_queue = _InstanceQueue(pending)
+  checkpoint_lock = threading.Lock()
+  new_episodes: dict[str, dict[str, Any]] = {}
+
+  def save(
+      item: _PendingInstance,
+      episode: dict[str, Any],
+      agent: base_agent.EnvironmentInteractingAgent,
+  ) -> None:
+    episode[constants.EpisodeConstants.AGENT_NAME] = agent.name
+    episode[constants.EpisodeConstants.INSTANCE_ID] = item.index
+    with checkpoint_lock:
+      checkpointer.save_episodes([episode], item.instance_name)
+      new_episodes[item.instance_name] = {
+          k: episode[k] for k in _METADATA_FIELDS
+      }
+
+  def work(agent: base_agent.EnvironmentInteractingAgent) -> None:
+    run_episode = _episode_fn(agent, demo_mode=False)
+    while (item := instance_queue.get()) is not None:
+      item.attempts += 1
+      try:
+        episode = _run_task(item.task, run_episode, agent.env, demo_mode=False)
+      except Exception:  # pylint: disable=broad-exception-caught
+        logging.exception(
+            'Worker for %s failed on %s; stopping it.',
+            agent.name,
+            item.instance_name,
+        )
+        item.task.initialized = False
+        instance_queue.done(requeue=item)
+        return
+      failed = (
+          episode.get(constants.EpisodeConstants.EXCEPTION_INFO) is not None
+      )
+      if failed and item.attempts < max_attempts:
+        print(f'Requeuing failed task {item.instance_name}')
+        item.task.initialized = False
+        instance_queue.done(requeue=item)
+        continue
+      if failed or check_episode_fn is None or check_episode_fn(episode):
+        save(item, episode, agent)
+      instance_queue.done()
+
+  workers = [
+      threading.Thread(target=work, args=(agent,), name=f'suite_worker_{i}')
+      for i, agent in enumerate(agents)
+  ]
+  for worker in workers:
+    worker.start()
+  for worker in workers:
+    worker.join()
+  for item in instance_queue.remaining():
+    logging.error('No worker left to run %s.', item.instance_name)
+
+  episodes_metadata = []
+  for instances in suite.values():
+    for i, instance in enumerate(instances):
+      instance_name = (
+          instance.name + checkpointer_lib.INSTANCE_SEPARATOR + str(i)
+      )
+      episodes_metadata.extend(previous_episodes[instance_name])
+      if instance_name in new_episodes:
+        episodes_metadata.append(new_episodes[instance_name])
+  if episodes_metadata:
+    process_episodes_fn(episodes_metadata, print_summary=True)
+  return episodes_metadata
+
+
 def _allocate_step_budget(task_complexity: float) -> int:
   """Allocates number of steps dynamically based on the complexity score.
 
@@ -14,7 +14,10 @@
 
 """Tests for suite utils."""
 
+import collections
 import copy
+import tempfile
+import threading
 import time
 from typing import Any
 from unittest import mock
@@ -277,6 +280,12 @@ class SuiteUtilsTest(parameterized.TestCase):
 
     self.assertEqual(result['is_successful'], 1)
     self.assertIn(result['goal'], 'ADB eval')
+    # initialize_task is mocked, so only the tear down reset is timed.
+    self.assertCountEqual(
+        result[constants.EpisodeConstants.RESET_TIMES], ['app_snapshot']
+    )
+    # The task uses no apps, so no snapshots are restored.
+    self.assertEqual(result[constants.EpisodeConstants.RESTORE_STATS], [])
     mock_initialize_task.assert_called_once()
     if demo_mode:
       mock_send_android_intent.assert_has_calls([
@@ -712,5 +721,187 @@ class RunTaskSuiteTest(absltest.TestCase):
     self.assertLen(result2, 1)
 
 
+def _fake_episode(
+    task, *, exception_info: str | None = None
+) -> dict[str, Any]:
+  return {
+      constants.EpisodeConstants.GOAL: task.goal,
+      constants.EpisodeConstants.TASK_TEMPLATE: task.name,
+      constants.EpisodeConstants.INSTANCE_ID: -1,
+      constants.EpisodeConstants.IS_SUCCESSFUL: (
+          np.nan if exception_info else 1
+      ),
+      constants.EpisodeConstants.EPISODE_LENGTH: 1,
+      constants.EpisodeConstants.RUN_TIME: 0,
+      constants.EpisodeConstants.EXCEPTION_INFO: exception_info,
+      constants.EpisodeConstants.AUX_DATA: None,
+  }
+
+
+class RunParallelTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.suite = suite_utils.Suite(
+        Task1=[
+            test_utils.FakeCurrentStateEval(
+                test_utils.FakeCurrentStateEval.generate_random_params()
+            )
+            for _ in range(3)
+        ],
+        Task2=[
+            test_utils.FakeAdbEval(
+                test_utils.FakeAdbEval.generate_random_params()
+            )
+            for _ in range(2)
+        ],
+    )
+    self.agents = []
+    for i in range(2):
+      agent = mock.create_autospec(
+          base_agent.EnvironmentInteractingAgent, instance=True
+      )
+      agent.name = 'AnAgent'
+      agent.env = test_utils.FakeAsyncEnv()
+      agent.env.device_index = i
+      self.agents.append(agent)
+    temp_dir = tempfile.TemporaryDirectory()
+    self.addCleanup(temp_dir.cleanup)
+    self.checkpointer = checkpointer.IncrementalCheckpointer(temp_dir.name)
+    self.process_episodes = mock.MagicMock()
+
+  def _instance_names(self, episodes: list[dict[str, Any]]) -> list[str]:
+    return [
+        episode[constants.EpisodeConstants.TASK_TEMPLATE]
+        + checkpointer.INSTANCE_SEPARATOR
+        + str(episode[constants.EpisodeConstants.INSTANCE_ID])
+        for episode in episodes
+    ]
+
+  def test_runs_each_instance_once_across_devices(self):
+    barrier = threading.Barrier(2, timeout=5)
+    devices = []
+    lock = threading.Lock()
+
+    def run_task(task, unused_run_episode, env, demo_mode):
+      del demo_mode
+      with lock:
+        devices.append(env.device_index)
+        first_task = len(devices) <= 2
+      if first_task:
+        # Both devices must be running at the same time.
+        barrier.wait()
+      return _fake_episode(task)
+
+    with mock.patch.object(suite_utils, '_run_task', side_effect=run_task):
+      results = suite_utils.run_parallel(
+          self.suite,
+          self.agents,
+          checkpointer=self.checkpointer,
+          process_episodes_fn=self.process_episodes,
+      )
+
+    expected = [
+        'FakeCurrentStateEval_0',
+        'FakeCurrentStateEval_1',
+        'FakeCurrentStateEval_2',
+        'FakeAdbEval_0',
+        'FakeAdbEval_1',
+    ]
+    self.assertEqual(self._instance_names(results), expected)
+    self.assertCountEqual(set(devices), [0, 1])
+    self.assertLen(devices, 5)
+    self.assertCountEqual(
+        self._instance_names(self.checkpointer.load()), expected
+    )
+    self.process_episodes.assert_called_once_with(results, print_summary=True)
+
+  def test_failed_instance_is_requeued(self):
+    attempts = collections.Counter()
+
+    def run_task(task, unused_run_episode, unused_env, demo_mode):
+      del demo_mode
+      attempts[id(task)] += 1
+      if task is self.suite['Task2'][0] and attempts[id(task)] == 1:
+        return _fake_episode(task, exception_info='flaky')
+      return _fake_episode(task)
+
+    with mock.patch.object(suite_utils, '_run_task', side_effect=run_task):
+      results = suite_utils.run_parallel(
+          self.suite,
+          self.agents,
+          checkpointer=self.checkpointer,
+          process_episodes_fn=self.process_episodes,
+      )
+
+    self.assertEqual(attempts[id(self.suite['Task2'][0])], 2)
+    self.assertLen(results, 5)
+    for result in results:
+      self.assertIsNone(result[constants.EpisodeConstants.EXCEPTION_INFO])
+
+  def test_failure_is_saved_after_max_attempts(self):
+    def run_task(task, unused_run_episode, unused_env, demo_mode):
+      del demo_mode
+      if task is self.suite['Task2'][0]:
+        return _fake_episode(task, exception_info='broken')
+      return _fake_episode(task)
+
+    with mock.patch.object(
+        suite_utils, '_run_task', side_effect=run_task
+    ) as mock_run_task:
+      results = suite_utils.run_parallel(
+          self.suite,
+          self.agents,
+          checkpointer=self.checkpointer,
+          max_attempts=3,
+          process_episodes_fn=self.process_episodes,
+      )
+
+    self.assertEqual(mock_run_task.call_count, 7)
+    failed = [
+        result
+        for result in results
+        if result[constants.EpisodeConstants.EXCEPTION_INFO] is not None
+    ]
+    self.assertEqual(self._instance_names(failed), ['FakeAdbEval_0'])
+
+  def test_broken_device_hands_instance_to_other_device(self):
+    def run_task(task, unused_run_episode, env, demo_mode):
+      del demo_mode
+      if env.device_index == 0:
+        raise RuntimeError('Device is gone.')
+      return _fake_episode(task)
+
+    with mock.patch.object(suite_utils, '_run_task', side_effect=run_task):
+      results = suite_utils.run_parallel(
+          self.suite,
+          self.agents,
+          checkpointer=self.checkpointer,
+          process_episodes_fn=self.process_episodes,
+      )
+
+    self.assertLen(results, 5)
+
+  def test_resumes_from_checkpoint(self):
+    done = _fake_episode(self.suite['Task1'][0])
+    done[constants.EpisodeConstants.INSTANCE_ID] = 0
+    self.checkpointer.save_episodes([done], 'FakeCurrentStateEval_0')
+
+    with mock.patch.object(
+        suite_utils,
+        '_run_task',
+        side_effect=lambda task, *args, **kwargs: _fake_episode(task),
+    ) as mock_run_task:
+      results = suite_utils.run_parallel(
+          self.suite,
+          self.agents,
+          checkpointer=self.checkpointer,
+          process_episodes_fn=self.process_episodes,
+      )
+
+    self.assertEqual(mock_run_task.call_count, 4)
+    self.assertLen(results, 5)
+
+
 if __name__ == '__main__':
   absltest.main()
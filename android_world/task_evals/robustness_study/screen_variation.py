@@ -54,6 +54,11 @@ def generate_screen_variation_wrapper(
 
     def initialize_task(self, env: interface.AsyncEnv):
       super().initialize_task(env)
+      # The orientation below only applies to the app in the foreground, so
+      # the device geometry can change whenever the foreground app changes.
+      # Keep the controller from caching it while this task runs.
+      env.controller.cache_device_geometry = False
+      env.controller.invalidate_device_geometry()
       # Go back to home screen with a reset.
       env.reset(True)
       adb_utils.set_screen_size(self.width, self.height, env.controller)
@@ -64,6 +69,11 @@ def generate_screen_variation_wrapper(
       # will take effect for the next app opened but expired after closing.
       adb_utils.change_orientation(self.orientation, env.controller)
 
+    def tear_down(self, env: interface.AsyncEnv):
+      super().tear_down(env)
+      env.controller.cache_device_geometry = True
+      env.controller.invalidate_device_geometry()
+
     @property
     def name(self) -> str:
       return base_task.__name__ + '_' + self.config_name
@@ -82,9 +82,6 @@ class SaveCopyOfReceiptTaskEvalTest(absltest.TestCase):
     _touch_temp_file(eval_task.params["file_name"])
     env.controller.execute_adb_call.side_effect = list(
         itertools.chain(
-            fake_adb_responses.create_taskeval_initialize_responses(
-                len(eval_task.app_names)
-            ),
             fake_adb_responses.create_remove_files_responses(),
             fake_adb_responses.create_copy_to_device_responses(),
         )
@@ -16,6 +16,7 @@
 
 import abc
 import random
+import time
 from typing import Any
 from absl import logging
 from android_world.env import adb_utils
@@ -23,6 +24,7 @@ from android_world.env import device_constants
 from android_world.env import interface
 from android_world.utils import app_snapshot
 from android_world.utils import datetime_utils
+from android_world.utils import reset_strategy as reset_strategy_lib
 
 
 class TaskEval(abc.ABC):
@@ -37,8 +39,18 @@ class TaskEval(abc.ABC):
 
   start_on_home_screen = True
 
+  # How app data is reset when the task is initialized and torn down. Shared by
+  # all tasks; set it before running a suite.
+  reset_strategy: reset_strategy_lib.ResetStrategy = (
+      reset_strategy_lib.AppSnapshotReset()
+  )
+
   def __init__(self, params: dict[str, Any]):
     self.initialized = False
+    # Seconds spent resetting apps in the current episode, per reset strategy.
+    self.reset_times: dict[str, float] = {}
+    # App snapshots restored in the current episode, in order, by app name.
+    self.restore_stats: list[tuple[str, app_snapshot.RestoreStats]] = []
 
     # Disabling this check for now as it is causing issues on occasion with a
     # with a RefResolutionError due to inability to resolve json-schema.org.
@@ -112,20 +124,15 @@ class TaskEval(abc.ABC):
     """Returns a random set of parameters for defining the task."""
 
   def _initialize_apps(self, env: interface.AsyncEnv) -> None:
-
-    for app_name in self.app_names:
-      # Don't need to restore snapshot for clipper app since it doesn't have
-      # any state.
-      
-      # if app_name in ["chrome", "google chrome"]:
-      #   print("skip resetting chrome to handle the permission setting")
-      #   continue
-
-      if app_name and app_name != "clipper":
-        try:
-          app_snapshot.restore_snapshot(app_name, env.controller)
-        except RuntimeError as error:
-          logging.warning("Skipping app snapshot loading : %s", error)
+    """Resets the apps with `reset_strategy`, recording the time it takes."""
+    start = time.perf_counter()
+    result = self.reset_strategy.reset(self.app_names, env)
+    self.reset_times[result.strategy] = (
+        self.reset_times.get(result.strategy, 0.0)
+        + time.perf_counter()
+        - start
+    )
+    self.restore_stats.extend(result.restore_stats.items())
 
   @classmethod
   def set_device_time(cls, env: interface.AsyncEnv) -> None:
@@ -135,15 +142,21 @@ class TaskEval(abc.ABC):
 
   def initialize_device_time(self, env: interface.AsyncEnv) -> None:
     """Initializes the device time."""
-    datetime_utils.setup_datetime(env.controller)
-    datetime_utils.set_datetime(env.controller, self.device_time)
+    datetime_utils.setup_datetime(env.controller, self.device_time)
 
   def initialize_task(self, env: interface.AsyncEnv) -> None:  # pylint: disable=unused-argument
     """Initializes the task."""
     # Reset the interaction cache so previous tasks don't affect this run:
     env.interaction_cache = ""
-    self.initialize_device_time(env)
-    self._initialize_apps(env)
+    self.reset_times = {}
+    self.restore_stats = []
+    if self.reset_strategy.restores_device:
+      # Restoring the device also restores its clock, so it has to come first.
+      self._initialize_apps(env)
+      self.initialize_device_time(env)
+    else:
+      self.initialize_device_time(env)
+      self._initialize_apps(env)
     logging.info("Initializing %s", self.name)
     if self.initialized:
       raise RuntimeError(f"{self.name}.initialize_task() is already called.")
@@ -180,7 +193,13 @@ class TaskEval(abc.ABC):
 
   def tear_down(self, env: interface.AsyncEnv) -> None:  # pylint: disable=unused-argument
     """Tears down the task."""
-    self._initialize_apps(env)
+    # If the whole device was restored, the next task restores it again, so
+    # there is nothing to gain from resetting the apps now.
+    if not (
+        self.reset_strategy.restores_device
+        and self.reset_strategy.name in self.reset_times
+    ):
+      self._initialize_apps(env)
     adb_utils.close_recents(env.controller)
     self.initialized = False
     logging.info("Tearing down %s", self.name)
@@ -15,8 +15,11 @@
 from typing import Any
 from unittest import mock
 from absl.testing import absltest
+from android_env.proto import state_pb2
 from android_world.env import interface
 from android_world.task_evals import task_eval
+from android_world.utils import app_snapshot
+from android_world.utils import reset_strategy
 from android_world.utils import test_utils
 
 
@@ -53,6 +56,33 @@ class MockTaskEval(task_eval.TaskEval):
     return 1.0
 
 
+_RESTORE_STATS = app_snapshot.RestoreStats(
+    differential=True,
+    files_copied=1,
+    paths_removed=0,
+    bytes_copied=10,
+    duration_sec=0.5,
+    time_saved_sec=2.0,
+)
+
+
+class FakeResetStrategy(reset_strategy.ResetStrategy):
+
+  name = "fake"
+
+  def __init__(self):
+    self.reset_app_names = []
+    self.on_reset = lambda: None
+
+  def reset(self, app_names, env) -> reset_strategy.ResetResult:
+    del env
+    self.on_reset()
+    self.reset_app_names.append(tuple(app_names))
+    return reset_strategy.ResetResult(
+        self.name, {app_name: _RESTORE_STATS for app_name in app_names}
+    )
+
+
 class TestTaskEval(test_utils.AdbEvalTestBase):
 
   def setUp(self):
@@ -86,6 +116,66 @@ class TestTaskEval(test_utils.AdbEvalTestBase):
     self.scripted_task.tear_down(self.mock_env)
     self.mock_close_recents.assert_called_once()
 
+  def test_reset_strategy_is_used_and_timed(self):
+    strategy = FakeResetStrategy()
+    self.enter_context(
+        mock.patch.object(task_eval.TaskEval, "reset_strategy", strategy)
+    )
+
+    self.scripted_task.initialize_task(self.mock_env)
+    self.scripted_task.tear_down(self.mock_env)
+
+    self.assertEqual(strategy.reset_app_names, [("MockApp",), ("MockApp",)])
+    self.assertCountEqual(self.scripted_task.reset_times, ["fake"])
+    self.assertGreaterEqual(self.scripted_task.reset_times["fake"], 0.0)
+    self.assertEqual(
+        self.scripted_task.restore_stats,
+        [("MockApp", _RESTORE_STATS)] * 2,
+    )
+    self.mock_restore_snapshot.assert_not_called()
+
+  def test_device_reset_happens_before_setting_time(self):
+    strategy = FakeResetStrategy()
+    strategy.restores_device = True
+    strategy.on_reset = lambda: self.mock_set_datetime.assert_not_called()
+    self.enter_context(
+        mock.patch.object(task_eval.TaskEval, "reset_strategy", strategy)
+    )
+
+    self.scripted_task.initialize_task(self.mock_env)
+
+    self.mock_set_datetime.assert_called_once()
+
+  def test_tear_down_skips_reset_after_device_restore(self):
+    strategy = FakeResetStrategy()
+    strategy.restores_device = True
+    self.enter_context(
+        mock.patch.object(task_eval.TaskEval, "reset_strategy", strategy)
+    )
+
+    self.scripted_task.initialize_task(self.mock_env)
+    self.scripted_task.tear_down(self.mock_env)
+
+    self.assertEqual(strategy.reset_app_names, [("MockApp",)])
+    self.mock_close_recents.assert_called_once()
+
+  def test_tear_down_resets_apps_after_fallback(self):
+    fallback = FakeResetStrategy()
+    strategy = reset_strategy.EmulatorSnapshotReset(fallback=fallback)
+    self.mock_env.controller.load_state.return_value = (
+        state_pb2.LoadStateResponse(
+            status=state_pb2.LoadStateResponse.Status.ERROR
+        )
+    )
+    self.enter_context(
+        mock.patch.object(task_eval.TaskEval, "reset_strategy", strategy)
+    )
+
+    self.scripted_task.initialize_task(self.mock_env)
+    self.scripted_task.tear_down(self.mock_env)
+
+    self.assertEqual(fallback.reset_app_names, [("MockApp",), ("MockApp",)])
+
 
 if __name__ == "__main__":
   absltest.main()
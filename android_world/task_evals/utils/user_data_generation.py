@@ -102,8 +102,7 @@ def generate_noise_files(
       filename += extension
     names.add(filename)
 
-  for filename in names:
-    file_utils.create_file(filename, directory_path, env)
+  file_utils.create_files(names, directory_path, env)
 
 
 def generate_modified_file_name(base_file_name: str) -> str:
@@ -14,7 +14,11 @@
 
 """Utils for handling snapshots for apps."""
 
+import dataclasses
 import os
+import shlex
+import time
+from typing import Optional
 
 from absl import logging
 from android_env import env_interface
@@ -37,6 +41,88 @@ def _snapshot_path(app_name: str) -> str:
   return os.path.join(device_constants.SNAPSHOT_DATA, package_name)
 
 
+def _manifest_path(snapshot_path: str) -> str:
+  # Kept next to the snapshot rather than in it, so it is never restored into
+  # the app data.
+  return f"{snapshot_path}.manifest"
+
+
+# Prefix of directory entries in a manifest; files are listed with their md5.
+_DIRECTORY = "directory"
+
+# Prefix of the manifest line recording how long the latest full restore of
+# the snapshot took.
+_FULL_RESTORE_SEC = "full_restore_sec"
+
+
+def _is_dir(digest: Optional[str]) -> bool:
+  return digest == _DIRECTORY
+
+
+def _list_command(path: str) -> str:
+  """Returns a command listing the directories and file hashes under `path`.
+
+  Each output line is `<md5 or "directory">  <path relative to path>`, as
+  printed by md5sum.
+  """
+  return (
+      f"cd {path} && find . -mindepth 1 -type d | sed 's/^/{_DIRECTORY}  /'"
+      " && find . -type f -exec md5sum {} +"
+  )
+
+
+def _parse_listing(output: bytes) -> dict[str, str]:
+  """Parses the output of `_list_command` into a map from path to hash."""
+  listing = {}
+  for line in output.decode("utf-8", errors="replace").splitlines():
+    digest, sep, path = line.partition("  ")
+    if sep and path.startswith("./"):
+      listing[path[2:]] = digest
+  return listing
+
+
+def _parse_full_restore_sec(output: bytes) -> Optional[float]:
+  """Returns the full restore time recorded in a manifest, if any."""
+  for line in output.decode("utf-8", errors="replace").splitlines():
+    key, sep, value = line.partition("  ")
+    if sep and key == _FULL_RESTORE_SEC:
+      try:
+        return float(value)
+      except ValueError:
+        return None
+  return None
+
+
+def _parents(path: str) -> list[str]:
+  """Returns the parent directories of a relative path."""
+  parts = path.split("/")
+  return ["/".join(parts[:i]) for i in range(1, len(parts))]
+
+
+@dataclasses.dataclass(frozen=True)
+class RestoreStats:
+  """Statistics about a single `restore_snapshot` call.
+
+  Attributes:
+    differential: Whether only changed files were restored.
+    files_copied: The number of files copied from the snapshot.
+    paths_removed: The number of files and directories removed from the app
+      data because they are not in the snapshot.
+    bytes_copied: The total size of the copied files, or None if unknown.
+    duration_sec: The time the restore took.
+    time_saved_sec: How much faster this restore was than the latest full
+      restore of the snapshot; 0 for full restores, and None if the snapshot
+      has not been restored in full since it was saved.
+  """
+
+  differential: bool
+  files_copied: int
+  paths_removed: int
+  bytes_copied: Optional[int]
+  duration_sec: float
+  time_saved_sec: Optional[float] = None
+
+
 def clear_snapshot(
     app_name: str,
     env: env_interface.AndroidEnvInterface,
@@ -49,6 +135,9 @@ def clear_snapshot(
   """
   snapshot_path = _snapshot_path(app_name)
   file_utils.clear_directory(snapshot_path, env)
+  adb_utils.issue_generic_request(
+      ["shell", "rm", "-f", _manifest_path(snapshot_path)], env
+  )
 
 
 def save_snapshot(app_name: str, env: env_interface.AndroidEnvInterface):
@@ -57,6 +146,9 @@ def save_snapshot(app_name: str, env: env_interface.AndroidEnvInterface):
   Only a single snapshot is stored at any given time. Repeated calls to
   `save_snapshot()` overwrite any prior snapshot.
 
+  Alongside the snapshot, a manifest of the hashes of its files is stored,
+  which lets `restore_snapshot()` copy back only the files that changed.
+
   Args:
     app_name: App package to be snapshotted.
     env: Android environment.
@@ -73,51 +165,253 @@ def save_snapshot(app_name: str, env: env_interface.AndroidEnvInterface):
         app_name,
     )
 
-  file_utils.copy_dir(_app_data_path(app_name), snapshot_path, env)
+  manifest_path = _manifest_path(snapshot_path)
+  app_data_path = _app_data_path(app_name)
+  adb_utils.issue_generic_request(["shell", "rm", "-f", manifest_path], env)
+  file_utils.copy_dir(app_data_path, snapshot_path, env)
+  # Without a manifest, snapshots are restored in full, so failing to write it
+  # only makes restores slower.
+  (write_manifest,) = adb_utils.issue_batch_request(
+      [f"{_list_command(snapshot_path)} > {manifest_path}"], env
+  )
+  if not write_manifest.ok:
+    logging.warning(
+        "Failed to write %s snapshot manifest; it will be restored in full.",
+        app_name,
+    )
+    adb_utils.issue_generic_request(["shell", "rm", "-f", manifest_path], env)
 
 
-def restore_snapshot(app_name: str, env: env_interface.AndroidEnvInterface):
+def restore_snapshot(
+    app_name: str,
+    env: env_interface.AndroidEnvInterface,
+    differential: bool = True,
+) -> RestoreStats:
   """Loads a snapshot of application data.
 
+  If the snapshot has a manifest and `differential` is set, the app data is
+  hashed on the device and only the files that differ from the snapshot are
+  copied back or removed. Otherwise the app data is replaced by the snapshot,
+  and the time it takes is recorded in the manifest as the baseline for the
+  time saved by later differential restores.
+
   Args:
     app_name: App package that will have its data overwritten with the stored
       snapshot.
     env: Android environment.
+    differential: Whether to only restore the files that changed.
+
+  Returns:
+    Statistics about the restore.
 
   Raises:
     RuntimeError: when there is no available snapshot or a failure occurs while
       loading the snapshot.
   """
-  adb_utils.close_app(app_name, env)
-
+  start = time.perf_counter()
+  package_name = adb_utils.extract_package_name(
+      adb_utils.get_adb_activity(app_name)
+  )
   snapshot_path = _snapshot_path(app_name)
-  if not file_utils.check_directory_exists(snapshot_path, env):
+  app_data_path = _app_data_path(app_name)
+  manifest_path = _manifest_path(snapshot_path)
+  commands = [
+      f"am force-stop {package_name}",
+      f'[ -d "{snapshot_path}" ]',
+  ]
+  if differential:
+    commands += [
+        f"cat {manifest_path}",
+        f"mkdir -p {app_data_path} && {_list_command(app_data_path)}",
+    ]
+  results = adb_utils.issue_batch_request(commands, env)
+  if not results[1].ok:
     raise RuntimeError(f"Snapshot not found in {snapshot_path}.")
+  full_restore_sec = None
+  if differential and results[2].ok and results[3].ok:
+    full_restore_sec = _parse_full_restore_sec(results[2].output)
+    stats = _restore_changed_files(
+        snapshot_path,
+        app_data_path,
+        snapshot=_parse_listing(results[2].output),
+        current=_parse_listing(results[3].output),
+        env=env,
+    )
+  else:
+    stats = _restore_all_files(app_name, snapshot_path, app_data_path, env)
 
-  app_data_path = _app_data_path(app_name)
-  try:
-    file_utils.clear_directory(app_data_path, env)
-  except RuntimeError:
+  duration_sec = time.perf_counter() - start
+  if not stats.differential:
+    _record_full_restore_sec(manifest_path, duration_sec, env)
+    time_saved_sec = 0.0
+  elif full_restore_sec is not None:
+    time_saved_sec = full_restore_sec - duration_sec
+  else:
+    time_saved_sec = None
+  stats = dataclasses.replace(
+      stats, duration_sec=duration_sec, time_saved_sec=time_saved_sec
+  )
+  logging.info(
+      "Restored %s snapshot: %d files (%s bytes) copied, %d paths removed in"
+      " %.2fs; saved %s s.",
+      app_name,
+      stats.files_copied,
+      stats.bytes_copied,
+      stats.paths_removed,
+      stats.duration_sec,
+      "unknown" if time_saved_sec is None else f"{time_saved_sec:.2f}",
+  )
+  return stats
+
+
+def _record_full_restore_sec(
+    manifest_path: str,
+    duration_sec: float,
+    env: env_interface.AndroidEnvInterface,
+) -> None:
+  """Records the time of a full restore in the manifest, if there is one."""
+  adb_utils.issue_batch_request(
+      [
+          f"[ -f {manifest_path} ] && sed -i '/^{_FULL_RESTORE_SEC}  /d'"
+          f" {manifest_path} && echo '{_FULL_RESTORE_SEC} "
+          f" {duration_sec:.3f}' >> {manifest_path}"
+      ],
+      env,
+  )
+
+
+def _restore_changed_files(
+    snapshot_path: str,
+    app_data_path: str,
+    snapshot: dict[str, str],
+    current: dict[str, str],
+    env: env_interface.AndroidEnvInterface,
+) -> RestoreStats:
+  """Copies back the files that differ from the snapshot, removes the rest."""
+  # Paths that are not in the snapshot, or are a file in one and a directory
+  # in the other. Changed files are simply overwritten.
+  removed = {
+      path
+      for path, digest in current.items()
+      if path not in snapshot or _is_dir(digest) != _is_dir(snapshot[path])
+  }
+  # Files inside removed directories are removed with them.
+  removed = sorted(
+      path
+      for path in removed
+      if not any(parent in removed for parent in _parents(path))
+  )
+  created_dirs = sorted(
+      path
+      for path, digest in snapshot.items()
+      if _is_dir(digest) and not _is_dir(current.get(path))
+  )
+  copied = sorted(
+      path
+      for path, digest in snapshot.items()
+      if not _is_dir(digest) and current.get(path) != digest
+  )
+  if not removed and not created_dirs and not copied:
+    return RestoreStats(
+        differential=True,
+        files_copied=0,
+        paths_removed=0,
+        bytes_copied=0,
+        duration_sec=0.0,
+    )
+
+  def quoted(root: str, paths: list[str]) -> str:
+    return " ".join(shlex.quote(os.path.join(root, path)) for path in paths)
+
+  commands = []
+  if removed:
+    commands.append(f"rm -rf {quoted(app_data_path, removed)}")
+  if created_dirs:
+    commands.append(f"mkdir -p {quoted(app_data_path, created_dirs)}")
+  for path in copied:
+    commands.append(
+        f"cp -a {shlex.quote(os.path.join(snapshot_path, path))}"
+        f" {shlex.quote(os.path.join(app_data_path, path))}"
+    )
+  # File permissions, ownership, and security context may be lost during save
+  # and/or loading of the snapshot. As with full restores, fix them, but only
+  # on the restored paths.
+  restored = created_dirs + copied
+  if restored:
+    commands.append(f"restorecon -RD {quoted(app_data_path, restored)}")
+    commands.append(f"chmod 777 -R {quoted(app_data_path, restored)}")
+  if copied:
+    commands.append(f"stat -c %s {quoted(snapshot_path, copied)}")
+
+  results = adb_utils.issue_batch_request(commands, env)
+  for result in results[:-1] if copied else results:
+    adb_utils.check_batch_ok(
+        result, f"Failed to restore {app_data_path} from {snapshot_path}."
+    )
+  bytes_copied = 0 if not copied else None
+  if copied and results[-1].ok:
+    bytes_copied = sum(int(size) for size in results[-1].output.split())
+  return RestoreStats(
+      differential=True,
+      files_copied=len(copied),
+      paths_removed=len(removed),
+      bytes_copied=bytes_copied,
+      duration_sec=0.0,
+  )
+
+
+def _restore_all_files(
+    app_name: str,
+    snapshot_path: str,
+    app_data_path: str,
+    env: env_interface.AndroidEnvInterface,
+) -> RestoreStats:
+  """Replaces the app data with the snapshot."""
+  (
+      clear_data,
+      copy_snapshot,
+      restore_context,
+      set_permissions,
+      snapshot_size,
+  ) = adb_utils.issue_batch_request(
+      [
+          f'if [ -n "$(ls -1 {app_data_path})" ]; then rm -r'
+          f" {app_data_path}/*; fi",
+          f"mkdir -p {app_data_path} &&"
+          f" cp -a {snapshot_path}/. {app_data_path}/",
+          f"restorecon -RD {app_data_path}",
+          f"chmod 777 -R {app_data_path}",
+          f"find {snapshot_path} -type f -exec stat -c %s {{}} +",
+      ],
+      env,
+  )
+  if not clear_data.ok:
     logging.warn(
         "Continuing to restore %s snapshot after failing to clear application"
         " data.",
         app_name,
     )
-
-  file_utils.copy_dir(snapshot_path, app_data_path, env)
+  adb_utils.check_batch_ok(
+      copy_snapshot,
+      f"Failure copying {snapshot_path} directory to {app_data_path}.",
+  )
 
   # File permissions, ownership, and security context may be lost during save
   # and/or loading of the snapshot. As a workaround, restore the security
   # context and open up full file permissions.
-  adb_utils.check_ok(
-      adb_utils.issue_generic_request(
-          ["shell", "restorecon", "-RD", app_data_path], env
-      ),
-      "Failed to restore app data security context.",
+  adb_utils.check_batch_ok(
+      restore_context, "Failed to restore app data security context."
+  )
+  adb_utils.check_batch_ok(
+      set_permissions, "Failed to set app data permissions."
   )
-  adb_utils.check_ok(
-      adb_utils.issue_generic_request(
-          ["shell", "chmod", "777", "-R", app_data_path], env
+  sizes = snapshot_size.output.split() if snapshot_size.ok else None
+  return RestoreStats(
+      differential=False,
+      files_copied=len(sizes) if sizes is not None else 0,
+      paths_removed=0,
+      bytes_copied=(
+          sum(int(size) for size in sizes) if sizes is not None else None
       ),
-      "Failed to set app data permissions.",
+      duration_sec=0.0,
   )
@@ -0,0 +1,200 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import mock
+
+from absl.testing import absltest
+from android_env import env_interface
+from android_world.env import adb_utils
+from android_world.utils import app_snapshot
+from android_world.utils import file_utils
+
+_APP_DATA = '/data/data/com.example.app'
+_SNAPSHOT = '/data/data/android_world/snapshots/com.example.app'
+
+
+def _result(command, output=b'', exit_code=0):
+  return adb_utils.ShellCommandResult(command, output, exit_code)
+
+
+def _batch(*results):
+  """Returns a fake `issue_batch_request` answering with `results`."""
+  results = list(results)
+
+  def issue_batch_request(commands, env):
+    del env
+    outputs = results.pop(0)
+    return [
+        _result(command, *output) for command, output in zip(commands, outputs)
+    ]
+
+  return issue_batch_request
+
+
+class RestoreSnapshotTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.env = mock.create_autospec(env_interface.AndroidEnvInterface)
+    self.enter_context(
+        mock.patch.object(
+            adb_utils,
+            'get_adb_activity',
+            return_value='com.example.app/.MainActivity',
+        )
+    )
+    self.mock_batch = self.enter_context(
+        mock.patch.object(adb_utils, 'issue_batch_request')
+    )
+
+  def test_copies_only_changed_files(self):
+    manifest = (
+        b'directory  ./databases\n'
+        b'aaa  ./databases/notes.db\n'
+        b'bbb  ./shared_prefs.xml\n'
+    )
+    current = (
+        b'directory  ./databases\n'
+        b'zzz  ./databases/notes.db\n'
+        b'bbb  ./shared_prefs.xml\n'
+        b'directory  ./cache\n'
+        b'ccc  ./cache/tmp\n'
+    )
+    self.mock_batch.side_effect = _batch(
+        [(), (), (manifest,), (current,)],
+        [(), (), (), (), (b'4096\n',)],
+    )
+
+    stats = app_snapshot.restore_snapshot('app', self.env)
+
+    commands = self.mock_batch.call_args_list[1].args[0]
+    self.assertEqual(
+        commands,
+        [
+            f'rm -rf {_APP_DATA}/cache',
+            f'cp -a {_SNAPSHOT}/databases/notes.db'
+            f' {_APP_DATA}/databases/notes.db',
+            f'restorecon -RD {_APP_DATA}/databases/notes.db',
+            f'chmod 777 -R {_APP_DATA}/databases/notes.db',
+            f'stat -c %s {_SNAPSHOT}/databases/notes.db',
+        ],
+    )
+    self.assertTrue(stats.differential)
+    self.assertEqual(stats.files_copied, 1)
+    self.assertEqual(stats.paths_removed, 1)
+    self.assertEqual(stats.bytes_copied, 4096)
+    self.assertIsNone(stats.time_saved_sec)
+
+  def test_unchanged_app_data_is_not_touched(self):
+    listing = b'directory  ./databases\naaa  ./databases/notes.db\n'
+    self.mock_batch.side_effect = _batch([(), (), (listing,), (listing,)])
+
+    stats = app_snapshot.restore_snapshot('app', self.env)
+
+    self.mock_batch.assert_called_once()
+    self.assertEqual(stats.files_copied, 0)
+    self.assertEqual(stats.bytes_copied, 0)
+
+  def test_restores_everything_without_manifest(self):
+    self.mock_batch.side_effect = _batch(
+        [(), (), (b'', 1), (b'',)],
+        [(), (), (), (), (b'10\n20\n',)],
+        [(b'', 1)],
+    )
+
+    stats = app_snapshot.restore_snapshot('app', self.env)
+
+    commands = self.mock_batch.call_args_list[1].args[0]
+    self.assertIn(f'cp -a {_SNAPSHOT}/. {_APP_DATA}/', commands[1])
+    self.assertFalse(stats.differential)
+    self.assertEqual(stats.files_copied, 2)
+    self.assertEqual(stats.bytes_copied, 30)
+    self.assertEqual(stats.time_saved_sec, 0.0)
+
+  def test_records_full_restore_time_in_manifest(self):
+    self.mock_batch.side_effect = _batch(
+        [(), ()], [(), (), (), (), (b'10\n',)], [()]
+    )
+
+    stats = app_snapshot.restore_snapshot('app', self.env, differential=False)
+
+    self.assertFalse(stats.differential)
+    (record_time,) = self.mock_batch.call_args_list[2].args[0]
+    self.assertRegex(
+        record_time,
+        rf"^\[ -f {_SNAPSHOT}.manifest \] && sed -i '/\^full_restore_sec  /d'"
+        rf" {_SNAPSHOT}.manifest && echo 'full_restore_sec  \d+\.\d{{3}}' >>"
+        rf' {_SNAPSHOT}.manifest$',
+    )
+
+  def test_reports_time_saved_against_recorded_full_restore(self):
+    listing = b'aaa  ./notes.db\n'
+    manifest = listing + b'full_restore_sec  100.000\n'
+    self.mock_batch.side_effect = _batch([(), (), (manifest,), (listing,)])
+
+    stats = app_snapshot.restore_snapshot('app', self.env)
+
+    self.assertAlmostEqual(
+        stats.time_saved_sec, 100.0 - stats.duration_sec, places=6
+    )
+
+  def test_missing_snapshot_raises(self):
+    self.mock_batch.side_effect = _batch([(), (b'', 1), (b'', 1), ()])
+
+    with self.assertRaises(RuntimeError):
+      app_snapshot.restore_snapshot('app', self.env)
+
+
+class SaveSnapshotTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.env = mock.create_autospec(env_interface.AndroidEnvInterface)
+    self.enter_context(
+        mock.patch.object(
+            adb_utils,
+            'get_adb_activity',
+            return_value='com.example.app/.MainActivity',
+        )
+    )
+    self.enter_context(mock.patch.object(file_utils, 'clear_directory'))
+    self.enter_context(mock.patch.object(file_utils, 'copy_dir'))
+    self.mock_generic = self.enter_context(
+        mock.patch.object(adb_utils, 'issue_generic_request')
+    )
+    self.mock_batch = self.enter_context(
+        mock.patch.object(adb_utils, 'issue_batch_request')
+    )
+
+  def test_writes_manifest_without_touching_app_data(self):
+    self.mock_batch.side_effect = _batch([()])
+
+    app_snapshot.save_snapshot('app', self.env)
+
+    (write_manifest,) = self.mock_batch.call_args.args[0]
+    self.assertTrue(write_manifest.endswith(f'> {_SNAPSHOT}.manifest'))
+    self.mock_batch.assert_called_once()
+
+  def test_removes_manifest_that_failed_to_write(self):
+    self.mock_batch.side_effect = _batch([(b'', 1)])
+
+    app_snapshot.save_snapshot('app', self.env)
+
+    self.mock_generic.assert_called_with(
+        ['shell', 'rm', '-f', f'{_SNAPSHOT}.manifest'], self.env
+    )
+
+
+if __name__ == '__main__':
+  absltest.main()
@@ -17,8 +17,10 @@
 import datetime
 import enum
 import random
+from typing import Optional
 import zoneinfo
 
+from absl import logging
 from android_env import env_interface
 from android_env.proto import adb_pb2
 from android_world.env import adb_utils
@@ -124,7 +126,10 @@ def toggle_auto_settings(
   )
 
 
-def setup_datetime(env: env_interface.AndroidEnvInterface) -> None:
+def setup_datetime(
+    env: env_interface.AndroidEnvInterface,
+    dt: Optional[datetime.datetime] = None,
+) -> None:
   """Prepares the Android device's date and time settings for benchmarking.
 
   This function should be called once before starting the benchmark tests. It
@@ -132,13 +137,26 @@ def setup_datetime(env: env_interface.AndroidEnvInterface) -> None:
   24-hour time format. The purpose is to create a consistent environment for
   reproducible results.
 
+  All settings are applied with a single adb call; see `set_datetime` for `dt`.
+
   Args:
     env: AndroidEnv instance.
+    dt: If set, the datetime to set the device to after the settings.
   """
   adb_utils.set_root_if_needed(env)
-  toggle_auto_settings(env, Toggle.OFF)
-  _enable_24_hour_format(env)
-  _set_timezone_to_utc(env)
+  commands = [
+      f'settings put global auto_time {Toggle.OFF.value}',
+      f'settings put global auto_time_zone {Toggle.OFF.value}',
+      # 24-hour time format, to be consistent and region-independent.
+      'settings put system time_12_24 24',
+      # Timezone to UTC.
+      'service call alarm 3 s16 UTC',
+  ]
+  if dt is not None:
+    commands.append(_set_datetime_command(dt))
+  for result in adb_utils.issue_batch_request(commands, env):
+    if not result.ok:
+      logging.error('Failed to set up datetime: %r', result.command)
 
 
 def set_datetime(
@@ -183,33 +201,15 @@ def advance_system_time(
   )
 
 
-def _enable_24_hour_format(env: env_interface.AndroidEnvInterface) -> None:
-  """Sets to 24-hour time format to be consistent and region-independent."""
-  adb_utils.put_settings(
-      adb_pb2.AdbRequest.SettingsRequest.Namespace.SYSTEM,
-      'time_12_24',
-      '24',
-      env,
-  )
-
-
-def _set_timezone_to_utc(env: env_interface.AndroidEnvInterface) -> None:
-  """Sets the Android device's timezone to UTC.
-
-  Args:
-      env: An instance of AndroidEnv interface.
-  """
-  adb_command = ['shell', 'service', 'call', 'alarm', '3', 's16', 'UTC']
-  adb_utils.issue_generic_request(adb_command, env)
+def _set_datetime_command(dt: datetime.datetime) -> str:
+  return f'date {dt.strftime("%m%d%H%M%y.%S")}'
 
 
 def _set_datetime(
     env: env_interface.AndroidEnvInterface, dt: datetime.datetime
 ) -> None:
   """Sets the date and time on the Android device."""
-  adb_utils.issue_generic_request(
-      ['shell', 'date', dt.strftime('%m%d%H%M%y.%S')], env
-  )
+  adb_utils.issue_generic_request(['shell', _set_datetime_command(dt)], env)
 
 
 def generate_random_datetime(
@@ -22,40 +22,38 @@ from android_env import env_interface
 from android_env.proto import adb_pb2
 from android_world.env import adb_utils
 from android_world.utils import datetime_utils
+from android_world.utils import fake_adb_responses
 
 
 @mock.patch.object(adb_utils, 'issue_generic_request')
 class AdbDatetimeManagerTest(absltest.TestCase):
 
-  @mock.patch.object(adb_utils, 'put_settings')
+  @mock.patch.object(adb_utils, 'issue_batch_request')
   def test_setup_datetime_environment(
-      self, mock_put_settings, unused_mock_issue_generic_request
+      self, mock_issue_batch_request, mock_issue_generic_request
   ):
     env_mock = mock.create_autospec(env_interface.AndroidEnvInterface)
+    mock_issue_generic_request.return_value = (
+        fake_adb_responses.create_successful_generic_response('root')
+    )
 
-    datetime_utils.setup_datetime(env_mock)
+    datetime_utils.setup_datetime(
+        env_mock, datetime.datetime(2023, 10, 15, 15, 34)
+    )
 
-    expected_calls = [
-        mock.call(
-            adb_pb2.AdbRequest.SettingsRequest.Namespace.GLOBAL,
-            'auto_time',
-            '0',
-            env_mock,
-        ),
-        mock.call(
-            adb_pb2.AdbRequest.SettingsRequest.Namespace.GLOBAL,
-            'auto_time_zone',
-            '0',
-            env_mock,
-        ),
-        mock.call(
-            adb_pb2.AdbRequest.SettingsRequest.Namespace.SYSTEM,
-            'time_12_24',
-            '24',
-            env_mock,
-        ),
-    ]
-    mock_put_settings.assert_has_calls(expected_calls, any_order=False)
+    mock_issue_generic_request.assert_called_once_with(
+        ['shell', 'whoami'], env_mock, None
+    )
+    mock_issue_batch_request.assert_called_once_with(
+        [
+            'settings put global auto_time 0',
+            'settings put global auto_time_zone 0',
+            'settings put system time_12_24 24',
+            'service call alarm 3 s16 UTC',
+            'date 1015153423.00',
+        ],
+        env_mock,
+    )
 
   def test_advance_system_time(self, mock_issue_generic_request):
     env_mock = mock.create_autospec(env_interface.AndroidEnvInterface)
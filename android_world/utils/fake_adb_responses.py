@@ -19,9 +19,11 @@ on the mock returning a response to an adb call. This module provides functions
 to construct these for common use cases.
 """
 
+from collections.abc import Sequence
 import os
 
 from android_env.proto import adb_pb2
+from android_world.env import adb_utils
 
 
 def create_successful_generic_response(output: str) -> adb_pb2.AdbResponse:
@@ -98,16 +100,34 @@ def create_check_file_or_folder_exists_responses(
   ]
 
 
+def create_successful_batch_response(
+    outputs: Sequence[str],
+) -> adb_pb2.AdbResponse:
+  """Returns an AdbResponse for `adb_utils.issue_batch_request`.
+
+  Args:
+    outputs: The output of each command; all commands exit with 0.
+  """
+  # pylint: disable=protected-access
+  return create_successful_generic_response("".join(
+      f"{output}\n{adb_utils._BATCH_MARKER} {index} 0\n"
+      for index, output in enumerate(outputs)
+  ))
+  # pylint: enable=protected-access
+
+
 def create_taskeval_initialize_responses(
     number_of_apps: int,
 ) -> list[adb_pb2.AdbResponse]:
   """Returns a list of responses to handle the initialize logic in TaskEval."""
-  # Two calls are used to set the time. Then a call per app is used to close the
-  # apps listed as associated with the task.
-  number_of_responses = 2 + number_of_apps
+  # Two calls are used to check for root and to set up the time. Then a call
+  # per app is used to restore the app snapshot.
   return [
-      create_successful_generic_response("")
-      for _ in range(number_of_responses)
+      create_successful_generic_response("root"),
+      create_successful_batch_response([""] * 5),
+  ] + [
+      create_successful_batch_response([""] * 6)
+      for _ in range(number_of_apps)
   ]
 
 
@@ -16,6 +16,7 @@ from unittest import mock
 
 from absl.testing import absltest
 from android_env import env_interface
+from android_world.env import adb_utils
 from android_world.utils import fake_adb_responses
 from android_world.utils import file_utils
 
@@ -85,5 +86,17 @@ class FakeAdbResponsesTest(absltest.TestCase):
     )
 
 
+  def test_create_successful_batch_response(self):
+    env = mock.create_autospec(env_interface.AndroidEnvInterface)
+
+    env.execute_adb_call.return_value = (
+        fake_adb_responses.create_successful_batch_response(["a\n", ""])
+    )
+
+    results = adb_utils.issue_batch_request(["echo a", "true"], env)
+    self.assertEqual([result.output for result in results], [b"a\n", b""])
+    self.assertTrue(all(result.ok for result in results))
+
+
 if __name__ == "__main__":
   absltest.main()
@@ -0,0 +1,178 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""A local fake of the ADB server for tests of `adb_wire`.
+
+Serves the subset of the ADB server protocol used by `adb_wire.AdbWireClient`
+for a single device: `host:transport:<serial>`, interactive `shell,raw:`
+sessions, which run a local `sh` like adbd runs one on the device, and `sync:`
+sessions, which read and write files in a local directory that stands in for
+the device file system.
+"""
+
+import os
+import socket
+import socketserver
+import struct
+import subprocess
+import threading
+
+_SYNC_HEADER = struct.Struct('<4sI')
+
+
+def _read_exactly(sock: socket.socket, size: int) -> bytes:
+  data = bytearray()
+  while len(data) < size:
+    chunk = sock.recv(size - len(data))
+    if not chunk:
+      raise ConnectionError('Connection closed.')
+    data += chunk
+  return bytes(data)
+
+
+def _fail(message: str) -> bytes:
+  data = message.encode('utf-8')
+  return b'FAIL' + b'%04x' % len(data) + data
+
+
+class FakeAdbServer:
+  """Fake ADB server listening on a local port.
+
+  Usage:
+
+  with FakeAdbServer('emulator-5554', root_dir) as server:
+    client = adb_wire.AdbWireClient('emulator-5554', port=server.port)
+  """
+
+  def __init__(self, serial: str, root_dir: str):
+    """Initializes the server.
+
+    Args:
+      serial: Serial of the only device.
+      root_dir: Local directory that device paths of sync requests are
+        resolved against.
+    """
+    self._serial = serial
+    self._root_dir = root_dir
+    self._lock = threading.Lock()
+    self.num_connections = 0
+    self.services: list[str] = []
+
+    fake = self
+
+    class Handler(socketserver.BaseRequestHandler):
+
+      def handle(self):
+        fake._handle(self.request)  # pylint: disable=protected-access
+
+    self._server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), Handler)
+    self._server.daemon_threads = True
+    self._thread = threading.Thread(
+        target=self._server.serve_forever, daemon=True
+    )
+
+  @property
+  def port(self) -> int:
+    return self._server.server_address[1]
+
+  def start(self) -> None:
+    self._thread.start()
+
+  def stop(self) -> None:
+    self._server.shutdown()
+    self._server.server_close()
+
+  def __enter__(self) -> 'FakeAdbServer':
+    self.start()
+    return self
+
+  def __exit__(self, *unused_exc_info) -> None:
+    self.stop()
+
+  def _local_path(self, path: str) -> str:
+    return os.path.join(self._root_dir, path.lstrip('/'))
+
+  def _read_request(self, sock: socket.socket) -> str:
+    length = int(_read_exactly(sock, 4), 16)
+    return _read_exactly(sock, length).decode('utf-8')
+
+  def _handle(self, sock: socket.socket) -> None:
+    with self._lock:
+      self.num_connections += 1
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    try:
+      request = self._read_request(sock)
+      if request != f'host:transport:{self._serial}':
+        sock.sendall(_fail(f"device '{request}' not found"))
+        return
+      sock.sendall(b'OKAY')
+      service = self._read_request(sock)
+      with self._lock:
+        self.services.append(service)
+      if service == 'shell,raw:':
+        sock.sendall(b'OKAY')
+        self._serve_shell(sock)
+      elif service == 'sync:':
+        sock.sendall(b'OKAY')
+        self._serve_sync(sock)
+      else:
+        sock.sendall(_fail(f'unknown service {service}'))
+    except ConnectionError:
+      pass
+
+  def _serve_shell(self, sock: socket.socket) -> None:
+    # Like adbd for a raw shell: a shell reading commands from the socket.
+    subprocess.run(
+        ['sh'],
+        stdin=sock.fileno(),
+        stdout=sock.fileno(),
+        stderr=subprocess.STDOUT,
+        check=False,
+    )
+
+  def _serve_sync(self, sock: socket.socket) -> None:
+    """Serves sync requests until QUIT or a failure."""
+    while True:
+      command, length = _SYNC_HEADER.unpack(_read_exactly(sock, 8))
+      if command == b'QUIT':
+        return
+      path = _read_exactly(sock, length).decode('utf-8')
+      if command == b'RECV':
+        try:
+          with open(self._local_path(path), 'rb') as f:
+            content = f.read()
+        except OSError as e:
+          message = str(e).encode('utf-8')
+          sock.sendall(_SYNC_HEADER.pack(b'FAIL', len(message)) + message)
+          return
+        for offset in range(0, len(content), 64 * 1024):
+          chunk = content[offset : offset + 64 * 1024]
+          sock.sendall(_SYNC_HEADER.pack(b'DATA', len(chunk)) + chunk)
+        sock.sendall(_SYNC_HEADER.pack(b'DONE', 0))
+      elif command == b'SEND':
+        device_path, mode = path.rsplit(',', 1)
+        chunks = []
+        while True:
+          command, length = _SYNC_HEADER.unpack(_read_exactly(sock, 8))
+          if command == b'DONE':
+            break
+          chunks.append(_read_exactly(sock, length))
+        local_path = self._local_path(device_path)
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        with open(local_path, 'wb') as f:
+          f.write(b''.join(chunks))
+        os.chmod(local_path, int(mode) & 0o777)
+        sock.sendall(_SYNC_HEADER.pack(b'OKAY', 0))
+      else:
+        return
@@ -22,6 +22,7 @@ import random
 import shutil
 import string
 import tempfile
+from typing import Iterable
 from typing import Iterator
 from typing import Optional
 
@@ -31,6 +32,7 @@ from android_env.components import errors
 from android_env.proto import adb_pb2
 from android_world.env import adb_utils
 from android_world.utils import fuzzy_match_lib
+from android_world.utils import tar_transfer
 
 
 # Local temporary location for files copied to or from the device.
@@ -111,6 +113,19 @@ def clear_directory(
     )
 
 
+def _random_file_content() -> str:
+  return "".join(random.choices(string.ascii_letters + string.digits, k=20))
+
+
+def _create_file_command(
+    file_name: str, directory_path: str, content: str
+) -> tuple[str, str]:
+  """Returns a shell command that writes `content` and the escaped content."""
+  # Escape quotes to avoid issues with writing them to file.
+  content = content.replace("'", "'\"'\"'")
+  return f"echo '{content}' > {directory_path}/{file_name}", content
+
+
 def create_file(
     file_name: str,
     directory_path: str,
@@ -130,23 +145,41 @@ def create_file(
     Content of the created file.
   """
   if not content:
-    content = "".join(
-        random.choices(string.ascii_letters + string.digits, k=20)
-    )
-  # Escape quotes to avoid issues with writing them to file.
-  content = content.replace("'", "'\"'\"'")
+    content = _random_file_content()
+  command, content = _create_file_command(file_name, directory_path, content)
   mkdir(directory_path, env)
-  adb_utils.issue_generic_request(
-      [
-          "shell",
-          "echo",
-          f"'{content}'",
-          ">",
-          f"{directory_path}/{file_name}",
+  adb_utils.issue_generic_request(["shell", command], env)
+  return content
+
+
+def create_files(
+    file_names: Iterable[str],
+    directory_path: str,
+    env: env_interface.AndroidEnvInterface,
+) -> None:
+  """Creates new files with random text using a single adb call.
+
+  Args:
+    file_names: Names of the files.
+    directory_path: Location to create the files.
+    env: The environment to use.
+
+  Raises:
+    RuntimeError when the directory could not be created.
+  """
+  mkdir_result, *_ = adb_utils.issue_batch_request(
+      [f"mkdir -p {directory_path}"]
+      + [
+          _create_file_command(
+              file_name, directory_path, _random_file_content()
+          )[0]
+          for file_name in file_names
       ],
       env,
   )
-  return content
+  adb_utils.check_batch_ok(
+      mkdir_result, f"Failed to create directory {directory_path}."
+  )
 
 
 def mkdir(directory_path: str, env: env_interface.AndroidEnvInterface) -> None:
@@ -317,18 +350,14 @@ def tmp_directory_from_device(
   if not check_directory_exists(device_path, env):
     raise FileNotFoundError(f"{device_path} does not exist.")
   try:
-    os.makedirs(tmp_directory, exist_ok=True)
-    files = get_file_list_with_metadata(device_path, env, timeout_sec)
-    for file in files:
-      pull_response = env.execute_adb_call(
-          adb_pb2.AdbRequest(
-              pull=adb_pb2.AdbRequest.Pull(path=file.full_path),
-              timeout_sec=timeout_sec,
-          )
-      )
-      adb_utils.check_ok(pull_response)
-      with open(os.path.join(tmp_directory, file.file_name), "wb") as f:
-        f.write(pull_response.pull.content)
+    # Only the regular files directly in `device_path` are copied.
+    tar_transfer.pull_directory(
+        device_path,
+        tmp_directory,
+        env,
+        include=lambda path: "/" not in path,
+        timeout_sec=timeout_sec,
+    )
 
     yield tmp_directory
 
@@ -433,26 +462,16 @@ def copy_data_to_device(
   """
   if not os.path.exists(local_path):
     raise FileNotFoundError(f"{local_path} does not exist.")
-  response = adb_pb2.AdbResponse()
   if os.path.isfile(local_path):
     # If the file extension is different, remote_path is likely a directory.
     if os.path.splitext(local_path)[1] != os.path.splitext(remote_path)[1]:
       remote_path = os.path.join(remote_path, os.path.basename(local_path))
     return copy_file_to_device(local_path, remote_path, env, timeout_sec)
 
-  # Copying a directory over, push every file separately.
-  for file_path in os.listdir(local_path):
-    current_response = copy_file_to_device(
-        os.path.join(local_path, file_path),
-        os.path.join(remote_path, os.path.basename(file_path)),
-        env,
-        timeout_sec,
-    )
-    if current_response.status != adb_pb2.AdbResponse.OK:
-      return current_response
-    response = current_response
-
-  return response
+  # Copying a directory over, push its whole tree as one archive.
+  return tar_transfer.push_directory(
+      local_path, remote_path, env, timeout_sec=timeout_sec
+  )
 
 
 def get_file_list_with_metadata(
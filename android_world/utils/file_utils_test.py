@@ -23,6 +23,7 @@ from absl.testing import parameterized
 from android_env.proto import adb_pb2
 from android_world.env import adb_utils
 from android_world.utils import file_utils
+from android_world.utils import tar_transfer
 
 
 def create_file_with_contents(file_name: str, contents: bytes) -> str:
@@ -59,7 +60,7 @@ class FilesTest(parameterized.TestCase):
     )
     self.assertFalse(result)
 
-  @mock.patch.object(os.path, 'exists')
+  @mock.patch.object(tar_transfer, 'pull_directory')
   @mock.patch.object(file_utils, 'check_directory_exists')
   @mock.patch.object(shutil, 'rmtree')
   @mock.patch.object(tempfile, 'mkdtemp')
@@ -68,50 +69,30 @@ class FilesTest(parameterized.TestCase):
       mock_mkdtemp,
       mock_rmtree,
       mock_check_directory_exists,
-      mock_path_exists,
+      mock_pull_directory,
   ):
     """Test if tmp_directory_from_device correctly copies a directory and handles exceptions."""
-    mock_response = adb_pb2.AdbResponse(status=adb_pb2.AdbResponse.Status.OK)
-    self.mock_env.execute_adb_call.return_value = mock_response
-    mock_path_exists.return_value = False
-    file_names = ['test1.txt', 'test2.txt']
     mock_check_directory_exists.return_value = True
-    self.mock_issue_generic_request.return_value = adb_pb2.AdbResponse(
-        status=adb_pb2.AdbResponse.Status.OK,
-        generic=adb_pb2.AdbResponse.GenericResponse(
-            output=bytes(
-                '-rw-rw---- 1 u0_a158 media_rw 0 2023-11-28 23:17:43.176000000'
-                f' +0000 {file_names[0]}\n'
-                '-rw-rw---- 1 u0_a158 media_rw 0 2023-11-28 23:17:43.176000000'
-                f' +0000 {file_names[1]}',
-                'utf-8',
-            )
-        ),
-    )
-
     tmp_local_directory = '/tmp/random/dir'
     mock_mkdtemp.return_value = tmp_local_directory
     with file_utils.tmp_directory_from_device(
         '/remotedir', self.mock_env
     ) as tmp_directory:
       self.assertEqual(tmp_local_directory, tmp_directory)
-      self.mock_env.execute_adb_call.assert_has_calls([
-          mock.call(
-              adb_pb2.AdbRequest(
-                  pull=adb_pb2.AdbRequest.Pull(
-                      path=os.path.join('/remotedir/', file_name)
-                  ),
-                  timeout_sec=None,
-              )
-          )
-          for file_name in file_names
-      ])
-      self.assertCountEqual(os.listdir(tmp_directory), file_names)
+      mock_pull_directory.assert_called_once_with(
+          '/remotedir',
+          tmp_local_directory,
+          self.mock_env,
+          include=mock.ANY,
+          timeout_sec=None,
+      )
+      include = mock_pull_directory.call_args.kwargs['include']
+      self.assertTrue(include('test1.txt'))
+      self.assertFalse(include('subdir/test2.txt'))
       mock_rmtree.assert_not_called()
     mock_rmtree.assert_called_with(tmp_local_directory)
 
     # Test FileNotFoundError
-    mock_path_exists.return_value = False
     mock_check_directory_exists.return_value = False
     with self.assertRaises(FileNotFoundError):
       with file_utils.tmp_directory_from_device(
@@ -121,9 +102,7 @@ class FilesTest(parameterized.TestCase):
 
     # Test ADB RuntimeError
     mock_check_directory_exists.return_value = True
-    self.mock_issue_generic_request.return_value.status = (
-        adb_pb2.AdbResponse.ADB_ERROR
-    )
+    mock_pull_directory.side_effect = RuntimeError('Failed to archive.')
     with self.assertRaises(RuntimeError):
       with file_utils.tmp_directory_from_device(
           '/remote/dir',
@@ -138,10 +117,11 @@ class FilesTest(parameterized.TestCase):
     self.mock_env.execute_adb_call.return_value = mock_response
     temp_dir = tempfile.mkdtemp()
     file_name = 'file1.txt'
-    create_file_with_contents(os.path.join(temp_dir, file_name), file_contents)
+    local_file = os.path.join(temp_dir, file_name)
+    create_file_with_contents(local_file, file_contents)
 
     response = file_utils.copy_data_to_device(
-        temp_dir, '/remote/dir', self.mock_env
+        local_file, '/remote/dir', self.mock_env
     )
     self.mock_env.execute_adb_call.assert_has_calls(
         [
@@ -160,39 +140,21 @@ class FilesTest(parameterized.TestCase):
 
     self.assertEqual(response, mock_response)
 
-  def test_copy_data_to_device_copies_full_dir(self):
-    """Test if copy_data_to_device correctly copies data from a directory."""
-    file_contents = b'test file contents'
+  @mock.patch.object(tar_transfer, 'push_directory')
+  def test_copy_data_to_device_copies_full_dir(self, mock_push_directory):
+    """Test if copy_data_to_device copies a directory as one archive."""
     mock_response = adb_pb2.AdbResponse(status=adb_pb2.AdbResponse.Status.OK)
-    self.mock_env.execute_adb_call.return_value = mock_response
+    mock_push_directory.return_value = mock_response
     temp_dir = tempfile.mkdtemp()
-    file_names = ['file1.txt', 'file2.txt']
-    for file_name in file_names:
-      create_file_with_contents(
-          os.path.join(temp_dir, file_name), file_contents
-      )
+    create_file_with_contents(os.path.join(temp_dir, 'file1.txt'), b'test')
 
     response = file_utils.copy_data_to_device(
         temp_dir, '/remote/dir', self.mock_env
     )
-    calls = []
-    for file_name in file_names:
-      calls.append(
-          mock.call(
-              adb_pb2.AdbRequest(
-                  push=adb_pb2.AdbRequest.Push(
-                      content=file_contents,
-                      path=os.path.join('/remote/dir/', file_name),
-                  ),
-                  timeout_sec=None,
-              )
-          )
-      )
-    self.mock_env.execute_adb_call.assert_has_calls(
-        calls,
-        any_order=True,
-    )
 
+    mock_push_directory.assert_called_once_with(
+        temp_dir, '/remote/dir', self.mock_env, timeout_sec=None
+    )
     self.assertEqual(response, mock_response)
 
   def test_copy_data_to_device_file_not_found(self):
@@ -0,0 +1,157 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Strategies for resetting device state before and after a task."""
+
+import abc
+from collections.abc import Sequence
+import dataclasses
+
+from absl import logging
+from android_env.proto import state_pb2
+from android_world.env import interface
+from android_world.utils import app_snapshot
+
+DEFAULT_EMULATOR_SNAPSHOT = 'android_world_task_reset'
+
+
+@dataclasses.dataclass(frozen=True)
+class ResetResult:
+  """The outcome of `ResetStrategy.reset`.
+
+  Attributes:
+    strategy: The name of the strategy that performed the reset; this differs
+      from the strategy's `name` if it fell back to another one.
+    restore_stats: Statistics of the app snapshots restored, by app name.
+  """
+
+  strategy: str
+  restore_stats: dict[str, app_snapshot.RestoreStats] = dataclasses.field(
+      default_factory=dict
+  )
+
+
+class ResetStrategy(abc.ABC):
+  """Resets the state of the apps used by a task."""
+
+  # The name under which reset times are recorded.
+  name = ''
+
+  # Whether `reset` restores the whole device, including its clock, rather
+  # than just app data.
+  restores_device = False
+
+  def prepare(self, env: interface.AsyncEnv) -> None:
+    """Prepares the device for resets; called once before running tasks."""
+    del env
+
+  @abc.abstractmethod
+  def reset(
+      self, app_names: Sequence[str], env: interface.AsyncEnv
+  ) -> ResetResult:
+    """Resets the data of the given apps.
+
+    Args:
+      app_names: The apps to reset.
+      env: The environment.
+
+    Returns:
+      The strategy that performed the reset and what it restored.
+    """
+
+
+class AppSnapshotReset(ResetStrategy):
+  """Restores the data of each app from its snapshot on the device."""
+
+  name = 'app_snapshot'
+
+  def reset(
+      self, app_names: Sequence[str], env: interface.AsyncEnv
+  ) -> ResetResult:
+    result = ResetResult(self.name)
+    for app_name in app_names:
+      # Don't need to restore snapshot for clipper app since it doesn't have
+      # any state.
+      if app_name and app_name != 'clipper':
+        try:
+          result.restore_stats[app_name] = app_snapshot.restore_snapshot(
+              app_name, env.controller
+          )
+        except RuntimeError as error:
+          logging.warning('Skipping app snapshot loading : %s', error)
+    return result
+
+
+class EmulatorSnapshotReset(ResetStrategy):
+  """Loads an emulator snapshot of the whole device.
+
+  Loading a snapshot takes about the same time regardless of the apps used,
+  whereas restoring app snapshots copies all data of each app. The snapshot is
+  saved by `prepare`, which should therefore run on a freshly set up device.
+
+  If the snapshot cannot be loaded, e.g. because the device is not an emulator,
+  the task falls back to `fallback`.
+  """
+
+  name = 'emulator_snapshot'
+  restores_device = True
+
+  def __init__(
+      self,
+      snapshot_name: str = DEFAULT_EMULATOR_SNAPSHOT,
+      fallback: ResetStrategy | None = None,
+  ):
+    self.snapshot_name = snapshot_name
+    self.fallback = fallback or AppSnapshotReset()
+
+  def prepare(self, env: interface.AsyncEnv) -> None:
+    response = env.controller.save_state(
+        state_pb2.SaveStateRequest(args={'snapshot_name': self.snapshot_name})
+    )
+    if response.status != state_pb2.SaveStateResponse.Status.OK:
+      logging.warning(
+          'Failed to save emulator snapshot %s; tasks will use %s: %s',
+          self.snapshot_name,
+          self.fallback.name,
+          response.error_message,
+      )
+
+  def reset(
+      self, app_names: Sequence[str], env: interface.AsyncEnv
+  ) -> ResetResult:
+    response = env.controller.load_state(
+        state_pb2.LoadStateRequest(args={'snapshot_name': self.snapshot_name})
+    )
+    if response.status == state_pb2.LoadStateResponse.Status.OK:
+      return ResetResult(self.name)
+    logging.warning(
+        'Failed to load emulator snapshot %s, using %s instead: %s',
+        self.snapshot_name,
+        self.fallback.name,
+        response.error_message,
+    )
+    return self.fallback.reset(app_names, env)
+
+
+def get_reset_strategy(name: str) -> ResetStrategy:
+  """Returns the reset strategy with the given name."""
+  strategies = {
+      AppSnapshotReset.name: AppSnapshotReset,
+      EmulatorSnapshotReset.name: EmulatorSnapshotReset,
+  }
+  if name not in strategies:
+    raise ValueError(
+        f'Unknown reset strategy {name!r}; expected one of {list(strategies)}.'
+    )
+  return strategies[name]()
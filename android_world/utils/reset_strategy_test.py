@@ -0,0 +1,119 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest import mock
+
+from absl.testing import absltest
+from android_env.proto import state_pb2
+from android_world.utils import app_snapshot
+from android_world.utils import reset_strategy
+from android_world.utils import test_utils
+
+
+class AppSnapshotResetTest(absltest.TestCase):
+
+  @mock.patch.object(app_snapshot, 'restore_snapshot')
+  def test_restores_each_app_except_clipper(self, mock_restore_snapshot):
+    env = test_utils.FakeAsyncEnv()
+    stats = app_snapshot.RestoreStats(
+        differential=True,
+        files_copied=1,
+        paths_removed=0,
+        bytes_copied=10,
+        duration_sec=0.5,
+        time_saved_sec=2.0,
+    )
+    mock_restore_snapshot.return_value = stats
+
+    result = reset_strategy.AppSnapshotReset().reset(
+        ['markor', 'clipper', ''], env
+    )
+
+    self.assertEqual(
+        result, reset_strategy.ResetResult('app_snapshot', {'markor': stats})
+    )
+    mock_restore_snapshot.assert_called_once_with('markor', env.controller)
+
+  @mock.patch.object(app_snapshot, 'restore_snapshot')
+  def test_missing_snapshot_is_skipped(self, mock_restore_snapshot):
+    mock_restore_snapshot.side_effect = [RuntimeError('missing'), None]
+
+    result = reset_strategy.AppSnapshotReset().reset(
+        ['markor', 'joplin'], test_utils.FakeAsyncEnv()
+    )
+
+    self.assertEqual(mock_restore_snapshot.call_count, 2)
+    self.assertCountEqual(result.restore_stats, ['joplin'])
+
+
+class EmulatorSnapshotResetTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.env = test_utils.FakeAsyncEnv()
+    self.fallback = mock.create_autospec(
+        reset_strategy.ResetStrategy, instance=True
+    )
+    self.fallback.name = 'fallback'
+    self.fallback.reset.return_value = reset_strategy.ResetResult('fallback')
+    self.strategy = reset_strategy.EmulatorSnapshotReset(
+        'snap', fallback=self.fallback
+    )
+
+  def test_prepare_saves_snapshot(self):
+    self.strategy.prepare(self.env)
+
+    self.env.controller.save_state.assert_called_once_with(
+        state_pb2.SaveStateRequest(args={'snapshot_name': 'snap'})
+    )
+
+  def test_reset_loads_snapshot(self):
+    self.env.controller.load_state.return_value = state_pb2.LoadStateResponse(
+        status=state_pb2.LoadStateResponse.Status.OK
+    )
+
+    result = self.strategy.reset(['markor'], self.env)
+
+    self.assertEqual(result, reset_strategy.ResetResult('emulator_snapshot'))
+    self.env.controller.load_state.assert_called_once_with(
+        state_pb2.LoadStateRequest(args={'snapshot_name': 'snap'})
+    )
+    self.fallback.reset.assert_not_called()
+
+  def test_reset_falls_back_if_snapshot_cannot_be_loaded(self):
+    self.env.controller.load_state.return_value = state_pb2.LoadStateResponse(
+        status=state_pb2.LoadStateResponse.Status.NOT_FOUND
+    )
+
+    result = self.strategy.reset(['markor'], self.env)
+
+    self.assertEqual(result.strategy, 'fallback')
+    self.fallback.reset.assert_called_once_with(['markor'], self.env)
+
+
+class GetResetStrategyTest(absltest.TestCase):
+
+  def test_get_reset_strategy(self):
+    self.assertIsInstance(
+        reset_strategy.get_reset_strategy('emulator_snapshot'),
+        reset_strategy.EmulatorSnapshotReset,
+    )
+
+  def test_unknown_strategy_raises(self):
+    with self.assertRaises(ValueError):
+      reset_strategy.get_reset_strategy('factory_reset')
+
+
+if __name__ == '__main__':
+  absltest.main()
@@ -0,0 +1,278 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Transfers directory trees to and from the device as a single tar archive.
+
+Pulling or pushing files one `AdbRequest` at a time costs a round trip, and
+with the `adb` binary a process, per file. Here a whole tree is moved at once:
+
+  * Pulls stream `tar -c` from the device over one `adb exec-out` call and
+    unpack the archive locally.
+  * Pushes pack the archive locally, push it with one `AdbRequest.Push` and
+    unpack it on the device with one shell call. `AdbRequest` has no way to
+    pass stdin to a command, so the archive cannot be piped into `tar -x`
+    directly.
+
+Archives can optionally be gzip compressed, which pays off for large, mostly
+textual data such as databases, at the cost of CPU time on the device.
+"""
+
+from collections.abc import Callable, Iterable
+import io
+import os
+import secrets
+import shlex
+import tarfile
+from typing import Optional
+
+from android_env import env_interface
+from android_env.proto import adb_pb2
+from android_world.env import adb_utils
+
+# Where archives are staged on the device before they are unpacked.
+_DEVICE_STAGING_DIR = "/data/local/tmp"
+
+# Decides which files to transfer, given their path relative to the root of
+# the transfer, e.g. "databases/notes.db".
+IncludeFilter = Callable[[str], bool]
+
+
+def _is_safe_member(member: tarfile.TarInfo) -> bool:
+  """Whether `member` is a file or directory that stays inside the target."""
+  if not (member.isfile() or member.isdir()):
+    return False
+  path = os.path.normpath(member.name)
+  return not (os.path.isabs(path) or path == ".." or path.startswith("../"))
+
+
+def _extract(archive: bytes, local_path: str) -> None:
+  """Unpacks the files and directories of `archive` into `local_path`."""
+  os.makedirs(local_path, exist_ok=True)
+  try:
+    with tarfile.open(fileobj=io.BytesIO(archive), mode="r:*") as tar:
+      members = [member for member in tar if _is_safe_member(member)]
+      if hasattr(tarfile, "data_filter"):
+        tar.extractall(local_path, members=members, filter="data")
+      else:
+        tar.extractall(local_path, members=members)
+  except tarfile.TarError as e:
+    raise RuntimeError(f"Failed to unpack archive into {local_path}.") from e
+
+
+def _list_device_files(
+    device_path: str,
+    env: env_interface.AndroidEnvInterface,
+    timeout_sec: Optional[float],
+) -> list[str]:
+  """Returns the regular files under `device_path`, relative to it."""
+  response = adb_utils.issue_generic_request(
+      ["shell", f"cd {shlex.quote(device_path)} && find . -type f"],
+      env,
+      timeout_sec,
+  )
+  adb_utils.check_ok(response, f"Failed to list files in {device_path}.")
+  files = []
+  for line in response.generic.output.decode("utf-8").splitlines():
+    if line.startswith("./"):
+      files.append(line[2:])
+  return files
+
+
+def pull_directory(
+    device_path: str,
+    local_path: str,
+    env: env_interface.AndroidEnvInterface,
+    include: Optional[IncludeFilter] = None,
+    compress: bool = False,
+    timeout_sec: Optional[float] = None,
+) -> None:
+  """Copies a directory tree from the device into a local directory.
+
+  Args:
+    device_path: The directory on the device.
+    local_path: The local directory to unpack into; created if needed.
+    env: The environment.
+    include: Which files to copy. If given, the files under `device_path` are
+      listed first, which costs one more adb call. Defaults to all files.
+    compress: Whether to gzip the archive on the device.
+    timeout_sec: A timeout for each adb call.
+
+  Raises:
+    RuntimeError: If the files cannot be listed or the archive is invalid,
+      e.g. because `device_path` does not exist.
+  """
+  if include is None:
+    members = ["."]
+  else:
+    members = [
+        f"./{path}"
+        for path in _list_device_files(device_path, env, timeout_sec)
+        if include(path)
+    ]
+    if not members:
+      os.makedirs(local_path, exist_ok=True)
+      return
+  flags = "-czf" if compress else "-cf"
+  # exec-out returns stdout unmodified, so tar errors must not end up in it.
+  command = (
+      f"tar {flags} - -C {shlex.quote(device_path)}"
+      f" {' '.join(shlex.quote(member) for member in members)} 2>/dev/null"
+  )
+  response = adb_utils.issue_generic_request(
+      ["exec-out", command], env, timeout_sec
+  )
+  adb_utils.check_ok(response, f"Failed to archive {device_path}.")
+  _extract(response.generic.output, local_path)
+
+
+def _archive(entries: Iterable[tuple[str, str]], compress: bool) -> bytes:
+  """Packs local `(path, name in archive)` entries into a tar archive."""
+
+  def as_root(info: tarfile.TarInfo) -> tarfile.TarInfo:
+    # Like files pushed with adb, the extracted files are owned by the user
+    # running adbd, rather than whoever owns them locally.
+    info.uid = info.gid = 0
+    info.uname = info.gname = "root"
+    return info
+
+  buffer = io.BytesIO()
+  with tarfile.open(fileobj=buffer, mode="w:gz" if compress else "w") as tar:
+    for path, name in entries:
+      tar.add(path, arcname=name, recursive=False, filter=as_root)
+  return buffer.getvalue()
+
+
+def _push_archive(
+    archive: bytes,
+    top_level_names: Iterable[str],
+    device_path: str,
+    env: env_interface.AndroidEnvInterface,
+    compress: bool,
+    timeout_sec: Optional[float],
+) -> adb_pb2.AdbResponse:
+  """Pushes `archive` and unpacks it into `device_path`."""
+  staged = os.path.join(
+      _DEVICE_STAGING_DIR, f"android_world_{secrets.token_hex(8)}.tar"
+  )
+  response = env.execute_adb_call(
+      adb_pb2.AdbRequest(
+          push=adb_pb2.AdbRequest.Push(content=archive, path=staged),
+          timeout_sec=timeout_sec,
+      )
+  )
+  if response.status != adb_pb2.AdbResponse.Status.OK:
+    return response
+  target = shlex.quote(device_path)
+  extracted = " ".join(
+      shlex.quote(os.path.join(device_path, name)) for name in top_level_names
+  )
+  # Like `file_utils.copy_file_to_device`, open up the permissions of the
+  # copied files. The staged archive is removed even if unpacking fails.
+  return adb_utils.issue_generic_request(
+      [
+          "shell",
+          f"mkdir -p {target} && tar -x{'z' if compress else ''}f {staged}"
+          f" -C {target} && chmod -R 777 {extracted}; status=$?;"
+          f" rm -f {staged}; exit $status",
+      ],
+      env,
+      timeout_sec,
+  )
+
+
+def _ancestors(name: str) -> list[str]:
+  """Returns the parent directories of relative path `name`, outermost first."""
+  parts = name.split(os.sep)[:-1]
+  return [os.sep.join(parts[:end]) for end in range(1, len(parts) + 1)]
+
+
+def push_directory(
+    local_path: str,
+    device_path: str,
+    env: env_interface.AndroidEnvInterface,
+    include: Optional[IncludeFilter] = None,
+    compress: bool = False,
+    timeout_sec: Optional[float] = None,
+) -> adb_pb2.AdbResponse:
+  """Copies the contents of a local directory tree into a device directory.
+
+  Args:
+    local_path: The local directory.
+    device_path: The directory on the device; created if needed.
+    env: The environment.
+    include: Which files to copy, given their path relative to `local_path`.
+      Defaults to all files.
+    compress: Whether to gzip the archive.
+    timeout_sec: A timeout for each adb call.
+
+  Returns:
+    The response of the first failing adb call, or of the last one.
+  """
+  files = []
+  for root, dirs, file_names in os.walk(local_path):
+    dirs.sort()
+    for file_name in sorted(file_names):
+      path = os.path.join(root, file_name)
+      name = os.path.relpath(path, local_path)
+      if include is None or include(name):
+        files.append((path, name))
+  if not files:
+    return adb_pb2.AdbResponse(status=adb_pb2.AdbResponse.Status.OK)
+  # Only directories leading to included files are archived, ahead of their
+  # contents.
+  dir_names = sorted(
+      {ancestor for _, name in files for ancestor in _ancestors(name)}
+  )
+  entries = [(os.path.join(local_path, name), name) for name in dir_names]
+  entries += files
+  return _push_archive(
+      _archive(entries, compress),
+      sorted({name.split(os.sep)[0] for _, name in files}),
+      device_path,
+      env,
+      compress,
+      timeout_sec,
+  )
+
+
+def push_files(
+    local_files: Iterable[str],
+    device_path: str,
+    env: env_interface.AndroidEnvInterface,
+    compress: bool = False,
+    timeout_sec: Optional[float] = None,
+) -> adb_pb2.AdbResponse:
+  """Copies local files into a device directory, keeping their base names.
+
+  Args:
+    local_files: Paths of local files.
+    device_path: The directory on the device; created if needed.
+    env: The environment.
+    compress: Whether to gzip the archive.
+    timeout_sec: A timeout for each adb call.
+
+  Returns:
+    The response of the first failing adb call, or of the last one.
+  """
+  entries = [(path, os.path.basename(path)) for path in local_files]
+  if not entries:
+    return adb_pb2.AdbResponse(status=adb_pb2.AdbResponse.Status.OK)
+  return _push_archive(
+      _archive(entries, compress),
+      [name for _, name in entries],
+      device_path,
+      env,
+      compress,
+      timeout_sec,
+  )
@@ -0,0 +1,203 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+r"""Compares per-file and tar transfers of directories on a running emulator.
+
+For each directory, it is pulled file by file with `AdbRequest.Pull` and with
+`tar_transfer.pull_directory`, then pushed back into a scratch directory file
+by file with `AdbRequest.Push` and with `tar_transfer.push_directory`:
+
+python -m android_world.utils.tar_transfer_benchmark \
+  --adb_path=~/Android/Sdk/platform-tools/adb --serial=emulator-5554
+
+By default the Joplin and OsmAnd data directories are used, so both apps should
+have been set up.
+"""
+
+from collections.abc import Callable, Sequence
+import os
+import tempfile
+import time
+
+from absl import app
+from absl import flags
+from android_env.components import adb_call_parser
+from android_env.components import adb_controller
+from android_env.components import config_classes
+from android_env.proto import adb_pb2
+from android_world.env import adb_utils
+from android_world.env import device_constants
+from android_world.utils import tar_transfer
+
+_ADB_PATH = flags.DEFINE_string(
+    'adb_path', '~/Android/Sdk/platform-tools/adb', 'Path to the adb binary.'
+)
+_ADB_SERVER_PORT = flags.DEFINE_integer(
+    'adb_server_port', 5037, 'ADB server port.'
+)
+_SERIAL = flags.DEFINE_string('serial', 'emulator-5554', 'Device serial.')
+_DIRECTORIES = flags.DEFINE_list(
+    'directories',
+    ['/data/data/net.cozic.joplin', device_constants.OSMAND_DATA],
+    'Device directories to transfer.',
+)
+_SCRATCH_DIR = flags.DEFINE_string(
+    'scratch_dir',
+    '/data/local/tmp/android_world_tar_benchmark',
+    'Device directory that pushes write to; removed afterwards.',
+)
+
+
+class _AdbEnv:
+  """Executes `AdbRequest`s like AndroidEnv, without starting a simulator."""
+
+  def __init__(self, controller: adb_controller.AdbController):
+    self._parser = adb_call_parser.AdbCallParser(controller)
+
+  def execute_adb_call(
+      self, request: adb_pb2.AdbRequest
+  ) -> adb_pb2.AdbResponse:
+    return self._parser.parse(request)
+
+
+def _timed(call: Callable[[], object]) -> float:
+  start = time.perf_counter()
+  call()
+  return time.perf_counter() - start
+
+
+def _list_files(device_path: str, env: _AdbEnv) -> list[str]:
+  response = adb_utils.issue_generic_request(
+      ['shell', f'cd {device_path} && find . -type f'], env
+  )
+  adb_utils.check_ok(response)
+  return [
+      line[2:]
+      for line in response.generic.output.decode('utf-8').splitlines()
+      if line.startswith('./')
+  ]
+
+
+def _pull_per_file(device_path: str, local_path: str, env: _AdbEnv) -> None:
+  for name in _list_files(device_path, env):
+    response = env.execute_adb_call(
+        adb_pb2.AdbRequest(
+            pull=adb_pb2.AdbRequest.Pull(path=os.path.join(device_path, name))
+        )
+    )
+    adb_utils.check_ok(response)
+    local_file = os.path.join(local_path, name)
+    os.makedirs(os.path.dirname(local_file), exist_ok=True)
+    with open(local_file, 'wb') as f:
+      f.write(response.pull.content)
+
+
+def _push_per_file(local_path: str, device_path: str, env: _AdbEnv) -> None:
+  for root, _, file_names in os.walk(local_path):
+    for file_name in file_names:
+      path = os.path.join(root, file_name)
+      with open(path, 'rb') as f:
+        content = f.read()
+      adb_utils.check_ok(
+          env.execute_adb_call(
+              adb_pb2.AdbRequest(
+                  push=adb_pb2.AdbRequest.Push(
+                      content=content,
+                      path=os.path.join(
+                          device_path, os.path.relpath(path, local_path)
+                      ),
+                  )
+              )
+          )
+      )
+
+
+def _directory_size(local_path: str) -> tuple[int, int]:
+  """Returns the number of files and bytes under `local_path`."""
+  num_files = num_bytes = 0
+  for root, _, file_names in os.walk(local_path):
+    for file_name in file_names:
+      num_files += 1
+      num_bytes += os.path.getsize(os.path.join(root, file_name))
+  return num_files, num_bytes
+
+
+def _run(device_path: str, env: _AdbEnv) -> None:
+  """Prints the transfer times of `device_path`."""
+  scratch = _SCRATCH_DIR.value
+  remove_scratch = lambda: adb_utils.issue_generic_request(
+      ['shell', f'rm -rf {scratch}'], env
+  )
+  with tempfile.TemporaryDirectory() as local_dir:
+    per_file, tar, tar_gz = (
+        os.path.join(local_dir, name) for name in ('per_file', 'tar', 'tar_gz')
+    )
+    results = {
+        'pull per file': _timed(
+            lambda: _pull_per_file(device_path, per_file, env)
+        ),
+        'pull tar': _timed(
+            lambda: tar_transfer.pull_directory(device_path, tar, env)
+        ),
+        'pull tar.gz': _timed(
+            lambda: tar_transfer.pull_directory(
+                device_path, tar_gz, env, compress=True
+            )
+        ),
+    }
+    remove_scratch()
+    results['push per file'] = _timed(
+        lambda: _push_per_file(per_file, scratch, env)
+    )
+    remove_scratch()
+    results['push tar'] = _timed(
+        lambda: adb_utils.check_ok(
+            tar_transfer.push_directory(per_file, scratch, env)
+        )
+    )
+    remove_scratch()
+    results['push tar.gz'] = _timed(
+        lambda: adb_utils.check_ok(
+            tar_transfer.push_directory(per_file, scratch, env, compress=True)
+        )
+    )
+    remove_scratch()
+    num_files, num_bytes = _directory_size(per_file)
+
+  print(f'{device_path}: {num_files} files, {num_bytes / 1e6:.1f} MB')
+  for label, seconds in results.items():
+    print(f'  {label:16}{seconds:>8.2f} s')
+  for direction in ('pull', 'push'):
+    speedup = results[f'{direction} per file'] / results[f'{direction} tar']
+    print(f'  {direction} speedup    {speedup:>8.1f}x')
+
+
+def main(argv: Sequence[str]) -> None:
+  if len(argv) > 1:
+    raise app.UsageError('Too many command-line arguments.')
+  controller = adb_controller.AdbController(
+      config_classes.AdbControllerConfig(
+          adb_path=os.path.expanduser(_ADB_PATH.value),
+          adb_server_port=_ADB_SERVER_PORT.value,
+          device_name=_SERIAL.value,
+      )
+  )
+  env = _AdbEnv(controller)
+  adb_utils.set_root_if_needed(env)
+  for device_path in _DIRECTORIES.value:
+    _run(device_path, env)
+
+
+if __name__ == '__main__':
+  app.run(main)
@@ -0,0 +1,242 @@
+# Copyright 2024 The android_world Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+from unittest import mock
+
+from absl.testing import absltest
+from absl.testing import parameterized
+from android_env.proto import adb_pb2
+from android_world.env import adb_utils
+from android_world.utils import tar_transfer
+
+
+def _ok(output: bytes = b'') -> adb_pb2.AdbResponse:
+  return adb_pb2.AdbResponse(
+      status=adb_pb2.AdbResponse.Status.OK,
+      generic=adb_pb2.AdbResponse.GenericResponse(output=output),
+  )
+
+
+def _write(path: str, content: bytes) -> None:
+  os.makedirs(os.path.dirname(path), exist_ok=True)
+  with open(path, 'wb') as f:
+    f.write(content)
+
+
+def _tar(files: dict[str, bytes], compress: bool = False) -> bytes:
+  buffer = io.BytesIO()
+  with tarfile.open(fileobj=buffer, mode='w:gz' if compress else 'w') as tar:
+    for name, content in files.items():
+      info = tarfile.TarInfo(name)
+      info.size = len(content)
+      tar.addfile(info, io.BytesIO(content))
+  return buffer.getvalue()
+
+
+def _untar(archive: bytes) -> dict[str, bytes]:
+  with tarfile.open(fileobj=io.BytesIO(archive), mode='r:*') as tar:
+    return {
+        member.name: (
+            tar.extractfile(member).read() if member.isfile() else None
+        )
+        for member in tar
+    }
+
+
+class PullDirectoryTest(parameterized.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.env = mock.MagicMock()
+    self.mock_issue_generic_request = self.enter_context(
+        mock.patch.object(adb_utils, 'issue_generic_request')
+    )
+    self.local_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.local_dir)
+
+  @parameterized.parameters(False, True)
+  def test_pulls_tree_with_one_call(self, compress):
+    self.mock_issue_generic_request.return_value = _ok(
+        _tar({'./a.txt': b'a', './sub/b.txt': b'b'}, compress)
+    )
+
+    tar_transfer.pull_directory(
+        '/sdcard/data', self.local_dir, self.env, compress=compress
+    )
+
+    self.mock_issue_generic_request.assert_called_once_with(
+        [
+            'exec-out',
+            f'tar {"-czf" if compress else "-cf"} - -C /sdcard/data .'
+            ' 2>/dev/null',
+        ],
+        self.env,
+        None,
+    )
+    with open(os.path.join(self.local_dir, 'sub/b.txt'), 'rb') as f:
+      self.assertEqual(f.read(), b'b')
+
+  def test_include_filter_selects_listed_files(self):
+    self.mock_issue_generic_request.side_effect = [
+        _ok(b'./a.txt\n./b.db\n./my notes.txt\n'),
+        _ok(_tar({'./a.txt': b'a', './my notes.txt': b'n'})),
+    ]
+
+    tar_transfer.pull_directory(
+        '/sdcard/data',
+        self.local_dir,
+        self.env,
+        include=lambda path: path.endswith('.txt'),
+    )
+
+    self.assertEqual(
+        self.mock_issue_generic_request.call_args.args[0],
+        [
+            'exec-out',
+            "tar -cf - -C /sdcard/data ./a.txt './my notes.txt' 2>/dev/null",
+        ],
+    )
+    self.assertCountEqual(
+        os.listdir(self.local_dir), ['a.txt', 'my notes.txt']
+    )
+
+  def test_nothing_included_skips_archive(self):
+    self.mock_issue_generic_request.return_value = _ok(b'./b.db\n')
+
+    tar_transfer.pull_directory(
+        '/sdcard/data', self.local_dir, self.env, include=lambda path: False
+    )
+
+    self.mock_issue_generic_request.assert_called_once()
+
+  def test_unsafe_members_are_skipped(self):
+    self.mock_issue_generic_request.return_value = _ok(
+        _tar({'../escape.txt': b'x', './ok.txt': b'ok'})
+    )
+
+    tar_transfer.pull_directory('/sdcard/data', self.local_dir, self.env)
+
+    self.assertEqual(os.listdir(self.local_dir), ['ok.txt'])
+
+  def test_invalid_archive_raises(self):
+    self.mock_issue_generic_request.return_value = _ok(b'not a tar archive')
+
+    with self.assertRaises(RuntimeError):
+      tar_transfer.pull_directory('/sdcard/data', self.local_dir, self.env)
+
+
+class PushTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.env = mock.MagicMock()
+    self.env.execute_adb_call.return_value = _ok()
+    self.mock_issue_generic_request = self.enter_context(
+        mock.patch.object(
+            adb_utils, 'issue_generic_request', return_value=_ok()
+        )
+    )
+    self.local_dir = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, self.local_dir)
+
+  def _pushed_archive(self) -> bytes:
+    request = self.env.execute_adb_call.call_args.args[0]
+    return request.push.content
+
+  def test_push_directory_pushes_one_archive(self):
+    _write(os.path.join(self.local_dir, 'a.txt'), b'a')
+    _write(os.path.join(self.local_dir, 'sub', 'b.txt'), b'b')
+
+    response = tar_transfer.push_directory(
+        self.local_dir, '/sdcard/data', self.env
+    )
+
+    self.assertEqual(response.status, adb_pb2.AdbResponse.Status.OK)
+    self.env.execute_adb_call.assert_called_once()
+    self.assertEqual(
+        _untar(self._pushed_archive()),
+        {'a.txt': b'a', 'sub': None, 'sub/b.txt': b'b'},
+    )
+    staged = self.env.execute_adb_call.call_args.args[0].push.path
+    self.mock_issue_generic_request.assert_called_once_with(
+        [
+            'shell',
+            f'mkdir -p /sdcard/data && tar -xf {staged} -C /sdcard/data &&'
+            ' chmod -R 777 /sdcard/data/a.txt /sdcard/data/sub; status=$?;'
+            f' rm -f {staged}; exit $status',
+        ],
+        self.env,
+        None,
+    )
+
+  def test_push_directory_include_filter(self):
+    _write(os.path.join(self.local_dir, 'a.txt'), b'a')
+    _write(os.path.join(self.local_dir, 'sub', 'b.db'), b'b')
+
+    tar_transfer.push_directory(
+        self.local_dir,
+        '/sdcard/data',
+        self.env,
+        include=lambda path: path.endswith('.txt'),
+    )
+
+    self.assertEqual(_untar(self._pushed_archive()), {'a.txt': b'a'})
+
+  def test_push_files_compressed(self):
+    first = os.path.join(self.local_dir, 'one', 'map.obf')
+    second = os.path.join(self.local_dir, 'two', 'notes.db')
+    _write(first, b'map')
+    _write(second, b'notes')
+
+    tar_transfer.push_files(
+        [first, second], '/sdcard/maps', self.env, compress=True
+    )
+
+    self.assertEqual(
+        _untar(self._pushed_archive()),
+        {'map.obf': b'map', 'notes.db': b'notes'},
+    )
+    self.assertIn(
+        'tar -xzf', self.mock_issue_generic_request.call_args.args[0][1]
+    )
+
+  def test_failed_push_is_returned(self):
+    _write(os.path.join(self.local_dir, 'a.txt'), b'a')
+    self.env.execute_adb_call.return_value = adb_pb2.AdbResponse(
+        status=adb_pb2.AdbResponse.Status.ADB_ERROR
+    )
+
+    response = tar_transfer.push_directory(
+        self.local_dir, '/sdcard/data', self.env
+    )
+
+    self.assertEqual(response.status, adb_pb2.AdbResponse.Status.ADB_ERROR)
+    self.mock_issue_generic_request.assert_not_called()
+
+  def test_empty_directory_is_not_pushed(self):
+    response = tar_transfer.push_directory(
+        self.local_dir, '/sdcard/data', self.env
+    )
+
+    self.assertEqual(response.status, adb_pb2.AdbResponse.Status.OK)
+    self.env.execute_adb_call.assert_not_called()
+
+
+if __name__ == '__main__':
+  absltest.main()
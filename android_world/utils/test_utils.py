@@ -157,6 +157,9 @@ class AdbEvalTestBase(absltest.TestCase):
     self.mock_get_orientation = mock.patch.object(
         adb_utils, 'get_orientation'
     ).start()
+    self.mock_get_device_geometry = mock.patch.object(
+        adb_utils, 'get_device_geometry'
+    ).start()
     self.mock_set_datetime = mock.patch.object(
         datetime_utils, 'set_datetime'
     ).start()
@@ -233,8 +236,16 @@ class FakeAsyncEnv(interface.AsyncAndroidEnv):
         ui_elements=[],
     )
 
-  def execute_action(self, action: json_action.JSONAction):
-    del action
+  def execute_action(
+      self,
+      action: json_action.JSONAction,
+      state_token: int | None = None,
+  ):
+    del action, state_token
+
+  def wait_for_settle(self, max_wait: float) -> float:
+    del max_wait
+    return 0.0
 
   def run_adb_command(self, command: str) -> adb_pb2.AdbResponse:
     del command
@@ -251,3 +262,11 @@ class FakeAsyncEnv(interface.AsyncAndroidEnv):
   @property
   def logical_screen_size(self) -> tuple[int, int]:
     return (100, 100)
+
+  @property
+  def orientation(self) -> int:
+    return adb_utils.get_orientation(self.controller)
+
+  @property
+  def physical_frame_boundary(self) -> tuple[int, int, int, int]:
+    return adb_utils.get_physical_frame_boundary(self.controller)
@@ -32,6 +32,7 @@ from android_world import suite_utils
 from android_world.agents import base_agent
 from android_world.agents import human_agent
 from android_world.agents import infer
+from android_world.agents import llm_cache as llm_cache_lib
 from android_world.agents import m3a
 from android_world.agents import random_agent
 from android_world.agents import seeact
@@ -39,6 +40,8 @@ from android_world.agents import t3a
 from android_world.agents import mobile_agent_e_w_m3a_perception
 from android_world.env import env_launcher
 from android_world.env import interface
+from android_world.task_evals import task_eval
+from android_world.utils import reset_strategy
 
 logging.set_verbosity(logging.WARNING)
 
@@ -74,6 +77,24 @@ _EMULATOR_SETUP = flags.DEFINE_boolean(
     ' before running Android World. After an emulator is setup, this flag'
     ' should always be False.',
 )
+_USE_ADB_WIRE_CLIENT = flags.DEFINE_boolean(
+    'use_adb_wire_client',
+    False,
+    'Whether to send adb shell commands and file transfers to the ADB server'
+    ' over pooled connections instead of spawning an adb process per call.',
+)
+_CONCURRENT_OBSERVATIONS = flags.DEFINE_boolean(
+    'concurrent_observations',
+    False,
+    'Whether to capture the screenshot and the UI tree of each observation'
+    ' concurrently.',
+)
+_WARM_STANDBY = flags.DEFINE_boolean(
+    'warm_standby',
+    False,
+    'Whether to keep a second controller warm in the background, so that a'
+    ' lost a11y connection is restored without reloading AndroidEnv.',
+)
 _DEVICE_CONSOLE_PORT = flags.DEFINE_integer(
     'console_port',
     5554,
@@ -82,6 +103,25 @@ _DEVICE_CONSOLE_PORT = flags.DEFINE_integer(
     ' first connected device is port 5554, the second is 5556, and'
     ' so on.',
 )
+_DEVICE_PORTS = flags.DEFINE_list(
+    'device_ports',
+    None,
+    'If set, runs the suite in parallel on several devices, given as'
+    ' `console_port:grpc_port` pairs, e.g. `5554:8554,5556:8556`. Each device'
+    ' needs its own gRPC port for the accessibility forwarder. Overrides'
+    ' --console_port.',
+)
+_RESET_STRATEGY = flags.DEFINE_enum(
+    'reset_strategy',
+    reset_strategy.AppSnapshotReset.name,
+    [
+        reset_strategy.AppSnapshotReset.name,
+        reset_strategy.EmulatorSnapshotReset.name,
+    ],
+    'How app data is reset around each task. `emulator_snapshot` saves an'
+    ' emulator snapshot of each device at startup and loads it for every'
+    ' reset, falling back to app snapshots if loading fails.',
+)
 
 _SUITE_FAMILY = flags.DEFINE_enum(
     'suite_family',
@@ -131,6 +171,39 @@ _OUTPUT_PATH = flags.DEFINE_string(
 # Agent specific.
 _AGENT_NAME = flags.DEFINE_string('agent_name', 'm3a_gpt4v', help='Agent name.')
 
+_PIPELINED = flags.DEFINE_boolean(
+    'pipelined',
+    False,
+    'Whether M3A and T3A summarize each step in the background, while the'
+    ' next step waits for the screen to settle and observes it.',
+)
+_DETERMINISTIC_SUB_AGENTS = flags.DEFINE_boolean(
+    'deterministic_sub_agents',
+    False,
+    'Whether Mobile-Agent-E runs its sub-agents one by one, instead of taking'
+    ' notes while the next step observes the screen. Useful for debugging.',
+)
+_LLM_CACHE_PATH = flags.DEFINE_string(
+    'llm_cache_path',
+    '',
+    'SQLite file to cache LLM responses in, keyed on the model, temperature,'
+    ' prompt and screenshots. Disabled if empty.',
+)
+_LLM_CACHE_MODE = flags.DEFINE_enum(
+    'llm_cache_mode',
+    'read_write',
+    [mode.value for mode in llm_cache_lib.CacheMode],
+    'read_only serves cached responses without storing new ones, read_write'
+    ' also stores them and record always calls the model, replacing cached'
+    ' responses.',
+)
+_LLM_CACHE_MAX_MB = flags.DEFINE_integer(
+    'llm_cache_max_mb',
+    1024,
+    'Maximum size of the LLM cache; least recently used responses are evicted'
+    ' beyond it.',
+)
+
 _FIXED_TASK_SEED = flags.DEFINE_boolean(
     'fixed_task_seed',
     False,
@@ -154,9 +227,16 @@ _MINIWOB_ADDITIONAL_GUIDELINES = [
 def _get_agent(
     env: interface.AsyncEnv,
     family: str | None = None,
+    llm_cache: llm_cache_lib.ResponseCache | None = None,
 ) -> base_agent.EnvironmentInteractingAgent:
   """Gets agent."""
   print('Initializing agent...')
+
+  def cached(llm: infer.LlmWrapper) -> infer.LlmWrapper:
+    if llm_cache is None:
+      return llm
+    return llm_cache_lib.CachingLlmWrapper(llm, llm_cache)
+
   agent = None
   if _AGENT_NAME.value == 'human_agent':
     agent = human_agent.HumanAgent(env)
@@ -165,24 +245,40 @@ def _get_agent(
   # Gemini.
   elif _AGENT_NAME.value == 'm3a_gemini_gcp':
     agent = m3a.M3A(
-        env, infer.GeminiGcpWrapper(model_name='gemini-1.5-pro-latest')
+        env,
+        cached(infer.GeminiGcpWrapper(model_name='gemini-1.5-pro-latest')),
+        pipelined=_PIPELINED.value,
     )
   elif _AGENT_NAME.value == 't3a_gemini_gcp':
     agent = t3a.T3A(
-        env, infer.GeminiGcpWrapper(model_name='gemini-1.5-pro-latest')
+        env,
+        cached(infer.GeminiGcpWrapper(model_name='gemini-1.5-pro-latest')),
+        pipelined=_PIPELINED.value,
     )
   # GPT.
   elif _AGENT_NAME.value == 't3a_gpt4':
     # agent = t3a.T3A(env, infer.Gpt4Wrapper('gpt-4-turbo-2024-04-09'))
-    agent = t3a.T3A(env, infer.Gpt4Wrapper('gpt-4o-mini'))
+    agent = t3a.T3A(
+        env,
+        cached(infer.Gpt4Wrapper('gpt-4o-mini')),
+        pipelined=_PIPELINED.value,
+    )
   elif _AGENT_NAME.value == 'm3a_gpt4v':
-    agent = m3a.M3A(env, infer.Gpt4Wrapper('gpt-4-turbo-2024-04-09'))
+    agent = m3a.M3A(
+        env,
+        cached(infer.Gpt4Wrapper('gpt-4-turbo-2024-04-09')),
+        pipelined=_PIPELINED.value,
+    )
   # SeeAct.
   elif _AGENT_NAME.value == 'seeact':
     agent = seeact.SeeAct(env)
   # Mobile Agent E.
   elif _AGENT_NAME.value == 'mobile_agent_e_gpt4o':
-    agent = mobile_agent_e_w_m3a_perception.MobileAgentE_M3A(env, infer.Gpt4Wrapper('gpt-4o-2024-11-20'))
+    agent = mobile_agent_e_w_m3a_perception.MobileAgentE_M3A(
+        env,
+        cached(infer.Gpt4Wrapper('gpt-4o-2024-11-20')),
+        deterministic_sub_agents=_DETERMINISTIC_SUB_AGENTS.value,
+    )
 
   if not agent:
     raise ValueError(f'Unknown agent: {_AGENT_NAME.value}')
@@ -202,14 +298,47 @@ def _get_agent(
   return agent
 
 
-def _main() -> None:
-  """Runs eval suite and gets rewards back."""
-  env = env_launcher.load_and_setup_env(
-      console_port=_DEVICE_CONSOLE_PORT.value,
+def _parse_device_ports(device_ports: Sequence[str]) -> list[tuple[int, int]]:
+  """Parses `console_port:grpc_port` pairs."""
+  ports = []
+  for pair in device_ports:
+    console_port, sep, grpc_port = pair.partition(':')
+    if not sep:
+      raise ValueError(
+          f'Invalid device ports {pair!r}; expected console_port:grpc_port.'
+      )
+    ports.append((int(console_port), int(grpc_port)))
+  return ports
+
+
+def _load_env(console_port: int, grpc_port: int = 8554) -> interface.AsyncEnv:
+  return env_launcher.load_and_setup_env(
+      console_port=console_port,
       emulator_setup=_EMULATOR_SETUP.value,
       adb_path=_ADB_PATH.value,
+      grpc_port=grpc_port,
+      use_adb_wire_client=_USE_ADB_WIRE_CLIENT.value,
+      concurrent_observations=_CONCURRENT_OBSERVATIONS.value,
+      warm_standby=_WARM_STANDBY.value,
   )
 
+
+def _main() -> None:
+  """Runs eval suite and gets rewards back."""
+  if _DEVICE_PORTS.value:
+    envs = [
+        _load_env(console_port, grpc_port)
+        for console_port, grpc_port in _parse_device_ports(_DEVICE_PORTS.value)
+    ]
+  else:
+    envs = [_load_env(_DEVICE_CONSOLE_PORT.value)]
+
+  task_eval.TaskEval.reset_strategy = reset_strategy.get_reset_strategy(
+      _RESET_STRATEGY.value
+  )
+  for env in envs:
+    task_eval.TaskEval.reset_strategy.prepare(env)
+
   n_task_combinations = _N_TASK_COMBINATIONS.value
   print("n_task_combinations: ", n_task_combinations)
   task_registry = registry.TaskRegistry()
@@ -222,14 +351,27 @@ def _main() -> None:
   )
   suite.suite_family = _SUITE_FAMILY.value
 
-  agent = _get_agent(env, _SUITE_FAMILY.value)
-  print("Agent:", agent)
+  llm_cache = None
+  if _LLM_CACHE_PATH.value:
+    llm_cache = llm_cache_lib.ResponseCache(
+        _LLM_CACHE_PATH.value,
+        max_bytes=_LLM_CACHE_MAX_MB.value * 2**20,
+        mode=llm_cache_lib.CacheMode(_LLM_CACHE_MODE.value),
+    )
 
-  if _SUITE_FAMILY.value.startswith('miniwob'):
-    # MiniWoB pages change quickly, don't need to wait for screen to stabilize.
-    agent.transition_pause = _MINIWOB_TRANSITION_PAUSE
-  else:
-    agent.transition_pause = None
+  agents = [
+      _get_agent(env, _SUITE_FAMILY.value, llm_cache=llm_cache)
+      for env in envs
+  ]
+  print("Agent:", agents[0])
+
+  for agent in agents:
+    if _SUITE_FAMILY.value.startswith('miniwob'):
+      # MiniWoB pages change quickly, don't need to wait for screen to
+      # stabilize.
+      agent.transition_pause = _MINIWOB_TRANSITION_PAUSE
+    else:
+      agent.transition_pause = None
 
   if _CHECKPOINT_DIR.value:
     checkpoint_dir = _CHECKPOINT_DIR.value
@@ -240,17 +382,32 @@ def _main() -> None:
       f'Starting eval with agent {_AGENT_NAME.value} and writing to'
       f' {checkpoint_dir}'
   )
-  suite_utils.run(
-      suite,
-      agent,
-      checkpointer=checkpointer_lib.IncrementalCheckpointer(checkpoint_dir),
-      demo_mode=False,
-  )
+  checkpointer = checkpointer_lib.IncrementalCheckpointer(checkpoint_dir)
+  if len(agents) > 1:
+    suite_utils.run_parallel(suite, agents, checkpointer=checkpointer)
+  else:
+    suite_utils.run(
+        suite,
+        agents[0],
+        checkpointer=checkpointer,
+        demo_mode=False,
+    )
   print(
       f'Finished running agent {_AGENT_NAME.value} on {_SUITE_FAMILY.value}'
       f' family. Wrote to {checkpoint_dir}.'
   )
-  env.close()
+  for agent in agents:
+    agent.close()
+  if llm_cache is not None:
+    stats = llm_cache.stats
+    print(
+        f'LLM cache: {stats.hits} hits, {stats.misses} misses'
+        f' ({stats.hit_rate:.1%} hit rate), {stats.writes} writes,'
+        f' {stats.evictions} evictions.'
+    )
+    llm_cache.close()
+  for env in envs:
+    env.close()
 
 
 def main(argv: Sequence[str]) -> None: